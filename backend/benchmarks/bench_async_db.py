@@ -0,0 +1,148 @@
+"""
+benchmark: request throughput with DB waits on the sync engine vs the async engine.
+
+two minimal handlers run the same lookup with simulated server-side latency:
+  blocking  - the old pattern: an `async def` handler issuing queries on a sync Session,
+              so every DB wait stalls the event loop and requests serialize
+  async     - the current pattern: AsyncSession (core/database.py), DB waits yield to the loop
+
+latency is injected inside the database (a sleep_ms() SQL function on SQLite, pg_sleep on postgres),
+so it behaves like a slow query rather than slow Python. requests go through httpx's ASGI transport.
+
+usage (from backend/):
+    python -m benchmarks.bench_async_db --requests 200 --concurrency 50 --latency-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from core.database import Base, async_url
+from modules.storage.models import User, Conversation, Node
+
+
+def install_sleep(engine) -> None:
+    # sqlite has no sleep(); register one per connection. runs wherever the driver runs the query
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, _):
+        dbapi_connection.create_function("sleep_ms", 1, lambda ms: time.sleep(ms / 1000) or 0)
+
+def slow_lookup(url: str, node_id: int, latency_ms: int):
+    delay = func.pg_sleep(latency_ms / 1000) if url.startswith("postgresql") else func.sleep_ms(latency_ms)
+    return select(Node.id, Node.position_x, Node.position_y, delay).where(Node.id == node_id)
+
+def build_app(url: str, concurrency: int, latency_ms: int) -> FastAPI:
+    sync_engine = create_engine(url, pool_size = concurrency)
+    async_engine = create_async_engine(async_url(url), pool_size = concurrency)
+    if not url.startswith("postgresql"):
+        install_sleep(sync_engine)
+        install_sleep(async_engine.sync_engine)
+
+    sync_factory = sessionmaker(bind = sync_engine)
+    async_factory = async_sessionmaker(async_engine, expire_on_commit = False)
+
+    def get_sync_db():
+        db = sync_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_factory() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/blocking/{node_id}")
+    async def blocking(node_id: int, db: Session = Depends(get_sync_db)):
+        row = db.execute(slow_lookup(url, node_id, latency_ms)).first()
+        return {"id": row.id, "x": row.position_x, "y": row.position_y}
+
+    @app.get("/async/{node_id}")
+    async def non_blocking(node_id: int, db: AsyncSession = Depends(get_async_db)):
+        row = (await db.execute(slow_lookup(url, node_id, latency_ms))).first()
+        return {"id": row.id, "x": row.position_x, "y": row.position_y}
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+def seed(url: str, nodes: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id = 1, name = "bench", email = "bench@example.com"))
+        db.add(Conversation(id = 1, user_id = 1, title = "bench"))
+        db.execute(insert(Node), [
+            {"id": i, "conversation_id": 1, "node_type": "prompt", "prompt_text": "",
+             "position_x": i, "position_y": i, "type_data": {}}
+            for i in range(1, nodes + 1)
+        ])
+        db.commit()
+    engine.dispose()
+
+async def load(app: FastAPI, path: str, requests: int, concurrency: int, nodes: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(f"/{path}/{i % nodes + 1}")
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "total_ms": elapsed * 1000,
+        "requests_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type = int, default = 200)
+    parser.add_argument("--concurrency", type = int, default = 50)
+    parser.add_argument("--latency-ms", type = int, default = 5, help = "simulated per-query DB latency")
+    parser.add_argument("--nodes", type = int, default = 100)
+    parser.add_argument("--url", default = None, help = "sync database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    seed(url, args.nodes)
+    app = build_app(url, args.concurrency, args.latency_ms)
+
+    results = {"requests": args.requests, "concurrency": args.concurrency, "latency_ms": args.latency_ms}
+    for path in ("blocking", "async"):
+        results[path] = asyncio.run(load(app, path, args.requests, args.concurrency, args.nodes))
+    results["speedup"] = results["async"]["requests_per_s"] / results["blocking"]["requests_per_s"]
+    print(json.dumps(results, indent = 2))
+
+    sync_engine, async_engine = app.state.engines
+    sync_engine.dispose()
+    asyncio.run(async_engine.dispose())
+    tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
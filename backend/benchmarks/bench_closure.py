@@ -0,0 +1,240 @@
+"""
+benchmark: closure-table ancestry (storage/closure.py) vs the old ARRAY ancestor_ids approach.
+
+builds synthetic conversation DAGs (10k-100k nodes by default), then times ancestor lookups,
+descendant lookups, and keeping ancestry correct after inserting / deleting internal edges.
+the array baseline stores ancestor lists in a side table and, like any correct array scheme,
+has to scan the conversation to find descendants.
+
+usage (from backend/):
+    python -m benchmarks.bench_closure --sizes 10000 50000 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import Column, Integer, JSON, create_engine, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from core.database import Base
+from modules.storage import closure
+from modules.storage.models import User, Conversation, Node, Edge
+
+CONVERSATION_SIZE = 1000
+PARENT_WINDOW = 50
+MERGE_PROBABILITY = 0.1
+
+
+class ArrayAncestry(Base):
+    """
+    stand-in for the old Node.ancestor_ids ARRAY column
+    """
+    __tablename__ = "bench_array_ancestry"
+
+    id = Column(Integer, primary_key = True)
+    conversation_id = Column(Integer, nullable = False, index = True)
+    ancestor_ids = Column(JSON, nullable = False)
+
+
+def generate_dag(size, rng):
+    """
+    conversations of CONVERSATION_SIZE nodes; each node hangs off a recent node,
+    occasionally merging a second parent. returns (conversation of each node, edges)
+    """
+    conversation_of = {}
+    edges = []
+    for node_id in range(1, size + 1):
+        conversation_id = (node_id - 1) // CONVERSATION_SIZE + 1
+        conversation_of[node_id] = conversation_id
+        first = (conversation_id - 1) * CONVERSATION_SIZE + 1
+        if node_id == first:
+            continue
+
+        window = range(max(first, node_id - PARENT_WINDOW), node_id)
+        parents = {rng.choice(window)}
+        if rng.random() < MERGE_PROBABILITY:
+            parents.add(rng.choice(window))
+        edges.extend((parent, node_id) for parent in sorted(parents))
+    return conversation_of, edges
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+def median_ms(samples):
+    return statistics.median(samples) if samples else float("nan")
+
+
+# --- array baseline -------------------------------------------------------------
+
+def array_build(db, conversation_of, edges):
+    ancestors = defaultdict(set)
+    for source, target in edges:
+        # what create_edge used to do: copy source's list + source onto target
+        ancestors[target] |= ancestors[source] | {source}
+    db.execute(insert(ArrayAncestry), [
+        {"id": node_id, "conversation_id": conversation_id, "ancestor_ids": sorted(ancestors[node_id])}
+        for node_id, conversation_id in conversation_of.items()
+    ])
+
+def array_ancestors(db, node_id):
+    return db.scalar(select(ArrayAncestry.ancestor_ids).where(ArrayAncestry.id == node_id))
+
+def array_descendants(db, node_id, conversation_id):
+    # no reverse index on an array column without GIN; scan the conversation
+    rows = db.execute(
+        select(ArrayAncestry.id, ArrayAncestry.ancestor_ids).where(ArrayAncestry.conversation_id == conversation_id)
+    ).all()
+    return [row_id for row_id, ancestor_ids in rows if node_id in ancestor_ids]
+
+def array_add_edge(db, source, target, conversation_id):
+    # keeping arrays correct means pushing the new ancestors into every descendant
+    new_ancestors = set(array_ancestors(db, source)) | {source}
+    rows = db.execute(
+        select(ArrayAncestry.id, ArrayAncestry.ancestor_ids).where(ArrayAncestry.conversation_id == conversation_id)
+    ).all()
+    updates = [
+        {"id": row_id, "ancestor_ids": sorted(set(ancestor_ids) | new_ancestors)}
+        for row_id, ancestor_ids in rows
+        if row_id == target or target in ancestor_ids
+    ]
+    db.execute(update(ArrayAncestry), updates)
+
+def array_remove_edge(db, target, conversation_id):
+    # recompute every affected list from the edge table
+    rows = db.execute(
+        select(ArrayAncestry.id, ArrayAncestry.ancestor_ids).where(ArrayAncestry.conversation_id == conversation_id)
+    ).all()
+    affected = {row_id for row_id, ancestor_ids in rows if row_id == target or target in ancestor_ids}
+    parents = defaultdict(list)
+    for source, edge_target in db.execute(
+        select(Edge.source_node_id, Edge.target_node_id).where(Edge.conversation_id == conversation_id)
+    ):
+        parents[edge_target].append(source)
+
+    memo = {}
+    def walk(node_id):
+        if node_id not in memo:
+            result = set()
+            for parent in parents[node_id]:
+                result |= walk(parent) | {parent}
+            memo[node_id] = result
+        return memo[node_id]
+
+    db.execute(update(ArrayAncestry), [
+        {"id": node_id, "ancestor_ids": sorted(walk(node_id))} for node_id in affected
+    ])
+
+
+# --- closure table ------------------------------------------------------------
+
+def closure_build(db, conversation_of, edges):
+    for source, target in edges:
+        closure.add_edge(db, source, target)
+
+def closure_add_edge(db, source, target, conversation_id):
+    closure.add_edge(db, source, target)
+
+def closure_remove_edge(db, target, conversation_id):
+    closure.remove_edge(db, target)
+
+
+def run(size, url, samples, seed):
+    rng = random.Random(seed)
+    conversation_of, edges = generate_dag(size, rng)
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        db.add(User(id = 1, name = "bench", email = "bench@example.com"))
+        conversation_count = max(conversation_of.values())
+        db.execute(insert(Conversation), [
+            {"id": i, "user_id": 1, "title": f"bench {i}"} for i in range(1, conversation_count + 1)
+        ])
+        db.execute(insert(Node), [
+            {"id": node_id, "conversation_id": conversation_id, "node_type": "prompt",
+             "prompt_text": "", "position_x": 0, "position_y": 0, "type_data": {}}
+            for node_id, conversation_id in conversation_of.items()
+        ])
+        db.execute(insert(Edge), [
+            {"conversation_id": conversation_of[target], "source_node_id": source, "target_node_id": target}
+            for source, target in edges
+        ])
+        closure.add_nodes(db, conversation_of.keys())
+        db.commit()
+
+        results = {"nodes": size, "edges": len(edges)}
+        results["build_array_bulk_ms"], _ = timed(array_build, db, conversation_of, edges)
+        results["build_closure_incremental_ms"], _ = timed(closure_build, db, conversation_of, edges)
+        db.commit()
+
+        probes = rng.sample(sorted(conversation_of), samples)
+
+        for label, fn in (("array", array_ancestors), ("closure", closure.ancestor_ids)):
+            results[f"ancestors_{label}_ms"] = median_ms([timed(fn, db, node_id)[0] for node_id in probes])
+
+        results["descendants_array_ms"] = median_ms([
+            timed(array_descendants, db, node_id, conversation_of[node_id])[0] for node_id in probes
+        ])
+        results["descendants_closure_ms"] = median_ms([
+            timed(closure.descendant_ids, db, node_id)[0] for node_id in probes
+        ])
+
+        # internal edge insert + delete, same random edges for both schemes
+        mutations = []
+        while len(mutations) < min(samples, 100):
+            target = rng.choice(probes)
+            first = (conversation_of[target] - 1) * CONVERSATION_SIZE + 1
+            if target - first < 2:
+                continue
+            source = rng.randrange(first, target - 1)
+            if not closure.would_create_cycle(db, source, target):
+                mutations.append((source, target))
+
+        for label, add_fn, remove_fn in (
+            ("array", array_add_edge, array_remove_edge),
+            ("closure", closure_add_edge, closure_remove_edge),
+        ):
+            insert_samples, delete_samples = [], []
+            for source, target in mutations:
+                conversation_id = conversation_of[target]
+                nested = db.begin_nested()
+                edge = Edge(conversation_id = conversation_id, source_node_id = source, target_node_id = target)
+                db.add(edge)
+                db.flush()
+                insert_samples.append(timed(add_fn, db, source, target, conversation_id)[0])
+
+                db.execute(delete(Edge).where(Edge.id == edge.id))
+                delete_samples.append(timed(remove_fn, db, target, conversation_id)[0])
+                nested.rollback()
+
+            results[f"edge_insert_{label}_ms"] = median_ms(insert_samples)
+            results[f"edge_delete_{label}_ms"] = median_ms(delete_samples)
+
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10_000, 50_000, 100_000])
+    parser.add_argument("--url", default = "sqlite://", help = "database URL (default: in-memory SQLite)")
+    parser.add_argument("--samples", type = int, default = 200)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(json.dumps(run(size, args.url, args.samples, args.seed), indent = 2))
+
+if __name__ == "__main__":
+    main()
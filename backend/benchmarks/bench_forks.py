@@ -0,0 +1,176 @@
+"""
+benchmark: copy-on-write conversation forks (storage/forks.py) vs deep-copying the conversation.
+
+builds one synthetic conversation (10k nodes by default), then times forking it both ways, the
+first edit of an inherited node in the fork (the copy it materializes), loading what the fork
+changed as edits accumulate, and a graph page of the fork vs the same page of its snapshot.
+
+usage (from backend/):
+    python -m benchmarks.bench_forks --sizes 10000 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from core.database import Base
+from modules.storage import closure
+from modules.storage.content import save_prompt_text
+from modules.storage.forks import fork_conversation, writable_node
+from modules.storage.graph import load_fork_changes, load_graph_page
+from modules.storage.models import User, Conversation, Node, Edge, NodeClosure
+
+MERGE_PROBABILITY = 0.05
+CHANGE_STEPS = (1, 10, 100, 1000)
+PAGE_SIZE = 1000
+
+
+def generate_dag(size, rng):
+    """
+    a random recursive tree (shallow, like branching chats) with occasional merges of a second parent
+    """
+    edges = []
+    for node_id in range(2, size + 1):
+        parents = {rng.randrange(1, node_id)}
+        if rng.random() < MERGE_PROBABILITY:
+            parents.add(rng.randrange(1, node_id))
+        edges.extend((parent, node_id) for parent in sorted(parents))
+    return edges
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+def median_ms(samples):
+    return statistics.median(samples) if samples else float("nan")
+
+def node_count(db):
+    return db.scalar(select(func.count()).select_from(Node))
+
+
+# --- deep copy baseline -------------------------------------------------------
+
+def deep_copy(db, conversation_id):
+    """
+    what forking costs without sharing: every node, edge and closure row copied under new ids
+    """
+    base = db.get(Conversation, conversation_id)
+    copy = Conversation(user_id = base.user_id, title = f"{base.title} (copy)")
+    db.add(copy)
+    db.flush()
+
+    columns = [column for column in Node.__table__.columns if column.name not in ("id", "conversation_id", "client_id")]
+    rows = db.execute(select(Node.id, *columns).where(Node.conversation_id == conversation_id).order_by(Node.id)).all()
+    new_ids = db.scalars(
+        insert(Node).returning(Node.id, sort_by_parameter_order = True),
+        [{"conversation_id": copy.id, **{column.name: value for column, value in zip(columns, row[1:])}} for row in rows]
+    ).all()
+    mapped = {row.id: new_id for row, new_id in zip(rows, new_ids)}
+
+    db.execute(insert(Edge), [
+        {"conversation_id": copy.id, "source_node_id": mapped[source], "target_node_id": mapped[target]}
+        for source, target in db.execute(
+            select(Edge.source_node_id, Edge.target_node_id).where(Edge.conversation_id == conversation_id)
+        )
+    ])
+    db.execute(insert(NodeClosure), [
+        {"ancestor_id": mapped[ancestor], "descendant_id": mapped[descendant], "depth": depth}
+        for ancestor, descendant, depth in db.execute(
+            select(NodeClosure.ancestor_id, NodeClosure.descendant_id, NodeClosure.depth)
+            .where(NodeClosure.descendant_id.in_(list(mapped)))
+        )
+    ])
+    return copy
+
+
+def run(size, url, samples, seed):
+    rng = random.Random(seed)
+    edges = generate_dag(size, rng)
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as db:
+        db.add(User(id = 1, name = "bench", email = "bench@example.com"))
+        db.add(Conversation(id = 1, user_id = 1, title = "bench"))
+        db.execute(insert(Node), [
+            {"id": node_id, "conversation_id": 1, "node_type": "prompt", "prompt_text": f"prompt {node_id}",
+             "response_text": f"response {node_id}", "response_size": 16,
+             "position_x": node_id % 100 * 300, "position_y": node_id // 100 * 200, "type_data": {}}
+            for node_id in range(1, size + 1)
+        ])
+        db.execute(insert(Edge), [
+            {"conversation_id": 1, "source_node_id": source, "target_node_id": target} for source, target in edges
+        ])
+        closure.add_nodes(db, range(1, size + 1))
+        for source, target in edges:
+            closure.add_edge(db, source, target)
+        db.commit()
+
+        results = {"nodes": size, "edges": len(edges)}
+
+        results["deep_copy_ms"], _ = timed(deep_copy, db, 1)
+        db.rollback()
+
+        before = node_count(db)
+        results["fork_cow_ms"], fork = timed(fork_conversation, db, 1)
+        db.commit()
+        results["fork_cow_rows_copied"] = node_count(db) - before
+
+        # first write to an inherited node: materialize the fork's copy, then save into it
+        def first_edit(node_id):
+            copy_id, _ = writable_node(db, node_id, fork.id)
+            save_prompt_text(db, copy_id, f"edited {node_id}")
+
+        targets = rng.sample(range(1, size + 1), min(size, max(CHANGE_STEPS)))
+        edit_samples = [timed(first_edit, node_id)[0] for node_id in targets[:samples]]
+        db.commit()
+        results["first_edit_ms"] = median_ms(edit_samples)
+
+        # loading the fork's changes grows with what it changed, not with the snapshot. an edit also
+        # changes the executed nodes below it: the fork takes stale copies of them
+        results["changes"] = []
+        edited = len(edit_samples)
+        for step in sorted({edited, *CHANGE_STEPS}):
+            if step < edited or step > len(targets):
+                continue
+            for node_id in targets[edited:step]:
+                first_edit(node_id)
+            edited = step
+            db.commit()
+            results["changes"].append({
+                "edits": step,
+                "rows_changed": node_count(db) - before,
+                "ms": median_ms([timed(load_fork_changes, db, fork.id)[0] for _ in range(5)]),
+            })
+
+        results["page_base_ms"] = median_ms([timed(load_graph_page, db, fork.base_conversation_id, limit = PAGE_SIZE)[0] for _ in range(5)])
+        results["page_fork_ms"] = median_ms([timed(load_graph_page, db, fork.id, limit = PAGE_SIZE)[0] for _ in range(5)])
+
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [10_000])
+    parser.add_argument("--url", default = "sqlite://", help = "database URL (default: in-memory SQLite)")
+    parser.add_argument("--samples", type = int, default = 50)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(json.dumps(run(size, args.url, args.samples, args.seed), indent = 2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+benchmark: 1,000 node position updates, before and after batching/coalescing.
+
+  before     - the old /nodes/update-position handler body per update:
+               SELECT, assign, flag_modified(type_data), COMMIT, refresh
+  coalesced  - 1,000 concurrent single-node submits through PositionCoalescer
+  batched    - one /nodes/update-positions call: a single bulk UPDATE + COMMIT
+
+runs against a SQLite file by default so commits actually hit the disk; pass --url for postgres.
+
+usage (from backend/):
+    python -m benchmarks.bench_positions --updates 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import flag_modified
+
+from core.database import Base
+from modules.llm.positions import PositionCoalescer
+from modules.storage.positions import bulk_update_positions
+from modules.storage.models import User, Conversation, Node
+
+
+def seed(factory, node_count):
+    db = factory()
+    db.add(User(id = 1, name = "bench", email = "bench@example.com"))
+    db.add(Conversation(id = 1, user_id = 1, title = "bench"))
+    db.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "prompt_text": "x" * 2000,
+         "response_text": "y" * 8000, "position_x": 0, "position_y": 0, "type_data": {"k": "v"}}
+        for i in range(1, node_count + 1)
+    ])
+    db.commit()
+    db.close()
+
+def before(factory, updates):
+    for node_id, (x, y) in updates:
+        db = factory()
+        try:
+            node = db.query(Node).filter(Node.id == node_id).first()
+            node.position_x = x
+            node.position_y = y
+            flag_modified(node, 'type_data')
+            db.commit()
+            db.refresh(node)
+        finally:
+            db.close()
+
+def coalesced(factory, updates):
+    coalescer = PositionCoalescer(session_factory = factory)
+
+    async def storm():
+        await asyncio.gather(*[coalescer.submit({node_id: position}) for node_id, position in updates])
+
+    asyncio.run(storm())
+    return coalescer.stats()
+
+def batched(factory, updates):
+    db = factory()
+    try:
+        bulk_update_positions(db, dict(updates))
+        db.commit()
+    finally:
+        db.close()
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type = int, default = 1000)
+    parser.add_argument("--nodes", type = int, default = 200, help = "updates are spread over this many nodes")
+    parser.add_argument("--url", default = None, help = "database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    engine = create_engine(url, connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {})
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind = engine)
+    seed(factory, args.nodes)
+
+    rng = random.Random(0)
+    updates = [(rng.randint(1, args.nodes), (rng.randint(0, 2000), rng.randint(0, 2000))) for _ in range(args.updates)]
+
+    results = {"updates": args.updates, "nodes": args.nodes}
+    results["before_ms"], _ = timed(before, factory, updates)
+    results["coalesced_ms"], stats = timed(coalesced, factory, updates)
+    results["coalesced_flushes"] = stats["flushes"]
+    results["batched_ms"], _ = timed(batched, factory, updates)
+    print(json.dumps(results, indent = 2))
+
+    engine.dispose()
+    tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+benchmark harness: the real FastAPI app, in-process, against a fake LLM.
+
+requests go through httpx's ASGI transport into main.app, so routing, middleware, validation,
+the async DB sessions, the coalescer and the graph runner all run as in production; only the
+Gemini API is replaced (FakeLLM: lognormal time-to-first-token plus a token rate).
+the database is a temporary SQLite file unless --url points at a real Postgres.
+
+workloads:
+  graph_build   - create nodes by temp ID, then connect each to an earlier node
+  drag_storm    - a burst of single-node position updates concentrated on a few nodes
+  deep_chain    - /execute/graph from the root of a long chain (sequential LLM calls,
+                  growing context at every step)
+  wide_fanout   - /execute/graph from a root with many children (concurrent LLM calls)
+
+each reports p50/p95/p99 latency (ms) and requests/s. --compare checks the run against the
+checked-in baseline (benchmarks/baseline.json) and exits non-zero on a regression.
+
+usage (from backend/):
+    python -m benchmarks.harness
+    python -m benchmarks.harness --workloads drag_storm deep_chain
+    python -m benchmarks.harness --compare --repeat 3
+    python -m benchmarks.harness --write-baseline --repeat 3
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# metrics compared against the baseline, and which direction is worse. p99 is reported but not
+# gated: with a few hundred requests per workload it moves too much run to run
+REGRESSION_CHECKS = {"p50_ms": "higher", "p95_ms": "higher", "requests_per_s": "lower"}
+
+
+@dataclass
+class FakeLLM:
+    """
+    stands in for client.aio.models. time to first token is lognormal around latency_ms,
+    then tokens arrive at tokens_per_s. responses echo the prompt, so they're deterministic.
+    """
+    latency_ms: float = 50
+    latency_sigma: float = 0.3
+    tokens_per_s: float = 400
+    response_tokens: int = 40
+    seed: int = 0
+    calls: int = 0
+    _rng: random.Random = field(default = None, repr = False)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def _timing(self):
+        first = self._rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+        tokens = max(1, int(self._rng.expovariate(1 / self.response_tokens)))
+        return first, tokens
+
+    @staticmethod
+    def _usage(contents, tokens):
+        prompt_tokens = sum(len(part.text or "") for content in contents for part in content.parts) // 4
+        return SimpleNamespace(prompt_token_count = prompt_tokens, candidates_token_count = tokens)
+
+    @staticmethod
+    def _text(contents, tokens):
+        prompt = contents[-1].parts[0].text
+        return " ".join([f"echo: {prompt[:40]}"] + ["tok"] * tokens)
+
+    async def generate_content(self, model, contents, config = None):
+        self.calls += 1
+        first, tokens = self._timing()
+        await asyncio.sleep(first + tokens / self.tokens_per_s)
+        return SimpleNamespace(text = self._text(contents, tokens), usage_metadata = self._usage(contents, tokens))
+
+    async def generate_content_stream(self, model, contents, config = None):
+        self.calls += 1
+        first, tokens = self._timing()
+        words = self._text(contents, tokens).split(" ")
+        usage = self._usage(contents, tokens)
+
+        async def chunks():
+            await asyncio.sleep(first)
+            for index, word in enumerate(words):
+                await asyncio.sleep(1 / self.tokens_per_s)
+                last = index == len(words) - 1
+                yield SimpleNamespace(text = word + " ", usage_metadata = usage if last else None)
+        return chunks()
+
+def install_fake_llm(fake) -> None:
+    """
+    route the app's Gemini provider through fake (anything with generate_content / generate_content_stream)
+    """
+    from modules.llm.providers.registry import get_provider
+    get_provider().client = SimpleNamespace(aio = SimpleNamespace(models = fake))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # nearest-rank
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies_ms: List[float], elapsed_s: float, errors: int) -> dict:
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "requests_per_s": round(len(latencies_ms) / elapsed_s, 2) if elapsed_s else 0.0,
+    }
+
+async def drive(calls: List[Callable[[], Awaitable[bool]]], concurrency: int) -> dict:
+    """
+    run request thunks with at most `concurrency` in flight; each returns whether it succeeded
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(call):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+async def read_graph_run(client, root_id: int) -> bool:
+    # consume the whole SSE stream; succeeded if the run finished with nothing failed
+    done = None
+    async with client.stream("POST", "/api/llm/execute/graph",
+                             json = {"node_ids": [str(root_id)], "bypass_cache": True}) as response:
+        if response.status_code != 200:
+            return False
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "done":
+                done = json.loads(line[len("data: "):])
+    return done is not None and done["failed"] == 0
+
+
+class Bench:
+    """
+    seeded database + client for one harness run
+    """
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self._next_conversation = 1
+
+    def conversation(self) -> int:
+        from core.database import SessionLocal
+        from modules.storage.models import Conversation
+
+        conversation_id = self._next_conversation
+        self._next_conversation += 1
+        with SessionLocal() as db:
+            db.add(Conversation(id = conversation_id, user_id = 1, title = f"bench {conversation_id}"))
+            db.commit()
+        return conversation_id
+
+    def seed_graph(self, edges: List[tuple], count: int) -> List[int]:
+        """
+        a fresh conversation with `count` nodes (non-empty prompts) and the given (source, target)
+        index pairs as edges, closure rows included. returns the node ids in index order.
+        """
+        from sqlalchemy import insert
+        from core.database import SessionLocal
+        from modules.storage import closure
+        from modules.storage.models import Edge, Node
+
+        conversation_id = self.conversation()
+        with SessionLocal() as db:
+            node_ids = list(db.scalars(insert(Node).returning(Node.id), [
+                {"conversation_id": conversation_id, "node_type": "prompt",
+                 "prompt_text": f"step {index}: summarize the context so far", "response_text": "",
+                 "position_x": index * 10, "position_y": 0, "type_data": {}}
+                for index in range(count)
+            ]))
+            closure.add_nodes(db, node_ids)
+            for source, target in edges:
+                db.add(Edge(conversation_id = conversation_id, source_node_id = node_ids[source],
+                            target_node_id = node_ids[target]))
+                closure.add_edge(db, node_ids[source], node_ids[target])
+            db.commit()
+        return node_ids
+
+
+async def graph_build(bench: Bench) -> dict:
+    args = bench.args
+    conversation_id = str(bench.conversation())
+    client = bench.client
+    run = f"{time.time_ns()}"
+
+    async def create(index):
+        response = await client.post("/api/llm/nodes/create", json = {
+            "position": {"x": index * 20, "y": index * 5},
+            "conversation_id": conversation_id,
+            "temp_id": f"temp_{run}_{index}",
+        })
+        return response.status_code == 200
+
+    async def connect(index):
+        parent = bench.rng.randrange(index)
+        response = await client.post("/api/llm/edges/create", json = {
+            "source_id": f"temp_{run}_{parent}",
+            "target_id": f"temp_{run}_{index}",
+            "conversation_id": conversation_id,
+        })
+        return response.status_code == 200
+
+    nodes = await drive([lambda i = i: create(i) for i in range(args.build_nodes)], args.concurrency)
+    edges = await drive([lambda i = i: connect(i) for i in range(1, args.build_nodes)], args.concurrency)
+    return {**merge(nodes, edges), "phases": {"create_node": nodes, "create_edge": edges}}
+
+def merge(*results: dict) -> dict:
+    # sequential phases as one workload: overall throughput, and the slowest phase's percentiles
+    requests = sum(result["requests"] for result in results)
+    elapsed = sum(result["requests"] / result["requests_per_s"] for result in results if result["requests_per_s"])
+    return {
+        "requests": requests,
+        "errors": sum(result["errors"] for result in results),
+        "p50_ms": max(result["p50_ms"] for result in results),
+        "p95_ms": max(result["p95_ms"] for result in results),
+        "p99_ms": max(result["p99_ms"] for result in results),
+        "requests_per_s": round(requests / elapsed, 2) if elapsed else 0.0,
+    }
+
+async def drag_storm(bench: Bench) -> dict:
+    args = bench.args
+    node_ids = bench.seed_graph([], args.drag_nodes)
+    # drags concentrate on a handful of nodes at a time
+    hot = node_ids[:max(1, args.drag_nodes // 10)]
+
+    async def move(index):
+        node_id = bench.rng.choice(hot)
+        response = await bench.client.patch("/api/llm/nodes/update-position", json = {
+            "node_id": str(node_id), "position": {"x": index, "y": index % 300},
+        })
+        return response.status_code == 200
+
+    return await drive([lambda i = i: move(i) for i in range(args.drag_updates)], args.drag_concurrency)
+
+async def deep_chain(bench: Bench) -> dict:
+    args = bench.args
+    depth = args.chain_depth
+    runs = []
+    for _ in range(args.graph_runs):
+        node_ids = bench.seed_graph([(i, i + 1) for i in range(depth - 1)], depth)
+        runs.append(lambda root = node_ids[0]: read_graph_run(bench.client, root))
+    return {**await drive(runs, 1), "nodes_per_run": depth}
+
+async def wide_fanout(bench: Bench) -> dict:
+    args = bench.args
+    width = args.fanout_width
+    runs = []
+    for _ in range(args.graph_runs):
+        node_ids = bench.seed_graph([(0, i) for i in range(1, width + 1)], width + 1)
+        runs.append(lambda root = node_ids[0]: read_graph_run(bench.client, root))
+    return {**await drive(runs, 1), "nodes_per_run": width + 1}
+
+WORKLOADS: Dict[str, Callable[[Bench], Awaitable[dict]]] = {
+    "graph_build": graph_build,
+    "drag_storm": drag_storm,
+    "deep_chain": deep_chain,
+    "wide_fanout": wide_fanout,
+}
+
+
+async def run(args, fake: FakeLLM) -> dict:
+    import httpx
+    from core.database import Base, SessionLocal, engine, async_engine
+    from main import app
+    from modules.storage.models import User
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        db.add(User(id = 1, name = "bench", email = "bench@example.com"))
+        db.commit()
+
+    install_fake_llm(fake)
+    results = {}
+    transport = httpx.ASGITransport(app = app)
+    try:
+        async with httpx.AsyncClient(transport = transport, base_url = "http://bench", timeout = None) as client:
+            bench = Bench(client, args)
+            for name in args.workloads:
+                results[name] = await WORKLOADS[name](bench)
+    finally:
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def median_results(runs: List[dict]) -> dict:
+    # per-metric median across repeated runs of the same workloads
+    merged = {}
+    for name, first in runs[0].items():
+        merged[name] = dict(first)
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "requests_per_s"):
+            merged[name][metric] = statistics.median(run[name][metric] for run in runs)
+        merged[name]["errors"] = sum(run[name]["errors"] for run in runs)
+    return merged
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    regressions of results vs baseline: a latency above baseline * (1 + tolerance), a throughput
+    below baseline * (1 - tolerance), or any errors
+    """
+    regressions = []
+    for name, result in results.items():
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+        expected = baseline.get("workloads", {}).get(name)
+        if expected is None:
+            continue
+        for metric, worse in REGRESSION_CHECKS.items():
+            before, after = expected[metric], result[metric]
+            if worse == "higher" and after > before * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {after} vs baseline {before}")
+            if worse == "lower" and after < before * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {after} vs baseline {before}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs = "+", choices = list(WORKLOADS), default = list(WORKLOADS))
+    parser.add_argument("--url", default = None, help = "sync database URL (default: temporary SQLite file)")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--concurrency", type = int, default = 8, help = "graph_build clients")
+    parser.add_argument("--build-nodes", type = int, default = 200)
+    parser.add_argument("--drag-nodes", type = int, default = 50)
+    parser.add_argument("--drag-updates", type = int, default = 2000)
+    parser.add_argument("--drag-concurrency", type = int, default = 50)
+    parser.add_argument("--chain-depth", type = int, default = 20)
+    parser.add_argument("--fanout-width", type = int, default = 50)
+    parser.add_argument("--graph-runs", type = int, default = 3)
+    parser.add_argument("--repeat", type = int, default = 1, help = "run everything N times, report medians")
+    parser.add_argument("--llm-latency-ms", type = float, default = 50, help = "median time to first token")
+    parser.add_argument("--llm-latency-sigma", type = float, default = 0.3)
+    parser.add_argument("--llm-tokens-per-s", type = float, default = 400)
+    parser.add_argument("--llm-response-tokens", type = int, default = 40, help = "mean response length")
+    parser.add_argument("--baseline", type = Path, default = BASELINE_PATH)
+    parser.add_argument("--compare", action = "store_true", help = "exit 1 if slower than the baseline")
+    parser.add_argument("--tolerance", type = float, default = 1.0, help = "allowed slowdown (1.0 = 2x)")
+    parser.add_argument("--write-baseline", action = "store_true")
+    args = parser.parse_args()
+
+    # the app reads its settings at import time, so point it at the bench database first
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    os.environ["BLOB_STORE_PATH"] = os.path.join(tmpdir.name, "blobs")
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(tmpdir.name, "vectors")
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ["LLM_PROVIDER"] = "gemini"     # FakeLLM stands in for the Gemini SDK
+    # every workload runs as one user; measure the server, not the per-user rate limit
+    os.environ.setdefault("SCHEDULER_USER_RATE", "1000000")
+    os.environ.setdefault("SCHEDULER_USER_BURST", "1000000")
+    os.environ.setdefault("SCHEDULER_MAX_QUEUE", "100000")
+    os.environ.setdefault("ALLOWED_ORIGINS", '["*"]')
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    fake = FakeLLM(args.llm_latency_ms, args.llm_latency_sigma, args.llm_tokens_per_s,
+                   args.llm_response_tokens, args.seed)
+    results = median_results([asyncio.run(run(args, fake)) for _ in range(args.repeat)])
+    report = {
+        "config": {
+            "database": "postgresql" if (args.url or "").startswith("postgresql") else "sqlite",
+            "llm": {key: value for key, value in asdict(fake).items() if not key.startswith("_") and key != "calls"},
+            **{key: value for key, value in vars(args).items()
+               if key not in ("workloads", "url", "baseline", "compare", "tolerance", "write_baseline", "repeat")
+               and not key.startswith("llm_")},
+        },
+        "workloads": results,
+        "llm_calls": fake.calls,
+    }
+    print(json.dumps(report, indent = 2))
+    tmpdir.cleanup()
+
+    if args.write_baseline:
+        args.baseline.write_text(json.dumps(report, indent = 2) + "\n")
+    if args.compare:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file = sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+export/import conversations as compressed archives (modules/storage/archive.py), for backups or
+moving a graph between databases. both directions stream, so memory stays flat for any graph size.
+
+usage (from backend/):
+    python conversation_archive.py export 42 -o conversation-42.mga
+    python conversation_archive.py import conversation-42.mga --user-id 1 [--title "restored"]
+"""
+
+import argparse
+import sys
+from typing import Optional
+
+from core.database import SessionLocal
+from modules.storage.archive import ArchiveError, export_conversation, import_conversation
+
+def export_archive(conversation_id: int, path: str) -> int:
+    with SessionLocal() as db:
+        frames = export_conversation(db, conversation_id)
+        if frames is None:
+            print(f"Conversation {conversation_id} not found", file = sys.stderr)
+            return 1
+
+        out = sys.stdout.buffer if path == "-" else open(path, "wb")
+        try:
+            written = sum(out.write(frame) for frame in frames)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    print(f"Exported conversation {conversation_id} ({written} bytes)", file = sys.stderr)
+    return 0
+
+def import_archive(path: str, user_id: int, title: Optional[str] = None) -> int:
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    with SessionLocal() as db:
+        try:
+            result = import_conversation(db, source, user_id, title)
+            db.commit()
+        except (ArchiveError, LookupError) as e:
+            db.rollback()
+            print(f"Import failed: {e}", file = sys.stderr)
+            return 1
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+    print(f"Imported conversation {result.conversation_id} ({result.nodes} nodes, {result.edges} edges)", file = sys.stderr)
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    export = commands.add_parser("export", help = "write a conversation to an archive")
+    export.add_argument("conversation_id", type = int)
+    export.add_argument("-o", "--output", default = "-", help = "archive path (default: stdout)")
+
+    load = commands.add_parser("import", help = "load an archive as a new conversation")
+    load.add_argument("path", help = "archive path, or - for stdin")
+    load.add_argument("--user-id", type = int, default = 1)
+    load.add_argument("--title", default = None)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        return export_archive(args.conversation_id, args.output)
+    return import_archive(args.path, args.user_id, args.title)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
+import logging
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import Dict
 
 CONFIG_DIR = Path(__file__).resolve().parent
 BACKEND_DIR = CONFIG_DIR.parent
@@ -12,6 +15,56 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str
 
+    # connection pools (see core/database.py). sizes are per engine, per worker process
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30           # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800         # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30_000   # postgres only; 0 disables
+
+    # logging (see core/logging.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"            # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10_000
+    # fraction of requests whose INFO/DEBUG lines are kept, by path prefix (longest match wins)
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "/api/llm/nodes/update-position": 0.01,
+        "/health": 0.0,
+        "/metrics": 0.0,
+    }
+    LOG_DEFAULT_SAMPLE_RATE: float = 1.0
+
+    # metrics (see core/metrics.py). Server-Timing exposes internal timings, so it's opt-in
+    SERVER_TIMING_ENABLED: bool = False
+
+    # large node content (see modules/storage/blobstore.py)
+    BLOB_STORE_BACKEND: str = "local"
+    BLOB_STORE_PATH: str = str(BACKEND_DIR / "blobs")
+    # prompts/responses at least this many UTF-8 bytes are offloaded from the nodes table
+    BLOB_THRESHOLD_BYTES: int = 32 * 1024
+    # the blob sweep leaves unreferenced blobs younger than this alone: a put whose row isn't committed yet
+    BLOB_SWEEP_GRACE_SECONDS: int = 3600
+
+    # conversation archives (see modules/storage/archive.py): records per frame, which bounds memory
+    # on export and import, and the zstd level when zstandard is installed
+    ARCHIVE_CHUNK_ROWS: int = 1000
+    ARCHIVE_ZSTD_LEVEL: int = 3
+
+    # full-text search (see modules/storage/search.py): postgres text search configuration,
+    # and characters of context returned around matches
+    SEARCH_LANGUAGE: str = "english"
+    SEARCH_SNIPPET_CHARS: int = 160
+
+    # node embedding index (see modules/storage/vectors.py). the optional IVF layer trades a little
+    # recall for sub-linear search once an index holds VECTOR_IVF_MIN_ROWS vectors; nlist 0 = sqrt(rows)
+    VECTOR_INDEX_PATH: str = str(BACKEND_DIR / "vectors")
+    VECTOR_IVF_ENABLED: bool = False
+    VECTOR_IVF_MIN_ROWS: int = 50_000
+    VECTOR_IVF_NLIST: int = 0
+    VECTOR_IVF_NPROBE: int = 8
+
     model_config = SettingsConfigDict(
         env_file = ENV_FILE_PATH,
         env_file_encoding='utf-8',
@@ -19,7 +72,6 @@ class Settings(BaseSettings):
         extra='ignore'
     )
 
-print(f"Loading .env from: {ENV_FILE_PATH}")
-print(f".env exists: {ENV_FILE_PATH.exists()}")
+logging.getLogger(__name__).debug("loading .env from %s (exists: %s)", ENV_FILE_PATH, ENV_FILE_PATH.exists())
 
 settings = Settings()
\ No newline at end of file
@@ -1,17 +1,73 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
 from .config import settings
+from .metrics import instrument_engine
 
-# create database engine
+# async drivers for the sync URLs used in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_url(url: str) -> str:
+    """
+    DATABASE_URL with its driver swapped for the async one (postgresql -> asyncpg, sqlite -> aiosqlite)
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend: {backend}")
+    return parsed.set(drivername = f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password = False)
+
+def engine_kwargs(url: str, is_async: bool = False) -> dict:
+    """
+    pool + timeout options for an engine on url. sqlite keeps SQLAlchemy's default pool.
+    """
+    parsed = make_url(url)
+    kwargs = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if parsed.get_backend_name() != "postgresql":
+        return kwargs
+
+    kwargs.update(
+        pool_size = settings.DB_POOL_SIZE,
+        max_overflow = settings.DB_MAX_OVERFLOW,
+        pool_timeout = settings.DB_POOL_TIMEOUT,
+        pool_recycle = settings.DB_POOL_RECYCLE,
+    )
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            kwargs["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return kwargs
+
+
+# sync engine: background writers (position coalescer, response cache) and scripts
 engine = create_engine(
     settings.DATABASE_URL,
-    echo = True
+    **engine_kwargs(settings.DATABASE_URL)
 )
 
 # setup factory for database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async engine: request handlers, so DB waits don't block the event loop
+async_engine = create_async_engine(
+    async_url(settings.DATABASE_URL),
+    **engine_kwargs(settings.DATABASE_URL, is_async = True)
+)
+
+# per-statement timings and per-request query counts (core/metrics.py)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# expire_on_commit = False: handlers read attributes after commit without another round trip
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush = False, expire_on_commit = False)
+
 Base = declarative_base()
 
 def get_db():
@@ -20,4 +76,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+
+    async with AsyncSessionLocal() as db:
+        yield db
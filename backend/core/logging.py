@@ -0,0 +1,225 @@
+"""
+structured, non-blocking, sampled logging.
+
+- handlers log through a bounded QueueHandler; a QueueListener thread formats and writes,
+  so request paths never block on stdout. when the queue is full records are dropped and counted.
+- output is one JSON object per line (or plain text with LOG_FORMAT=text).
+- every record carries the request id of the request that produced it (contextvar set by
+  RequestContextMiddleware), and responses echo it back as X-Request-ID.
+- INFO and below are sampled per route (LOG_SAMPLE_RATES, longest prefix wins). the decision is
+  made once per request, so a request's log lines are kept or dropped together. WARNING+ always pass.
+- prompt/response bodies and credential headers are redacted from structured fields.
+
+call sites use lazy %-style arguments (logger.info("saved %s", node_id)) so nothing is formatted
+when a level is disabled; structured fields go in extra = {...}.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from .config import settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default = None)
+sampled_var: ContextVar[bool] = ContextVar("log_sampled", default = True)
+
+# structured field names whose values never reach the log output
+REDACTED_FIELDS = {
+    "prompt", "prompt_text", "response", "response_text", "history", "contents",
+    "authorization", "cookie", "set-cookie", "x-api-key", "api_key", "gemini_api_key",
+}
+
+# attributes every LogRecord has; anything else came in through extra = {...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def redact(value, key: Optional[str] = None):
+    if key is not None and key.lower() in REDACTED_FIELDS:
+        size = len(value) if isinstance(value, (str, bytes, list, tuple, dict)) else None
+        return "[redacted]" if size is None else f"[redacted len={size}]"
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+def extra_fields(record: logging.LogRecord) -> dict:
+    return {
+        key: redact(value, key)
+        for key, value in record.__dict__.items()
+        if key not in _RECORD_ATTRS and not key.startswith("_")
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    one JSON object per record: ts, level, logger, msg, request_id, then any extra fields
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default = str, ensure_ascii = False)
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = extra_fields(record)
+        if getattr(record, "request_id", None):
+            fields = {"request_id": record.request_id, **fields}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class ContextFilter(logging.Filter):
+    """
+    stamps the request id and applies the per-request sampling decision.
+    runs on the calling thread, before the record is queued (contextvars don't cross the queue).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not sampled_var.get():
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    never blocks the caller: a full queue drops the record instead
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the listener thread formats; only freeze the args here (they may be mutated later)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def sample_rate(path: str, rates: Optional[Dict[str, float]] = None) -> float:
+    rates = settings.LOG_SAMPLE_RATES if rates is None else rates
+    matches = [prefix for prefix in rates if path.startswith(prefix)]
+    if not matches:
+        return settings.LOG_DEFAULT_SAMPLE_RATE
+    return rates[max(matches, key = len)]
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+queue_handler: Optional[DroppingQueueHandler] = None
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    route the root logger through the queue. safe to call more than once.
+    """
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(TextFormatter() if (fmt or settings.LOG_FORMAT) == "text" else JsonFormatter())
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize = settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level or settings.LOG_LEVEL)
+
+    # uvicorn's own access log duplicates RequestContextMiddleware's line
+    logging.getLogger("uvicorn.access").disabled = True
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, output, respect_handler_level = True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    # flush whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+access_logger = logging.getLogger("access")
+
+class RequestContextMiddleware:
+    """
+    pure ASGI middleware: assigns/propagates X-Request-ID, makes the per-request sampling
+    decision, and writes one access line per request (method, path, status, duration). no headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        path = scope.get("path", "")
+        request_token = request_id_var.set(request_id)
+        sampled_token = sampled_var.set(random.random() < sample_rate(path))
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            level = logging.WARNING if status >= 500 else logging.INFO
+            if access_logger.isEnabledFor(level):
+                access_logger.log(level, "%s %s %s", scope.get("method"), path, status, extra = {
+                    "method": scope.get("method"),
+                    "path": path,
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                })
+            sampled_var.reset(sampled_token)
+            request_id_var.reset(request_token)
@@ -3,11 +3,29 @@ setup script to create all database tables. run once to initialize schema
 """
 
 from core.database import engine, Base
-from modules.storage.models import User, Conversation, Node, Edge
+from modules.llm.id_mapper import ensure_client_id_schema
+from modules.storage.models import User, Conversation, Node, Edge, NodeClosure, LLMCacheEntry
+from modules.storage.closure import ensure_closure_schema
+from modules.storage.content import ensure_content_schema
+from modules.storage.forks import ensure_fork_schema
+from modules.storage.search import ensure_search_schema
+from modules.storage.staleness import ensure_staleness_schema
 
 def create_tables():
     print("Creating database tables...")
     Base.metadata.create_all(bind = engine)
+    # closure table for a database from the ancestor_ids era (drops the column, backfills from edges)
+    ensure_closure_schema(engine)
+    # blob key / size columns for large content, added after the first release
+    ensure_content_schema(engine)
+    # client_id (frontend temp ID a node was created under) + unique index
+    ensure_client_id_schema(engine)
+    # full-text search column + GIN index on postgres, also for a nodes table that already existed
+    ensure_search_schema(engine)
+    # staleness columns for a nodes table from before they existed
+    ensure_staleness_schema(engine)
+    # fork columns (base conversation / snapshot flag, copied node's original)
+    ensure_fork_schema(engine)
     print("Tables created successfully")
 
 if __name__ == "__main__":
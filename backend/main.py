@@ -1,11 +1,12 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from core.logging import setup_logging, RequestContextMiddleware
+from core.metrics import registry, MetricsMiddleware, CONTENT_TYPE
 from modules.llm.api import router as llm_router
-import logging
 
-# configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# configure logging: queued, structured, sampled per route (core/logging.py)
+setup_logging()
 
 # "uvicorn main:app" where 'main' corresponds to file, 'app' corresponds to variable name
 app = FastAPI(
@@ -16,14 +17,6 @@ app = FastAPI(
     redoc_url = '/redoc',
 )
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    logger.info(f"Headers: {dict(request.headers)}")
-    response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
-    return response
-
 # add middleware
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +26,12 @@ app.add_middleware(
     allow_headers = ["*"]
 )
 
+# per-route latency, DB usage per request, optional Server-Timing header (core/metrics.py)
+app.add_middleware(MetricsMiddleware)
+
+# outermost: request id + access line cover everything below, including CORS preflights
+app.add_middleware(RequestContextMiddleware)
+
 # add LLM module router
 app.include_router(llm_router, prefix="/api/llm", tags=["llm"])
 
@@ -44,6 +43,11 @@ def read_root():
 def health_check():
     return {"status": "health"}
 
+# Prometheus scrape target
+@app.get("/metrics", include_in_schema = False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type = CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run('main:app', port=8000, reload = True)
\ No newline at end of file
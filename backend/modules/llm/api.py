@@ -1,87 +1,807 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+import asyncio
+import logging
+from contextlib import nullcontext
+from functools import partial
+from tempfile import SpooledTemporaryFile
+
+import anyio
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional, Tuple
 
 from modules.storage.models import Node, Conversation, Edge
+from modules.storage import closure
+from modules.storage.archive import ArchiveError, export_conversation, import_conversation
+from modules.storage.content import content_values, load_body_ref, save_content
+from modules.storage.blobstore import blob_store
+from modules.storage.forks import ForkError, check_new_edge, check_writable, fork_conversation, node_refs, snapshot_error, \
+    snapshot_conversation, writable_node
+from modules.storage.graph import load_graph_page, load_fork_changes, read_page_blobs
+from modules.storage.search import search_nodes_async
+from modules.storage.staleness import mark_descendants_stale, record_execution, stale_node_ids
 from .id_mapper import id_mapper
-from .models import DeleteNodeRequest, DeleteNodeResponse, ExecuteNodeRequest, CreateNodeRequest, CreateNodeResponse, \
-    CreateEdgeRequest, CreateEdgeResponse, DeleteEdgeRequest, DeleteEdgeResponse, UpdateNodePositionRequest, UpdateNodePositionResponse \
+from .models import DeleteNodeRequest, DeleteNodeResponse, ExecuteNodeRequest, ExecuteGraphRequest, RefreshStaleRequest, CreateNodeRequest, CreateNodeResponse, \
+    CreateEdgeRequest, CreateEdgeResponse, DeleteEdgeRequest, DeleteEdgeResponse, UpdateNodePositionRequest, UpdateNodePositionResponse, \
+    BatchRequest, BatchResponse, UpdateNodePositionsRequest, UpdateNodePositionsResponse, ForkConversationRequest
     
-from .gemini_client import gemini_client
-from core.database import get_db
+from .providers.base import LLMProvider
+from .providers.errors import LLMError
+from .providers.policy import deadline
+from .scheduler import scheduler, principal, user_key, SchedulerRejected
+from .embeddings import embedding_indexer
+from .sync import sync_hub, sync_origin, node_added, node_content, node_removed, node_replaced, edge_added, edge_removed
+from .retrieval import related_context
+from .providers.registry import get_provider
+from .context import context_assembler
+from .cache import response_cache, generate_cached
+from .graph_runner import build_plan, build_stale_plan, run_plan, execute_and_save, refresh_and_save
+from .batch import apply_batch, BatchError
+from .positions import position_coalescer
+from .config import llm_settings
+from .sse import sse_event, SSE_HEADERS
+from .responses import FastJSONResponse, body_response, text_body_response
+from core.database import get_async_db, AsyncSessionLocal, SessionLocal
+from core.metrics import stage
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies = [Depends(sync_origin)])
+
+# archive uploads larger than this are spooled to a temporary file instead of memory
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+def _provider(tier: Optional[str]) -> LLMProvider:
+    try:
+        return get_provider(tier)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail = str(e))
+
+def request_timeout(x_request_timeout: Optional[float] = Header(None, gt = 0)) -> float:
+    # seconds the client is willing to wait for the LLM; never more than LLM_DEFAULT_DEADLINE_S
+    if x_request_timeout is None:
+        return llm_settings.LLM_DEFAULT_DEADLINE_S
+    return min(x_request_timeout, llm_settings.LLM_DEFAULT_DEADLINE_S)
+
+def _rejected_http_error(e: SchedulerRejected) -> HTTPException:
+    headers = {"Retry-After": str(max(1, round(e.retry_after)))}
+    if e.position is not None:
+        headers["X-Queue-Position"] = str(e.position)
+    return HTTPException(status_code = 429, detail = e.to_dict(), headers = headers)
+
+async def _owner(db: AsyncSession, node_id: int) -> Optional[Tuple[int, str]]:
+    # (conversation id, scheduler key of the user owning it) for a node; None if the node doesn't exist
+    row = (await db.execute(
+        select(Conversation.id, Conversation.user_id)
+        .join(Node, Node.conversation_id == Conversation.id)
+        .where(Node.id == node_id)
+    )).first()
+    return None if row is None else (row.id, user_key(row.user_id))
+
+def _conversation_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail = "Invalid conversation ID format")
+
+async def _writable(db: AsyncSession, node_id: int, conversation_id: Optional[str]) -> int:
+    # the row a write to node_id lands on: itself, or (inherited from a snapshot) the fork's copy of it
+    try:
+        found = await db.run_sync(writable_node, node_id, _conversation_id(conversation_id))
+    except ForkError as e:
+        raise HTTPException(status_code = e.status_code, detail = str(e))
+    if found is None:
+        raise HTTPException(status_code=404,
+            detail="Node does not exist to be executed")
+    return found[0]
 
+async def _check_writable(db: AsyncSession, conversation_ids) -> None:
+    try:
+        await db.run_sync(check_writable, conversation_ids)
+    except ForkError as e:
+        raise HTTPException(status_code = e.status_code, detail = str(e))
+
+def _admit(key: str) -> None:
+    try:
+        scheduler.check(key)
+    except SchedulerRejected as e:
+        logger.info("admission refused for %s: %s", key, e.reason)
+        raise _rejected_http_error(e)
 
-router = APIRouter()
-_next_fake_id = 1
+async def _context(db: AsyncSession, node_id: int, request: ExecuteNodeRequest):
+    """
+    (ancestor turns, history sent to the LLM): the ancestors plus similar nodes from elsewhere in
+    the graph when retrieval is on. context_hash covers the ancestors only, as a refresh run
+    (graph_runner.refresh_and_save) recomputes it without retrieval
+    """
+    with stage("context"):
+        ancestors = await context_assembler.assemble_async(db, node_id)
+    history = ancestors
+    k = llm_settings.RETRIEVAL_TOP_K if request.retrieve_k is None else request.retrieve_k
+    if k:
+        with stage("retrieve"):
+            related = await related_context(db, node_id, request.prompt, k,
+                                            request.retrieval_scope or llm_settings.RETRIEVAL_SCOPE)
+        history = related + ancestors
+    return ancestors, history
+
+async def _move_inherited(db: AsyncSession, positions: dict, conversations: dict) -> dict:
+    """
+    positions the coalescer didn't find: a node inherited from a snapshot moves the fork's copy of it
+    (conversations: node id -> fork id), made on its first write. returns requested id -> copy moved
+    """
+    refs = await db.run_sync(node_refs, list(positions))
+    copies, deltas = {}, []
+    try:
+        for node_id, ref in refs.items():
+            if ref.frozen:
+                copy_id, conversation_id = await db.run_sync(
+                    writable_node, node_id, _conversation_id(conversations.get(node_id))
+                )
+                copies[node_id] = copy_id
+                deltas.append((conversation_id, node_replaced(node_id, copy_id)))
+    except ForkError as e:
+        raise HTTPException(status_code = e.status_code, detail = str(e))
+    if not copies:
+        return {}
+
+    # the copy must be committed before the coalescer's own session moves it
+    await db.commit()
+    sync_hub.publish_many(deltas)
+    found = await position_coalescer.submit({copies[node_id]: positions[node_id] for node_id in copies})
+    return {node_id: copy_id for node_id, copy_id in copies.items() if copy_id in found}
+
+def _replaced(requested_id: int, node_id: int) -> list:
+    # a write to an inherited node went to the fork's new copy of it
+    return [node_replaced(requested_id, node_id)] if node_id != requested_id else []
+
+def _llm_http_error(e: LLMError) -> HTTPException:
+    headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after is not None else None
+    return HTTPException(status_code = e.status_code, detail = str(e), headers = headers)
 
 @router.post("/execute")
 async def execute_node(
     request: ExecuteNodeRequest,
-    db: Session = Depends(get_db)
+    timeout: float = Depends(request_timeout),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Receives a node execution request from frontend.
-    For now, just log prompt to console
+    run one node: save its prompt, generate a response from the provider (through the response
+    cache and the scheduler) with its ancestors as context, and save and broadcast the result.
+    an inherited node in a fork is copied into the fork first
     """
 
-    global _next_fake_id
-
-    print(f"\n{'='*50}")
-    print(f"Received execution request from node: {request.node_id}")
-    print(f"Prompt: {request.prompt}")
-    print(f"{'='*50}\n")
-
+    provider = _provider(request.tier)
 
     try:
         # resolve existing node id to db id
-        print(f"[Execute] Resolving existing node ID: {request.node_id}")
-        node_id = id_mapper.resolve_id(request.node_id)
+        logger.debug("execute %s", request.node_id, extra = {"prompt": request.prompt})
+        with stage("resolve"):
+            requested_id = await id_mapper.resolve_id_async(request.node_id, db)
+            node_id = await _writable(db, requested_id, request.conversation_id)
 
-        # if node does not exist, do nothing and error
-        node = db.query(Node).filter(Node.id == request.node_id).first()
+            # if node does not exist, do nothing and error
+            found = await _owner(db, node_id)
+            if found is None:
+                raise HTTPException(status_code=404, 
+                    detail="Node does not exist to be executed")
+            conversation_id, owner = found
 
-        if not node:
-            raise HTTPException(status_code=404, 
-                detail="Node does not exist to be executed")
+        # turn the request away before doing any work if the user is over their limit
+        _admit(owner)
         
-         # TODO: fine-tune and assemble prompt history + scaffolding
+        # assemble prompt history from ancestors (+ retrieved related nodes)
+        ancestors, history = await _context(db, node_id, request)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("assembled context: %d turns, %d tokens", len(history), sum(t.tokens for t in history))
 
-        node.prompt_text = request.prompt
+        # commit before the LLM call so no pooled connection is held while it runs
+        with stage("save_prompt"):
+            await _save_text(db, node_id, "prompt", request.prompt)
+            await db.commit()
+        sync_hub.publish(conversation_id, _replaced(requested_id, node_id) + [node_content(node_id, prompt = request.prompt)])
 
-        print(f"[Execute] Using database node ID: {node_id}")
-        response_text = await gemini_client.generate_response(
-            request.prompt
-        )
+        with stage("llm"), deadline(timeout), principal(owner):
+            response_text, cache_hit = await generate_cached(
+                provider,
+                request.prompt,
+                history = history,
+                bypass = request.bypass_cache,
+                invalidate = request.invalidate_cache
+            )
 
         # save response to database
-        node.response_text = response_text
-        db.commit()
+        with stage("save_response"):
+            await _save_text(db, node_id, "response", response_text)
+            await db.run_sync(record_execution, node_id, provider.request_key(request.prompt, ancestors))
+            await db.commit()
+        embedding_indexer.schedule([node_id])
+        sync_hub.publish(conversation_id, [node_content(node_id, response = response_text)])
 
-        print(f"[Execute] Saved response to database")
+        logger.info("executed node %s", node_id, extra = {"node_id": node_id, "cached": cache_hit})
 
         return {
             "status": "success",
-            "node_id": str(node.id),
-            "response": response_text
+            "node_id": str(node_id),
+            "response": response_text,
+            "cached": cache_hit
         }
     except ValueError as e:
-        db.rollback()
-        print(f"[Execute] Error resolving ID: {e}")
+        await db.rollback()
+        logger.info("execute: bad node id: %s", e)
         raise HTTPException(status_code=400, detail = str(e))
+
+    except HTTPException:
+        await db.rollback()
+        raise
+
+    except SchedulerRejected as e:
+        await db.rollback()
+        raise _rejected_http_error(e)
+
+    except LLMError as e:
+        await db.rollback()
+        logger.warning("execute: LLM call failed: %s", e, extra = {"node_id": request.node_id})
+        raise _llm_http_error(e)
     
     except Exception as e:
-        db.rollback()
-        print(f"[Execute] Error: {e}")
+        await db.rollback()
+        logger.exception("execute failed", extra = {"node_id": request.node_id})
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.post("/execute/stream")
+async def execute_node_stream(
+    request: ExecuteNodeRequest,
+    timeout: float = Depends(request_timeout),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    streaming variant of /execute. sends tokens back as server-sent events
+    while the response is generated.
+    """
+    logger.debug("execute stream %s", request.node_id, extra = {"prompt": request.prompt})
+    provider = _provider(request.tier)
+
+    with stage("resolve"):
+        try:
+            requested_id = await id_mapper.resolve_id_async(request.node_id, db)
+        except ValueError as e:
+            logger.info("execute stream: bad node id: %s", e)
+            raise HTTPException(status_code=400, detail = str(e))
+        node_id = await _writable(db, requested_id, request.conversation_id)
+
+        found = await _owner(db, node_id)
+        if found is None:
+            raise HTTPException(status_code=404,
+                detail="Node does not exist to be executed")
+        conversation_id, owner = found
+
+    _admit(owner)
+
+    ancestors, history = await _context(db, node_id, request)
+
+    # the previous response stays until the first checkpoint (or completion) replaces it,
+    # so a stream that fails before any text arrives loses nothing
+    with stage("save_prompt"):
+        await _save_text(db, node_id, "prompt", request.prompt)
+        await db.commit()
+    sync_hub.publish(conversation_id, _replaced(requested_id, node_id) +
+                     [node_content(node_id, prompt = request.prompt)])
+
+    return StreamingResponse(
+        _stream_execution(provider, node_id, request.prompt, history, request.bypass_cache, request.invalidate_cache,
+                          timeout = timeout, owner = owner, conversation_id = conversation_id,
+                          context_hash = provider.request_key(request.prompt, ancestors)),
+        media_type = "text/event-stream",
+        headers = SSE_HEADERS
+    )
+
+async def _save_text(db: AsyncSession, node_id: int, field: str, text: str, offload: bool = True,
+                     mark_stale: bool = True) -> None:
+    # a large body is written to the blob store in a worker thread, the row through the async session.
+    # offload = False (streaming checkpoints) never touches the blob store
+    values = await asyncio.to_thread(content_values, field, text) if offload else content_values(field, text, False)
+    await db.run_sync(save_content, node_id, field, values, mark_stale = mark_stale)
+
+async def _save_response_text(node_id: int, response_text: str, offload: bool = True,
+                              context_hash: Optional[str] = None, mark_stale: bool = True) -> None:
+    # own short-lived session; the request session may already be closed while streaming
+    async with AsyncSessionLocal() as db:
+        await _save_text(db, node_id, "response", response_text, offload = offload, mark_stale = mark_stale)
+        if context_hash is not None:
+            await db.run_sync(record_execution, node_id, context_hash)
+        await db.commit()
+
+async def _single_chunk(text: str):
+    yield text
+
+async def _scheduled(source):
+    # hold an execution slot for the whole provider stream
+    async with scheduler.slot():
+        async for chunk in source:
+            yield chunk
+
+async def _stream_execution(provider: LLMProvider, node_id: int, prompt: str, history = (),
+                            bypass_cache: bool = False, invalidate_cache: bool = False,
+                            timeout: Optional[float] = None, owner: Optional[str] = None,
+                            conversation_id: Optional[int] = None, context_hash: Optional[str] = None):
+    chunks = []
+    saved_count = 0
+    use_cache = llm_settings.CACHE_ENABLED and not bypass_cache
+    cache_key = provider.request_key(prompt, history)
+
+    try:
+        if use_cache and invalidate_cache:
+            await response_cache.invalidate_async(cache_key)
+
+        cached = await response_cache.get_async(cache_key) if use_cache and not invalidate_cache else None
+        if not use_cache:
+            response_cache.record_bypass()
+
+        # cache hit: whole response arrives as a single chunk
+        source = _single_chunk(cached) if cached is not None else _scheduled(provider.stream(prompt, history = history))
+
+        with deadline(timeout), principal(owner) if owner else nullcontext():
+            async for chunk in source:
+                chunks.append(chunk)
+                yield sse_event("chunk", {"text": chunk})
+
+                # checkpoint partial text so a disconnect doesn't lose everything
+                if len(chunks) - saved_count >= llm_settings.STREAM_FLUSH_EVERY:
+                    # kept inline: offloading every checkpoint would leave a blob per partial response
+                    await _save_response_text(node_id, "".join(chunks), offload = False, mark_stale = False)
+                    saved_count = len(chunks)
+
+        response_text = "".join(chunks)
+        await _save_response_text(node_id, response_text, context_hash = context_hash or cache_key)
+        saved_count = len(chunks)
+        embedding_indexer.schedule([node_id])
+        if conversation_id is not None:
+            sync_hub.publish(conversation_id, [node_content(node_id, response = response_text)])
+
+        if use_cache and cached is None:
+            await response_cache.put_async(cache_key, provider.model, response_text)
+
+        logger.info("streamed node %s", node_id, extra = {"node_id": node_id, "chunks": len(chunks), "cached": cached is not None})
+
+        yield sse_event("done", {
+            "status": "success",
+            "node_id": str(node_id),
+            "response": response_text,
+            "cached": cached is not None
+        })
+
+    except SchedulerRejected as e:
+        yield sse_event("error", {**e.to_dict(), "status": 429})
+
+    except LLMError as e:
+        logger.warning("execute stream: LLM call failed: %s", e, extra = {"node_id": node_id})
+        yield sse_event("error", {"detail": str(e), "status": e.status_code, "retry_after": e.retry_after})
+
+    except Exception as e:
+        logger.exception("execute stream failed", extra = {"node_id": node_id})
+        yield sse_event("error", {"detail": str(e), "status": 500})
+
+    finally:
+        # client disconnected or upstream failed mid-stream: keep whatever arrived.
+        # shielded: on disconnect the surrounding scope is already cancelled
+        if saved_count < len(chunks):
+            with anyio.CancelScope(shield = True):
+                await _save_response_text(node_id, "".join(chunks))
+
+@router.post("/execute/graph")
+async def execute_graph(
+    request: ExecuteGraphRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    execute the given roots and every node downstream of them.
+    independent branches run concurrently; progress streams back as server-sent events.
+    """
+    logger.debug("execute graph from %d roots", len(request.node_ids))
+    provider = _provider(request.tier)
+
+    try:
+        root_ids = [await id_mapper.resolve_id_async(node_id, db) for node_id in request.node_ids]
+    except ValueError as e:
+        logger.info("execute graph: bad node id: %s", e)
+        raise HTTPException(status_code=400, detail = str(e))
+
+    # in a fork, every inherited node the run reaches is copied into the fork first
+    try:
+        plan = await db.run_sync(build_plan, root_ids, _conversation_id(request.conversation_id))
+    except ForkError as e:
+        raise HTTPException(status_code = e.status_code, detail = str(e))
+
+    root_ids = [plan.replaced.get(root_id, root_id) for root_id in root_ids]
+    missing = set(root_ids) - plan.node_ids
+    if missing:
+        raise HTTPException(status_code=404,
+            detail=f"Nodes not found: {sorted(missing)}")
+
+    # the whole run is admitted (or refused) up front; its nodes then wait their fair turn
+    found = await _owner(db, root_ids[0]) if root_ids else None
+    owner = found[1] if found else user_key(None)
+    _admit(owner)
+
+    if plan.replaced:
+        await db.commit()
+        sync_hub.publish(found[0], [node_replaced(old, new) for old, new in plan.replaced.items()])
+
+    logger.info("planned graph run", extra = {"nodes": len(plan.node_ids), "edges": len(plan.edges)})
+
+    execute = partial(
+        execute_and_save,
+        bypass_cache = request.bypass_cache,
+        invalidate_cache = request.invalidate_cache,
+        provider = provider
+    )
+
+    async def events():
+        # node tasks inherit the principal; block: rate limits pace the run instead of failing nodes
+        with principal(owner, block = True):
+            async for event in run_plan(plan, execute, max_workers = request.max_workers):
+                name = event.pop("event")
+                yield sse_event(name, event)
+
+    return StreamingResponse(
+        events(),
+        media_type = "text/event-stream",
+        headers = SSE_HEADERS
+    )
+
+@router.post("/execute/stale")
+async def refresh_stale(
+    request: RefreshStaleRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    re-execute only the conversation's stale nodes, upstream first. a node whose recomputed
+    context hash matches the one its response came from is cleared without an LLM call
+    ("unchanged" event). progress streams back as server-sent events, as for /execute/graph.
+    """
+    provider = _provider(request.tier)
+
+    try:
+        conversation_id = int(request.conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail = "Invalid conversation ID format")
+
+    user_id = await db.scalar(select(Conversation.user_id).where(Conversation.id == conversation_id))
+    if user_id is None:
+        raise HTTPException(status_code=404,
+            detail=f"Conversation with ID {conversation_id} not found")
+
+    await _check_writable(db, [conversation_id])
+
+    owner = user_key(user_id)
+    _admit(owner)
+
+    plan = await db.run_sync(build_stale_plan, conversation_id)
+    logger.info("planned stale refresh", extra = {"conversation_id": conversation_id, "nodes": len(plan.node_ids)})
+
+    execute = partial(refresh_and_save, provider = provider)
+
+    async def events():
+        with principal(owner, block = True):
+            async for event in run_plan(plan, execute, max_workers = request.max_workers):
+                name = event.pop("event")
+                yield sse_event(name, event)
+
+    return StreamingResponse(
+        events(),
+        media_type = "text/event-stream",
+        headers = SSE_HEADERS
+    )
+
+@router.get("/conversations/{conversation_id}/stale")
+async def get_stale_nodes(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    node_ids = await db.run_sync(stale_node_ids, conversation_id)
+    return {"conversation_id": str(conversation_id), "node_ids": [str(node_id) for node_id in node_ids]}
+
+@router.post("/conversations/{conversation_id}/fork")
+async def create_fork(
+    conversation_id: int,
+    request: Optional[ForkConversationRequest] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    branch a conversation without copying it. the new fork starts out sharing all of its nodes,
+    which are copied into it only as they are changed there. a live conversation stays writable:
+    its nodes move to a new read-only snapshot (base_conversation_id) that it and the fork are both
+    based on, and its own edits copy nodes the same way. a snapshot is forked as it is
+    """
+    conversation = await db.run_sync(fork_conversation, conversation_id, request.title if request else None)
+    if conversation is None:
+        raise HTTPException(status_code=404,
+            detail=f"Conversation with ID {conversation_id} not found")
+    base_id = conversation.base_conversation_id
+    await db.commit()
+
+    if base_id != conversation_id and llm_settings.EMBEDDINGS_ENABLED:
+        # the moved nodes' embeddings carry their old conversation
+        embedding_indexer.schedule(await db.scalars(select(Node.id).where(Node.conversation_id == base_id)))
+
+    logger.info("forked conversation %s", conversation_id, extra = {"conversation_id": conversation.id})
+    return {
+        "status": "success",
+        "conversation_id": str(conversation.id),
+        "base_conversation_id": str(base_id)
+    }
+
+@router.post("/conversations/{conversation_id}/snapshot")
+async def create_snapshot(
+    conversation_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    freeze a conversation as a read-only snapshot; fork it to keep working on a copy
+    """
+    if not await db.run_sync(snapshot_conversation, conversation_id):
+        raise HTTPException(status_code=404,
+            detail=f"Conversation with ID {conversation_id} not found")
+    await db.commit()
+    return {"status": "success", "conversation_id": str(conversation_id)}
+
+@router.get("/conversations/{conversation_id}/changes", response_class = FastJSONResponse)
+async def get_fork_changes(
+    conversation_id: int,
+    mode: Literal["full", "preview"] = "full",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    what a fork changed relative to its base: nodes it copied (each with the inherited node it
+    "replaces") or created, and its new edges. costs O(changes), however large the base is
+    """
+    preview_chars = llm_settings.GRAPH_PREVIEW_CHARS if mode == "preview" else None
+    changes = await db.run_sync(load_fork_changes, conversation_id, preview_chars = preview_chars, read_blobs = False)
+    if changes is None:
+        raise HTTPException(
+            status_code = 404,
+            detail = f"Conversation with ID {conversation_id} not found"
+        )
+    # offloaded bodies are file reads: off the event loop
+    await asyncio.to_thread(read_page_blobs, changes)
+    return FastJSONResponse(changes)
+
+@router.get("/conversations/{conversation_id}/export")
+async def export_archive(conversation_id: int):
+    """
+    stream the conversation as a compressed archive (storage/archive.py). rows are read with a
+    server-side cursor as the response is sent, so memory stays flat however large the graph is.
+    a fork exports as the conversation it shows
+    """
+    # sync session: the frames are produced by a plain generator, iterated in the threadpool
+    db = SessionLocal()
+    frames = await asyncio.to_thread(export_conversation, db, conversation_id)
+    if frames is None:
+        db.close()
+        raise HTTPException(
+            status_code = 404,
+            detail = f"Conversation with ID {conversation_id} not found"
+        )
+
+    def stream():
+        try:
+            yield from frames
+        finally:
+            db.close()
+
+    logger.info("exporting conversation %s", conversation_id, extra = {"conversation_id": conversation_id})
+    return StreamingResponse(
+        stream(),
+        media_type = "application/octet-stream",
+        headers = {"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.mga"'}
+    )
+
+@router.post("/conversations/import")
+async def import_archive(
+    request: Request,
+    user_id: int = Query(1),
+    title: Optional[str] = Query(None, max_length = 255)
+):
+    """
+    load an archive from /export (the raw request body) as a new conversation with new ids.
+    the upload is spooled to disk past IMPORT_SPOOL_BYTES, then inserted a frame at a time
+    """
+    def load(upload):
+        # sync session in the threadpool, like export: large bodies are written to the blob store as rows go in
+        with SessionLocal() as db:
+            result = import_conversation(db, upload, user_id, title)
+            db.commit()
+            return result
+
+    with SpooledTemporaryFile(max_size = IMPORT_SPOOL_BYTES) as upload:
+        async for chunk in request.stream():
+            await asyncio.to_thread(upload.write, chunk)
+        upload.seek(0)
+
+        try:
+            result = await asyncio.to_thread(load, upload)
+        except ArchiveError as e:
+            logger.info("import rejected: %s", e)
+            raise HTTPException(status_code = 400, detail = str(e))
+        except LookupError as e:
+            raise HTTPException(status_code = 404, detail = str(e))
+    embedding_indexer.schedule(result.node_ids)
+
+    logger.info("imported conversation %s", result.conversation_id,
+                extra = {"conversation_id": result.conversation_id, "nodes": result.nodes, "edges": result.edges})
+    return {
+        "status": "success",
+        "conversation_id": str(result.conversation_id),
+        "nodes": result.nodes,
+        "edges": result.edges
+    }
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    return scheduler.stats()
+
+@router.get("/embeddings/stats")
+async def get_embedding_stats():
+    return embedding_indexer.stats()
+
+@router.get("/sync/stats")
+async def get_sync_stats():
+    return sync_hub.stats()
+
+@router.websocket("/conversations/{conversation_id}/sync")
+async def conversation_sync(
+    websocket: WebSocket,
+    conversation_id: int,
+    since: Optional[int] = Query(None, ge = 0),
+    epoch: Optional[str] = Query(None, max_length = 64),
+):
+    """
+    live graph deltas for one conversation (message format in sync.py).
+    to resume after a disconnect, reconnect with the last seq received and the hello's epoch.
+    """
+    await websocket.accept()
+    async with AsyncSessionLocal() as db:
+        exists = await db.scalar(select(Conversation.id).where(Conversation.id == conversation_id))
+    if exists is None:
+        await websocket.close(code = 4404, reason = f"Conversation with ID {conversation_id} not found")
+        return
+
+    async with sync_hub.connect(conversation_id, since, epoch) as subscriber:
+        sender = asyncio.create_task(_send_frames(websocket, subscriber))
+        try:
+            # nothing is expected from the client; reading is how the disconnect shows up
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+
+    logger.debug("sync client left", extra = {"conversation_id": conversation_id})
+
+async def _send_frames(websocket: WebSocket, subscriber) -> None:
+    while True:
+        await websocket.send_text(await subscriber.get())
+
+@router.post("/cache/clear")
+async def clear_cache():
+    await asyncio.to_thread(response_cache.clear)
+    return {
+        "status": "cleared"
+    }
+
+@router.get("/conversations/{conversation_id}/graph", response_class = FastJSONResponse)
+async def get_conversation_graph(
+    conversation_id: int,
+    cursor: Optional[int] = Query(None, description = "next_cursor from the previous page"),
+    limit: int = Query(1000, ge = 1, le = 5000),
+    min_x: Optional[int] = None,
+    min_y: Optional[int] = None,
+    max_x: Optional[int] = None,
+    max_y: Optional[int] = None,
+    mode: Literal["full", "preview"] = "full",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    load a conversation's nodes and edges in one or two queries, paged by node id.
+    pass all four of min_x/min_y/max_x/max_y to only load nodes inside a viewport.
+    mode=preview returns each body's size in bytes and first GRAPH_PREVIEW_CHARS characters;
+    fetch full bodies from /nodes/{node_id}/body.
+    """
+    bounds = (min_x, min_y, max_x, max_y)
+    if any(b is not None for b in bounds) and any(b is None for b in bounds):
+        raise HTTPException(
+            status_code = 400,
+            detail = "Bounding box needs all of min_x, min_y, max_x, max_y"
+        )
+    bbox = bounds if min_x is not None else None
+
+    preview_chars = llm_settings.GRAPH_PREVIEW_CHARS if mode == "preview" else None
+    page = await db.run_sync(load_graph_page, conversation_id, cursor = cursor, limit = limit, bbox = bbox,
+                             preview_chars = preview_chars, read_blobs = False)
+    if page is None:
+        raise HTTPException(
+            status_code = 404,
+            detail = f"Conversation with ID {conversation_id} not found"
+        )
+    await asyncio.to_thread(read_page_blobs, page)
+
+    logger.info("loaded graph page", extra = {"conversation_id": conversation_id, "nodes": len(page["nodes"]), "edges": len(page["edges"])})
+    return FastJSONResponse(page)
+
+@router.get("/search", response_class = FastJSONResponse)
+async def search(
+    q: str = Query(..., min_length = 1, max_length = 500, description = "free-text query"),
+    conversation_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    limit: int = Query(20, ge = 1, le = 100),
+    offset: int = Query(0, ge = 0, le = 10_000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    ranked full-text search over node prompts and responses, optionally within one conversation
+    or one user's conversations. each hit carries a snippet per field with [start, end) offsets
+    of the matched terms.
+    """
+    found = await search_nodes_async(db, q, limit = limit, offset = offset,
+                                     conversation_id = conversation_id, user_id = user_id)
+    logger.info("searched", extra = {"results": len(found["results"]), "total": found["total"], "backend": found["backend"]})
+    return FastJSONResponse({"query": q, **found})
+
+@router.get("/nodes/{node_id}/body")
+async def get_node_body(
+    node_id: str,
+    request: Request,
+    field: Literal["prompt", "response"] = "response",
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    full prompt or response body as text/plain.
+    supports If-None-Match (304) against a content-hash ETag and single byte ranges (206).
+    """
+    try:
+        db_id = await id_mapper.resolve_id_async(node_id, db)
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+
+    ref = await db.run_sync(load_body_ref, db_id, field)
+    if ref is None:
+        raise HTTPException(
+            status_code = 404,
+            detail = f"Node with ID {node_id} not found"
+        )
+
+    text, blob_key, size = ref
+    if blob_key:
+        # the content hash is already a strong ETag; ranges are read straight from the blob
+        # built in a worker thread: the range read is file I/O
+        try:
+            return await asyncio.to_thread(
+                body_response, size, partial(blob_store.read, blob_key), f'"{blob_key}"', request.headers
+            )
+        except KeyError:
+            raise HTTPException(
+                status_code = 410,
+                detail = f"Body of node {node_id} is no longer stored"
+            )
+
+    return text_body_response(text or "", request.headers)
+
 @router.get("/debug/id-mappings")
 async def get_id_mappings():
     # debugging endpoint to get id mappings. remove later
+    mappings = id_mapper.snapshot()
     return {
-        "mappings": id_mapper._mappings,
-        "count": len(id_mapper._mappings)
+        "mappings": mappings,
+        "count": len(mappings),
+        "stats": id_mapper.stats()
     }
 
 @router.post("/debug/clear-mappings")
@@ -92,30 +812,47 @@ async def clear_id_mappings():
         "status": "cleared"
     }
 
+async def _created_node_response(db: AsyncSession, temp_id: str) -> Optional[CreateNodeResponse]:
+    # the node an earlier create with this temp_id produced, if any
+    node = (await db.execute(
+        select(Node.id, Node.conversation_id, Node.position_x, Node.position_y).where(Node.client_id == temp_id)
+    )).first()
+    if node is None:
+        return None
+
+    id_mapper.add_mapping(temp_id, node.id)
+    return CreateNodeResponse(
+        status = "success",
+        node_id = str(node.id),
+        conversation_id = str(node.conversation_id),
+        position = { "x":node.position_x, "y":node.position_y}
+    )
+
 @router.post("/nodes/create")
 async def create_node(
     request: CreateNodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # creates the node in the database
-    print(f"\n{'='*50}")
-    print(f"[CreateNode] Position: {request.position}")
-    print(f"[CreateNode] Conversation ID: {request.conversation_id}")
-    print(f"\n{'='*50}")
-    
     try:
+        # idempotent on temp_id: a retried create returns the node made the first time
+        if request.temp_id:
+            existing = await _created_node_response(db, request.temp_id)
+            if existing is not None:
+                logger.info("node already created for %s: %s", request.temp_id, existing.node_id)
+                return existing
 
         # TODO: for the future, the conversation should already be created
         if request.conversation_id:
             
             # lookup existing conversation in database
-            conversation = db.query(Conversation).filter(
-                Conversation.id == int(request.conversation_id)
-            ).first()
+            conversation = await db.get(Conversation, int(request.conversation_id))
 
             if not conversation:
                 raise HTTPException(status_code=404, 
                     detail="Conversation could not be found")
+            if conversation.is_snapshot:
+                raise HTTPException(status_code=409, detail = str(snapshot_error(conversation.id)))
 
         else:
 
@@ -125,10 +862,9 @@ async def create_node(
                 title="Untitled Conversation"
             )
             db.add(conversation)
-            db.flush()
+            await db.flush()
 
-            print(f"[CreateNode] Created new conversation in DB: \
-                  {conversation.id}")
+            logger.info("created conversation %s", conversation.id, extra = {"conversation_id": conversation.id})
 
         # creating default node
         node = Node(
@@ -139,15 +875,19 @@ async def create_node(
             position_x = request.position['x'],
             position_y = request.position['y'],
             node_type="prompt",
-            ancestor_ids = []
+            client_id = request.temp_id,
         )
 
         db.add(node)
-        db.commit()
-        db.refresh(node)
+        await db.flush()
+        await db.run_sync(closure.add_node, node.id)
+        await db.commit()
+
+        if request.temp_id:
+            id_mapper.add_mapping(request.temp_id, node.id)
+        sync_hub.publish(conversation.id, [node_added(node.id, node.position_x, node.position_y, node.node_type)])
 
-        print(f"[CreateNode] Created node in DB: {node.id}, (\
-              {node.position_x, node.position_y})")
+        logger.info("created node %s", node.id, extra = {"node_id": node.id, "conversation_id": conversation.id})
 
         return CreateNodeResponse(
             status = "success",
@@ -155,30 +895,38 @@ async def create_node(
             conversation_id = str(conversation.id),
             position = { "x":node.position_x, "y":node.position_y}
         )
+    except HTTPException:
+        await db.rollback()
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        # lost a race with a concurrent create (another worker) for the same temp_id
+        existing = await _created_node_response(db, request.temp_id) if request.temp_id else None
+        if existing is None:
+            logger.exception("create node failed")
+            raise HTTPException(status_code=500, detail = str(e))
+        return existing
     except Exception as e:
-        db.rollback()
-        print(f"[CreateNode] Error: {e}")
+        await db.rollback()
+        logger.exception("create node failed")
         raise HTTPException(status_code=500, detail = str(e))
     
 @router.post('/edges/create')
 async def create_edge(
     request: CreateEdgeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(f"\n{'='*50}")
-    print(f"[CreateEdge] Intended source: {request.source_id}, Intended target: {request.target_id}")
-    print(f"\n{'='*50}")
-
     try:
         # convert temp ID to perma ID if necessary
-        source_db_id = id_mapper.resolve_id(request.source_id)
-        target_db_id = id_mapper.resolve_id(request.target_id)
+        source_db_id = await id_mapper.resolve_id_async(request.source_id, db)
+        target_db_id = await id_mapper.resolve_id_async(request.target_id, db)
 
-        print(f"[CreateEdge] Resolved source: {source_db_id}, Resolved target: {target_db_id}")
+        logger.debug("create edge %s -> %s", source_db_id, target_db_id)
 
-        # verify node existence in DB
-        source_node = db.query(Node).filter(Node.id == source_db_id).first()
-        target_node = db.query(Node).filter(Node.id == target_db_id).first()
+        # verify node existence in DB (one query for both endpoints)
+        nodes = await db.run_sync(node_refs, [source_db_id, target_db_id])
+        source_node = nodes.get(source_db_id)
+        target_node = nodes.get(target_db_id)
 
         if not source_node or not target_node:
             raise HTTPException(
@@ -186,76 +934,86 @@ async def create_edge(
                 detail = f"Node not found: source={source_node is not None}, target={target_node is not None}"
             )
 
+        # in a fork, edges end at the fork's own nodes and are stored from the original source node
+        try:
+            await db.run_sync(check_new_edge, source_node, target_node)
+        except ForkError as e:
+            raise HTTPException(status_code = e.status_code, detail = str(e))
+        requested_source_id, source_db_id = source_db_id, source_node.identity
+
         # check for duplicating edge
-        existing_edge = db.query(Edge).filter(
+        existing_edge_id = await db.scalar(select(Edge.id).where(
             Edge.source_node_id == source_db_id,
             Edge.target_node_id == target_db_id
-        ).first()
+        ))
 
         # avoid network retries creating duplicate edges
-        if existing_edge:
-            print(f"[CreateEdge] Edge already exists: {existing_edge.id}")
+        if existing_edge_id is not None:
+            logger.info("edge already exists: %s", existing_edge_id)
 
             # return existing request for existing edge
-            return CreateEdgeRequest(
+            return CreateEdgeResponse(
                 status = "exists",
-                edge_id = str(existing_edge.id),
-                source_id = str(source_db_id),
+                edge_id = str(existing_edge_id),
+                source_id = str(requested_source_id),
                 target_id = str(target_db_id),
             )
         
-        # create edge and persist
+        # reject edges that would close a cycle (single closure lookup)
+        if await db.run_sync(closure.would_create_cycle, source_db_id, target_db_id):
+            raise HTTPException(
+                status_code = 400,
+                detail = f"Edge {source_db_id} -> {target_db_id} would create a cycle"
+            )
+
+        # create edge and extend ancestry in the same transaction
         edge = Edge(
-            conversation_id = source_node.conversation_id,
+            conversation_id = target_node.conversation_id,
             source_node_id=source_db_id,
             target_node_id=target_db_id,
         )
 
         db.add(edge)
-        db.commit()
-        db.refresh(edge)
-
-        print(f"[CreateEdge] Create edge: {edge.id}")
+        await db.run_sync(closure.add_edge, source_db_id, target_db_id)
+        await db.run_sync(mark_descendants_stale, [target_db_id], include_self = True)
+        await db.commit()
+        sync_hub.publish(edge.conversation_id, [edge_added(edge.id, requested_source_id, target_db_id)])
 
-        source_ancestors = source_node.ancestor_ids or []
-        target_node.ancestor_ids = list(set(source_ancestors + [source_db_id])) # update ancestor list
-        db.commit()
-
-        print(f"[CreateEdge] Updated ancestor_ids for node {target_db_id}: {target_node.ancestor_ids}")
+        logger.info("created edge %s", edge.id, extra = {"edge_id": edge.id, "source_id": source_db_id, "target_id": target_db_id})
 
         return CreateEdgeResponse(
             status="success",
             edge_id=str(edge.id),
-            source_id=str(source_db_id),
+            source_id=str(requested_source_id),
             target_id=str(target_db_id)
         )
 
     except ValueError as e:
-        print(f"[CreateEdge] ID resolution error: {e}")
+        logger.info("create edge: bad node id: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+
+    except HTTPException:
+        await db.rollback()
+        raise
     
     except Exception as e:
-        db.rollback()
-        print(f"[CreateEdge] Error: {e}")
+        await db.rollback()
+        logger.exception("create edge failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/edges/delete")
 async def delete_edges(
     request: DeleteEdgeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(f"\n{'='*50}")
-    print(f"[DeleteEdge] Request to delete edge: {request.edge_id}")
-    print(f"{'='*50}")
-
     try:
         edge_id = int(request.edge_id)
 
         # query edge in database
-        edge = db.query(Edge).filter(Edge.id == edge_id).first()
+        edge = await db.get(Edge, edge_id)
 
         if not edge:
-            print(f"[DeleteEdge] Edge not found: {edge.id}")
+            logger.info("edge not found: %s", edge_id)
             raise HTTPException(
                 status_code = 404,
                 detail=f"Edge with ID {edge_id} not found"
@@ -264,12 +1022,17 @@ async def delete_edges(
         # store source and target IDs before deletion
         source_id = edge.source_node_id
         target_id = edge.target_node_id
+        conversation_id = edge.conversation_id
+        await _check_writable(db, [conversation_id])
         
-        db.delete(edge)
-        db.commit()
+        await db.delete(edge)
+        await db.flush()
+        await db.run_sync(closure.remove_edge, target_id)
+        await db.run_sync(mark_descendants_stale, [target_id], include_self = True)
+        await db.commit()
+        sync_hub.publish(conversation_id, [edge_removed(edge_id)])
 
-        print(f"[DeleteEdge] Successfully deleted edge {edge_id} \
-              (source: {source_id}, target: {target_id})")
+        logger.info("deleted edge %s", edge_id, extra = {"edge_id": edge_id, "source_id": source_id, "target_id": target_id})
         
         return DeleteEdgeResponse(
             status = "success",
@@ -277,20 +1040,18 @@ async def delete_edges(
             message="Edge deleted successfully"
         )
     except ValueError:
-        print(f"[DeleteEdge] Invalid edge ID format: {request.edge_id}")
+        logger.info("delete edge: bad edge id: %s", request.edge_id)
         raise HTTPException(
             status_code = 400,
             detail="Invalid edge ID format"
         )
     except HTTPException:
-        raise HTTPException(
-            status_code = 404,
-            detail=f"Edge with ID {edge_id} not found"
-        )
+        await db.rollback()
+        raise
     
     except Exception as e:
-        db.rollback()
-        print(f"[DeleteEdge] Error: {e}")
+        await db.rollback()
+        logger.exception("delete edge failed")
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -299,62 +1060,63 @@ async def delete_edges(
 @router.delete('/nodes/delete')
 async def delete_node(
     request: DeleteNodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(f"\n{'='*50}")
-    print(f"[DeleteNode] Request to delete node: {request.node_id}")
-    print(f"\n{'='*50}")
-
     try:
         node_id = int(request.node_id)
 
         # query database to find node
-        node = db.query(Node).filter(Node.id == node_id).first()
+        node = await db.get(Node, node_id)
 
         if not node:
-            print(f"[DeleteNode] Node not found: {node_id}")
+            logger.info("node not found: %s", node_id)
             raise HTTPException(
                 status_code = 404,
                 detail=f"Node with ID {node_id} not found"
             )
+        await _check_writable(db, [node.conversation_id])
+        if node.base_node_id is not None:
+            raise HTTPException(
+                status_code = 409,
+                detail = f"Node {node_id} is inherited from a snapshot and can't be removed in a fork"
+            )
         
         # calculate amount of edges affected by deletion
-        connected_edges = db.query(Edge).filter(
-            (Edge.source_node_id == node_id) | (Edge.target_node_id == node_id)
-        ).all()
-        edges_count = len(connected_edges)
-
-        if edges_count > 0:
-            edge_ids = [edge.id for edge in connected_edges]
-            print(f"[DeleteNode] will cascade-delete {edges_count} edges\
-                : {edge_ids}")
-            
-        db.delete(node)
-        db.commit()
+        edge_ids = (await db.scalars(select(Edge.id).where(
+            or_(Edge.source_node_id == node_id, Edge.target_node_id == node_id)
+        ))).all()
+        edges_count = len(edge_ids)
+
+        # drop edges + ancestry rows and repair descendants that lost paths through this node
+        affected = await db.run_sync(closure.remove_node, node_id)
+        await db.run_sync(mark_descendants_stale, affected, include_self = True)
+        conversation_id = node.conversation_id
+        await db.delete(node)
+        await db.commit()
+        embedding_indexer.schedule([node_id])
+        sync_hub.publish(conversation_id, [node_removed(node_id)])
 
-        print(f"[DeleteNode] Successfully deleted node {node_id} and {edges_count} connected edges")
+        logger.info("deleted node %s", node_id, extra = {"node_id": node_id, "edges_deleted": edges_count})
 
         return DeleteNodeResponse(
             status="success",
-            node_id = str(node.id),
+            node_id = str(node_id),
             message=f"Node deleted successfully with cascade-deletion of {edges_count} edges",
             edges_deleted_count = edges_count
         )
     except ValueError:
-        print(f"[DeleteNode Invalid ndoe ID format: {request.node_id}]")
+        logger.info("delete node: bad node id: %s", request.node_id)
         raise HTTPException(
             status_code = 400,
             detail = "Invalid node ID format"
         )
     
     except HTTPException:
-        raise HTTPException(
-            status_code = 404,
-            detail=f"Node with ID {node_id} not found"
-        )
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
-        print(f"[Deletenode] error: {e}")
+        await db.rollback()
+        logger.exception("delete node failed")
         raise HTTPException(
             status_code = 500,
             detail = str(e)
@@ -363,12 +1125,8 @@ async def delete_node(
 @router.patch('/nodes/update-position')
 async def update_node_position(
     request: UpdateNodePositionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    print(f"\n{'='*50}")
-    print(f"[UpdatePosition] Node: {request.node_id}, New position: {request.position}")
-    print(f"{'='*50}\n")
-
     try:
         # Convert node_id to integer
         node_id = int(request.node_id)
@@ -379,42 +1137,36 @@ async def update_node_position(
                 status_code=400,
                 detail="Position must include 'x' and 'y' coordinates"
             )
-        
-        # query the database to find the node
-        node = db.query(Node).filter(Node.id == node_id).first()
-        
+
+        # coalesced with other in-flight updates; no SELECT/refresh round trips, no JSONB rewrite
+        position = {node_id: (request.position['x'], request.position['y'])}
+        found = await position_coalescer.submit(position)
+        if node_id not in found:
+            # inherited by a fork: its copy moved instead
+            found = await _move_inherited(db, position, {node_id: request.conversation_id})
+            node_id = found.get(node_id)
+
         # failed to find node in DB
-        if not node:
-            print(f"[UpdatePosition] Node not found: {node_id}")
+        if node_id is None:
+            logger.info("node not found: %s", request.node_id)
             raise HTTPException(
                 status_code=404,
-                detail=f"Node with ID {node_id} not found"
+                detail=f"Node with ID {request.node_id} not found"
             )
         
-
-        node.position_x = request.position['x']
-        node.position_y = request.position['y']
-        
-        # Mark the field as modified (important for JSONB!)
-        
-        flag_modified(node, 'type_data')
-        
-        db.commit()
-        db.refresh(node)
-        
-        print(f"[UpdatePosition] Successfully updated position for node {node_id}: {request.position}")
+        logger.debug("moved node %s", node_id, extra = {"position": request.position})
         
         # Return success response
         return UpdateNodePositionResponse(
             status="success",
             node_id=str(node_id),
-            position=node.type_data.get('position'),
+            position=request.position,
             message="Position updated successfully"
         )
         
     except ValueError:
         # Invalid node ID format
-        print(f"[UpdatePosition] Invalid node ID format: {request.node_id}")
+        logger.info("update position: bad node id: %s", request.node_id)
         raise HTTPException(
             status_code=400,
             detail="Invalid node ID format"
@@ -426,9 +1178,95 @@ async def update_node_position(
     
     except Exception as e:
         # Catch any other unexpected errors
-        db.rollback()
-        print(f"[UpdatePosition] Error: {e}")
+        logger.exception("update position failed")
         raise HTTPException(
             status_code=500,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.patch('/nodes/update-positions')
+async def update_node_positions(
+    request: UpdateNodePositionsRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    batched position update: many nodes per call, one UPDATE ... FROM (VALUES ...).
+    the last position given for a node wins.
+    """
+    logger.debug("update positions: %d updates", len(request.updates))
+
+    positions = {}
+    conversations = {}
+    for update in request.updates:
+        if 'x' not in update.position or 'y' not in update.position:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Position for node {update.node_id} must include 'x' and 'y' coordinates"
+            )
+        try:
+            positions[int(update.node_id)] = (update.position['x'], update.position['y'])
+            conversations[int(update.node_id)] = update.conversation_id or request.conversation_id
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid node ID format: {update.node_id}"
+            )
+
+    try:
+        found = await position_coalescer.submit(positions)
+        missing = {node_id: position for node_id, position in positions.items() if node_id not in found}
+        replaced = await _move_inherited(db, missing, conversations) if missing else {}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("update positions failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return UpdateNodePositionsResponse(
+        status = "success",
+        updated = [str(node_id) for node_id in positions if node_id in found or node_id in replaced],
+        not_found = [str(node_id) for node_id in positions if node_id not in found and node_id not in replaced],
+        replaced = {str(node_id): str(copy_id) for node_id, copy_id in replaced.items()}
+    )
+
+@router.post('/graph/batch')
+async def batch_mutate(
+    request: BatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    apply an ordered list of node/edge operations in one transaction.
+    temp IDs created earlier in the batch can be referenced by later operations.
+    """
+    logger.debug("applying batch of %d operations", len(request.operations))
+
+    deltas = []
+    try:
+        mappings, results = await db.run_sync(apply_batch, request, deltas)
+        await db.commit()
+
+    except BatchError as e:
+        await db.rollback()
+        logger.info("batch rolled back: %s", e)
+        # the failing operation's index lets the client drop it and resend the rest
+        return FastJSONResponse({"detail": str(e), "operation": e.index}, status_code = e.status_code)
+
+    except Exception as e:
+        await db.rollback()
+        logger.exception("batch failed")
+        raise HTTPException(status_code = 500, detail = str(e))
+
+    # warm this worker's temp-id cache once the nodes are durable
+    for op, result in zip(request.operations, results):
+        if op.op == "create_node" and op.temp_id:
+            id_mapper.add_mapping(op.temp_id, int(result["node_id"]))
+
+    sync_hub.publish_many(deltas)
+
+    logger.info("committed batch", extra = {"operations": len(results), "new_ids": len(mappings)})
+
+    return BatchResponse(
+        status = "success",
+        id_mappings = mappings,
+        results = results
+    )
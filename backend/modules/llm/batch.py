@@ -0,0 +1,363 @@
+"""
+applies an ordered list of graph mutations in a single transaction.
+
+consecutive operations of the same kind are grouped and applied with bulk statements,
+so pasting or deleting a large subgraph costs a handful of queries and one commit.
+snapshots are read-only; in a fork (storage/forks.py), moving an inherited node materializes the
+fork's copy of it (pass the fork as conversation_id), and new edges must end at the fork's own nodes.
+"""
+
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from modules.storage import closure
+from modules.storage.forks import ForkError, check_new_edge, node_refs, snapshot_error, writable_node
+from modules.storage.staleness import mark_descendants_stale
+from modules.storage.positions import bulk_update_positions, conversation_ids
+from modules.storage.models import Node, Edge, Conversation
+from .id_mapper import id_mapper
+from .models import BatchOperation, BatchRequest
+from .sync import node_added, node_moved, node_removed, node_replaced, edge_added, edge_removed
+
+
+class BatchError(Exception):
+    """
+    a single operation failed; the whole batch is rolled back
+    """
+
+    def __init__(self, index: int, message: str, status_code: int = 400):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+        self.status_code = status_code
+
+
+class BatchApplier:
+
+    def __init__(self, db: Session, request: BatchRequest, deltas: Optional[list] = None):
+        self.db = db
+        self.request = request
+        self.deltas = [] if deltas is None else deltas     # (conversation_id, sync delta) per change
+        self.node_ids: Dict[str, int] = {}      # temp id -> db id, nodes created in this batch
+        self.edge_ids: Dict[str, int] = {}      # temp id -> db id, edges created in this batch
+        self.results: List[Optional[dict]] = [None] * len(request.operations)
+        self._default_conversation_id: Optional[int] = None
+        self._chains: Dict[int, List[int]] = {}     # conversation id -> its fork chain
+
+    def apply(self) -> Tuple[Dict[str, str], List[dict]]:
+        indexed = list(enumerate(self.request.operations))
+        handlers = {
+            "create_node": self._create_nodes,
+            "create_edge": self._create_edges,
+            "delete_node": self._delete_nodes,
+            "delete_edge": self._delete_edges,
+            "update_position": self._update_positions,
+        }
+
+        for op, run in groupby(indexed, key = lambda item: item[1].op):
+            handlers[op](list(run))
+
+        mappings = {temp: str(db_id) for temp, db_id in {**self.node_ids, **self.edge_ids}.items()}
+        return mappings, self.results
+
+    # --- id resolution -------------------------------------------------------
+
+    def _node_id(self, index: int, node_id: Optional[str]) -> int:
+        if node_id is None:
+            raise BatchError(index, "missing node id")
+        if node_id in self.node_ids:
+            return self.node_ids[node_id]
+        try:
+            return id_mapper.resolve_id(node_id, self.db)
+        except ValueError as e:
+            raise BatchError(index, str(e))
+
+    def _edge_id(self, index: int, edge_id: Optional[str]) -> int:
+        if edge_id is None:
+            raise BatchError(index, "missing edge id")
+        if edge_id in self.edge_ids:
+            return self.edge_ids[edge_id]
+        try:
+            return int(edge_id)
+        except ValueError:
+            raise BatchError(index, f"Invalid edge ID format: {edge_id}")
+
+    def _conversation_id(self, index: int, op: BatchOperation) -> int:
+        requested = op.conversation_id or self.request.conversation_id
+        if requested is None:
+            # same fallback as /nodes/create: one new conversation for the whole batch
+            if self._default_conversation_id is None:
+                conversation = Conversation(user_id = 1, title = "Untitled Conversation")
+                self.db.add(conversation)
+                self.db.flush()
+                self._default_conversation_id = conversation.id
+            return self._default_conversation_id
+
+        try:
+            return int(requested)
+        except ValueError:
+            raise BatchError(index, f"Invalid conversation ID format: {requested}")
+
+    # --- handlers --------------------------------------------------------------
+
+    def _create_nodes(self, run: List[Tuple[int, BatchOperation]]) -> None:
+        # idempotent on temp_id: a temp id that already has a node (a retried batch, or an
+        # earlier op in this one) reports that node with status "exists" instead of creating another
+        temp_ids = {op.temp_id for _, op in run if op.temp_id}
+        existing = {}
+        if temp_ids:
+            for row in self.db.execute(
+                select(Node.id, Node.client_id, Node.conversation_id, Node.position_x, Node.position_y)
+                .where(Node.client_id.in_(temp_ids))
+            ):
+                existing[row.client_id] = {
+                    "node_id": str(row.id),
+                    "conversation_id": str(row.conversation_id),
+                    "position": {"x": row.position_x, "y": row.position_y},
+                }
+                self.node_ids[row.client_id] = row.id
+
+        created, rows, repeats, claimed = [], [], [], {}
+        for index, op in run:
+            position = op.position or {}
+            if 'x' not in position or 'y' not in position:
+                raise BatchError(index, "Position must include 'x' and 'y' coordinates")
+            if op.temp_id in existing or op.temp_id in claimed:
+                repeats.append((index, op.temp_id))
+                continue
+            if op.temp_id:
+                claimed[op.temp_id] = index
+            created.append((index, op))
+            rows.append({
+                "conversation_id": self._conversation_id(index, op),
+                "client_id": op.temp_id,
+                "prompt_text": "",
+                "response_text": "",
+                "position_x": position['x'],
+                "position_y": position['y'],
+                "node_type": "prompt",
+                "type_data": {},
+            })
+
+        conversation_ids = {row["conversation_id"] for row in rows}
+        found = dict(self.db.execute(
+            select(Conversation.id, Conversation.is_snapshot).where(Conversation.id.in_(conversation_ids))
+        ).all())
+        for (index, _), row in zip(created, rows):
+            if row["conversation_id"] not in found:
+                raise BatchError(index, "Conversation could not be found", 404)
+            if found[row["conversation_id"]]:
+                raise self._fork_error(index, snapshot_error(row["conversation_id"]))
+
+        new_ids = []
+        if rows:
+            new_ids = list(self.db.scalars(
+                insert(Node).returning(Node.id, sort_by_parameter_order = True), rows
+            ))
+            closure.add_nodes(self.db, new_ids)
+
+        for (index, op), node_id, row in zip(created, new_ids, rows):
+            if op.temp_id:
+                self.node_ids[op.temp_id] = node_id
+            self.deltas.append((row["conversation_id"], node_added(node_id, row["position_x"], row["position_y"], row["node_type"])))
+            self.results[index] = {
+                "status": "success",
+                "node_id": str(node_id),
+                "conversation_id": str(row["conversation_id"]),
+                "position": {"x": row["position_x"], "y": row["position_y"]},
+            }
+
+        for index, temp_id in repeats:
+            original = existing.get(temp_id) or self.results[claimed[temp_id]]
+            self.results[index] = {**original, "status": "exists"}
+
+    def _create_edges(self, run: List[Tuple[int, BatchOperation]]) -> None:
+        requested = [(self._node_id(index, op.source_id), self._node_id(index, op.target_id)) for index, op in run]
+        refs = node_refs(self.db, {node_id for pair in requested for node_id in pair})
+
+        # edges connect original nodes; a fork's copy stands in for the one it shadows
+        pairs, shown = [], {}
+        for (index, _), (source, target) in zip(run, requested):
+            if source not in refs or target not in refs:
+                raise BatchError(index, f"Node not found: source={source in refs}, target={target in refs}")
+            try:
+                check_new_edge(self.db, refs[source], refs[target], self._chains)
+            except ForkError as e:
+                raise self._fork_error(index, e)
+            pair = (refs[source].identity, target)
+            pairs.append(pair)
+            shown[pair] = source
+        conversation_of = {target: refs[target].conversation_id for _, target in pairs}
+
+        existing = dict(((source, target), edge_id) for edge_id, source, target in self.db.execute(
+            select(Edge.id, Edge.source_node_id, Edge.target_node_id).where(
+                tuple_(Edge.source_node_id, Edge.target_node_id).in_(pairs)
+            )
+        ))
+
+        rows, created, repeated = [], [], []
+        for (index, op), (source, target) in zip(run, pairs):
+            # same edge requested twice in this run: resolved once the first one is inserted
+            if existing.get((source, target), 0) is None:
+                repeated.append((index, op, source, target))
+                continue
+
+            if (source, target) in existing:
+                edge_id = existing[(source, target)]
+                if op.temp_id:
+                    self.edge_ids[op.temp_id] = edge_id
+                self.results[index] = {"status": "exists", "edge_id": str(edge_id),
+                                       "source_id": str(shown[(source, target)]), "target_id": str(target)}
+                continue
+
+            # edges earlier in this run are already in the closure, so this check sees them
+            if closure.would_create_cycle(self.db, source, target):
+                raise BatchError(index, f"Edge {source} -> {target} would create a cycle")
+
+            closure.add_edge(self.db, source, target)
+            existing[(source, target)] = None
+            rows.append({"conversation_id": conversation_of[target], "source_node_id": source, "target_node_id": target})
+            created.append((index, op, source, target))
+
+        if not rows:
+            return
+
+        # new upstream turns: executed targets (and everything below them) are out of date
+        mark_descendants_stale(self.db, {target for _, _, _, target in created}, include_self = True)
+
+        new_ids = list(self.db.scalars(
+            insert(Edge).returning(Edge.id, sort_by_parameter_order = True), rows
+        ))
+        for (index, op, source, target), edge_id in zip(created, new_ids):
+            existing[(source, target)] = edge_id
+            self.deltas.append((conversation_of[target], edge_added(edge_id, shown[(source, target)], target)))
+            if op.temp_id:
+                self.edge_ids[op.temp_id] = edge_id
+            self.results[index] = {"status": "success", "edge_id": str(edge_id),
+                                   "source_id": str(shown[(source, target)]), "target_id": str(target)}
+
+        for index, op, source, target in repeated:
+            edge_id = existing[(source, target)]
+            if op.temp_id:
+                self.edge_ids[op.temp_id] = edge_id
+            self.results[index] = {"status": "exists", "edge_id": str(edge_id),
+                                   "source_id": str(shown[(source, target)]), "target_id": str(target)}
+
+    def _delete_edges(self, run: List[Tuple[int, BatchOperation]]) -> None:
+        edge_ids = [self._edge_id(index, op.edge_id) for index, op in run]
+        rows = self.db.execute(
+            select(Edge.id, Edge.target_node_id, Edge.conversation_id, Conversation.is_snapshot)
+            .join(Conversation, Conversation.id == Edge.conversation_id)
+            .where(Edge.id.in_(edge_ids))
+        ).all()
+        frozen = {edge_id: conversation_id for edge_id, _, conversation_id, is_snapshot in rows if is_snapshot}
+        for index, edge_id in zip((index for index, _ in run), edge_ids):
+            if edge_id in frozen:
+                raise self._fork_error(index, snapshot_error(frozen[edge_id]))
+
+        targets = {edge_id: target for edge_id, target, _, _ in rows}
+        self.deltas.extend((conversation_id, edge_removed(edge_id)) for edge_id, _, conversation_id, _ in rows)
+
+        if targets:
+            self.db.execute(delete(Edge).where(Edge.id.in_(list(targets))))
+            closure.remove_edges(self.db, targets.values())
+            mark_descendants_stale(self.db, set(targets.values()), include_self = True)
+
+        # deletes are idempotent: an edge already removed (e.g. by a node cascade) doesn't fail the batch
+        for (index, _), edge_id in zip(run, edge_ids):
+            status = "success" if edge_id in targets else "not_found"
+            self.results[index] = {"status": status, "edge_id": str(edge_id)}
+
+    def _delete_nodes(self, run: List[Tuple[int, BatchOperation]]) -> None:
+        node_ids = [self._node_id(index, op.node_id) for index, op in run]
+        refs = node_refs(self.db, node_ids)
+        for (index, _), node_id in zip(run, node_ids):
+            ref = refs.get(node_id)
+            if ref is not None and ref.frozen:
+                raise self._fork_error(index, snapshot_error(ref.conversation_id))
+            if ref is not None and ref.is_copy:
+                raise BatchError(index, f"Node {node_id} is inherited from a snapshot and can't be removed in a fork", 409)
+        found = {node_id: ref.conversation_id for node_id, ref in refs.items()}
+
+        edge_counts: Dict[int, int] = {node_id: 0 for node_id in found}
+        for source, target in self.db.execute(
+            select(Edge.source_node_id, Edge.target_node_id).where(
+                Edge.source_node_id.in_(list(found)) | Edge.target_node_id.in_(list(found))
+            )
+        ):
+            for endpoint in {source, target}:
+                if endpoint in edge_counts:
+                    edge_counts[endpoint] += 1
+
+        if found:
+            affected = closure.remove_nodes(self.db, found)
+            mark_descendants_stale(self.db, affected, include_self = True)
+            self.db.execute(delete(Node).where(Node.id.in_(list(found))))
+            self.deltas.extend((conversation_id, node_removed(node_id)) for node_id, conversation_id in found.items())
+
+        for (index, _), node_id in zip(run, node_ids):
+            if node_id not in found:
+                self.results[index] = {"status": "not_found", "node_id": str(node_id)}
+                continue
+            self.results[index] = {"status": "success", "node_id": str(node_id),
+                                   "edges_deleted_count": edge_counts[node_id]}
+
+    def _update_positions(self, run: List[Tuple[int, BatchOperation]]) -> None:
+        # later updates to the same node win
+        positions: Dict[int, dict] = {}
+        written: Dict[int, int] = {}        # requested id -> row written (a fork's copy of an inherited node)
+        refs = node_refs(self.db, {self._node_id(index, op.node_id) for index, op in run})
+        for index, op in run:
+            position = op.position or {}
+            if 'x' not in position or 'y' not in position:
+                raise BatchError(index, "Position must include 'x' and 'y' coordinates")
+            node_id = self._node_id(index, op.node_id)
+            if node_id in refs and refs[node_id].frozen and node_id not in written:
+                written[node_id] = self._materialize(index, node_id, op)
+            positions[written.get(node_id, node_id)] = position
+
+        found = bulk_update_positions(self.db, {
+            node_id: (position['x'], position['y']) for node_id, position in positions.items()
+        })
+        for index, op in run:
+            node_id = self._node_id(index, op.node_id)
+            if written.get(node_id, node_id) not in found:
+                raise BatchError(index, f"Node with ID {node_id} not found", 404)
+
+        for node_id, conversation_id in conversation_ids(self.db, found).items():
+            position = positions[node_id]
+            self.deltas.append((conversation_id, node_moved(node_id, position['x'], position['y'])))
+
+        for index, op in run:
+            node_id = self._node_id(index, op.node_id)
+            self.results[index] = {"status": "success", "node_id": str(written.get(node_id, node_id)),
+                                   "position": op.position}
+
+    # --- forks -----------------------------------------------------------------
+
+    def _materialize(self, index: int, node_id: int, op: BatchOperation) -> int:
+        # the fork's copy of an inherited node, made on its first change in the fork
+        requested = op.conversation_id or self.request.conversation_id
+        try:
+            fork_id = int(requested) if requested is not None else None
+        except ValueError:
+            raise BatchError(index, f"Invalid conversation ID format: {requested}")
+        try:
+            copy_id, conversation_id = writable_node(self.db, node_id, fork_id)
+        except ForkError as e:
+            raise self._fork_error(index, e)
+        self.deltas.append((conversation_id, node_replaced(node_id, copy_id)))
+        return copy_id
+
+    def _fork_error(self, index: int, error: ForkError) -> BatchError:
+        return BatchError(index, str(error), error.status_code)
+
+
+def apply_batch(db: Session, request: BatchRequest, deltas: Optional[list] = None) -> Tuple[Dict[str, str], List[dict]]:
+    """
+    apply every operation, in order, inside the caller's transaction. raises BatchError on failure.
+    deltas, if given, collects (conversation_id, sync delta) pairs to publish after the commit
+    """
+    return BatchApplier(db, request, deltas).apply()
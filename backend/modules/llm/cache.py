@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, select, true
+from sqlalchemy.orm import Session
+
+from modules.storage.models import LLMCacheEntry
+from core.database import SessionLocal
+from .config import llm_settings
+from .scheduler import scheduler
+
+
+class ResponseCache:
+    """
+    two-tier cache of LLM responses keyed by LLMProvider.request_key.
+
+    tier 1 is an in-process LRU with TTL. tier 2 is the llm_cache table, shared across workers
+    and restarts, bounded by TTL and a max row count that is enforced every few writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        persistent: Optional[bool] = None,
+        db_max_entries: Optional[int] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.max_entries = max_entries or llm_settings.CACHE_MEMORY_ENTRIES
+        self.ttl_seconds = ttl_seconds or llm_settings.CACHE_TTL_SECONDS
+        self.persistent = llm_settings.CACHE_PERSISTENT if persistent is None else persistent
+        self.db_max_entries = db_max_entries or llm_settings.CACHE_DB_MAX_ENTRIES
+        self.session_factory = session_factory
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # the db tier runs in worker threads (get_async / put_async) and refills memory from there
+        self._lock = threading.Lock()
+        self._writes_since_sweep = 0
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        cached = self._memory_get(key)
+        return cached if cached is not None else self._db_get(key)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        # memory hits stay on the event loop; only the db tier moves to a worker thread
+        cached = self._memory_get(key)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self._db_get, key)
+
+    def put(self, key: str, model: str, response_text: str) -> None:
+        self._remember(key, response_text, time.time() + self.ttl_seconds)
+        self._db_put(key, model, response_text)
+
+    async def put_async(self, key: str, model: str, response_text: str) -> None:
+        self._remember(key, response_text, time.time() + self.ttl_seconds)
+        await asyncio.to_thread(self._db_put, key, model, response_text)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        self._db_delete(LLMCacheEntry.key == key)
+
+    async def invalidate_async(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        await asyncio.to_thread(self._db_delete, LLMCacheEntry.key == key)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response_text, expires_at = entry
+                if expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response_text
+                del self._memory[key]
+            if not self.persistent:
+                self.misses += 1
+        return None
+
+    def _db_get(self, key: str) -> Optional[str]:
+        if not self.persistent:
+            return None
+
+        db = self.session_factory()
+        try:
+            row = db.execute(
+                select(LLMCacheEntry.response_text, LLMCacheEntry.expires_at).where(
+                    LLMCacheEntry.key == key,
+                    LLMCacheEntry.expires_at > datetime.now(timezone.utc)
+                )
+            ).first()
+        finally:
+            db.close()
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+        self._remember(key, row.response_text, time.time() + self.ttl_seconds)
+        return row.response_text
+
+    def _db_put(self, key: str, model: str, response_text: str) -> None:
+        if not self.persistent:
+            return
+
+        now = datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            db.merge(LLMCacheEntry(
+                key = key,
+                model = model,
+                response_text = response_text,
+                created_at = now,
+                expires_at = now + timedelta(seconds = self.ttl_seconds)
+            ))
+
+            # counters move on to_thread workers, so only under the lock
+            with self._lock:
+                self._writes_since_sweep += 1
+                sweep = self._writes_since_sweep >= llm_settings.CACHE_SWEEP_EVERY
+                if sweep:
+                    self._writes_since_sweep = 0
+            if sweep:
+                self._sweep(db, now)
+
+            db.commit()
+        finally:
+            db.close()
+
+    def _db_delete(self, condition) -> None:
+        if not self.persistent:
+            return
+        db = self.session_factory()
+        try:
+            db.execute(delete(LLMCacheEntry).where(condition))
+            db.commit()
+        finally:
+            db.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        self._db_delete(true())
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def _remember(self, key: str, response_text: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (response_text, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last = False)
+                self.evictions += 1
+
+    def _sweep(self, db: Session, now: datetime) -> None:
+        # drop expired rows, then the oldest rows beyond the size bound
+        expired = db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= now))
+
+        overflow = select(LLMCacheEntry.key).order_by(LLMCacheEntry.created_at.desc()).offset(self.db_max_entries)
+        trimmed = db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(overflow)))
+
+        with self._lock:
+            self.evictions += (expired.rowcount or 0) + (trimmed.rowcount or 0)
+
+
+response_cache = ResponseCache()
+
+
+async def generate_cached(
+    client,
+    prompt: str,
+    history: Optional[Sequence] = None,
+    bypass: bool = False,
+    invalidate: bool = False,
+) -> Tuple[str, bool]:
+    """
+    generate through the cache. returns (response_text, cache_hit).
+    bypass skips the cache entirely; invalidate drops any stored entry so this call refreshes it.
+    """
+    if not llm_settings.CACHE_ENABLED or bypass:
+        response_cache.record_bypass()
+        async with scheduler.slot():
+            return await client.generate(prompt, history = history), False
+
+    key = client.request_key(prompt, history)
+    if invalidate:
+        await response_cache.invalidate_async(key)
+    else:
+        cached = await response_cache.get_async(key)
+        if cached is not None:
+            return cached, True
+
+    # only actual provider calls count against the scheduler
+    async with scheduler.slot():
+        response_text = await client.generate(prompt, history = history)
+    await response_cache.put_async(key, client.model, response_text)
+    return response_text, False
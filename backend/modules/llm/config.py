@@ -1,6 +1,6 @@
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pathlib import Path
 
 CONFIG_DIR = Path(__file__).resolve().parent
@@ -29,6 +29,101 @@ class LLMSettings(BaseSettings):
 
     GEMINI_API_KEY: str
 
+    # providers (see providers/registry.py): the default "provider" + model, and named tiers
+    # mapping to "provider:model", e.g. cheap nodes on a faster model
+    LLM_PROVIDER: str = "gemini"
+    LLM_MODEL: str = "gemini-2.0-flash"
+    LLM_TIERS: Dict[str, str] = {"fast": "gemini:gemini-2.0-flash-lite"}
+    LLM_EMBEDDING_MODEL: str = "text-embedding-004"
+
+    # max concurrent LLM calls per process (per provider instance)
+    LLM_MAX_CONCURRENCY: int = 8
+
+    # micro-batching: concurrent calls arriving within the window go out as one provider batch call
+    # (only for providers with a native batch call)
+    LLM_BATCH_ENABLED: bool = True
+    LLM_BATCH_MAX_SIZE: int = 16
+    LLM_BATCH_MAX_WAIT_MS: int = 5
+
+    # call policy (providers/policy.py). per-attempt timeout, and the default / max overall deadline
+    # per request (clients can ask for less with X-Request-Timeout)
+    LLM_CALL_TIMEOUT_S: float = 60.0
+    LLM_DEFAULT_DEADLINE_S: float = 120.0
+    LLM_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_S: float = 0.5
+    LLM_RETRY_MAX_DELAY_S: float = 8.0
+    LLM_HEDGE_AFTER_S: float = 0.0       # 0 disables hedged requests
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_S: float = 30.0
+
+    # admission control / fair queuing (scheduler.py): process-wide cap on in-flight LLM calls,
+    # bound on waiting calls, and a per-user token bucket (calls/s, burst). weights are keyed
+    # "user:<id>" and default to 1. the cap defaults to LLM_MAX_CONCURRENCY: a higher cap only lets
+    # calls past fair queuing to wait in the provider's semaphore instead. raise it when calls are
+    # spread over several providers or tiers, each with its own LLM_MAX_CONCURRENCY
+    SCHEDULER_MAX_CONCURRENCY: Optional[int] = None
+    SCHEDULER_MAX_QUEUE: int = 256
+    SCHEDULER_USER_RATE: float = 2.0
+    SCHEDULER_USER_BURST: float = 10.0
+    SCHEDULER_WEIGHTS: Dict[str, float] = {}
+
+    # node embeddings (embeddings.py): "hashing" is local and offline, "provider" uses LLM_PROVIDER's
+    # embed call (set EMBEDDING_DIMENSIONS to the model's size). changed nodes are embedded in the
+    # background, debounced by EMBED_FLUSH_DELAY_MS
+    EMBEDDINGS_ENABLED: bool = True
+    EMBEDDER: str = "hashing"
+    EMBEDDING_DIMENSIONS: int = 256
+    EMBED_FLUSH_DELAY_MS: int = 200
+    EMBED_BATCH_SIZE: int = 64
+
+    # retrieval-augmented context (retrieval.py): similar non-ancestor nodes added to /execute
+    # prompts. top_k 0 = off unless the request asks; scope is "conversation" or "user"
+    RETRIEVAL_TOP_K: int = 0
+    RETRIEVAL_SCOPE: str = "conversation"
+    RETRIEVAL_MIN_SCORE: float = 0.2
+    RETRIEVAL_TOKEN_BUDGET: int = 2000
+
+    # persist partial streamed responses every N chunks
+    STREAM_FLUSH_EVERY: int = 20
+
+    # ancestor context assembly
+    CONTEXT_TOKEN_BUDGET: int = 8000
+    CONTEXT_MAX_TURN_TOKENS: int = 2000
+    CONTEXT_POLICY: str = "truncate"     # 'truncate' or 'drop_oldest'
+    CONTEXT_CACHE_SIZE: int = 256
+
+    # concurrent nodes per whole-graph run
+    GRAPH_MAX_WORKERS: int = 4
+
+    # response cache
+    CACHE_ENABLED: bool = True
+    CACHE_PERSISTENT: bool = True
+    CACHE_MEMORY_ENTRIES: int = 1024
+    CACHE_DB_MAX_ENTRIES: int = 100_000
+    CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    CACHE_SWEEP_EVERY: int = 100       # enforce db-tier bounds every N writes
+
+    # debounce window for coalesced position writes
+    POSITION_FLUSH_DELAY_MS: int = 10
+
+    # per-process cache in front of Node.client_id temp-ID lookups
+    ID_MAPPER_CACHE_SIZE: int = 10_000
+    ID_MAPPER_TTL_SECONDS: int = 600
+
+    # characters of prompt/response returned per node by the graph loader's preview mode
+    GRAPH_PREVIEW_CHARS: int = 160
+
+    # real-time graph sync (sync.py): deltas are debounced into one frame per conversation every
+    # SYNC_FLUSH_DELAY_MS, and the last SYNC_REPLAY_FRAMES frames are kept for resuming clients
+    # while anyone is (or was, within SYNC_LINGER_S) connected. pub/sub backend: "memory" for a
+    # single process, "postgres" (LISTEN/NOTIFY) for several workers
+    SYNC_ENABLED: bool = True
+    SYNC_PUBSUB: str = "memory"
+    SYNC_FLUSH_DELAY_MS: int = 30
+    SYNC_REPLAY_FRAMES: int = 1000
+    SYNC_LINGER_S: float = 60.0
+    SYNC_CLIENT_QUEUE: int = 1000       # frames queued per socket before a slow client is reset
+
     @field_validator("ALLOWED_ORIGINS")
     def parse_allowed_origins(cls, v: str) -> List[str]:
         return v.split(",") if v else []
@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import heapq
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from modules.storage.models import Node, Edge, NodeClosure
+from modules.storage.content import resolve_rows
+from modules.storage.forks import fork_ancestors
+from .config import llm_settings
+
+TRUNCATION_MARKER = "\n[...]\n"
+POLICIES = ("truncate", "drop_oldest")
+
+
+@dataclass(frozen = True)
+class ContextTurn:
+    """
+    one ancestor prompt/response pair as it will be sent to the model
+    """
+    node_id: int
+    prompt: str
+    response: str
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    # rough heuristic (~4 chars per token). good enough for budgeting, no tokenizer round trip
+    return (len(text) + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    keep the head and tail of text so it fits in max_tokens
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = max(max_tokens * 4 - len(TRUNCATION_MARKER), 0)
+    head = max_chars // 2
+    tail = max_chars - head
+    return text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail else "")
+
+def topological_order(node_ids: Iterable[int], edges: Iterable[Tuple[int, int]]) -> List[int]:
+    """
+    Kahn's algorithm over the ancestor subgraph. ties broken by id so the order is stable
+    """
+    node_ids = set(node_ids)
+    children: Dict[int, List[int]] = {node_id: [] for node_id in node_ids}
+    in_degree: Dict[int, int] = {node_id: 0 for node_id in node_ids}
+
+    for source_id, target_id in edges:
+        if source_id in node_ids and target_id in node_ids:
+            children[source_id].append(target_id)
+            in_degree[target_id] += 1
+
+    ready = [node_id for node_id, degree in in_degree.items() if degree == 0]
+    heapq.heapify(ready)
+    order = []
+
+    while ready:
+        node_id = heapq.heappop(ready)
+        order.append(node_id)
+        for child_id in children[node_id]:
+            in_degree[child_id] -= 1
+            if in_degree[child_id] == 0:
+                heapq.heappush(ready, child_id)
+
+    # cycles shouldn't exist, but don't silently drop nodes if one slips through
+    if len(order) < len(node_ids):
+        order.extend(sorted(node_ids - set(order)))
+
+    return order
+
+
+class ContextAssembler:
+    """
+    builds the conversation history for a node from its ancestors.
+
+    ancestors are fetched in one query, ordered topologically using the edges between them,
+    and packed newest-first into a token budget. assembled prefixes are memoized by
+    content fingerprint so siblings sharing a parent reuse the same result.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        max_turn_tokens: Optional[int] = None,
+        policy: Optional[str] = None,
+        cache_size: Optional[int] = None,
+    ):
+        self.token_budget = token_budget or llm_settings.CONTEXT_TOKEN_BUDGET
+        self.max_turn_tokens = max_turn_tokens or llm_settings.CONTEXT_MAX_TURN_TOKENS
+        self.policy = policy or llm_settings.CONTEXT_POLICY
+        self.cache_size = cache_size or llm_settings.CONTEXT_CACHE_SIZE
+
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown context policy: {self.policy}")
+
+        self._cache: "OrderedDict[str, Tuple[ContextTurn, ...]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def assemble(self, db: Session, node_id: int) -> Tuple[ContextTurn, ...]:
+        """
+        fetch ancestors + connecting edges and build the context
+        """
+        rows, edges = self.fetch(db, node_id)
+        return self._build(rows, edges) if rows else ()
+
+    async def assemble_async(self, db: AsyncSession, node_id: int) -> Tuple[ContextTurn, ...]:
+        """
+        assemble() for request handlers: the queries run through the async session, and offloaded
+        bodies are read in a worker thread, only on a memo miss
+        """
+        rows, edges = await db.run_sync(self.fetch, node_id)
+        if not rows:
+            return ()
+        key = self._fingerprint(rows, edges)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, await asyncio.to_thread(resolve_rows, rows), edges)
+
+    def fetch(self, db: Session, node_id: int) -> Tuple[list, list]:
+        """
+        (ancestor rows, connecting edges) in two queries, after a fork check. rows are
+        (node_id, prompt_text, prompt_blob_key, response_text, response_blob_key); no blob is read.
+        in a fork, ancestors are the fork's view of them: its copies where it has edited one
+        """
+        fork = fork_ancestors(db, node_id)
+        if fork is not None:
+            ancestors, edges = fork
+            return list(ancestors), list(edges)
+
+        ancestor_ids = select(NodeClosure.ancestor_id).where(
+            NodeClosure.descendant_id == node_id, NodeClosure.depth > 0
+        )
+
+        rows = db.query(
+            Node.id, Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key
+        ).filter(Node.id.in_(ancestor_ids)).all()
+
+        if not rows:
+            return [], []
+
+        edges = db.query(Edge.source_node_id, Edge.target_node_id).filter(
+            Edge.target_node_id.in_(ancestor_ids)
+        ).all()
+
+        return rows, edges
+
+    def build(
+        self,
+        rows: Iterable[Tuple[int, str, Optional[str]]],
+        edges: Iterable[Tuple[int, int]]
+    ) -> Tuple[ContextTurn, ...]:
+        """
+        order and pack already-fetched (node_id, prompt, response) rows. memoized on their content and edges
+        """
+        return self._build([(node_id, prompt, None, response, None) for node_id, prompt, response in rows], edges)
+
+    def _build(self, rows, edges) -> Tuple[ContextTurn, ...]:
+        """
+        rows are (node_id, prompt_text, prompt_blob_key, response_text, response_blob_key). an offloaded
+        body is keyed by its blob key (the hash of its content), so a memo hit reads no blobs
+        """
+        rows, edges = list(rows), list(edges)
+        key = self._fingerprint(rows, edges)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, resolve_rows(rows), edges)
+
+    def _lookup(self, key: str) -> Optional[Tuple[ContextTurn, ...]]:
+        cached = self._cache.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return cached
+
+    def _store(self, key: str, texts: Dict[int, Tuple[str, str]], edges) -> Tuple[ContextTurn, ...]:
+        order = topological_order(texts.keys(), edges)
+        turns = self._pack([(node_id, *texts[node_id]) for node_id in order])
+
+        self._cache[key] = turns
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last = False)
+
+        return turns
+
+    def _pack(self, ordered: List[Tuple[int, str, str]]) -> Tuple[ContextTurn, ...]:
+        # walk backwards from the nearest ancestor so the most relevant turns survive
+        remaining = self.token_budget
+        packed: List[ContextTurn] = []
+
+        for node_id, prompt, response in reversed(ordered):
+            if not prompt and not response:
+                continue
+
+            if self.policy == "truncate":
+                prompt = truncate_to_tokens(prompt, self.max_turn_tokens)
+                response = truncate_to_tokens(response, self.max_turn_tokens)
+
+            tokens = estimate_tokens(prompt) + estimate_tokens(response)
+
+            if tokens > remaining:
+                if self.policy == "truncate" and remaining > 0:
+                    # squeeze the oldest surviving turn into whatever budget is left
+                    prompt = truncate_to_tokens(prompt, remaining // 2)
+                    response = truncate_to_tokens(response, remaining - remaining // 2)
+                    tokens = estimate_tokens(prompt) + estimate_tokens(response)
+                    packed.append(ContextTurn(node_id, prompt, response, tokens))
+                break
+
+            packed.append(ContextTurn(node_id, prompt, response, tokens))
+            remaining -= tokens
+
+        packed.reverse()
+        return tuple(packed)
+
+    def _fingerprint(self, rows: List[tuple], edges: List[Tuple[int, int]]) -> str:
+        digest = hashlib.blake2b(digest_size = 16)
+        node_ids = set()
+        for node_id, *parts in sorted(rows, key = lambda row: row[0]):
+            node_ids.add(node_id)
+            digest.update(f"{node_id}|".encode())
+            for part in parts:
+                data = (part or "").encode()
+                digest.update(f"{len(data)}:".encode())
+                digest.update(data)
+        # the edges among the ancestors decide the order turns are packed in
+        for source_id, target_id in sorted({(s, t) for s, t in edges if s in node_ids and t in node_ids}):
+            digest.update(f"{source_id}>{target_id}|".encode())
+        return digest.hexdigest()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+context_assembler = ContextAssembler()
@@ -0,0 +1,223 @@
+"""
+node embeddings: embedders, and the background indexer that keeps the vector index in step with
+node content.
+
+writes never embed on the request path. handlers call `embedding_indexer.schedule(node_ids)`
+after saving a response; a single background task debounces those ids, reads the nodes'
+prompt + response, embeds them in one batch and upserts them into the VectorIndex
+(modules/storage/vectors.py). nodes that no longer exist are dropped from the index.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from modules.storage.content import resolve_text
+from modules.storage.models import Conversation, Node
+from modules.storage.vectors import VectorIndex
+from core.config import settings
+from core.database import SessionLocal
+from .config import llm_settings
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+class Embedder(ABC):
+    """
+    text -> fixed-size float32 vectors. name + dimensions identify the vector space.
+    """
+
+    name: str = ""
+    dimensions: int = 0
+
+    @abstractmethod
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder(Embedder):
+    """
+    offline embedder: feature-hashed bag of words. each word adds +-1 to one dimension, then the
+    vector is L2-normalized, so texts sharing words land near each other. no model, no network.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or llm_settings.EMBEDDING_DIMENSIONS
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype = np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                digest = hashlib.blake2b(word.encode(), digest_size = 8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis = 1, keepdims = True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        # cheap, but a big batch still shouldn't hold up the event loop
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+
+class ProviderEmbedder(Embedder):
+    """
+    embeddings from the configured LLM provider (e.g. Gemini text-embedding-004).
+    EMBEDDING_DIMENSIONS has to match the model's output size.
+    """
+
+    def __init__(self, tier: Optional[str] = None, dimensions: Optional[int] = None):
+        from .providers.registry import get_provider
+        self.provider = get_provider(tier)
+        self.name = f"{self.provider.name}:{self.provider.model}"
+        self.dimensions = dimensions or llm_settings.EMBEDDING_DIMENSIONS
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(await self.provider.embed(list(texts)), dtype = np.float32)
+
+
+def create_embedder(kind: Optional[str] = None) -> Embedder:
+    kind = kind or llm_settings.EMBEDDER
+    if kind == "hashing":
+        return HashingEmbedder()
+    if kind == "provider":
+        return ProviderEmbedder()
+    raise ValueError(f"Unknown embedder: {kind}")
+
+
+def node_text(prompt: Optional[str], response: Optional[str]) -> str:
+    # what gets embedded for a node: its whole exchange
+    return f"{prompt or ''}\n{response or ''}".strip()
+
+
+class EmbeddingIndexer:
+    """
+    background, batched embedding of changed nodes. the embedder and index are created on
+    first use so importing this module touches neither the provider nor the disk.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        embedder: Optional[Embedder] = None,
+        index: Optional[VectorIndex] = None,
+        flush_delay_ms: Optional[int] = None,
+    ):
+        self.session_factory = session_factory
+        self._embedder = embedder
+        self._index = index
+        self.flush_delay = (llm_settings.EMBED_FLUSH_DELAY_MS if flush_delay_ms is None else flush_delay_ms) / 1000
+
+        self._pending: Set[int] = set()
+        self._writer: Optional[asyncio.Task] = None
+
+        self.embedded = 0
+        self.removed = 0
+        self.batches = 0
+        self.failures = 0
+
+    @property
+    def embedder(self) -> Embedder:
+        if self._embedder is None:
+            self._embedder = create_embedder()
+        return self._embedder
+
+    @property
+    def index(self) -> VectorIndex:
+        if self._index is None:
+            self._index = VectorIndex(settings.VECTOR_INDEX_PATH, self.embedder.dimensions, self.embedder.name)
+        return self._index
+
+    def schedule(self, node_ids: Iterable[int]) -> None:
+        """
+        (re-)embed these nodes soon. never blocks; safe to call from any coroutine.
+        """
+        if not llm_settings.EMBEDDINGS_ENABLED:
+            return
+        self._pending.update(node_ids)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def drain(self) -> None:
+        """
+        wait until everything scheduled so far is indexed
+        """
+        while self._writer is not None and not self._writer.done():
+            await asyncio.shield(self._writer)
+
+    async def _drain(self) -> None:
+        # debounce: a streamed response, then its final save, embed once
+        if self.flush_delay:
+            await asyncio.sleep(self.flush_delay)
+
+        while self._pending:
+            batch, self._pending = sorted(self._pending), set()
+            for start in range(0, len(batch), llm_settings.EMBED_BATCH_SIZE):
+                chunk = batch[start:start + llm_settings.EMBED_BATCH_SIZE]
+                try:
+                    await self._index_batch(chunk)
+                except Exception:
+                    # the next write to these nodes retries them
+                    self.failures += 1
+                    logger.exception("embedding batch failed", extra = {"nodes": len(chunk)})
+
+    async def _index_batch(self, node_ids: List[int]) -> None:
+        rows = await asyncio.to_thread(self._load, node_ids)
+        found = {row[0] for row in rows}
+        gone = [node_id for node_id in node_ids if node_id not in found]
+        rows = [row for row in rows if row[3]]
+
+        if rows:
+            vectors = await self.embedder.embed([row[3] for row in rows])
+            await asyncio.to_thread(
+                self.index.upsert,
+                [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows], vectors,
+            )
+        if gone:
+            await asyncio.to_thread(self.index.delete, gone)
+
+        self.batches += 1
+        self.embedded += len(rows)
+        self.removed += len(gone)
+
+    def _load(self, node_ids: List[int]):
+        # (node_id, conversation_id, user_id, text) for the nodes that still exist
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                select(Node.id, Node.conversation_id, Conversation.user_id,
+                       Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key)
+                .join(Conversation, Conversation.id == Node.conversation_id)
+                .where(Node.id.in_(node_ids))
+            ).all()
+        finally:
+            db.close()
+        return [
+            (node_id, conversation_id, user_id,
+             node_text(resolve_text(prompt, prompt_key), resolve_text(response, response_key)))
+            for node_id, conversation_id, user_id, prompt, prompt_key, response, response_key in result
+        ]
+
+    def stats(self) -> dict:
+        stats = {
+            "embedded": self.embedded,
+            "removed": self.removed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "pending": len(self._pending),
+        }
+        if self._index is not None:
+            stats.update(self._index.stats())
+        return stats
+
+embedding_indexer = EmbeddingIndexer()
@@ -0,0 +1,246 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from modules.storage.models import Node, Edge, NodeClosure
+from modules.storage.content import BlobRef, content_values, read_blob_ref, save_content, text_or_ref
+from modules.storage.forks import materialize_subgraph, node_refs, snapshot_error
+from modules.storage.staleness import record_execution, clear_stale, stale_node_ids
+from core.database import AsyncSessionLocal
+from .config import llm_settings
+from .context import context_assembler
+from .providers.base import LLMProvider
+from .providers.policy import deadline
+from .providers.registry import get_provider
+from .cache import generate_cached
+from .embeddings import embedding_indexer
+from .sync import sync_hub, node_content
+
+
+@dataclass
+class GraphPlan:
+    """
+    subgraph to execute: every root plus all of its descendants (or, for a refresh, the stale nodes)
+    """
+    node_ids: Set[int]
+    edges: List[Tuple[int, int]]
+    # node id -> prompt, or a BlobRef for an offloaded one: read when the node runs, off the event loop
+    prompts: Dict[int, Union[str, BlobRef]] = field(default_factory = dict)
+    # inside a fork: node id the client knew -> the fork's copy the run writes to
+    replaced: Dict[int, int] = field(default_factory = dict)
+
+
+def build_plan(db: Session, root_ids: Iterable[int], conversation_id: Optional[int] = None) -> GraphPlan:
+    """
+    load the downstream subgraph with three indexed queries (closure, nodes, edges).
+    roots in a fork, or inherited by the fork given as conversation_id, run on the fork's view of
+    the graph: every inherited node the run will rewrite is materialized in the fork first
+    """
+    root_ids = list(root_ids)
+    refs = node_refs(db, root_ids)
+    forked = [ref for ref in refs.values() if ref.frozen or ref.is_copy]
+    if conversation_id is None and forked:
+        if forked[0].frozen:
+            raise snapshot_error(forked[0].conversation_id)
+        conversation_id = forked[0].conversation_id
+
+    if conversation_id is None:
+        node_ids = set(db.scalars(
+            select(NodeClosure.descendant_id).where(NodeClosure.ancestor_id.in_(root_ids))
+        ))
+        return _load_plan(db, node_ids)
+
+    rows = materialize_subgraph(db, conversation_id, root_ids)
+    plan = _load_plan(db, set(rows.values()))
+    plan.replaced = {
+        root_id: rows[refs[root_id].identity] for root_id in root_ids if rows[refs[root_id].identity] != root_id
+    }
+    return plan
+
+def build_stale_plan(db: Session, conversation_id: int) -> GraphPlan:
+    """
+    the conversation's stale nodes only, wired by the edges among them. an upstream stale node
+    still finishes before anything below it starts
+    """
+    return _load_plan(db, set(stale_node_ids(db, conversation_id)))
+
+def _load_plan(db: Session, node_ids: Set[int]) -> GraphPlan:
+    prompts = {}
+    # edges refer to original nodes; a fork's copies stand in for theirs (storage/forks.py)
+    node_of: Dict[int, int] = {}
+    for node_id, identity, prompt, blob_key in db.execute(
+        select(Node.id, func.coalesce(Node.base_node_id, Node.id), Node.prompt_text, Node.prompt_blob_key)
+        .where(Node.id.in_(node_ids))
+    ):
+        prompts[node_id] = text_or_ref(prompt, blob_key, read_blobs = False)
+        node_of[identity] = node_id
+
+    edges = [
+        (node_of[source], node_of[target]) for source, target in db.execute(
+            select(Edge.source_node_id, Edge.target_node_id).where(Edge.target_node_id.in_(list(node_of)))
+        )
+        if source in node_of
+    ]
+
+    return GraphPlan(node_ids = node_ids, edges = edges, prompts = prompts)
+
+
+async def run_plan(
+    plan: GraphPlan,
+    execute: Callable[[int, str], Awaitable[Optional[str]]],
+    max_workers: Optional[int] = None,
+) -> AsyncIterator[dict]:
+    """
+    execute the plan in topological waves. a node starts as soon as all its parents inside the
+    subgraph have finished; independent branches run concurrently up to max_workers.
+    an executor returning None had nothing to do (refresh runs) and reports "unchanged".
+    yields progress events as they happen.
+    """
+    max_workers = max_workers or llm_settings.GRAPH_MAX_WORKERS
+    semaphore = asyncio.Semaphore(max_workers)
+    events: asyncio.Queue = asyncio.Queue()
+
+    children: Dict[int, List[int]] = {node_id: [] for node_id in plan.node_ids}
+    waiting_on: Dict[int, int] = {node_id: 0 for node_id in plan.node_ids}
+    for source, target in plan.edges:
+        children[source].append(target)
+        waiting_on[target] += 1
+
+    tasks: Set[asyncio.Task] = set()
+    blocked: Set[int] = set()
+    finished = 0
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+
+    async def run_node(node_id: int) -> None:
+        prompt = plan.prompts.get(node_id) or ""
+        if not isinstance(prompt, BlobRef) and not prompt.strip():
+            await events.put({"event": "skipped", "node_id": str(node_id), "reason": "empty prompt"})
+            await events.put({"event": "_finished", "node_id": node_id, "ok": True})
+            return
+
+        async with semaphore:
+            await events.put({"event": "started", "node_id": str(node_id)})
+            try:
+                if isinstance(prompt, BlobRef):
+                    prompt = await asyncio.to_thread(read_blob_ref, prompt)
+                response_text = await execute(node_id, prompt)
+            except Exception as e:
+                await events.put({"event": "failed", "node_id": str(node_id), "detail": str(e),
+                                  "status": getattr(e, "status_code", 500)})
+                await events.put({"event": "_finished", "node_id": node_id, "ok": False})
+                return
+
+        if response_text is None:
+            await events.put({"event": "unchanged", "node_id": str(node_id)})
+        else:
+            await events.put({"event": "completed", "node_id": str(node_id), "response": response_text})
+        await events.put({"event": "_finished", "node_id": node_id, "ok": True})
+
+    def launch(node_id: int) -> None:
+        task = asyncio.create_task(run_node(node_id))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def block_descendants(node_id: int) -> List[int]:
+        # a failed node poisons everything below it
+        newly_blocked = []
+        stack = list(children[node_id])
+        while stack:
+            child = stack.pop()
+            if child not in blocked:
+                blocked.add(child)
+                newly_blocked.append(child)
+                stack.extend(children[child])
+        return newly_blocked
+
+    yield {"event": "plan", "node_count": len(plan.node_ids), "max_workers": max_workers}
+
+    for node_id in sorted(plan.node_ids):
+        if waiting_on[node_id] == 0:
+            launch(node_id)
+
+    try:
+        while finished < len(plan.node_ids):
+            event = await events.get()
+
+            if event["event"] != "_finished":
+                if event["event"] in counts or event["event"] == "unchanged":
+                    counts[event["event"]] = counts.get(event["event"], 0) + 1
+                yield event
+                continue
+
+            node_id = event["node_id"]
+            finished += 1
+
+            if not event["ok"]:
+                for child in block_descendants(node_id):
+                    finished += 1
+                    counts["skipped"] += 1
+                    yield {"event": "skipped", "node_id": str(child), "reason": f"upstream node {node_id} failed"}
+                continue
+
+            for child in children[node_id]:
+                waiting_on[child] -= 1
+                if waiting_on[child] == 0 and child not in blocked:
+                    launch(child)
+
+        yield {"event": "done", **counts}
+
+    finally:
+        # client went away mid-run: don't leave orphaned LLM calls behind
+        for task in list(tasks):
+            task.cancel()
+
+
+async def execute_and_save(node_id: int, prompt: str, bypass_cache: bool = False,
+                           invalidate_cache: bool = False, provider: Optional[LLMProvider] = None) -> str:
+    """
+    default per-node executor: assemble ancestor context, call the LLM, persist the response
+    """
+    provider = provider or get_provider()
+
+    async with AsyncSessionLocal() as db:
+        history = await context_assembler.assemble_async(db, node_id)
+
+    # unchanged upstream nodes come straight from the response cache on re-runs.
+    # each node gets its own deadline; the run as a whole can take longer
+    with deadline(llm_settings.LLM_DEFAULT_DEADLINE_S):
+        response_text, _ = await generate_cached(
+            provider, prompt, history = history,
+            bypass = bypass_cache, invalidate = invalidate_cache
+        )
+
+    async with AsyncSessionLocal() as db:
+        # the blob write (if any) in a worker thread, the row through the session
+        values = await asyncio.to_thread(content_values, "response", response_text)
+        await db.run_sync(save_content, node_id, "response", values)
+        await db.run_sync(record_execution, node_id, provider.request_key(prompt, history))
+        conversation_id = await db.scalar(select(Node.conversation_id).where(Node.id == node_id))
+        await db.commit()
+    embedding_indexer.schedule([node_id])
+    if conversation_id is not None:
+        sync_hub.publish(conversation_id, [node_content(node_id, response = response_text)])
+
+    return response_text
+
+
+async def refresh_and_save(node_id: int, prompt: str, provider: Optional[LLMProvider] = None,
+                           **options) -> Optional[str]:
+    """
+    refresh-run executor: re-execute a stale node only if the context it would run with now
+    differs from the one its response came from. otherwise just clear the flag (returns None)
+    """
+    provider = provider or get_provider()
+
+    async with AsyncSessionLocal() as db:
+        history = await context_assembler.assemble_async(db, node_id)
+        stored = await db.scalar(select(Node.context_hash).where(Node.id == node_id))
+        if stored == provider.request_key(prompt, history):
+            await db.run_sync(clear_stale, node_id)
+            await db.commit()
+            return None
+
+    return await execute_and_save(node_id, prompt, provider = provider, **options)
@@ -1,43 +1,152 @@
-from typing import Dict, Optional
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from modules.storage.models import Node
+from core.database import SessionLocal
+from .config import llm_settings
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_client_id_schema(bind) -> None:
+    """
+    add Node.client_id and its unique index to a nodes table created before they existed
+    """
+    columns = {column["name"] for column in inspect(bind).get_columns("nodes")}
+    if "client_id" in columns:
+        return
+    with bind.begin() as connection:
+        connection.exec_driver_sql("ALTER TABLE nodes ADD COLUMN client_id VARCHAR(64)")
+        connection.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_node_client_id ON nodes (client_id)")
+
 
 class IDMapper:
-    # simple mapper between frontend IDs and backend db IDs
+    """
+    maps frontend temp IDs to backend db IDs.
+
+    the source of truth is Node.client_id, written in the same transaction as the node itself,
+    so mappings survive restarts and are shared by every worker. each process keeps a bounded
+    LRU with TTL in front of it so resolving a known temp ID is a dict lookup.
+    """
 
-    def __init__(self):
-        self._mappings: Dict[str, int] = {}
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.max_entries = max_entries or llm_settings.ID_MAPPER_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or llm_settings.ID_MAPPER_TTL_SECONDS
+        self.session_factory = session_factory
+
+        # temp_id -> (db_id, expires_at)
+        self._mappings = OrderedDict()
+        # handlers resolve from both the event loop and the sync threadpool
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
 
     def add_mapping(self, temp_id: str, db_id: int) -> None:
-        self._mappings[temp_id] = db_id
-        print(f"[IDMapper] Storedi mapping: {temp_id} -> {db_id}")
+        # cache only: the node row already carries its client_id
+        with self._lock:
+            self._mappings[temp_id] = (db_id, time.monotonic() + self.ttl_seconds)
+            self._mappings.move_to_end(temp_id)
+            while len(self._mappings) > self.max_entries:
+                self._mappings.popitem(last = False)
+
+    def resolve_id(self, node_id: str, db: Optional[Session] = None) -> int:
+        if node_id.startswith("temp_"):
+            db_id = self.get_mapping(node_id, db)
+            if db_id is None:
+                raise ValueError(f"Unknown temporary ID: {node_id}")
+            return db_id
+        return self._parse_db_id(node_id)
 
-    def resolve_id(self, node_id: str) -> int:        
+    async def resolve_id_async(self, node_id: str, db: AsyncSession) -> int:
+        # same as resolve_id, with the cache-miss lookup on an AsyncSession
         if node_id.startswith("temp_"):
-            print("is temp.")
-            # valid temporary ID
-            if node_id in self._mappings:
-                db_id = self._mappings[node_id]
-                print(f"[IDMapper] Resolved temp ID: {node_id} -> {db_id}")
-                return db_id
-            
-            # fake temporary ID
-            else:
+            db_id = self._cached(node_id)
+            if db_id is None:
+                db_id = self._loaded(node_id, await db.scalar(self._lookup(node_id)))
+            if db_id is None:
                 raise ValueError(f"Unknown temporary ID: {node_id}")
-            
+            return db_id
+        return self._parse_db_id(node_id)
+
+    def get_mapping(self, temp_id: str, db: Optional[Session] = None) -> Optional[int]:
+        """
+        cached db id for temp_id, falling back to Node.client_id (on `db` if given).
+        misses aren't cached: another worker may create the node a moment later.
+        """
+        db_id = self._cached(temp_id)
+        if db_id is not None:
+            return db_id
+
+        if db is not None:
+            return self._loaded(temp_id, db.scalar(self._lookup(temp_id)))
+        session = self.session_factory()
+        try:
+            return self._loaded(temp_id, session.scalar(self._lookup(temp_id)))
+        finally:
+            session.close()
+
+    @staticmethod
+    def _parse_db_id(node_id: str) -> int:
         # already a DB ID (assumes that we only get non-malicious requests from frontend)
-        # unsafe so MVP only. 
+        # unsafe so MVP only.
         try:
-            db_id = int(node_id)
-            print(f"[IDMapper] Using database ID: {db_id}")
-            return db_id
+            return int(node_id)
         except ValueError:
             raise ValueError(f"Invalid node ID format: {node_id}")
-            
-    def get_mapping(self, temp_id: str) -> Optional[int]:
-        return self._mappings.get(temp_id)
-    
-    # reset mappings
+
+    @staticmethod
+    def _lookup(temp_id: str):
+        return select(Node.id).where(Node.client_id == temp_id)
+
+    def _cached(self, temp_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._mappings.get(temp_id)
+            if entry is not None:
+                db_id, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._mappings.move_to_end(temp_id)
+                    self.hits += 1
+                    return db_id
+                del self._mappings[temp_id]
+            self.misses += 1
+            return None
+
+    def _loaded(self, temp_id: str, db_id: Optional[int]) -> Optional[int]:
+        if db_id is not None:
+            logger.debug("loaded temp ID from DB: %s -> %s", temp_id, db_id)
+            self.add_mapping(temp_id, db_id)
+        return db_id
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {temp_id: db_id for temp_id, (db_id, _) in self._mappings.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._mappings),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # reset the in-process cache; persisted mappings are untouched
     def clear_mappings(self) -> None:
-        self._mappings.clear()
-        print("[IDMapper] Cleared all mappings")
+        with self._lock:
+            self._mappings.clear()
+        logger.info("cleared cached ID mappings")
 
-id_mapper = IDMapper()
\ No newline at end of file
+id_mapper = IDMapper()
@@ -0,0 +1,54 @@
+"""
+LLM call metrics, shared by every client: latency, token usage, in-flight calls, cache state.
+"""
+
+from core.metrics import counter, gauge, histogram, register_collector
+from .cache import response_cache
+from .id_mapper import id_mapper
+
+llm_request_seconds = histogram(
+    "llm_request_duration_seconds", "LLM call latency (streams: until the last chunk)",
+    ("model", "operation", "outcome"),
+)
+llm_first_chunk_seconds = histogram(
+    "llm_first_chunk_seconds", "time to first streamed chunk", ("model",),
+)
+llm_tokens = counter("llm_tokens_total", "tokens reported by the LLM API", ("model", "kind"))
+llm_in_flight = gauge("llm_requests_in_flight", "LLM calls currently holding a concurrency slot", ("model",))
+llm_queue_seconds = histogram(
+    "llm_queue_wait_seconds", "time spent waiting for a free LLM concurrency slot", ("model",),
+)
+
+
+def record_usage(model: str, usage) -> None:
+    """
+    count tokens from a response's usage metadata (prompt/candidates/total token counts)
+    """
+    if usage is None:
+        return
+    for kind, attr in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        count = getattr(usage, attr, None)
+        if count:
+            llm_tokens.labels(model = model, kind = kind).inc(count)
+
+
+def _collect():
+    # the cache and ID mapper already count hits/misses; read them at scrape time
+    cache = response_cache.stats()
+    yield "llm_cache_lookups_total", "counter", "response cache lookups by result", [
+        ({"result": "memory_hit"}, cache["memory_hits"]),
+        ({"result": "db_hit"}, cache["db_hits"]),
+        ({"result": "miss"}, cache["misses"]),
+        ({"result": "bypass"}, cache["bypassed"]),
+    ]
+    yield "llm_cache_evictions_total", "counter", "response cache entries evicted", [({}, cache["evictions"])]
+    yield "llm_cache_memory_entries", "gauge", "entries in the in-process response cache", [({}, cache["memory_entries"])]
+
+    mapper = id_mapper.stats()
+    yield "id_mapper_lookups_total", "counter", "temp ID cache lookups by result", [
+        ({"result": "hit"}, mapper["hits"]),
+        ({"result": "miss"}, mapper["misses"]),
+    ]
+    yield "id_mapper_entries", "gauge", "temp ID mappings cached in process", [({}, mapper["entries"])]
+
+register_collector(_collect)
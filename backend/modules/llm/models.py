@@ -1,14 +1,45 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 
 # structure for API request from frontend
 class ExecuteNodeRequest(BaseModel):
     node_id: str
     prompt: str
+    # skip the response cache entirely / drop the cached entry so this call refreshes it
+    bypass_cache: bool = False
+    invalidate_cache: bool = False
+    # model tier from LLM_TIERS (e.g. "fast" for cheap nodes); None uses the default model
+    tier: Optional[str] = None
+    # add up to N similar non-ancestor nodes as extra context; None uses RETRIEVAL_TOP_K / RETRIEVAL_SCOPE
+    retrieve_k: Optional[int] = Field(None, ge = 0, le = 20)
+    retrieval_scope: Optional[Literal["conversation", "user"]] = None
+    # the fork the node is run in, when the node was inherited from a snapshot (storage/forks.py)
+    conversation_id: Optional[str] = None
+
+class ExecuteGraphRequest(BaseModel):
+    # roots of the run; every downstream node is executed too
+    node_ids: List[str]
+    max_workers: Optional[int] = None
+    bypass_cache: bool = False
+    invalidate_cache: bool = False
+    tier: Optional[str] = None
+    # the fork to run in, when the roots were inherited from a snapshot
+    conversation_id: Optional[str] = None
+
+class RefreshStaleRequest(BaseModel):
+    # re-executes the conversation's stale nodes; ones whose context turns out unchanged are only un-flagged
+    conversation_id: str
+    max_workers: Optional[int] = None
+    tier: Optional[str] = None
+
+class ForkConversationRequest(BaseModel):
+    # title of the new fork; defaults to "<base title> (fork)"
+    title: Optional[str] = None
 
 class CreateNodeRequest(BaseModel):
     position: dict
     conversation_id: Optional[str] = None
+    temp_id: Optional[str] = None
 
 class CreateNodeResponse(BaseModel):
     status: str
@@ -47,9 +78,43 @@ class DeleteNodeResponse(BaseModel):
 class UpdateNodePositionRequest(BaseModel):
     node_id: str
     position: dict
+    # the fork being edited: moving a node it inherits moves the fork's copy of it
+    conversation_id: Optional[str] = None
 
 class UpdateNodePositionResponse(BaseModel):
     status:str
     node_id:str
     position:dict
     mesage: Optional[str] = None
+
+class UpdateNodePositionsRequest(BaseModel):
+    updates: List[UpdateNodePositionRequest]
+    # default for updates that don't name a conversation
+    conversation_id: Optional[str] = None
+
+class UpdateNodePositionsResponse(BaseModel):
+    status: str
+    updated: List[str]
+    not_found: List[str]
+    # inherited node id -> the fork's copy that was moved instead
+    replaced: Dict[str, str] = {}
+
+class BatchOperation(BaseModel):
+    op: Literal["create_node", "create_edge", "delete_node", "delete_edge", "update_position"]
+    # client-side id for created nodes/edges; later operations in the batch may reference it
+    temp_id: Optional[str] = None
+    node_id: Optional[str] = None
+    edge_id: Optional[str] = None
+    source_id: Optional[str] = None
+    target_id: Optional[str] = None
+    position: Optional[dict] = None
+    conversation_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    conversation_id: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    status: str
+    id_mappings: Dict[str, str]
+    results: List[dict]
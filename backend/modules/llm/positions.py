@@ -0,0 +1,110 @@
+import asyncio
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from modules.storage.positions import bulk_update_positions, conversation_ids
+from core.database import SessionLocal
+from .config import llm_settings
+from .sync import SyncHub, node_moved, origin_var, sync_hub
+
+
+class PositionCoalescer:
+    """
+    last-write-wins coalescing of node position updates.
+
+    updates land in a pending map keyed by node id, so a drag storm on one node collapses to its
+    latest position. a single writer flushes the map with one bulk UPDATE + commit; anything that
+    arrives while a flush is in flight rides along in the next one. callers wait until the flush
+    carrying their update has committed. with a sync hub, each flush is then announced as one
+    move delta per node, tagged with the client that sent the node's last position.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_delay_ms: Optional[int] = None,
+        hub: Optional[SyncHub] = None,
+    ):
+        self.session_factory = session_factory
+        self.hub = hub
+        self.flush_delay = (llm_settings.POSITION_FLUSH_DELAY_MS if flush_delay_ms is None else flush_delay_ms) / 1000
+
+        self._pending: Dict[int, Tuple[int, int]] = {}
+        self._origins: Dict[int, Optional[str]] = {}
+        self._next_flush: Optional[asyncio.Future] = None
+        self._writer: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.written = 0
+        self.flushes = 0
+
+    async def submit(self, positions: Dict[int, Tuple[int, int]]) -> Set[int]:
+        """
+        queue positions and wait for them to be committed. returns the ids that exist
+        """
+        self._pending.update(positions)
+        self.submitted += len(positions)
+        if self.hub is not None:
+            origin = origin_var.get()
+            self._origins.update((node_id, origin) for node_id in positions)
+
+        if self._next_flush is None:
+            self._next_flush = asyncio.get_running_loop().create_future()
+        flush = self._next_flush
+
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+
+        found = await asyncio.shield(flush)
+        return found & set(positions)
+
+    async def _drain(self) -> None:
+        # this task inherited the context of whichever request started it; origins travel per node
+        origin_var.set(None)
+
+        # short debounce so a burst of drag events shares the first flush too
+        if self.flush_delay:
+            await asyncio.sleep(self.flush_delay)
+
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            origins, self._origins = self._origins, {}
+            flush, self._next_flush = self._next_flush, None
+
+            try:
+                # commit off the event loop so new updates keep accumulating meanwhile
+                found, conversations = await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                flush.set_exception(e)
+                continue
+
+            self.flushes += 1
+            self.written += len(batch)
+            flush.set_result(found)
+
+            for node_id, conversation_id in conversations.items():
+                self.hub.publish(conversation_id, [node_moved(node_id, *batch[node_id])], origins.get(node_id))
+
+    def _write(self, batch: Dict[int, Tuple[int, int]]) -> Tuple[Set[int], Dict[int, int]]:
+        db = self.session_factory()
+        try:
+            found = bulk_update_positions(db, batch)
+            conversations = conversation_ids(db, found) if self.hub is not None and found else {}
+            db.commit()
+            return found, conversations
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "flushes": self.flushes,
+            "pending": len(self._pending),
+        }
+
+position_coalescer = PositionCoalescer(hub = sync_hub)
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, List, Optional, Sequence, Tuple, TypeVar
+
+from ..config import llm_settings
+from ..metrics import llm_first_chunk_seconds, llm_in_flight, llm_queue_seconds, llm_request_seconds
+from .batching import MicroBatcher
+from .errors import DeadlineExceededError
+from .policy import CallPolicy
+
+logger = logging.getLogger(__name__)
+
+# (prompt, history) for one generate call; history is ContextTurn-like (.prompt/.response)
+GenerateRequest = Tuple[str, Optional[Sequence]]
+
+T = TypeVar("T")
+
+
+class LLMProvider(ABC):
+    """
+    interface every LLM backend implements: generate, stream, count_tokens, embed.
+
+    subclasses implement the underscored hooks. the public methods add what every provider
+    shares: the call policy (deadlines, retries, hedging, circuit breaker; failures surface as
+    LLMError subclasses), the per-process concurrency limit, latency/in-flight metrics, and
+    micro-batching of concurrent calls for providers with a native batch call
+    (batch_generate / batch_embed).
+    """
+
+    name: str = ""
+    batch_generate: bool = False
+    batch_embed: bool = False
+
+    def __init__(self, model: str, max_concurrency: Optional[int] = None, batching: Optional[bool] = None):
+        self.model = model
+
+        # bound in-flight calls per process. extra callers wait here instead of piling onto the API
+        self.max_concurrency = max_concurrency or llm_settings.LLM_MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # deadlines, retries, hedging, circuit breaker (policy.py); one breaker per provider instance
+        self.policy = CallPolicy(f"{self.name}:{model}")
+
+        batching = llm_settings.LLM_BATCH_ENABLED if batching is None else batching
+        self.generate_batcher = MicroBatcher(self._run_generate_batch) if batching and self.batch_generate else None
+        self.embed_batcher = MicroBatcher(self._run_embed_batch) if batching and self.batch_embed else None
+
+    # provider hooks
+
+    @abstractmethod
+    async def _generate(self, prompt: str, history: Optional[Sequence]) -> str:
+        ...
+
+    async def _generate_batch(self, requests: List[GenerateRequest]) -> List[str]:
+        # providers with a native batch call (batch_generate) override this; one call per request otherwise
+        return list(await asyncio.gather(*(self._generate(prompt, history) for prompt, history in requests)))
+
+    @abstractmethod
+    def _stream(self, prompt: str, history: Optional[Sequence]) -> AsyncIterator[str]:
+        ...
+
+    @abstractmethod
+    async def _count_tokens(self, prompt: str, history: Optional[Sequence]) -> int:
+        ...
+
+    @abstractmethod
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+    def config_fingerprint(self) -> dict:
+        # anything besides model + contents that changes the output
+        return {}
+
+    # public interface
+
+    def request_key(self, prompt: str, history: Optional[Sequence] = None) -> str:
+        """
+        content hash of everything that determines the response: provider, model, contents, config
+        """
+        payload = {
+            "provider": self.name,
+            "model": self.model,
+            "contents": [[turn.prompt, turn.response] for turn in history or ()] + [[prompt, None]],
+            "config": self.config_fingerprint(),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys = True).encode()).hexdigest()
+
+    async def generate(self, prompt: str, history: Optional[Sequence] = None) -> str:
+        if self.generate_batcher is not None:
+            return await self.policy.run(lambda: self.generate_batcher.submit((prompt, history)))
+        return await self.policy.run(lambda: self._timed("generate", self._generate(prompt, history)), slot = self._slot)
+
+    def stream(self, prompt: str, history: Optional[Sequence] = None) -> AsyncIterator[str]:
+        """
+        yields text chunks as they arrive
+        """
+        return self.policy.run_stream(lambda: self._stream_once(prompt, history), slot = self._slot)
+
+    async def count_tokens(self, prompt: str, history: Optional[Sequence] = None) -> int:
+        return await self.policy.run(lambda: self._count_tokens(prompt, history))
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        if self.embed_batcher is not None:
+            return list(await asyncio.gather(*(
+                self.policy.run(lambda text = text: self.embed_batcher.submit(text)) for text in texts
+            )))
+        texts = list(texts)
+        return await self.policy.run(lambda: self._timed("embed", self._embed(texts)), slot = self._slot)
+
+    # shared plumbing
+
+    @asynccontextmanager
+    async def _slot(self, timeout: Optional[float] = None):
+        # a concurrency slot, with queue wait and in-flight calls tracked. the policy takes it before
+        # starting the attempt timeout, so waiting here is bounded by the request deadline only
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            # queued locally past the deadline: the provider never saw the call
+            raise DeadlineExceededError(f"LLM request deadline exceeded waiting for a {self.model} slot") from None
+        try:
+            llm_queue_seconds.labels(model = self.model).observe(time.perf_counter() - start)
+            with llm_in_flight.track_inprogress(model = self.model):
+                yield
+        finally:
+            self._semaphore.release()
+
+    async def _timed(self, operation: str, call: Awaitable[T]) -> T:
+        # latency metric for a single non-streaming attempt (the caller holds the slot)
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            result = await call
+            outcome = "ok"
+            return result
+        finally:
+            llm_request_seconds.labels(model = self.model, operation = operation, outcome = outcome) \
+                .observe(time.perf_counter() - start)
+
+    async def _stream_once(self, prompt: str, history: Optional[Sequence]) -> AsyncIterator[str]:
+        # one streaming attempt; the policy holds the slot until the stream ends
+        outcome = "error"
+        start = time.perf_counter()
+        first = True
+        try:
+            async for chunk in self._stream(prompt, history):
+                if first:
+                    llm_first_chunk_seconds.labels(model = self.model).observe(time.perf_counter() - start)
+                    first = False
+                yield chunk
+            outcome = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            # consumer went away (client disconnect) mid-stream
+            outcome = "cancelled"
+            raise
+        finally:
+            llm_request_seconds.labels(model = self.model, operation = "stream", outcome = outcome) \
+                .observe(time.perf_counter() - start)
+
+    # a batch takes one slot for all its callers, in the batcher's task
+
+    async def _run_generate_batch(self, requests: List[GenerateRequest]) -> List[str]:
+        async with self._slot():
+            return await self._timed("generate_batch", self._generate_batch(requests))
+
+    async def _run_embed_batch(self, texts: List[str]) -> List[List[float]]:
+        async with self._slot():
+            return await self._timed("embed", self._embed(texts))
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Set, Tuple
+
+from ..config import llm_settings
+
+
+class MicroBatcher:
+    """
+    coalesces concurrent single calls into batch calls.
+
+    the first item to arrive opens a short window (max_wait_ms); everything submitted during it,
+    up to max_size items, goes to run_batch as one list. a full batch goes out immediately.
+    each caller gets back the result at its own position, or the batch's exception.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[Sequence[Any]]],
+        max_size: Optional[int] = None,
+        max_wait_ms: Optional[int] = None,
+    ):
+        self.run_batch = run_batch
+        self.max_size = max_size or llm_settings.LLM_BATCH_MAX_SIZE
+        self.max_wait = (llm_settings.LLM_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.submitted = 0
+        self.batches = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.submitted += 1
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+            # callers cancelled while waiting drop out of the batch
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "mean_batch_size": self.submitted / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Optional
+
+
+class LLMError(Exception):
+    """
+    base for provider call failures. status_code is what the API answers with;
+    retryable says whether the call policy may try again.
+    """
+    status_code = 502
+    retryable = False
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RateLimitedError(LLMError):
+    # upstream 429 / quota exhausted
+    status_code = 429
+    retryable = True
+
+class ProviderUnavailableError(LLMError):
+    # upstream 5xx, connection failures, per-attempt timeouts
+    status_code = 503
+    retryable = True
+
+class CircuitOpenError(LLMError):
+    # failing fast: the provider has been failing and the breaker hasn't let a probe through yet
+    status_code = 503
+
+class DeadlineExceededError(LLMError):
+    # the request's overall deadline ran out (across retries)
+    status_code = 504
+
+class ProviderRequestError(LLMError):
+    # upstream rejected the request itself (4xx other than 429); retrying won't help
+    status_code = 502
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    # Retry-After in seconds from the upstream HTTP response, if the SDK kept it
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(float(headers.get("retry-after")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def classify(exc: Exception) -> LLMError:
+    """
+    map an SDK / transport exception onto the LLMError hierarchy
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return ProviderUnavailableError("LLM call timed out")
+    if isinstance(exc, (ConnectionError, OSError)):
+        return ProviderUnavailableError(f"LLM connection failed: {exc}")
+
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        if code == 429:
+            return RateLimitedError(f"LLM rate limited: {exc}", _retry_after(exc))
+        if code >= 500:
+            return ProviderUnavailableError(f"LLM provider error: {exc}", _retry_after(exc))
+        if code >= 400:
+            return ProviderRequestError(f"LLM rejected the request: {exc}")
+
+    # unknown failure: treat as the provider misbehaving, but don't retry blindly
+    return LLMError(f"LLM call failed: {exc}")
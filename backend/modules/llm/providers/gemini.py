@@ -0,0 +1,94 @@
+from typing import AsyncIterator, List, Optional, Sequence
+
+from google import genai
+from google.genai import types
+
+from ..config import llm_settings
+from ..metrics import record_usage
+from .base import LLMProvider
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through the SDK's async client, so the event loop stays free during round trips.
+    embeddings are batched natively (embed_content takes a list); generation has no online batch call.
+    """
+
+    name = "gemini"
+    batch_embed = True
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        embedding_model: Optional[str] = None,
+        batching: Optional[bool] = None,
+    ):
+        super().__init__(model or llm_settings.LLM_MODEL, max_concurrency, batching)
+        self.client = genai.Client(api_key=api_key or llm_settings.GEMINI_API_KEY)
+        self.embedding_model = embedding_model or llm_settings.LLM_EMBEDDING_MODEL
+
+    def generation_config(self) -> types.GenerateContentConfig:
+        # fixed seed: identical requests give (effectively) identical responses, which makes caching safe
+        return types.GenerateContentConfig(
+            seed = 0
+        )
+
+    def config_fingerprint(self) -> dict:
+        # part of request_key: a config change must not serve responses cached under the old one
+        return self.generation_config().model_dump(exclude_none = True)
+
+    @staticmethod
+    def build_contents(prompt: str, history: Optional[Sequence] = None) -> list:
+        """
+        turn ancestor context (ContextTurn-like: .prompt/.response) + prompt into chat contents
+        """
+        contents = []
+        for turn in history or ():
+            contents.append(types.Content(role = "user", parts = [types.Part(text = turn.prompt)]))
+            if turn.response:
+                contents.append(types.Content(role = "model", parts = [types.Part(text = turn.response)]))
+
+        contents.append(types.Content(role = "user", parts = [types.Part(text = prompt)]))
+        return contents
+
+    async def _generate(self, prompt: str, history: Optional[Sequence]) -> str:
+        response = await self.client.aio.models.generate_content(
+            model = self.model,
+            contents = self.build_contents(prompt, history),
+            config = self.generation_config()
+        )
+        record_usage(self.model, getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def _stream(self, prompt: str, history: Optional[Sequence]) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model = self.model,
+            contents = self.build_contents(prompt, history),
+            config = self.generation_config()
+        )
+
+        usage = None
+        try:
+            async for chunk in stream:
+                # usage metadata is cumulative; the last chunk carries the totals
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            record_usage(self.model, usage)
+
+    async def _count_tokens(self, prompt: str, history: Optional[Sequence]) -> int:
+        response = await self.client.aio.models.count_tokens(
+            model = self.model,
+            contents = self.build_contents(prompt, history),
+        )
+        return response.total_tokens
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.aio.models.embed_content(
+            model = self.embedding_model,
+            contents = texts,
+        )
+        return [list(embedding.values) for embedding in response.embeddings]
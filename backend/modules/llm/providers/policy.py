@@ -0,0 +1,261 @@
+"""
+call policy for provider requests: deadlines, retries, hedging and a circuit breaker.
+
+- deadline: an absolute time carried in a contextvar. the API sets it per request (X-Request-Timeout,
+  capped by LLM_DEFAULT_DEADLINE_S); every attempt and backoff sleep has to fit inside it.
+- retries: retryable failures (429, 5xx, timeouts, connection errors) back off exponentially with
+  full jitter, waiting at least as long as the upstream's Retry-After.
+- hedging: with LLM_HEDGE_AFTER_S set, a non-streaming attempt that hasn't answered by then gets
+  a duplicate; whichever finishes first wins and the other is cancelled.
+- concurrency slot: calls pass the provider's slot (slot = ...), which is taken before the attempt
+  timeout starts. queueing for it is bounded by the deadline alone and never counts as a provider failure.
+- circuit breaker: after LLM_BREAKER_FAILURE_THRESHOLD consecutive provider failures calls fail fast
+  with CircuitOpenError for LLM_BREAKER_RESET_S, then a single probe decides whether to close it.
+
+streams are retried only until their first chunk; after that a failure goes to the caller.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from core.metrics import counter, gauge
+from ..config import llm_settings
+from .errors import CircuitOpenError, DeadlineExceededError, LLMError, ProviderUnavailableError, classify
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# the provider's concurrency slot: called with the longest wait allowed (None: no deadline)
+Slot = Callable[[Optional[float]], AsyncContextManager[None]]
+
+llm_retries = counter("llm_retries_total", "LLM call attempts retried, by error", ("model", "error"))
+llm_hedges = counter("llm_hedged_requests_total", "duplicate LLM attempts started for tail latency", ("model",))
+llm_circuit_state = gauge("llm_circuit_open", "1 while the model's circuit breaker is open", ("model",))
+
+
+deadline_var: ContextVar[Optional[float]] = ContextVar("llm_deadline", default = None)
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    bound everything inside to `seconds` from now. nested deadlines only ever tighten.
+    """
+    if seconds is None:
+        yield
+        return
+    new = time.monotonic() + seconds
+    current = deadline_var.get()
+    token = deadline_var.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+def remaining() -> Optional[float]:
+    current = deadline_var.get()
+    return None if current is None else current - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open -> half-open after
+    `reset_timeout`; half-open lets one probe through, which closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold or llm_settings.LLM_BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = llm_settings.LLM_BREAKER_RESET_S if reset_timeout is None else reset_timeout
+        self.clock = clock
+
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            retry_after = max(self.reset_timeout - (self.clock() - self.opened_at), 0.0)
+            raise CircuitOpenError(f"LLM provider {self.name} is unavailable (circuit open)", retry_after)
+        if state == "half_open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("circuit closed for %s", self.name)
+            llm_circuit_state.labels(model = self.name).set(0)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning("circuit opened for %s after %d failures", self.name, self.failures)
+            self.opened_at = self.clock()
+            self._probing = False
+            llm_circuit_state.labels(model = self.name).set(1)
+
+    def release_probe(self) -> None:
+        # probe ended without telling us anything about the provider (e.g. cancelled)
+        self._probing = False
+
+
+class CallPolicy:
+
+    def __init__(
+        self,
+        name: str,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        attempt_timeout: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.name = name
+        self.max_attempts = max_attempts or llm_settings.LLM_MAX_ATTEMPTS
+        self.base_delay = llm_settings.LLM_RETRY_BASE_DELAY_S if base_delay is None else base_delay
+        self.max_delay = llm_settings.LLM_RETRY_MAX_DELAY_S if max_delay is None else max_delay
+        self.attempt_timeout = attempt_timeout or llm_settings.LLM_CALL_TIMEOUT_S
+        self.hedge_after = (llm_settings.LLM_HEDGE_AFTER_S if hedge_after is None else hedge_after) or None
+        self.breaker = breaker or CircuitBreaker(name)
+        self.rng = rng or random.Random()
+
+    def backoff(self, attempt: int, error: LLMError) -> float:
+        # full jitter, never shorter than the upstream asked for
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, error.retry_after or 0.0)
+
+    def _timeout(self) -> float:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceededError("LLM request deadline exceeded")
+        return self.attempt_timeout if left is None else min(self.attempt_timeout, left)
+
+    def _hold(self, slot: Optional[Slot]) -> AsyncContextManager[None]:
+        # the slot is waited for outside the attempt timeout, so a local queue is never a provider failure
+        if slot is None:
+            return nullcontext()
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceededError("LLM request deadline exceeded")
+        return slot(left)
+
+    async def _attempt(self, call: Callable[[], Awaitable[T]], slot: Optional[Slot] = None) -> T:
+        # one breaker-guarded attempt bounded by the attempt timeout / remaining deadline. call() is
+        # only built once the slot is held
+        async with self._hold(slot):
+            self.breaker.before_call()
+            try:
+                result = await asyncio.wait_for(call(), self._timeout())
+            except (asyncio.CancelledError, StopAsyncIteration):
+                # StopAsyncIteration: an empty stream, which is an answer
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                error = classify(e)
+                if isinstance(error, ProviderUnavailableError):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+                raise error from e
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, call: Callable[[], Awaitable[T]], slot: Optional[Slot]) -> T:
+        if self.hedge_after is None:
+            return await self._attempt(call, slot)
+
+        tasks = {asyncio.ensure_future(self._attempt(call, slot))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout = self.hedge_after)
+            if not done:
+                llm_hedges.labels(model = self.name).inc()
+                tasks.add(asyncio.ensure_future(self._attempt(call, slot)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when = asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # the loser (or everything, if we were cancelled)
+            for task in tasks:
+                task.cancel()
+
+    async def _retry_wait(self, attempt: int, error: LLMError) -> None:
+        delay = self.backoff(attempt, error)
+        left = remaining()
+        if left is not None and delay >= left:
+            raise DeadlineExceededError(f"LLM request deadline exceeded (last error: {error})") from error
+        llm_retries.labels(model = self.name, error = type(error).__name__).inc()
+        logger.info("retrying %s in %.2fs after %s", self.name, delay, error)
+        await asyncio.sleep(delay)
+
+    async def run(self, call: Callable[[], Awaitable[T]], slot: Optional[Slot] = None) -> T:
+        """
+        result of call(), retried/hedged per the policy, each attempt inside `slot`. raises an LLMError on failure.
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return await self._hedged(call, slot)
+            except LLMError as error:
+                if not error.retryable or attempt == self.max_attempts - 1:
+                    raise
+                await self._retry_wait(attempt, error)
+
+    async def run_stream(self, open_stream: Callable[[], AsyncIterator[str]], slot: Optional[Slot] = None) -> AsyncIterator[str]:
+        """
+        chunks from open_stream(), retried until the first chunk arrives. every chunk has to arrive
+        within the attempt timeout (and the deadline); `slot` is held until the stream ends.
+        """
+        for attempt in range(self.max_attempts):
+            async with self._hold(slot):
+                stream = open_stream()
+                try:
+                    first = await self._attempt(stream.__anext__)
+                except StopAsyncIteration:
+                    return
+                except LLMError as error:
+                    await stream.aclose()
+                    if not error.retryable or attempt == self.max_attempts - 1:
+                        raise
+                    failure = error
+                else:
+                    try:
+                        yield first
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(stream.__anext__(), self._timeout())
+                            except StopAsyncIteration:
+                                return
+                            except LLMError:
+                                raise
+                            except Exception as e:
+                                raise classify(e) from e
+                            yield chunk
+                    finally:
+                        await stream.aclose()
+            # back off without holding the slot
+            await self._retry_wait(attempt, failure)
@@ -0,0 +1,84 @@
+"""
+provider registry: named provider factories plus the tier -> "provider:model" routing table.
+
+callers ask for a tier (None = default) and get a shared provider instance; cheap nodes can be
+sent to a faster model by naming a tier configured in LLM_TIERS. backends import lazily, so the
+stub works without the Gemini SDK installed.
+"""
+
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from ..config import llm_settings
+from .base import LLMProvider
+
+
+def _gemini(model: Optional[str]) -> LLMProvider:
+    from .gemini import GeminiProvider
+    return GeminiProvider(model)
+
+def _stub(model: Optional[str]) -> LLMProvider:
+    from .stub import StubProvider
+    return StubProvider(model)
+
+
+class ProviderRegistry:
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[Optional[str]], LLMProvider]] = {}
+        self._instances: Dict[Tuple[str, Optional[str]], LLMProvider] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[Optional[str]], LLMProvider]) -> None:
+        """
+        factory(model) builds a provider; model None means the provider's default
+        """
+        self._factories[name] = factory
+
+    def names(self):
+        return sorted(self._factories)
+
+    @staticmethod
+    def _key(spec: Optional[str]) -> Tuple[str, Optional[str]]:
+        name, _, model = (spec or llm_settings.LLM_PROVIDER).partition(":")
+        if not model and name == llm_settings.LLM_PROVIDER:
+            model = llm_settings.LLM_MODEL
+        return name, model or None
+
+    def get(self, spec: Optional[str] = None) -> LLMProvider:
+        """
+        shared instance for "provider" or "provider:model" (default: LLM_PROVIDER with LLM_MODEL)
+        """
+        name, model = key = self._key(spec)
+        if name not in self._factories:
+            raise ValueError(f"Unknown LLM provider: {name}")
+
+        with self._lock:
+            provider = self._instances.get(key)
+            if provider is None:
+                provider = self._instances[key] = self._factories[name](model)
+        return provider
+
+    def for_tier(self, tier: Optional[str] = None) -> LLMProvider:
+        if tier is None or tier == "default":
+            return self.get()
+        if tier not in llm_settings.LLM_TIERS:
+            raise ValueError(f"Unknown model tier: {tier}")
+        return self.get(llm_settings.LLM_TIERS[tier])
+
+    def set(self, spec: Optional[str], provider: LLMProvider) -> None:
+        # swap in an instance (tests, benchmarks)
+        with self._lock:
+            self._instances[self._key(spec)] = provider
+
+    def clear(self) -> None:
+        with self._lock:
+            self._instances.clear()
+
+
+registry = ProviderRegistry()
+registry.register("gemini", _gemini)
+registry.register("stub", _stub)
+
+def get_provider(tier: Optional[str] = None) -> LLMProvider:
+    return registry.for_tier(tier)
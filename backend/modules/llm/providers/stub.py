@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import random
+from types import SimpleNamespace
+from typing import AsyncIterator, List, Optional, Sequence, Union
+
+from ..context import estimate_tokens
+from ..embeddings import HashingEmbedder
+from .base import GenerateRequest, LLMProvider
+
+
+class StubProvider(LLMProvider):
+    """
+    local, deterministic provider for development, tests and benchmarks: no network, no API key.
+    the same prompt + context always gives the same response, and embeddings come from the
+    offline HashingEmbedder, so similar texts land near each other.
+    """
+
+    name = "stub"
+    batch_generate = True
+    batch_embed = True
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        latency_ms: float = 0,
+        dimensions: int = 256,
+        batching: Optional[bool] = None,
+    ):
+        super().__init__(model or "stub-echo", max_concurrency, batching)
+        self.latency = latency_ms / 1000
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def respond(self, prompt: str, history: Optional[Sequence] = None) -> str:
+        turns = len(history or ())
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        return f"[{self.model} {digest}] {prompt.strip()[:200]} ({turns} context turns)"
+
+    async def _generate(self, prompt: str, history: Optional[Sequence]) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.respond(prompt, history)
+
+    async def _generate_batch(self, requests: List[GenerateRequest]) -> List[str]:
+        # one round trip for the whole batch
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self.respond(prompt, history) for prompt, history in requests]
+
+    async def _stream(self, prompt: str, history: Optional[Sequence]) -> AsyncIterator[str]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for word in self.respond(prompt, history).split(" "):
+            yield word + " "
+
+    async def _count_tokens(self, prompt: str, history: Optional[Sequence]) -> int:
+        texts = [prompt] + [text for turn in history or () for text in (turn.prompt, turn.response or "")]
+        return sum(estimate_tokens(text) for text in texts)
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return HashingEmbedder(self.dimensions).embed_sync(texts).tolist()
+
+
+class UpstreamError(Exception):
+    """
+    stand-in for an SDK API error: an HTTP status code and, optionally, a Retry-After header
+    """
+
+    def __init__(self, code: int, retry_after: Optional[float] = None):
+        super().__init__(f"upstream returned {code}")
+        self.code = code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers = headers)
+
+
+# one scripted outcome per call: None succeeds, a number stalls that many seconds first,
+# an exception is raised
+Fault = Union[None, float, BaseException]
+
+
+class FaultInjectingStub(StubProvider):
+    """
+    StubProvider that misbehaves on purpose, for exercising the call policy.
+    calls consume `faults` in order; once it runs out, each call fails with a 503 at `error_rate`
+    and stalls for `slow_s` at `slow_rate`.
+    """
+
+    name = "faulty"
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        faults: Sequence[Fault] = (),
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_s: float = 1.0,
+        seed: int = 0,
+        **kwargs,
+    ):
+        kwargs.setdefault("batching", False)
+        super().__init__(model or "stub-faulty", **kwargs)
+        self.faults = list(faults)
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_s = slow_s
+        self.rng = random.Random(seed)
+        self.attempts = 0
+
+    async def _inject(self) -> None:
+        self.attempts += 1
+        if self.faults:
+            fault = self.faults.pop(0)
+        elif self.rng.random() < self.error_rate:
+            fault = UpstreamError(503)
+        elif self.rng.random() < self.slow_rate:
+            fault = self.slow_s
+        else:
+            fault = None
+
+        if isinstance(fault, BaseException):
+            raise fault
+        if fault:
+            await asyncio.sleep(fault)
+
+    async def _generate(self, prompt: str, history: Optional[Sequence]) -> str:
+        await self._inject()
+        return await super()._generate(prompt, history)
+
+    async def _generate_batch(self, requests: List[GenerateRequest]) -> List[str]:
+        await self._inject()
+        return await super()._generate_batch(requests)
+
+    async def _stream(self, prompt: str, history: Optional[Sequence]) -> AsyncIterator[str]:
+        await self._inject()
+        async for chunk in super()._stream(prompt, history):
+            yield chunk
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        await self._inject()
+        return await super()._embed(texts)
@@ -0,0 +1,197 @@
+"""
+pub/sub fan-out behind graph sync (sync.py).
+
+a backend numbers the messages of each channel (seq 1, 2, 3, ...) and delivers them to every
+subscriber of that channel in that order, in every process sharing the backend. `epoch` names
+the numbering: a subscriber holding a seq from a different epoch can't resume from it.
+
+- memory: one process. sequence numbers restart (new epoch) with the process
+- postgres: LISTEN/NOTIFY on DATABASE_URL, for several workers. per-channel sequence numbers
+  live in pubsub_sequences and are taken in the transaction that sends the NOTIFY; the row lock
+  serializes publishers, so commit order (= delivery order) is seq order
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import make_url
+
+from modules.storage.models import PubSubSequence
+from core.config import settings
+from core.database import async_engine
+from .config import llm_settings
+
+logger = logging.getLogger(__name__)
+
+# called with (seq, message) for every message on a subscribed channel
+Callback = Callable[[int, dict], None]
+
+
+class PubSub(ABC):
+
+    epoch: str = ""
+    # largest encoded message the backend accepts; None = unbounded
+    max_message_bytes: Optional[int] = None
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Callback]] = {}
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict) -> int:
+        """
+        deliver message to the channel's subscribers everywhere. returns its seq
+        """
+
+    @abstractmethod
+    async def current(self, channel: str) -> int:
+        """
+        seq of the channel's latest message (0 if none yet)
+        """
+
+    async def subscribe(self, channel: str, callback: Callback) -> Callable[[], None]:
+        """
+        register callback for the channel's messages from now on. returns an unsubscribe function.
+        callbacks run on the event loop and must not block
+        """
+        self._subscribers.setdefault(channel, set()).add(callback)
+
+        def unsubscribe() -> None:
+            callbacks = self._subscribers.get(channel)
+            if callbacks is not None:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self._subscribers[channel]
+        return unsubscribe
+
+    def _deliver(self, channel: str, seq: int, message: dict) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            try:
+                callback(seq, message)
+            except Exception:
+                logger.exception("pubsub subscriber failed", extra = {"channel": channel})
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+
+class InMemoryPubSub(PubSub):
+    """
+    single-process backend: publish calls the subscribers directly
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.epoch = uuid.uuid4().hex[:12]
+        self._seqs: Dict[str, int] = {}
+
+    async def publish(self, channel: str, message: dict) -> int:
+        seq = self._seqs.get(channel, 0) + 1
+        self._seqs[channel] = seq
+        self._deliver(channel, seq, message)
+        return seq
+
+    async def current(self, channel: str) -> int:
+        return self._seqs.get(channel, 0)
+
+
+class PostgresPubSub(PubSub):
+    """
+    cross-process backend over LISTEN/NOTIFY. every worker holds one listening connection and
+    receives all channels' messages, keeping the ones it has subscribers for.
+    """
+
+    epoch = "postgres"
+    max_message_bytes = 7900        # NOTIFY payloads must stay under 8000 bytes
+
+    def __init__(self, url: Optional[str] = None, pg_channel: str = "graph_sync", engine = None):
+        super().__init__()
+        # asyncpg wants a plain postgresql:// DSN, without SQLAlchemy's +driver suffix
+        self.dsn = make_url(url or settings.DATABASE_URL).set(drivername = "postgresql").render_as_string(hide_password = False)
+        self.pg_channel = pg_channel
+        self.engine = engine or async_engine
+        self._connection = None
+        self._connecting: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, message: dict) -> int:
+        table = PubSubSequence.__table__
+        upsert = pg_insert(table).values(channel = channel, seq = 1)
+        upsert = upsert.on_conflict_do_update(
+            index_elements = [table.c.channel], set_ = {"seq": table.c.seq + 1}
+        ).returning(table.c.seq)
+
+        async with self.engine.begin() as connection:
+            seq = (await connection.execute(upsert)).scalar_one()
+            payload = json.dumps({"c": channel, "s": seq, "m": message}, separators = (",", ":"))
+            await connection.execute(select(func.pg_notify(self.pg_channel, payload)))
+        return seq
+
+    async def current(self, channel: str) -> int:
+        async with self.engine.connect() as connection:
+            seq = await connection.scalar(select(PubSubSequence.seq).where(PubSubSequence.channel == channel))
+        return seq or 0
+
+    async def subscribe(self, channel: str, callback: Callback) -> Callable[[], None]:
+        await self._listen()
+        return await super().subscribe(channel, callback)
+
+    async def _listen(self) -> None:
+        # one connection per process, opened on first subscribe; concurrent callers share the attempt
+        if self._connection is not None and not self._connection.is_closed():
+            return
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.ensure_future(self._connect())
+        await asyncio.shield(self._connecting)
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.pg_channel, self._on_notify)
+        connection.add_termination_listener(self._on_lost)
+        self._connection = connection
+
+    def _on_notify(self, connection, pid, pg_channel, payload) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning("malformed pubsub payload on %s", pg_channel)
+            return
+        self._deliver(data["c"], data["s"], data["m"])
+
+    def _on_lost(self, connection) -> None:
+        # messages sent meanwhile are lost; subscribers see the seq gap on the next one and resync
+        logger.warning("pubsub listener connection lost, reconnecting")
+        self._connection = None
+        if self._subscribers:
+            asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        while self._subscribers and self._connection is None:
+            try:
+                await self._listen()
+            except Exception:
+                logger.exception("pubsub reconnect failed")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def close(self) -> None:
+        await super().close()
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+def create_pubsub(kind: Optional[str] = None) -> PubSub:
+    kind = kind or llm_settings.SYNC_PUBSUB
+    if kind == "memory":
+        return InMemoryPubSub()
+    if kind == "postgres":
+        return PostgresPubSub()
+    raise ValueError(f"Unknown pub/sub backend: {kind}")
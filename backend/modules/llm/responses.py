@@ -0,0 +1,104 @@
+"""
+response helpers for large payloads.
+fast JSON for conversation graphs (orjson when installed, the stdlib encoder otherwise),
+and cacheable, range-addressable text bodies for node prompts/responses.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:     # optional dependency
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    serializes plain dicts/lists directly, skipping FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size = 16).hexdigest() + '"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # weak comparison, as If-None-Match requires
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    a single "bytes=start-end" / "bytes=start-" / "bytes=-suffix" range as inclusive (start, end).
+    returns None for anything we don't serve partially (multiple ranges, other units, garbage);
+    raises ValueError when the range is well-formed but unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = (part.strip() for part in spec.partition("-"))
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+
+    if not first:
+        # suffix range: the last n bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(size - int(last), 0), size - 1
+
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def body_response(size: int, read: Callable[[int, int], bytes], etag: str,
+                  headers: Mapping[str, str]) -> Response:
+    """
+    serve a UTF-8 text body of `size` bytes, answering If-None-Match with 304 and single byte
+    ranges (Range / If-Range) with 206. read(start, end) returns bytes [start, end), so
+    blob-backed bodies only read the requested range.
+    """
+    base_headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+    media_type = "text/plain; charset=utf-8"
+
+    if_none_match = headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code = 304, headers = base_headers)
+
+    range_header = headers.get("range")
+    if_range = headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code = 416,
+                headers = {**base_headers, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            return Response(
+                content = read(start, end + 1),
+                status_code = 206,
+                media_type = media_type,
+                headers = {**base_headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+            )
+
+    return Response(content = read(0, size), media_type = media_type, headers = base_headers)
+
+def text_body_response(body: str, headers: Mapping[str, str]) -> Response:
+    """
+    body_response for an in-memory string, with a content-hash ETag. offsets are over the UTF-8 bytes.
+    """
+    data = body.encode("utf-8")
+    return body_response(len(data), lambda start, end: data[start:end], _etag(data), headers)
@@ -0,0 +1,81 @@
+import asyncio
+from typing import List, Literal, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from modules.storage import closure
+from modules.storage.content import resolve_rows
+from modules.storage.models import Conversation, Node
+from .config import llm_settings
+from .context import ContextTurn, estimate_tokens, truncate_to_tokens
+from .embeddings import EmbeddingIndexer, embedding_indexer
+
+Scope = Literal["conversation", "user"]
+
+
+def _scope_and_exclusions(db: Session, node_id: int) -> Tuple[Optional[Tuple[int, int]], List[int]]:
+    # (conversation_id, user_id) of the node, and the ids retrieval must skip: itself + its ancestors
+    owner = db.execute(
+        select(Node.conversation_id, Conversation.user_id)
+        .join(Conversation, Conversation.id == Node.conversation_id)
+        .where(Node.id == node_id)
+    ).first()
+    return (tuple(owner) if owner else None), [node_id] + closure.ancestor_ids(db, node_id)
+
+def _load_turns(db: Session, node_ids: List[int]):
+    # raw rows: offloaded bodies are read afterwards, in a worker thread
+    return db.execute(
+        select(Node.id, Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key)
+        .where(Node.id.in_(node_ids))
+    ).all()
+
+async def related_context(
+    db,
+    node_id: int,
+    query: str,
+    k: int,
+    scope: Scope = "conversation",
+    indexer: EmbeddingIndexer = embedding_indexer,
+) -> Tuple[ContextTurn, ...]:
+    """
+    up to k nodes similar to `query` from the node's conversation (or all of its user's
+    conversations), excluding the node and its ancestors, which the context assembler already
+    covers. most similar last, so they sit closest to the ancestor turns; capped at
+    RETRIEVAL_TOKEN_BUDGET tokens. db is an AsyncSession.
+    """
+    if k <= 0 or not query.strip():
+        return ()
+
+    owner, exclude = await db.run_sync(_scope_and_exclusions, node_id)
+    if owner is None:
+        return ()
+    conversation_id, user_id = owner
+
+    vector = (await indexer.embedder.embed([query]))[0]
+    hits = await asyncio.to_thread(
+        indexer.index.search, vector, k,
+        conversation_id = conversation_id if scope == "conversation" else None,
+        user_id = user_id if scope == "user" else None,
+        exclude = exclude,
+    )
+    hits = [node_id for node_id, score in hits if score >= llm_settings.RETRIEVAL_MIN_SCORE]
+    if not hits:
+        return ()
+
+    texts = await asyncio.to_thread(resolve_rows, await db.run_sync(_load_turns, hits))
+    remaining = llm_settings.RETRIEVAL_TOKEN_BUDGET
+    turns: List[ContextTurn] = []
+    for hit in hits:
+        if hit not in texts or remaining <= 0:
+            # deleted since it was indexed, or out of budget
+            continue
+        prompt, response = texts[hit]
+        prompt = truncate_to_tokens(prompt, min(llm_settings.CONTEXT_MAX_TURN_TOKENS, remaining // 2))
+        response = truncate_to_tokens(response, min(llm_settings.CONTEXT_MAX_TURN_TOKENS, remaining - remaining // 2))
+        tokens = estimate_tokens(prompt) + estimate_tokens(response)
+        turns.append(ContextTurn(hit, prompt, response, tokens))
+        remaining -= tokens
+
+    turns.reverse()
+    return tuple(turns)
@@ -0,0 +1,306 @@
+"""
+admission control and fair queuing in front of the LLM providers.
+
+- global cap: at most SCHEDULER_MAX_CONCURRENCY provider calls in flight per process (by default
+  LLM_MAX_CONCURRENCY, so a granted slot isn't left waiting on the provider's own semaphore).
+  waiting for a slot counts against the request deadline.
+- per-user rate limit: a token bucket per user (SCHEDULER_USER_RATE calls/s, bursts of
+  SCHEDULER_USER_BURST). interactive requests over the limit get a 429; graph runs wait instead.
+- weighted fair queuing: when the cap is reached, waiters are ordered by virtual finish time
+  (start-time fair queuing), so a user with 500 queued nodes gets the same share of slots as a
+  user with one. SCHEDULER_WEIGHTS gives some users a bigger share.
+- back-pressure: once SCHEDULER_MAX_QUEUE calls are waiting, interactive requests get a 429
+  with their would-be queue position and an ETA.
+
+the caller's user travels in a contextvar (set with `principal(...)`), like the LLM deadline,
+so graph-run tasks inherit it. calls made outside any principal (scripts, tests) still share the
+global cap under "anonymous" but aren't rate limited. cache hits never take a slot.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.metrics import counter, gauge, histogram
+from .config import llm_settings
+from .providers.errors import DeadlineExceededError
+from .providers.policy import remaining
+
+scheduler_queue_depth = gauge("llm_scheduler_queue_depth", "LLM calls waiting for an execution slot")
+scheduler_active = gauge("llm_scheduler_active", "LLM calls holding an execution slot")
+scheduler_wait_seconds = histogram(
+    "llm_scheduler_wait_seconds", "time from admission to getting an execution slot", ("outcome",),
+)
+scheduler_rejected = counter("llm_scheduler_rejected_total", "LLM calls turned away by admission control", ("reason",))
+
+ANONYMOUS = "anonymous"
+
+# (user key, block): block=True waits out rate limits and ignores the queue bound (graph runs)
+principal_var: ContextVar[Optional[Tuple[str, bool]]] = ContextVar("llm_principal", default = None)
+
+@contextmanager
+def principal(key: str, block: bool = False):
+    """
+    attribute LLM calls made inside to `key` for rate limiting and fair queuing
+    """
+    token = principal_var.set((key, block))
+    try:
+        yield
+    finally:
+        principal_var.reset(token)
+
+def user_key(user_id: Optional[int]) -> str:
+    return ANONYMOUS if user_id is None else f"user:{user_id}"
+
+
+class SchedulerRejected(Exception):
+    """
+    admission refused. retry_after is in seconds; position/eta are set when the queue was full.
+    """
+
+    def __init__(self, reason: str, retry_after: float, position: Optional[int] = None, eta: Optional[float] = None):
+        message = "Rate limit exceeded" if reason == "rate_limited" else "LLM execution queue is full"
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.position = position
+        self.eta = eta
+
+    def to_dict(self) -> dict:
+        return {
+            "detail": str(self),
+            "reason": self.reason,
+            "retry_after": round(self.retry_after, 3),
+            "queue_position": self.position,
+            "eta_seconds": None if self.eta is None else round(self.eta, 3),
+        }
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, holding at most `burst`
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """
+        take one token. returns 0 on success, else seconds until one is available
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+@dataclass(order = True)
+class _Waiter:
+    finish: float
+    seq: int
+    start: float = field(compare = False)
+    key: str = field(compare = False)
+    future: asyncio.Future = field(compare = False)
+
+
+class ExecutionScheduler:
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        weights: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = (
+            max_concurrency or llm_settings.SCHEDULER_MAX_CONCURRENCY or llm_settings.LLM_MAX_CONCURRENCY
+        )
+        self.max_queue = llm_settings.SCHEDULER_MAX_QUEUE if max_queue is None else max_queue
+        self.rate = rate or llm_settings.SCHEDULER_USER_RATE
+        self.burst = burst or llm_settings.SCHEDULER_USER_BURST
+        self.weights = llm_settings.SCHEDULER_WEIGHTS if weights is None else weights
+        self.clock = clock
+
+        self.active = 0
+        self._queue: List[_Waiter] = []      # heap by virtual finish time
+        self._queued = 0                      # live waiters (the heap also holds cancelled ones)
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+        # moving average of how long a slot is held, for ETAs
+        self.service_time = 1.0
+
+        self.admitted = 0
+        self.rejected = 0
+
+    # admission
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= 10_000:
+                # idle users' buckets are full again; forgetting them changes nothing
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.full}
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+        return bucket
+
+    def eta(self, position: int) -> float:
+        # rough: waiters ahead drain max_concurrency at a time
+        return position * self.service_time / self.max_concurrency
+
+    def _reject(self, reason: str, retry_after: float, position: Optional[int] = None) -> SchedulerRejected:
+        self.rejected += 1
+        scheduler_rejected.labels(reason = reason).inc()
+        eta = None if position is None else self.eta(position)
+        return SchedulerRejected(reason, retry_after, position, eta)
+
+    def check(self, key: str) -> None:
+        """
+        raise SchedulerRejected if a call for `key` would be turned away right now.
+        lets handlers answer 429 before doing any work; consumes nothing.
+        """
+        bucket = self._bucket(key)
+        bucket._refill()
+        if bucket.tokens < 1:
+            raise self._reject("rate_limited", (1 - bucket.tokens) / bucket.rate)
+        if self._queued >= self.max_queue:
+            position = self._queued + 1
+            raise self._reject("queue_full", self.eta(position), position)
+
+    @asynccontextmanager
+    async def slot(self, key: Optional[str] = None, block: Optional[bool] = None):
+        """
+        hold an execution slot for one provider call. user and blocking mode default to the
+        current principal().
+        """
+        current = principal_var.get()
+        if key is None and current is None:
+            key, block, limited = ANONYMOUS, True, False
+        else:
+            key = key or current[0]
+            block = (current[1] if current else False) if block is None else block
+            limited = True
+
+        start = time.perf_counter()
+        if limited:
+            await self._take_token(key, block)
+        await self._acquire(key, block, start)
+        self.admitted += 1
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service_time = 0.9 * self.service_time + 0.1 * (time.perf_counter() - held)
+            self._release()
+
+    async def _take_token(self, key: str, block: bool) -> None:
+        bucket = self._bucket(key)
+        while True:
+            wait = bucket.take()
+            if not wait:
+                return
+            if not block:
+                raise self._reject("rate_limited", wait)
+            left = remaining()
+            if left is not None and wait >= left:
+                raise DeadlineExceededError("LLM request deadline exceeded while rate limited")
+            await asyncio.sleep(wait)
+
+    async def _acquire(self, key: str, block: bool, start: float) -> None:
+        if self.active < self.max_concurrency and not self._queued:
+            self.active += 1
+            scheduler_active.set(self.active)
+            scheduler_wait_seconds.labels(outcome = "immediate").observe(time.perf_counter() - start)
+            return
+
+        if not block and self._queued >= self.max_queue:
+            position = self._queued + 1
+            raise self._reject("queue_full", self.eta(position), position)
+
+        # start-time fair queuing: each user's calls are spaced 1/weight apart in virtual time
+        virtual_start = max(self._virtual_time, self._last_finish.get(key, 0.0))
+        finish = virtual_start + 1.0 / self.weights.get(key, 1.0)
+        self._last_finish[key] = finish
+        waiter = _Waiter(finish, next(self._seq), virtual_start, key, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        self._queued += 1
+        scheduler_queue_depth.set(self._queued)
+
+        # the queue wait counts against the request deadline like the provider call does
+        left = remaining()
+        try:
+            await asyncio.wait_for(waiter.future, max(left, 0.0) if left is not None else None)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            scheduler_wait_seconds.labels(outcome = "deadline").observe(time.perf_counter() - start)
+            raise DeadlineExceededError("LLM request deadline exceeded while queued for a slot") from None
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            scheduler_wait_seconds.labels(outcome = "cancelled").observe(time.perf_counter() - start)
+            raise
+        scheduler_wait_seconds.labels(outcome = "queued").observe(time.perf_counter() - start)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done() and not waiter.future.cancelled():
+            # granted at the same moment we gave up: pass the slot on
+            self._release()
+        else:
+            # still in the heap; skipped when it reaches the top
+            waiter.future.cancel()
+            self._queued -= 1
+            scheduler_queue_depth.set(self._queued)
+
+    def _release(self) -> None:
+        # hand the slot straight to the next live waiter, or give it back
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue
+            self._queued -= 1
+            scheduler_queue_depth.set(self._queued)
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            waiter.future.set_result(None)
+            return
+        self.active -= 1
+        scheduler_active.set(self.active)
+        if not self._queued:
+            # idle: nobody is behind anyone any more
+            self._last_finish.clear()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": round(self.service_time, 3),
+        }
+
+
+scheduler = ExecutionScheduler()
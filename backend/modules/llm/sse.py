@@ -0,0 +1,14 @@
+import json
+
+# helpers for server-sent event responses
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",     # stop reverse proxies from buffering the stream
+}
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    format a single server-sent event frame
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,438 @@
+"""
+real-time graph sync: a numbered stream of compact graph deltas per conversation.
+
+handlers report what they changed once it is committed (`sync_hub.publish(conversation_id, deltas)`).
+the hub collects deltas per conversation for SYNC_FLUSH_DELAY_MS in commit order, split into runs
+of one origin each. each run is coalesced (a drag burst ends up as one position per node) and
+published as one frame through the pub/sub backend (pubsub.py), which numbers it. runs go out in
+the order they started, so frames from different clients keep their commit order. WebSocket clients (/conversations/{id}/sync in
+api.py) get every frame of their conversation and can reconnect with ?since=<seq>&epoch=<epoch>
+to be sent the frames they missed from the replay buffer instead of reloading the graph.
+
+deltas are short arrays with integer ids:
+    ["n+", node_id, x, y, node_type]        node added
+    ["n~", node_id, x, y]                   node moved
+    ["n*", node_id, {field: value}]         content changed: {prompt,response}_preview / _length
+    ["n-", node_id]                         node removed, its edges with it
+    ["n=", node_id, new_id]                 node now goes by new_id (a fork's copy of an inherited node
+                                            replaced it, storage/forks.py); its edges follow it
+    ["e+", edge_id, source_id, target_id]   edge added
+    ["e-", edge_id]                         edge removed
+
+server -> client messages:
+    {"t": "hello", "seq": n, "epoch": e, "resumed": bool}
+        first message. resumed: the missed frames follow. otherwise load the graph and apply the
+        frames after seq n on top of it
+    {"t": "d", "s": seq, "o": origin, "d": [delta, ...]}
+        one frame. origin is the X-Sync-Client header of the request that caused it, so a client
+        can skip its own echoes
+    {"t": "reset"}
+        frames were lost (slow client, pub/sub gap): reload the graph
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fastapi import Header
+
+from core.metrics import counter, gauge
+from .config import llm_settings
+from .pubsub import PubSub, create_pubsub
+
+try:
+    import orjson
+except ImportError:     # optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+sync_clients = gauge("llm_sync_clients", "WebSocket clients subscribed to graph sync")
+sync_frames = counter("llm_sync_frames_total", "graph sync frames published")
+sync_resets = counter("llm_sync_resets_total", "graph sync clients told to reload", ("reason",))
+
+# X-Sync-Client of the request being handled; deltas it causes carry it as their origin
+origin_var: ContextVar[Optional[str]] = ContextVar("sync_origin", default = None)
+
+# room for the envelope around a frame's deltas (channel, seq, origin)
+_ENVELOPE_BYTES = 256
+
+
+def _dumps(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii = False, separators = (",", ":"))
+
+RESET = _dumps({"t": "reset"})
+
+
+async def sync_origin(x_sync_client: Optional[str] = Header(None, max_length = 64)) -> Optional[str]:
+    # router dependency: deltas published while handling the request are tagged with the client
+    origin_var.set(x_sync_client)
+    return x_sync_client
+
+def channel_name(conversation_id: int) -> str:
+    return f"conversation:{conversation_id}"
+
+
+# delta builders
+
+def node_added(node_id: int, x: int, y: int, node_type: str = "prompt") -> list:
+    return ["n+", node_id, x, y, node_type]
+
+def node_moved(node_id: int, x: int, y: int) -> list:
+    return ["n~", node_id, x, y]
+
+def node_content(node_id: int, prompt: Optional[str] = None, response: Optional[str] = None) -> list:
+    # previews like the graph loader's preview mode; clients fetch full bodies from /nodes/{id}/body
+    fields = {}
+    for field, text in (("prompt", prompt), ("response", response)):
+        if text is not None:
+            fields[f"{field}_preview"] = text[:llm_settings.GRAPH_PREVIEW_CHARS]
+            fields[f"{field}_length"] = len(text.encode("utf-8"))
+    return ["n*", node_id, fields]
+
+def node_removed(node_id: int) -> list:
+    return ["n-", node_id]
+
+def node_replaced(node_id: int, new_id: int) -> list:
+    return ["n=", node_id, new_id]
+
+def edge_added(edge_id: int, source_id: int, target_id: int) -> list:
+    return ["e+", edge_id, source_id, target_id]
+
+def edge_removed(edge_id: int) -> list:
+    return ["e-", edge_id]
+
+
+class _Outbox:
+    """
+    deltas waiting for the next frame of one run (consecutive deltas of one conversation and origin),
+    coalesced as they arrive:
+    moves and content changes of a node merge into their first slot, and a node removed in the
+    same window as it was added disappears from the frame entirely, with its new edges
+    """
+
+    def __init__(self):
+        self._deltas: List[Optional[list]] = []
+        self._slots: Dict[Tuple[str, int], int] = {}   # (kind, node_id) -> index in _deltas
+        self.received = 0
+
+    def add(self, delta: list) -> None:
+        self.received += 1
+        kind = delta[0]
+        if kind == "n~":
+            added = self._slots.get(("n+", delta[1]))
+            if added is not None:
+                self._deltas[added][2:4] = delta[2:4]
+                return
+        if kind in ("n~", "n*"):
+            slot = self._slots.get((kind, delta[1]))
+            if slot is not None:
+                if kind == "n~":
+                    self._deltas[slot] = delta
+                else:
+                    self._deltas[slot][2].update(delta[2])
+                return
+        if kind == "n-":
+            for key in (("n~", delta[1]), ("n*", delta[1])):
+                slot = self._slots.pop(key, None)
+                if slot is not None:
+                    self._deltas[slot] = None
+            added = self._slots.pop(("n+", delta[1]), None)
+            if added is not None:
+                # never announced: drop it along with the edges it got meanwhile
+                self._deltas[added] = None
+                for index, pending in enumerate(self._deltas):
+                    if pending is not None and pending[0] == "e+" and delta[1] in pending[2:4]:
+                        self._deltas[index] = None
+                return
+        if kind in ("n+", "n~", "n*"):
+            self._slots[(kind, delta[1])] = len(self._deltas)
+        self._deltas.append(delta)
+
+    def deltas(self) -> List[list]:
+        return [delta for delta in self._deltas if delta is not None]
+
+
+class _Subscriber:
+    """
+    one WebSocket's outgoing queue of encoded messages
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def put(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # too far behind to catch up frame by frame: drop the backlog, have it reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+            return False
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class _Channel:
+    """
+    one conversation as seen by this process: its pub/sub subscription, local sockets and the
+    replay buffer (contiguous frames ending at seq)
+    """
+
+    def __init__(self, replay_frames: int):
+        self.subscribers: Set[_Subscriber] = set()
+        self.buffer: Deque[Tuple[int, str]] = deque(maxlen = replay_frames)
+        self.seq: Optional[int] = None          # None until the subscription is in place
+        self.early: List[Tuple[int, dict]] = []
+        self.opening: Optional[asyncio.Future] = None
+        self.unsubscribe: Optional[Callable[[], None]] = None
+        self.linger: Optional[asyncio.TimerHandle] = None
+
+
+class SyncHub:
+    """
+    producer side: publish() stages deltas, a background writer flushes them as frames.
+    consumer side: connect() subscribes a socket to a conversation's frames.
+    the pub/sub backend is created on first use.
+    """
+
+    def __init__(
+        self,
+        pubsub: Optional[PubSub] = None,
+        flush_delay_ms: Optional[int] = None,
+        replay_frames: Optional[int] = None,
+        linger_s: Optional[float] = None,
+        client_queue: Optional[int] = None,
+    ):
+        self._pubsub = pubsub
+        self.flush_delay = (llm_settings.SYNC_FLUSH_DELAY_MS if flush_delay_ms is None else flush_delay_ms) / 1000
+        self.replay_frames = replay_frames or llm_settings.SYNC_REPLAY_FRAMES
+        self.linger = llm_settings.SYNC_LINGER_S if linger_s is None else linger_s
+        self.client_queue = client_queue or llm_settings.SYNC_CLIENT_QUEUE
+
+        # conversation -> its runs in commit order: (origin, outbox)
+        self._outboxes: Dict[int, List[Tuple[Optional[str], _Outbox]]] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self._channels: Dict[int, _Channel] = {}
+
+        self.received = 0
+        self.published = 0
+        self.frames = 0
+        self.resumes = 0
+        self.resets = 0
+        self.failures = 0
+
+    @property
+    def pubsub(self) -> PubSub:
+        if self._pubsub is None:
+            self._pubsub = create_pubsub()
+        return self._pubsub
+
+    # producer side
+
+    def publish(self, conversation_id: int, deltas: Iterable[list], origin: Optional[str] = None) -> None:
+        """
+        queue deltas for the conversation's next frame. call after the change is committed.
+        never blocks
+        """
+        if not llm_settings.SYNC_ENABLED:
+            return
+        origin = origin or origin_var.get()
+        runs = self._outboxes.setdefault(conversation_id, [])
+        if not runs or runs[-1][0] != origin:
+            # another client's changes came in between: coalescing across them would reorder them
+            runs.append((origin, _Outbox()))
+        outbox = runs[-1][1]
+        for delta in deltas:
+            outbox.add(delta)
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done() or self._writer.get_loop() is not loop:
+            self._writer = loop.create_task(self._drain())
+
+    def publish_many(self, deltas: Iterable[Tuple[int, list]], origin: Optional[str] = None) -> None:
+        # (conversation_id, delta) pairs, e.g. from a batch spanning conversations
+        grouped: Dict[int, List[list]] = {}
+        for conversation_id, delta in deltas:
+            grouped.setdefault(conversation_id, []).append(delta)
+        for conversation_id, conversation_deltas in grouped.items():
+            self.publish(conversation_id, conversation_deltas, origin)
+
+    async def drain(self) -> None:
+        """
+        wait until everything queued so far is published
+        """
+        while self._writer is not None and not self._writer.done():
+            await asyncio.shield(self._writer)
+
+    async def _drain(self) -> None:
+        if self.flush_delay:
+            await asyncio.sleep(self.flush_delay)
+
+        while self._outboxes:
+            outboxes, self._outboxes = self._outboxes, {}
+            for conversation_id, runs in outboxes.items():
+                for origin, outbox in runs:
+                    await self._flush(conversation_id, origin, outbox)
+
+    async def _flush(self, conversation_id: int, origin: Optional[str], outbox: _Outbox) -> None:
+        self.received += outbox.received
+        for frame in self._frames(outbox.deltas()):
+            try:
+                await self.pubsub.publish(channel_name(conversation_id), {"o": origin, "d": frame})
+            except Exception:
+                self.failures += 1
+                logger.exception("sync publish failed", extra = {"conversation_id": conversation_id})
+                continue
+            self.frames += 1
+            self.published += len(frame)
+            sync_frames.inc()
+
+    def _frames(self, deltas: List[list]) -> Iterator[List[list]]:
+        # split so each frame fits the backend's message size
+        limit = self.pubsub.max_message_bytes
+        if limit is None:
+            if deltas:
+                yield deltas
+            return
+        frame, size = [], 0
+        for delta in deltas:
+            delta_size = len(_dumps(delta).encode("utf-8")) + 1
+            if frame and size + delta_size > limit - _ENVELOPE_BYTES:
+                yield frame
+                frame, size = [], 0
+            frame.append(delta)
+            size += delta_size
+        if frame:
+            yield frame
+
+    # consumer side
+
+    @asynccontextmanager
+    async def connect(self, conversation_id: int, since: Optional[int] = None,
+                      epoch: Optional[str] = None) -> AsyncIterator[_Subscriber]:
+        """
+        subscribe to the conversation's frames. the subscriber's first message is the hello;
+        with since/epoch from an earlier hello or frame, the frames missed since then follow it
+        """
+        channel = await self._open(conversation_id)
+        subscriber = _Subscriber(self.client_queue)
+
+        replay = self._replay(channel, since, epoch)
+        if since is not None and replay is None:
+            self.resets += 1
+            sync_resets.labels(reason = "resume").inc()
+        elif replay is not None:
+            self.resumes += 1
+        subscriber.queue.put_nowait(_dumps({
+            "t": "hello",
+            "seq": since if replay is not None else channel.seq,
+            "epoch": self.pubsub.epoch,
+            "resumed": replay is not None,
+        }))
+        for message in replay or ():
+            subscriber.queue.put_nowait(message)
+
+        channel.subscribers.add(subscriber)
+        sync_clients.inc()
+        try:
+            yield subscriber
+        finally:
+            channel.subscribers.discard(subscriber)
+            sync_clients.dec()
+            if not channel.subscribers:
+                # keep following for a while so a reconnecting client can still resume
+                channel.linger = asyncio.get_running_loop().call_later(
+                    self.linger, self._close, conversation_id, channel
+                )
+
+    def _replay(self, channel: _Channel, since: Optional[int], epoch: Optional[str]) -> Optional[List[str]]:
+        # frames after `since`, or None if the buffer doesn't reach back that far
+        if since is None or epoch != self.pubsub.epoch or since > channel.seq:
+            return None
+        if since == channel.seq:
+            return []
+        if not channel.buffer or channel.buffer[0][0] > since + 1:
+            return None
+        missed = [message for seq, message in channel.buffer if seq > since]
+        return missed if len(missed) < self.client_queue else None
+
+    async def _open(self, conversation_id: int) -> _Channel:
+        channel = self._channels.get(conversation_id)
+        if channel is None:
+            channel = self._channels[conversation_id] = _Channel(self.replay_frames)
+            channel.opening = asyncio.ensure_future(self._subscribe(conversation_id, channel))
+        try:
+            await asyncio.shield(channel.opening)
+        except Exception:
+            if self._channels.get(conversation_id) is channel:
+                del self._channels[conversation_id]
+            raise
+        if channel.linger is not None:
+            channel.linger.cancel()
+            channel.linger = None
+        return channel
+
+    async def _subscribe(self, conversation_id: int, channel: _Channel) -> None:
+        name = channel_name(conversation_id)
+        channel.unsubscribe = await self.pubsub.subscribe(name, partial(self._receive, channel))
+        # frames that raced the subscription are replayed against the current seq
+        channel.seq = await self.pubsub.current(name)
+        early, channel.early = channel.early, []
+        for seq, message in sorted(early, key = lambda item: item[0]):
+            self._receive(channel, seq, message)
+
+    def _receive(self, channel: _Channel, seq: int, message: dict) -> None:
+        if channel.seq is None:
+            channel.early.append((seq, message))
+            return
+        if seq <= channel.seq:
+            return
+        if seq != channel.seq + 1:
+            # frames went missing upstream: nobody here can trust their state any more
+            channel.buffer.clear()
+            for subscriber in channel.subscribers:
+                subscriber.put(RESET)
+            self.resets += len(channel.subscribers)
+            sync_resets.labels(reason = "gap").inc(len(channel.subscribers))
+
+        encoded = _dumps({"t": "d", "s": seq, "o": message.get("o"), "d": message["d"]})
+        channel.seq = seq
+        channel.buffer.append((seq, encoded))
+        for subscriber in list(channel.subscribers):
+            if not subscriber.put(encoded):
+                self.resets += 1
+                sync_resets.labels(reason = "slow_client").inc()
+
+    def _close(self, conversation_id: int, channel: _Channel) -> None:
+        if channel.subscribers or self._channels.get(conversation_id) is not channel:
+            return
+        del self._channels[conversation_id]
+        if channel.unsubscribe is not None:
+            channel.unsubscribe()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.pubsub).__name__,
+            "epoch": self.pubsub.epoch,
+            "channels": len(self._channels),
+            "clients": sum(len(channel.subscribers) for channel in self._channels.values()),
+            "deltas_received": self.received,
+            "deltas_published": self.published,
+            "frames": self.frames,
+            "resumes": self.resumes,
+            "resets": self.resets,
+            "failures": self.failures,
+            "pending": sum(len(outbox.deltas()) for runs in self._outboxes.values() for _, outbox in runs),
+        }
+
+sync_hub = SyncHub()
@@ -0,0 +1,331 @@
+"""
+streaming export/import of whole conversations (backups, moving a graph between databases).
+
+an archive is a short header followed by length-prefixed frames:
+
+    b"MGA" version:u8 codec:u8 compression:u8
+    (length:u32 big-endian, compressed payload)*
+
+each payload is one encoded list of up to ARCHIVE_CHUNK_ROWS records, in this order:
+
+    ["conversation", {"title": ..., "source_id": ...}]
+    ["node", id, node_type, x, y, type_data, prompt, response, is_stale, context_hash]   (many)
+    ["edge", source_id, target_id]                                                      (many)
+    ["closure", ancestor_id, descendant_id, depth]                                      (many)
+    ["end", {"nodes": n, "edges": n, "closure": n}]
+
+codec is msgpack when installed (JSON otherwise), compression zstd when installed (zlib
+otherwise); the header says which, so any reader with the same libraries can load it. rows are
+read with server-side cursors (yield_per) and written one frame at a time, so exporting holds one
+chunk in memory whatever the graph's size. a fork (storage/forks.py) exports as the plain
+conversation it shows, copies swapped in. imports insert in bulk per frame and remap ids as they
+go; only the old -> new id map grows with the graph. closure rows travel with the archive, so
+ancestry isn't recomputed on import.
+"""
+
+import json
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    import msgpack
+except ImportError:     # optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:     # optional dependency
+    zstandard = None
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from .content import CHANGED_NODES_KEY, content_values, resolve_text
+from .forks import conversation_chain
+from .models import Conversation, Edge, Node, NodeClosure, User
+
+MAGIC = b"MGA"
+VERSION = 1
+HEADER = struct.Struct(">3sBBB")
+FRAME_LENGTH = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+CODEC_MSGPACK, CODEC_JSON = ord("m"), ord("j")
+COMPRESSION_ZSTD, COMPRESSION_ZLIB = ord("z"), ord("d")
+
+
+class ArchiveError(Exception):
+    """
+    an archive that can't be read: not an archive, truncated, inconsistent, or written with a
+    codec/compression this process doesn't have
+    """
+
+
+@dataclass
+class ImportResult:
+    conversation_id: int
+    nodes: int = 0
+    edges: int = 0
+    closure: int = 0
+    node_ids: List[int] = field(default_factory = list)
+
+
+# --- frames ---------------------------------------------------------------------
+
+class _Codec:
+    """
+    encodes/decodes one frame payload with the codec and compression named in the header
+    """
+
+    def __init__(self, codec: int, compression: int):
+        if codec == CODEC_MSGPACK and msgpack is None:
+            raise ArchiveError("Archive is msgpack-encoded; install msgpack to read it")
+        if compression == COMPRESSION_ZSTD and zstandard is None:
+            raise ArchiveError("Archive is zstd-compressed; install zstandard to read it")
+        if codec not in (CODEC_MSGPACK, CODEC_JSON) or compression not in (COMPRESSION_ZSTD, COMPRESSION_ZLIB):
+            raise ArchiveError(f"Unknown archive encoding: codec={codec}, compression={compression}")
+        self.codec = codec
+        self.compression = compression
+        if compression == COMPRESSION_ZSTD:
+            self._compressor = zstandard.ZstdCompressor(level = settings.ARCHIVE_ZSTD_LEVEL)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    @classmethod
+    def best(cls) -> "_Codec":
+        return cls(
+            CODEC_MSGPACK if msgpack is not None else CODEC_JSON,
+            COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB,
+        )
+
+    def header(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, self.codec, self.compression)
+
+    def frame(self, records: List[list]) -> bytes:
+        if self.codec == CODEC_MSGPACK:
+            data = msgpack.packb(records, use_bin_type = True)
+        else:
+            data = json.dumps(records, separators = (",", ":")).encode("utf-8")
+        if self.compression == COMPRESSION_ZSTD:
+            data = self._compressor.compress(data)
+        else:
+            data = zlib.compress(data, 6)
+        return FRAME_LENGTH.pack(len(data)) + data
+
+    def records(self, payload: bytes) -> List[list]:
+        try:
+            if self.compression == COMPRESSION_ZSTD:
+                data = self._decompressor.decompress(payload)
+            else:
+                data = zlib.decompress(payload)
+            if self.codec == CODEC_MSGPACK:
+                return msgpack.unpackb(data, raw = False)
+            return json.loads(data)
+        except Exception as e:
+            raise ArchiveError(f"Corrupt archive frame: {e}") from e
+
+
+def _read_exactly(source: BinaryIO, size: int) -> bytes:
+    data = source.read(size)
+    while data is not None and len(data) < size:
+        more = source.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data or b""
+
+def read_records(source: BinaryIO) -> Iterator[list]:
+    """
+    the records of an archive, one frame in memory at a time
+    """
+    header = _read_exactly(source, HEADER.size)
+    if len(header) < HEADER.size or header[:3] != MAGIC:
+        raise ArchiveError("Not a conversation archive")
+    _, version, codec, compression = HEADER.unpack(header)
+    if version != VERSION:
+        raise ArchiveError(f"Unsupported archive version {version}")
+    codec = _Codec(codec, compression)
+
+    while True:
+        prefix = _read_exactly(source, FRAME_LENGTH.size)
+        if not prefix:
+            return
+        if len(prefix) < FRAME_LENGTH.size:
+            raise ArchiveError("Archive is truncated")
+        (length,) = FRAME_LENGTH.unpack(prefix)
+        if length > MAX_FRAME_BYTES:
+            raise ArchiveError(f"Archive frame too large: {length} bytes")
+        payload = _read_exactly(source, length)
+        if len(payload) < length:
+            raise ArchiveError("Archive is truncated")
+        yield from codec.records(payload)
+
+
+# --- export -----------------------------------------------------------------------
+
+def export_conversation(db: Session, conversation_id: int,
+                        chunk_rows: Optional[int] = None) -> Optional[Iterator[bytes]]:
+    """
+    the conversation as archive bytes (header, then one frame per chunk), or None if it doesn't
+    exist. rows are streamed from the database as the iterator is consumed
+    """
+    conversation = db.execute(
+        select(Conversation.id, Conversation.title).where(Conversation.id == conversation_id)
+    ).first()
+    if conversation is None:
+        return None
+    return _export(db, conversation, chunk_rows or settings.ARCHIVE_CHUNK_ROWS)
+
+def _export(db: Session, conversation, chunk_rows: int) -> Iterator[bytes]:
+    codec = _Codec.best()
+    chain = conversation_chain(db, conversation.id)
+    yield codec.header()
+    yield codec.frame([["conversation", {"title": conversation.title, "source_id": conversation.id}]])
+
+    counts = {"nodes": 0, "edges": 0, "closure": 0}
+    for kind, counted, rows in (
+        ("node", "nodes", _node_records(db, chain, chunk_rows)),
+        ("edge", "edges", _streamed(db, select(Edge.source_node_id, Edge.target_node_id)
+                                    .where(Edge.conversation_id.in_(chain)).order_by(Edge.id), chunk_rows)),
+        ("closure", "closure", _streamed(db, select(NodeClosure.ancestor_id, NodeClosure.descendant_id, NodeClosure.depth)
+                                         .where(NodeClosure.descendant_id.in_(_identities(chain))), chunk_rows)),
+    ):
+        chunk = []
+        for row in rows:
+            chunk.append([kind, *row])
+            if len(chunk) >= chunk_rows:
+                yield codec.frame(chunk)
+                counts[counted] += len(chunk)
+                chunk = []
+        if chunk:
+            yield codec.frame(chunk)
+            counts[counted] += len(chunk)
+
+    yield codec.frame([["end", counts]])
+
+def _streamed(db: Session, statement, chunk_rows: int) -> Iterator[tuple]:
+    # server-side cursor: rows arrive chunk_rows at a time instead of all at once
+    for row in db.execute(statement.execution_options(yield_per = chunk_rows)):
+        yield tuple(row)
+
+def _identities(chain: List[int]):
+    # the original rows; edges and closure rows only refer to these (a fork's copies have none)
+    return select(Node.id).where(Node.conversation_id.in_(chain), Node.base_node_id.is_(None))
+
+def _node_records(db: Session, chain: List[int], chunk_rows: int) -> Iterator[tuple]:
+    # a fork shows each node's nearest copy along its chain; every other row of it is hidden.
+    # what's hidden is bounded by what the fork changed, not by the size of its snapshot
+    hidden = set()
+    if len(chain) > 1:
+        rank = {conversation_id: depth for depth, conversation_id in enumerate(chain)}
+        nearest: Dict[int, tuple] = {}
+        for row_id, identity, owner in db.execute(
+            select(Node.id, Node.base_node_id, Node.conversation_id)
+            .where(Node.conversation_id.in_(chain[:-1]), Node.base_node_id.is_not(None))
+        ):
+            hidden.add(row_id)
+            if identity not in nearest or rank[owner] < rank[nearest[identity][1]]:
+                nearest[identity] = (row_id, owner)
+        hidden.update(nearest)
+        hidden.difference_update(row_id for row_id, _ in nearest.values())
+
+    statement = select(
+        Node.id, Node.base_node_id, Node.node_type, Node.position_x, Node.position_y, Node.type_data,
+        Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key,
+        Node.is_stale, Node.context_hash,
+    ).where(Node.conversation_id.in_(chain)).order_by(Node.id)
+
+    for row in _streamed(db, statement, chunk_rows):
+        (row_id, base_node_id, node_type, x, y, type_data,
+         prompt, prompt_key, response, response_key, is_stale, context_hash) = row
+        if row_id in hidden:
+            continue
+        yield (base_node_id or row_id, node_type, x, y, type_data or {},
+               resolve_text(prompt, prompt_key) or "", resolve_text(response, response_key),
+               bool(is_stale), context_hash)
+
+
+# --- import -----------------------------------------------------------------------
+
+def import_conversation(db: Session, source: BinaryIO, user_id: int,
+                        title: Optional[str] = None) -> ImportResult:
+    """
+    load an archive as a new conversation of user_id, in bulk inserts of one frame each.
+    large bodies are offloaded to the blob store as on any other write. raises ArchiveError for an
+    unreadable archive and LookupError for a missing user; the caller commits (or rolls back)
+    """
+    if db.get(User, user_id) is None:
+        raise LookupError(f"User with ID {user_id} not found")
+
+    records = read_records(source)
+    first = next(records, None)
+    if not first or first[0] != "conversation":
+        raise ArchiveError("Archive doesn't start with a conversation")
+
+    conversation = Conversation(user_id = user_id, title = (title or first[1].get("title") or "Imported conversation")[:255])
+    db.add(conversation)
+    db.flush()
+
+    result = ImportResult(conversation_id = conversation.id)
+    mapped: Dict[int, int] = {}
+    pending: List[list] = []
+    kind = None
+    for record in records:
+        if record[0] != kind or len(pending) >= settings.ARCHIVE_CHUNK_ROWS:
+            _flush(db, kind, pending, conversation.id, mapped, result)
+            pending, kind = [], record[0]
+        if kind == "end":
+            _check_end(record[1], result)
+            db.info.setdefault(CHANGED_NODES_KEY, set()).update(result.node_ids)
+            return result
+        pending.append(record)
+    raise ArchiveError("Archive is truncated")
+
+def _flush(db: Session, kind: Optional[str], records: List[list], conversation_id: int,
+           mapped: Dict[int, int], result: ImportResult) -> None:
+    if not records:
+        return
+    try:
+        if kind == "node":
+            rows = []
+            for _, _, node_type, x, y, type_data, prompt, response, is_stale, context_hash in records:
+                prompt_values = content_values("prompt", prompt or "")
+                response_values = content_values("response", response) if response is not None else {}
+                rows.append({
+                    "conversation_id": conversation_id, "node_type": node_type,
+                    "position_x": x, "position_y": y, "type_data": type_data,
+                    **prompt_values, **response_values,
+                    "is_large_content": bool(prompt_values["prompt_blob_key"] or response_values.get("response_blob_key")),
+                    "is_stale": is_stale, "context_hash": context_hash,
+                })
+            new_ids = db.scalars(insert(Node).returning(Node.id, sort_by_parameter_order = True), rows).all()
+            for record, new_id in zip(records, new_ids):
+                mapped[record[1]] = new_id
+            result.node_ids.extend(new_ids)
+            result.nodes += len(new_ids)
+        elif kind == "edge":
+            db.execute(insert(Edge), [
+                {"conversation_id": conversation_id, "source_node_id": mapped[source], "target_node_id": mapped[target]}
+                for _, source, target in records
+            ])
+            result.edges += len(records)
+        elif kind == "closure":
+            db.execute(insert(NodeClosure), [
+                {"ancestor_id": mapped[ancestor], "descendant_id": mapped[descendant], "depth": depth}
+                for _, ancestor, descendant, depth in records
+            ])
+            result.closure += len(records)
+        else:
+            raise ArchiveError(f"Unexpected archive record: {kind!r}")
+    except KeyError as e:
+        raise ArchiveError(f"Archive refers to node {e.args[0]} before (or without) exporting it") from e
+    except (TypeError, ValueError) as e:
+        raise ArchiveError(f"Malformed {kind} record: {e}") from e
+
+def _check_end(counts: dict, result: ImportResult) -> None:
+    expected = (counts.get("nodes"), counts.get("edges"), counts.get("closure"))
+    if expected != (result.nodes, result.edges, result.closure):
+        raise ArchiveError(f"Archive is incomplete: expected nodes/edges/closure {expected}, "
+                           f"read {(result.nodes, result.edges, result.closure)}")
@@ -0,0 +1,127 @@
+"""
+content-addressed blob storage for large node prompts/responses.
+
+blobs are keyed by the sha256 of their bytes, so identical content is stored once and a key
+doubles as a strong ETag. BlobStore is the backend interface; LocalBlobStore keeps blobs on
+the local filesystem and serves reads through mmap so range requests only touch the pages they need.
+blobs are shared between rows, so nothing deletes one on overwrite: storage/content.py sweep_blobs
+removes those no row references anymore.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from core.config import settings
+
+
+def blob_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(ABC):
+    """
+    backend interface. keys are sha256 hex digests of the content.
+    """
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        """store data and return its key. storing existing content only refreshes its modified time"""
+
+    @abstractmethod
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """bytes [start, end) of a blob; KeyError if it doesn't exist"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str, modified_before: Optional[float] = None) -> bool:
+        """delete a blob; with modified_before, only if it hasn't been written or re-put since. true if deleted"""
+
+    @abstractmethod
+    def keys(self) -> Iterator[Tuple[str, float]]:
+        """(key, last modified unix time) for every stored blob"""
+
+
+class LocalBlobStore(BlobStore):
+    """
+    blobs at <root>/<key[:2]>/<key[2:4]>/<key>, written atomically via rename.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def put(self, data: bytes) -> str:
+        key = blob_key(data)
+        path = self._path(key)
+
+        # dedup: same hash, same bytes. touching it starts the sweep's grace period over, so a
+        # re-reference that hasn't committed yet isn't swept as an old orphan
+        try:
+            os.utime(path)
+            return key
+        except FileNotFoundError:
+            pass
+
+        path.parent.mkdir(parents = True, exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = path.parent, prefix = ".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # atomic: concurrent writers of the same key race harmlessly
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return key
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise KeyError(key)
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:       # mmap can't map empty files
+                return b""
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+                return mapped[start:size if end is None else end]
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str, modified_before: Optional[float] = None) -> bool:
+        path = self._path(key)
+        try:
+            if modified_before is not None and path.stat().st_mtime > modified_before:
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def keys(self) -> Iterator[Tuple[str, float]]:
+        # in-flight writes are still .tmp- files
+        for path in self.root.glob("*/*/*"):
+            if not path.name.startswith(".tmp-"):
+                yield path.name, path.stat().st_mtime
+
+
+def create_blob_store(backend: str = None, path: str = None) -> BlobStore:
+    backend = backend or settings.BLOB_STORE_BACKEND
+    if backend == "local":
+        return LocalBlobStore(path or settings.BLOB_STORE_PATH)
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+
+blob_store = create_blob_store()
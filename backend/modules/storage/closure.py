@@ -0,0 +1,258 @@
+"""
+incremental maintenance of the NodeClosure table.
+
+every node has a depth-0 row to itself, so the closure of a new edge source -> target is just
+(ancestors-or-self of source) x (descendants-or-self of target). deletes recompute only the
+rows that enter the affected descendant set from outside it. ensure_closure_schema migrates a
+database from the ARRAY ancestor_ids era.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import delete, exists, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from .models import Edge, Node, NodeClosure
+
+# core-level table: skips ORM bulk-persistence overhead on the hot insert path
+closure_table = NodeClosure.__table__
+edges_table = Edge.__table__
+
+
+def ensure_closure_schema(bind) -> None:
+    """
+    migrate a nodes table from before the closure table: drop ancestor_ids (NOT NULL without a
+    default, so every insert would fail), give each node its depth-0 row and rebuild from edges
+    """
+    if "ancestor_ids" in {column["name"] for column in inspect(bind).get_columns("nodes")}:
+        with bind.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE nodes DROP COLUMN ancestor_ids")
+
+    with Session(bind) as db:
+        missing = db.execute(insert(closure_table).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(Node.id, Node.id, literal(0)).where(
+                ~exists().where(closure_table.c.ancestor_id == Node.id, closure_table.c.descendant_id == Node.id)
+            )
+        )).rowcount
+        # nodes without a self row predate the table: rows for their edges were never written
+        if missing:
+            rebuild_closure(db)
+        db.commit()
+
+def rebuild_closure(db: Session) -> None:
+    """
+    recompute every depth > 0 row from edges. edges are added in topological order of their
+    target, so each add_edge only crosses ancestors(source) with the target itself.
+    edges on a cycle (older data was never checked) stay out of the closure
+    """
+    db.execute(delete(closure_table).where(closure_table.c.depth > 0))
+    in_edges = db.execute(select(edges_table.c.source_node_id, edges_table.c.target_node_id)).all()
+
+    parents: Dict[int, List[int]] = {}
+    children: Dict[int, List[int]] = {}
+    in_degree: Dict[int, int] = {}
+    for source, target in in_edges:
+        parents.setdefault(target, []).append(source)
+        children.setdefault(source, []).append(target)
+        in_degree[target] = in_degree.get(target, 0) + 1
+        in_degree.setdefault(source, 0)
+
+    ready = [node_id for node_id, degree in in_degree.items() if degree == 0]
+    while ready:
+        node_id = ready.pop()
+        for parent in parents.get(node_id, ()):
+            add_edge(db, parent, node_id)
+        for child in children.get(node_id, ()):
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                ready.append(child)
+
+
+def add_node(db: Session, node_id: int) -> None:
+    db.execute(insert(closure_table), [{"ancestor_id": node_id, "descendant_id": node_id, "depth": 0}])
+
+def add_nodes(db: Session, node_ids: Iterable[int]) -> None:
+    rows = [{"ancestor_id": node_id, "descendant_id": node_id, "depth": 0} for node_id in node_ids]
+    if rows:
+        db.execute(insert(closure_table), rows)
+
+def ancestor_ids(db: Session, node_id: int) -> List[int]:
+    # nearest ancestors first
+    return list(db.scalars(
+        select(closure_table.c.ancestor_id)
+        .where(closure_table.c.descendant_id == node_id, closure_table.c.depth > 0)
+        .order_by(closure_table.c.depth, closure_table.c.ancestor_id)
+    ))
+
+def descendant_ids(db: Session, node_id: int) -> List[int]:
+    return list(db.scalars(
+        select(closure_table.c.descendant_id)
+        .where(closure_table.c.ancestor_id == node_id, closure_table.c.depth > 0)
+        .order_by(closure_table.c.depth, closure_table.c.descendant_id)
+    ))
+
+def would_create_cycle(db: Session, source_id: int, target_id: int) -> bool:
+    """
+    source -> target closes a cycle iff target already reaches source.
+    the depth-0 rows make self-loops fall out of the same lookup
+    """
+    return db.scalar(
+        select(closure_table.c.depth).where(
+            closure_table.c.ancestor_id == target_id,
+            closure_table.c.descendant_id == source_id
+        )
+    ) is not None
+
+def add_edge(db: Session, source_id: int, target_id: int) -> None:
+    """
+    extend the closure for a new edge. caller checks would_create_cycle first
+    """
+    ancestors = db.execute(
+        select(closure_table.c.ancestor_id, closure_table.c.depth).where(closure_table.c.descendant_id == source_id)
+    ).all()
+    descendants = db.execute(
+        select(closure_table.c.descendant_id, closure_table.c.depth).where(closure_table.c.ancestor_id == target_id)
+    ).all()
+
+    pairs: Dict[Tuple[int, int], int] = {
+        (ancestor_id, descendant_id): up + down + 1
+        for ancestor_id, up in ancestors
+        for descendant_id, down in descendants
+    }
+
+    # pairs already connected by another path only need a shorter depth
+    existing = db.execute(
+        select(closure_table.c.ancestor_id, closure_table.c.descendant_id, closure_table.c.depth).where(
+            closure_table.c.ancestor_id.in_([a for a, _ in ancestors]),
+            closure_table.c.descendant_id.in_([d for d, _ in descendants])
+        )
+    ).all()
+
+    shorter = []
+    for ancestor_id, descendant_id, depth in existing:
+        new_depth = pairs.pop((ancestor_id, descendant_id))
+        if new_depth < depth:
+            shorter.append({"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": new_depth})
+
+    if pairs:
+        db.execute(insert(closure_table), [
+            {"ancestor_id": a, "descendant_id": d, "depth": depth} for (a, d), depth in pairs.items()
+        ])
+
+    # bulk update by primary key
+    if shorter:
+        db.execute(update(NodeClosure), shorter)
+
+def remove_edge(db: Session, target_id: int) -> None:
+    """
+    repair the closure after an edge into target_id was deleted (edge row already gone)
+    """
+    remove_edges(db, [target_id])
+
+def remove_edges(db: Session, target_ids: Iterable[int]) -> None:
+    """
+    repair the closure after edges into target_ids were deleted, in one pass.
+    descendants are read from the not-yet-repaired closure: a superset, still closed under descendants
+    """
+    affected = set(db.scalars(
+        select(closure_table.c.descendant_id).where(closure_table.c.ancestor_id.in_(list(set(target_ids))))
+    ))
+    if affected:
+        rebuild_descendants(db, affected)
+
+def remove_node(db: Session, node_id: int) -> Set[int]:
+    """
+    drop a node's closure rows and repair its former descendants.
+    call before deleting the node row; returns the affected descendants
+    """
+    return remove_nodes(db, [node_id])
+
+def remove_nodes(db: Session, node_ids: Iterable[int]) -> Set[int]:
+    """
+    bulk variant of remove_node: deletes edges and closure rows touching node_ids
+    """
+    node_ids = list(set(node_ids))
+    affected = set(db.scalars(
+        select(closure_table.c.descendant_id).where(
+            closure_table.c.ancestor_id.in_(node_ids), closure_table.c.depth > 0
+        )
+    )) - set(node_ids)
+
+    db.execute(delete(edges_table).where(
+        edges_table.c.source_node_id.in_(node_ids) | edges_table.c.target_node_id.in_(node_ids)
+    ))
+    db.execute(delete(closure_table).where(
+        closure_table.c.ancestor_id.in_(node_ids) | closure_table.c.descendant_id.in_(node_ids)
+    ))
+
+    if affected:
+        rebuild_descendants(db, affected)
+    return affected
+
+def rebuild_descendants(db: Session, affected: Set[int]) -> None:
+    """
+    recompute closure rows (a, d) with d in `affected` and a outside it.
+
+    `affected` must be closed under descendants. rows inside the set can't change: every path
+    between two of its members stays inside it. so only paths entering from outside are rebuilt,
+    walking the set in topological order from the (unchanged) closure of outside parents.
+    """
+    affected_list = list(affected)
+
+    in_edges = db.execute(
+        select(edges_table.c.source_node_id, edges_table.c.target_node_id).where(edges_table.c.target_node_id.in_(affected_list))
+    ).all()
+
+    outside_parents = {source for source, _ in in_edges if source not in affected}
+    outside_closure: Dict[int, Dict[int, int]] = {parent: {} for parent in outside_parents}
+    if outside_parents:
+        for ancestor_id, descendant_id, depth in db.execute(
+            select(closure_table.c.ancestor_id, closure_table.c.descendant_id, closure_table.c.depth)
+            .where(closure_table.c.descendant_id.in_(list(outside_parents)))
+        ):
+            outside_closure[descendant_id][ancestor_id] = depth
+
+    parents: Dict[int, List[int]] = {node_id: [] for node_id in affected}
+    children: Dict[int, List[int]] = {node_id: [] for node_id in affected}
+    in_degree: Dict[int, int] = {node_id: 0 for node_id in affected}
+    for source, target in in_edges:
+        parents[target].append(source)
+        if source in affected:
+            children[source].append(target)
+            in_degree[target] += 1
+
+    # outside ancestors per affected node, with shortest depth
+    external: Dict[int, Dict[int, int]] = {}
+    ready = [node_id for node_id, degree in in_degree.items() if degree == 0]
+    heapq.heapify(ready)
+
+    while ready:
+        node_id = heapq.heappop(ready)
+        merged: Dict[int, int] = {}
+
+        for parent in parents[node_id]:
+            source = outside_closure[parent] if parent in outside_closure else external[parent]
+            for ancestor_id, depth in source.items():
+                if depth + 1 < merged.get(ancestor_id, 1 << 30):
+                    merged[ancestor_id] = depth + 1
+
+        external[node_id] = merged
+        for child in children[node_id]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                heapq.heappush(ready, child)
+
+    db.execute(delete(closure_table).where(
+        closure_table.c.descendant_id.in_(affected_list),
+        closure_table.c.ancestor_id.notin_(affected_list)
+    ))
+
+    rows = [
+        {"ancestor_id": ancestor_id, "descendant_id": node_id, "depth": depth}
+        for node_id, ancestors in external.items()
+        for ancestor_id, depth in ancestors.items()
+    ]
+    if rows:
+        db.execute(insert(closure_table), rows)
@@ -0,0 +1,198 @@
+"""
+shared read/write paths for node prompt/response content.
+
+bodies at least BLOB_THRESHOLD_BYTES long are offloaded to the blob store; the node row keeps
+the key and size. everything that reads or writes Node.prompt_text / Node.response_text goes
+through here so callers never see the difference. every write also invalidates the executed
+nodes downstream of it (storage/staleness.py; storage/forks.py for a fork's copies).
+
+blob reads and writes are plain file I/O. AsyncSession.run_sync runs these helpers on the event
+loop, so async callers split them: content_values / read_blob_refs in a worker thread, the
+database part (save_content, the loaders with read_blobs = False) through run_sync.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import false, inspect, or_, select, true, union, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from .blobstore import BlobStore, blob_store
+from .forks import mark_copy_descendants_stale
+from .models import Node
+from .staleness import mark_descendants_stale
+
+# session.info key: ids of nodes whose content the session wrote (read on commit by storage/search.py)
+CHANGED_NODES_KEY = "changed_node_content"
+
+SWEEP_BATCH = 500
+
+_CONTENT_COLUMNS = {
+    "prompt_blob_key": "VARCHAR(64)",
+    "response_blob_key": "VARCHAR(64)",
+    "prompt_size": "INTEGER",
+    "response_size": "INTEGER",
+}
+
+
+def ensure_content_schema(bind) -> None:
+    """
+    add the blob key / size columns to a nodes table created before they existed.
+    older rows keep NULL sizes; readers fall back to the inline text
+    """
+    columns = {column["name"] for column in inspect(bind).get_columns("nodes")}
+    with bind.begin() as connection:
+        for name, column_type in _CONTENT_COLUMNS.items():
+            if name not in columns:
+                connection.exec_driver_sql(f"ALTER TABLE nodes ADD COLUMN {name} {column_type}")
+
+
+def _columns(field: str):
+    return (
+        getattr(Node, f"{field}_text"),
+        getattr(Node, f"{field}_blob_key"),
+        getattr(Node, f"{field}_size"),
+    )
+
+def content_values(field: str, text: str, offload: bool = True) -> dict:
+    """
+    column values storing text as the given field, offloading it to the blob store if large.
+    usable in inserts (create paths) and updates alike.
+    """
+    data = text.encode("utf-8")
+    if offload and len(data) >= settings.BLOB_THRESHOLD_BYTES:
+        return {
+            f"{field}_text": "",
+            f"{field}_blob_key": blob_store.put(data),
+            f"{field}_size": len(data),
+        }
+    return {
+        f"{field}_text": text,
+        f"{field}_blob_key": None,
+        f"{field}_size": len(data),
+    }
+
+def save_content(db: Session, node_id: int, field: str, values: dict, mark_stale: bool = True) -> None:
+    """
+    write a field from content_values(), which async callers compute in a worker thread (it may write a blob)
+    """
+    other_key = _columns("response" if field == "prompt" else "prompt")[1]
+    offloaded = true() if values[f"{field}_blob_key"] else false()
+
+    written = db.execute(
+        update(Node).where(Node.id == node_id).values(
+            **values,
+            is_large_content = or_(other_key.is_not(None), offloaded),
+        ).returning(Node.conversation_id, Node.base_node_id)
+    ).first()
+    db.info.setdefault(CHANGED_NODES_KEY, set()).add(node_id)
+    if not mark_stale:
+        return
+    # a new prompt also outdates the node's own response until it is re-executed
+    if written is not None and written.base_node_id is not None:
+        # a fork's copy has no closure rows of its own; its descendants are the fork's view of the original's
+        mark_copy_descendants_stale(db, node_id, written.base_node_id, written.conversation_id,
+                                    include_self = field == "prompt")
+    else:
+        mark_descendants_stale(db, [node_id], include_self = field == "prompt")
+
+def save_prompt_text(db: Session, node_id: int, prompt_text: str, offload: bool = True) -> None:
+    save_content(db, node_id, "prompt", content_values("prompt", prompt_text, offload))
+
+def save_response_text(db: Session, node_id: int, response_text: str, offload: bool = True,
+                       mark_stale: bool = True) -> None:
+    # partial streaming checkpoints pass offload = False (keeps even a large body inline) and
+    # mark_stale = False: descendants are flagged once, by the final save
+    save_content(db, node_id, "response", content_values("response", response_text, offload), mark_stale)
+
+
+def resolve_text(text: Optional[str], blob_key: Optional[str]) -> Optional[str]:
+    """
+    the real body for a (*_text, *_blob_key) column pair
+    """
+    if blob_key:
+        return blob_store.read(blob_key).decode("utf-8")
+    return text
+
+def resolve_rows(rows) -> Dict[int, Tuple[str, str]]:
+    """
+    node_id -> (prompt, response) for (node_id, prompt_text, prompt_blob_key, response_text, response_blob_key)
+    rows, reading offloaded bodies
+    """
+    return {
+        node_id: (resolve_text(prompt, prompt_key) or "", resolve_text(response, response_key) or "")
+        for node_id, prompt, prompt_key, response, response_key in rows
+    }
+
+class BlobRef(NamedTuple):
+    """
+    an offloaded body left unread (read_blobs = False): read_blob_refs() swaps it for the text,
+    or for its first `chars` characters
+    """
+    key: str
+    chars: Optional[int] = None
+
+def text_or_ref(text: Optional[str], blob_key: Optional[str], read_blobs: bool = True):
+    return BlobRef(blob_key) if blob_key and not read_blobs else resolve_text(text, blob_key)
+
+def read_blob_ref(ref: BlobRef) -> str:
+    if ref.chars is None:
+        return blob_store.read(ref.key).decode("utf-8")
+    # a UTF-8 character is at most 4 bytes; drop any character cut off at the end
+    prefix = blob_store.read(ref.key, 0, ref.chars * 4)
+    return prefix.decode("utf-8", errors = "ignore")[:ref.chars]
+
+def read_blob_refs(values: dict) -> dict:
+    """
+    read every BlobRef among a dict's values, in place. returns the dict
+    """
+    for name, value in values.items():
+        if isinstance(value, BlobRef):
+            values[name] = read_blob_ref(value)
+    return values
+
+def load_text(db: Session, node_id: int, field: str) -> Optional[str]:
+    """
+    a single prompt or response body, selected on its own (the columns are deferred on Node).
+    None if the node doesn't exist; a node without a response yet reads as "".
+    """
+    text_column, key_column, _ = _columns(field)
+    row = db.execute(select(text_column, key_column).where(Node.id == node_id)).first()
+    if row is None:
+        return None
+    return resolve_text(*row) or ""
+
+def load_body_ref(db: Session, node_id: int, field: str):
+    """
+    (inline_text, blob_key, size) for a body without reading any blob, or None if the node doesn't exist.
+    lets the body endpoint serve byte ranges straight out of the blob store.
+    """
+    row = db.execute(select(*_columns(field)).where(Node.id == node_id)).first()
+    if row is None:
+        return None
+    return tuple(row)
+
+
+def sweep_blobs(db: Session, store: Optional[BlobStore] = None, grace_seconds: Optional[int] = None) -> List[str]:
+    """
+    delete stored blobs no node references. blobs written (or re-put) within grace_seconds are
+    kept: their row may belong to a transaction that hasn't committed yet. returns the deleted keys
+    """
+    store = store or blob_store
+    grace_seconds = settings.BLOB_SWEEP_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+
+    candidates = [key for key, modified in store.keys() if modified <= cutoff]
+    deleted = []
+    for start in range(0, len(candidates), SWEEP_BATCH):
+        batch = candidates[start:start + SWEEP_BATCH]
+        referenced = set(db.scalars(union(
+            select(Node.prompt_blob_key).where(Node.prompt_blob_key.in_(batch)),
+            select(Node.response_blob_key).where(Node.response_blob_key.in_(batch)),
+        )))
+        for key in batch:
+            # re-checked at delete time: a put since the listing makes the blob recent again
+            if key not in referenced and store.delete(key, modified_before = cutoff):
+                deleted.append(key)
+    return deleted
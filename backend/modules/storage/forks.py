@@ -0,0 +1,386 @@
+"""
+copy-on-write conversation forks and snapshots.
+
+a snapshot is a frozen conversation (is_snapshot): nothing in it changes again, so it can be shared.
+forking copies no nodes: the fork is a new Conversation pointing at its base (base_conversation_id).
+a snapshot is forked as it is. a live conversation is split first: its nodes and edges move (one
+UPDATE each) to a new snapshot, and the conversation becomes a fork of that snapshot itself. both
+branches stay writable, and the conversation keeps its id. a fork sees its own nodes plus everything
+along its chain of bases (fork, base, base's base, ...).
+
+the first write to an inherited node materializes a copy in the fork: a Node row whose base_node_id
+names the node it shadows (offloaded bodies stay shared through their blob keys). edges and closure
+rows only ever refer to the original ("identity") rows, so copies need no edges or ancestry of their
+own; readers swap each identity for its nearest copy along the chain. what a fork changed - its
+copies, new nodes and new edges - is read in O(nodes changed), independent of the size of its base.
+
+inherited topology is read-only inside a fork: new edges must point at nodes created in the fork,
+and inherited nodes and edges can't be removed. new subtrees can hang off any visible node.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import inspect, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from .models import Conversation, Edge, Node, NodeClosure
+from .staleness import has_response
+
+# columns a copy takes over from the row it shadows
+COPIED_COLUMNS = (
+    "node_type", "position_x", "position_y", "type_data",
+    "prompt_text", "prompt_blob_key", "prompt_size",
+    "response_text", "response_blob_key", "response_size",
+    "is_large_content", "context_hash", "is_stale",
+)
+
+
+class ForkError(Exception):
+    """
+    a write the fork model refuses (into a snapshot, or changing inherited topology),
+    or a node that isn't part of the conversation it was addressed through
+    """
+
+    def __init__(self, message: str, status_code: int = 409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass(frozen = True)
+class NodeRef:
+    id: int
+    conversation_id: int
+    identity: int           # the row edges and closure rows refer to (itself unless a copy)
+    frozen: bool            # its conversation is a snapshot
+
+    @property
+    def is_copy(self) -> bool:
+        return self.identity != self.id
+
+
+def ensure_fork_schema(bind) -> None:
+    """
+    add the fork columns to tables created before they existed
+    """
+    inspector = inspect(bind)
+    conversation_columns = {column["name"] for column in inspector.get_columns("conversations")}
+    node_columns = {column["name"] for column in inspector.get_columns("nodes")}
+    with bind.begin() as connection:
+        if "base_conversation_id" not in conversation_columns:
+            connection.exec_driver_sql(
+                "ALTER TABLE conversations ADD COLUMN base_conversation_id INTEGER "
+                "REFERENCES conversations(id) ON DELETE CASCADE"
+            )
+        if "is_snapshot" not in conversation_columns:
+            connection.exec_driver_sql("ALTER TABLE conversations ADD COLUMN is_snapshot BOOLEAN NOT NULL DEFAULT FALSE")
+        if "base_node_id" not in node_columns:
+            connection.exec_driver_sql("ALTER TABLE nodes ADD COLUMN base_node_id INTEGER REFERENCES nodes(id) ON DELETE CASCADE")
+            connection.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_node_base ON nodes (base_node_id, conversation_id)")
+
+
+def snapshot_error(conversation_id: int) -> ForkError:
+    return ForkError(f"Conversation {conversation_id} is a snapshot; fork it to make changes")
+
+
+def conversation_chain(db: Session, conversation_id: int) -> List[int]:
+    """
+    the conversation followed by its bases, nearest first. empty if it doesn't exist
+    """
+    chain: List[int] = []
+    current = conversation_id
+    while current is not None and current not in chain:
+        row = db.execute(select(Conversation.base_conversation_id).where(Conversation.id == current)).first()
+        if row is None:
+            break
+        chain.append(current)
+        current = row.base_conversation_id
+    return chain
+
+
+def fork_conversation(db: Session, conversation_id: int, title: Optional[str] = None) -> Optional[Conversation]:
+    """
+    start a fork of the conversation. None if it doesn't exist. a live conversation is split
+    first, so it stays writable: its fork and itself then share a new snapshot as their base
+    """
+    original = db.get(Conversation, conversation_id)
+    if original is None:
+        return None
+    base = original if original.is_snapshot else _split(db, original)
+    fork = Conversation(
+        user_id = original.user_id,
+        title = (title or f"{original.title} (fork)")[:255],
+        base_conversation_id = base.id,
+    )
+    db.add(fork)
+    db.flush()
+    return fork
+
+
+def _split(db: Session, conversation: Conversation) -> Conversation:
+    # move the conversation's rows to a new snapshot and make the conversation a fork of it
+    from .content import CHANGED_NODES_KEY     # content imports this module
+    snapshot = Conversation(
+        user_id = conversation.user_id,
+        title = f"{conversation.title} (snapshot)"[:255],
+        base_conversation_id = conversation.base_conversation_id,
+        is_snapshot = True,
+    )
+    db.add(snapshot)
+    db.flush()
+
+    moved = db.scalars(
+        update(Node).where(Node.conversation_id == conversation.id)
+        .values(conversation_id = snapshot.id).returning(Node.id)
+    ).all()
+    db.execute(update(Edge).where(Edge.conversation_id == conversation.id).values(conversation_id = snapshot.id))
+    conversation.base_conversation_id = snapshot.id
+    # the search index keeps each node's conversation
+    db.info.setdefault(CHANGED_NODES_KEY, set()).update(moved)
+    db.flush()
+    return snapshot
+
+
+def snapshot_conversation(db: Session, conversation_id: int) -> bool:
+    """
+    freeze the conversation as it is. False if it doesn't exist
+    """
+    result = db.execute(update(Conversation).where(Conversation.id == conversation_id).values(is_snapshot = True))
+    return result.rowcount > 0
+
+
+def frozen_conversations(db: Session, conversation_ids: Iterable[int]) -> Set[int]:
+    conversation_ids = list(conversation_ids)
+    if not conversation_ids:
+        return set()
+    return set(db.scalars(
+        select(Conversation.id).where(Conversation.id.in_(conversation_ids), Conversation.is_snapshot.is_(True))
+    ))
+
+
+def check_writable(db: Session, conversation_ids: Iterable[int]) -> None:
+    frozen = frozen_conversations(db, conversation_ids)
+    if frozen:
+        raise snapshot_error(min(frozen))
+
+
+def node_refs(db: Session, node_ids: Iterable[int]) -> Dict[int, NodeRef]:
+    node_ids = list(node_ids)
+    if not node_ids:
+        return {}
+    rows = db.execute(
+        select(Node.id, Node.conversation_id, Node.base_node_id, Conversation.is_snapshot)
+        .join(Conversation, Conversation.id == Node.conversation_id)
+        .where(Node.id.in_(node_ids))
+    )
+    return {
+        row.id: NodeRef(row.id, row.conversation_id, row.base_node_id or row.id, bool(row.is_snapshot))
+        for row in rows
+    }
+
+
+def check_new_edge(db: Session, source: NodeRef, target: NodeRef,
+                   chains: Optional[Dict[int, List[int]]] = None) -> None:
+    """
+    refuse an edge the fork model doesn't allow. inherited nodes keep the inputs they had in the
+    snapshot, so new edges end at nodes created in a live conversation; the source can be anything
+    that conversation sees. the edge is stored between identities, in the target's conversation.
+    chains caches conversation_chain across calls
+    """
+    if target.frozen:
+        raise snapshot_error(target.conversation_id)
+    if target.is_copy:
+        raise ForkError(f"Node {target.id} is inherited from a snapshot; new edges must end at nodes created in the fork")
+    if source.conversation_id == target.conversation_id:
+        return
+
+    chains = {} if chains is None else chains
+    if target.conversation_id not in chains:
+        chains[target.conversation_id] = conversation_chain(db, target.conversation_id)
+    chain = chains[target.conversation_id]
+    if len(chain) > 1 and source.conversation_id not in chain:
+        raise ForkError(f"Node {source.id} is not part of conversation {target.conversation_id}", 404)
+
+
+def _nearest(db: Session, chain: Sequence[int], identities: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    # identity -> (row id, owning conversation) of the nearest row along the chain
+    identities = list(identities)
+    if not identities:
+        return {}
+    rank = {conversation_id: index for index, conversation_id in enumerate(chain)}
+    best: Dict[int, Tuple[int, int, int]] = {}
+    for row_id, base_node_id, conversation_id in db.execute(
+        select(Node.id, Node.base_node_id, Node.conversation_id).where(
+            Node.conversation_id.in_(list(chain)),
+            or_(Node.id.in_(identities), Node.base_node_id.in_(identities)),
+        )
+    ):
+        identity = base_node_id or row_id
+        if identity not in best or rank[conversation_id] < best[identity][0]:
+            best[identity] = (rank[conversation_id], row_id, conversation_id)
+    return {identity: (row_id, owner) for identity, (_, row_id, owner) in best.items()}
+
+
+def visible_ids(db: Session, chain: Sequence[int], identities: Iterable[int]) -> Dict[int, int]:
+    """
+    identity -> the row the first conversation of the chain sees for it: its nearest copy, else the
+    identity itself. identities that aren't part of the chain are left out
+    """
+    return {identity: row_id for identity, (row_id, _) in _nearest(db, chain, identities).items()}
+
+
+def _copy(db: Session, conversation_id: int, sources: Dict[int, int], **values) -> Dict[int, int]:
+    # identity -> new copy in conversation_id of the given source rows
+    if not sources:
+        return {}
+    columns = [getattr(Node, name) for name in COPIED_COLUMNS]
+    by_id = {row.id: row for row in db.execute(select(Node.id, *columns).where(Node.id.in_(list(sources.values()))))}
+
+    order = list(sources.items())
+    rows = [
+        {
+            **{name: getattr(by_id[row_id], name) for name in COPIED_COLUMNS},
+            **values,
+            "conversation_id": conversation_id,
+            "base_node_id": identity,
+        }
+        for identity, row_id in order
+    ]
+    new_ids = db.scalars(insert(Node).returning(Node.id, sort_by_parameter_order = True), rows)
+    return {identity: new_id for (identity, _), new_id in zip(order, new_ids)}
+
+
+def materialize(db: Session, conversation_id: int, chain: Sequence[int], identities: Iterable[int],
+                **values) -> Dict[int, Tuple[int, int]]:
+    """
+    copy the inherited ones among identities into the fork. returns identity -> (row it shadowed,
+    new copy) for every node copied; nodes the fork already owns are left alone.
+    values override copied columns (e.g. is_stale = True)
+    """
+    nearest = _nearest(db, chain, identities)
+    inherited = {identity: row_id for identity, (row_id, owner) in nearest.items() if owner != conversation_id}
+    copies = _copy(db, conversation_id, inherited, **values)
+    return {identity: (inherited[identity], new_id) for identity, new_id in copies.items()}
+
+
+def writable_node(db: Session, node_id: int, conversation_id: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    (row to write, its conversation) for a write a request addresses to node_id, or None if the node
+    doesn't exist. nodes of live conversations are written in place. a node inherited from a snapshot
+    needs the fork it is being edited in (conversation_id) and is materialized there on first write;
+    later writes through the inherited id land on the same copy
+    """
+    ref = node_refs(db, [node_id]).get(node_id)
+    if ref is None:
+        return None
+    if not ref.frozen:
+        return ref.id, ref.conversation_id
+    if conversation_id is None or conversation_id == ref.conversation_id:
+        raise snapshot_error(ref.conversation_id)
+
+    chain = conversation_chain(db, conversation_id)
+    if not chain:
+        raise ForkError(f"Conversation {conversation_id} not found", 404)
+    if ref.conversation_id not in chain:
+        raise ForkError(f"Node {node_id} is not part of conversation {conversation_id}", 404)
+    check_writable(db, [conversation_id])
+
+    row_id, owner = _nearest(db, chain, [ref.identity])[ref.identity]
+    if owner != conversation_id:
+        row_id = _copy(db, conversation_id, {ref.identity: row_id})[ref.identity]
+    return row_id, conversation_id
+
+
+def materialize_subgraph(db: Session, conversation_id: int, root_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    the fork's writable rows for roots and everything below them, materializing inherited ones:
+    identity -> row in conversation_id. for whole-graph runs, which rewrite every node they reach
+    """
+    chain = conversation_chain(db, conversation_id)
+    if not chain:
+        raise ForkError(f"Conversation {conversation_id} not found", 404)
+    check_writable(db, [conversation_id])
+
+    root_ids = list(root_ids)
+    refs = node_refs(db, root_ids)
+    for root_id in root_ids:
+        if root_id not in refs or refs[root_id].conversation_id not in chain:
+            raise ForkError(f"Node {root_id} is not part of conversation {conversation_id}", 404)
+
+    below = set(db.scalars(
+        select(NodeClosure.descendant_id).where(NodeClosure.ancestor_id.in_({ref.identity for ref in refs.values()}))
+    ))
+    nearest = _nearest(db, chain, below)
+    rows = {identity: row_id for identity, (row_id, owner) in nearest.items() if owner == conversation_id}
+    rows.update(_copy(db, conversation_id, {
+        identity: row_id for identity, (row_id, owner) in nearest.items() if owner != conversation_id
+    }))
+    return rows
+
+
+def mark_copy_descendants_stale(db: Session, node_id: int, identity: int, conversation_id: int,
+                                include_self: bool = False) -> int:
+    """
+    staleness.mark_descendants_stale for a write to a fork's copy: flags the executed nodes below its
+    identity as the fork sees them. inherited ones are materialized to carry the flag. returns rows flagged
+    """
+    chain = conversation_chain(db, conversation_id)
+    below = db.scalars(
+        select(NodeClosure.descendant_id).where(NodeClosure.ancestor_id == identity, NodeClosure.depth > 0)
+    )
+    nearest = _nearest(db, chain, below)
+
+    # only executed, not yet flagged nodes have anything to invalidate
+    candidates = {row_id: identity for identity, (row_id, _) in nearest.items()}
+    if include_self:
+        candidates[node_id] = identity
+    flagged = set(db.scalars(
+        select(Node.id).where(Node.id.in_(list(candidates)), Node.is_stale.is_(False), has_response())
+    ))
+
+    owned = [row_id for row_id in flagged if row_id == node_id or nearest[candidates[row_id]][1] == conversation_id]
+    if owned:
+        db.execute(
+            update(Node).where(Node.id.in_(owned)).values(is_stale = True)
+            .execution_options(synchronize_session = False)
+        )
+    inherited = {candidates[row_id]: row_id for row_id in flagged - set(owned)}
+    _copy(db, conversation_id, inherited, is_stale = True)
+    return len(flagged)
+
+
+def fork_ancestors(db: Session, node_id: int) -> Optional[Tuple[list, list]]:
+    """
+    context inputs for a node in a fork: ([(identity, prompt_text, prompt_blob_key, response_text,
+    response_blob_key)] for its ancestors as the fork sees them, [(source, target)] among them).
+    None for a node outside any fork, whose ancestors are simply its closure rows
+    """
+    row = db.execute(
+        select(Node.conversation_id, Node.base_node_id, Conversation.base_conversation_id)
+        .join(Conversation, Conversation.id == Node.conversation_id)
+        .where(Node.id == node_id)
+    ).first()
+    if row is None or row.base_conversation_id is None:
+        return None
+
+    chain = conversation_chain(db, row.conversation_id)
+    ancestor_ids = list(db.scalars(
+        select(NodeClosure.ancestor_id).where(
+            NodeClosure.descendant_id == (row.base_node_id or node_id), NodeClosure.depth > 0
+        )
+    ))
+    visible = visible_ids(db, chain, ancestor_ids)
+    if not visible:
+        return [], []
+
+    identity_of = {row_id: identity for identity, row_id in visible.items()}
+    rows = [
+        (identity_of[row_id], *texts) for row_id, *texts in db.execute(
+            select(Node.id, Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key)
+            .where(Node.id.in_(list(identity_of)))
+        )
+    ]
+    edges = db.execute(
+        select(Edge.source_node_id, Edge.target_node_id).where(Edge.target_node_id.in_(list(visible)))
+    ).all()
+    return rows, edges
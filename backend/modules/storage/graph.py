@@ -0,0 +1,225 @@
+"""
+conversation graph loader.
+reads nodes and edges as plain rows (no ORM hydration, no lazy relationships), after a primary-key
+lookup of the conversation, in two queries:
+    1. a keyset page of nodes: WHERE conversation_id = ? AND id > cursor [AND inside bbox] ORDER BY id LIMIT n
+    2. the edges pointing into that page, narrowed by ix_edge_conversation
+every edge is returned exactly once across pages, on the page holding its target node.
+forks (storage/forks.py) read the same way across their chain of bases plus one query for their copies.
+preview mode swaps the prompt/response bodies for their byte length and a short prefix, computed in SQL
+(or read from the head of the blob for offloaded bodies). with read_blobs = False offloaded bodies come
+back as BlobRefs, for async callers to read with read_page_blobs in a worker thread.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from .content import BlobRef, read_blob_refs, text_or_ref
+from .forks import conversation_chain
+from .models import Conversation, Node, Edge
+
+BBox = Tuple[int, int, int, int]   # (min_x, min_y, max_x, max_y), inclusive
+
+
+def _preview_columns(preview_chars: int) -> list:
+    columns = []
+    for field in ("prompt", "response"):
+        text = getattr(Node, f"{field}_text")
+        columns += [
+            # byte sizes are recorded by storage/content.py; older rows fall back to length()
+            func.coalesce(getattr(Node, f"{field}_size"), func.length(text), 0).label(f"{field}_length"),
+            func.substr(text, 1, preview_chars).label(f"{field}_preview"),
+            getattr(Node, f"{field}_blob_key"),
+        ]
+    return columns
+
+def _node_dict(row, preview_chars: Optional[int]) -> dict:
+    node = {
+        "id": str(row.id),
+        "node_type": row.node_type,
+        "position": {"x": row.position_x, "y": row.position_y},
+        "type_data": row.type_data,
+        "is_stale": row.is_stale,
+    }
+    if preview_chars is None:
+        node["prompt"] = text_or_ref(row.prompt_text, row.prompt_blob_key, read_blobs = False)
+        node["response"] = text_or_ref(row.response_text, row.response_blob_key, read_blobs = False)
+        return node
+
+    for field in ("prompt", "response"):
+        blob_key = getattr(row, f"{field}_blob_key")
+        preview = getattr(row, f"{field}_preview")
+        node[f"{field}_preview"] = BlobRef(blob_key, preview_chars) if blob_key else preview
+        node[f"{field}_length"] = getattr(row, f"{field}_length")   # UTF-8 bytes
+    return node
+
+def read_page_blobs(page: Optional[dict]) -> Optional[dict]:
+    """
+    read the offloaded bodies / previews a page or change set was loaded without. returns the page
+    """
+    for node in page["nodes"] if page is not None else ():
+        read_blob_refs(node)
+    return page
+
+
+def load_graph_page(db: Session, conversation_id: int, cursor: Optional[int] = None,
+                    limit: int = 1000, bbox: Optional[BBox] = None,
+                    preview_chars: Optional[int] = None, read_blobs: bool = True) -> Optional[dict]:
+    """
+    one page of a conversation graph as a JSON-ready dict, or None if the conversation doesn't exist.
+    with preview_chars set, nodes carry {prompt,response}_{preview,length} instead of full bodies.
+    a fork's page holds its own nodes plus everything it inherits, with its copies swapped in.
+    """
+    conversation = db.execute(
+        select(Conversation.base_conversation_id).where(Conversation.id == conversation_id)
+    ).first()
+    if conversation is None:
+        return None
+    chain = [conversation_id]
+    if conversation.base_conversation_id is not None:
+        chain += conversation_chain(db, conversation.base_conversation_id)
+    forked = len(chain) > 1
+
+    columns = _node_columns(preview_chars)
+    query = select(*columns)
+    if forked:
+        # inherited nodes are keyed by their original; the fork's copies replace them below
+        query = query.where(Node.conversation_id.in_(chain), Node.base_node_id.is_(None))
+    else:
+        query = query.where(Node.conversation_id == conversation_id)
+
+    if cursor is not None:
+        query = query.where(Node.id > cursor)
+    if bbox is not None:
+        min_x, min_y, max_x, max_y = bbox
+        inside = and_(
+            Node.position_x.between(min_x, max_x),
+            Node.position_y.between(min_y, max_y),
+        )
+        if forked:
+            # a copy may sit somewhere else than its original: those are checked after the swap
+            inside = or_(inside, Node.id.in_(
+                select(Node.base_node_id).where(Node.conversation_id.in_(chain[:-1]), Node.base_node_id.is_not(None))
+            ))
+        query = query.where(inside)
+
+    # fetch one extra row to learn whether another page exists
+    rows = db.execute(query.order_by(Node.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page_ids = [row.id for row in rows]
+    edges = []
+    if page_ids:
+        edge_query = select(Edge.id, Edge.source_node_id, Edge.target_node_id) \
+            .where(Edge.conversation_id.in_(chain) if forked else Edge.conversation_id == conversation_id)
+
+        # a complete, unfiltered graph needs no target filter
+        if cursor is not None or has_more or bbox is not None:
+            edge_query = edge_query.where(Edge.target_node_id.in_(page_ids))
+
+        edges = [tuple(edge) for edge in db.execute(edge_query.order_by(Edge.id))]
+
+    if forked:
+        rows, edges = _swap_copies(db, chain, columns, rows, edges, bbox)
+
+    page = {
+        "conversation_id": str(conversation_id),
+        "nodes": [_node_dict(row, preview_chars) for row in rows],
+        "edges": [
+            {"id": str(edge_id), "source": str(source), "target": str(target)}
+            for edge_id, source, target in edges
+        ],
+        "next_cursor": str(page_ids[-1]) if has_more else None,
+        "has_more": has_more,
+    }
+    return read_page_blobs(page) if read_blobs else page
+
+def _node_columns(preview_chars: Optional[int]) -> list:
+    if preview_chars is not None:
+        content = _preview_columns(preview_chars)
+    else:
+        content = [Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key]
+    return [Node.id, Node.node_type, Node.position_x, Node.position_y, Node.type_data, Node.is_stale, *content]
+
+def _nearest_rows(chain: List[int], rows) -> Dict[int, object]:
+    # identity -> the row nearest the start of the chain, for rows selected with base_node_id + conversation_id
+    rank = {conversation_id: index for index, conversation_id in enumerate(chain)}
+    nearest = {}
+    for row in rows:
+        identity = row.base_node_id or row.id
+        current = nearest.get(identity)
+        if current is None or rank[row.conversation_id] < rank[current.conversation_id]:
+            nearest[identity] = row
+    return nearest
+
+def _swap_copies(db: Session, chain: List[int], columns: list, rows: list, edges: list,
+                 bbox: Optional[BBox]) -> Tuple[list, list]:
+    identities = {row.id for row in rows} | {source for _, source, _ in edges}
+    copies = _nearest_rows(chain, db.execute(
+        select(Node.base_node_id, Node.conversation_id, *columns)
+        .where(Node.conversation_id.in_(chain[:-1]), Node.base_node_id.in_(identities))
+    ))
+
+    swapped = [(row.id, copies.get(row.id, row)) for row in rows]
+    if bbox is not None:
+        min_x, min_y, max_x, max_y = bbox
+        swapped = [
+            (identity, row) for identity, row in swapped
+            if min_x <= row.position_x <= max_x and min_y <= row.position_y <= max_y
+        ]
+        kept = {identity for identity, _ in swapped}
+        edges = [edge for edge in edges if edge[2] in kept]
+    rows = [row for _, row in swapped]
+
+    visible = {identity: copy.id for identity, copy in copies.items()}
+    return rows, [
+        (edge_id, visible.get(source, source), visible.get(target, target)) for edge_id, source, target in edges
+    ]
+
+
+def load_fork_changes(db: Session, conversation_id: int, preview_chars: Optional[int] = None,
+                      read_blobs: bool = True) -> Optional[dict]:
+    """
+    what a fork changed relative to the snapshot at the root of its chain, or None if the conversation
+    doesn't exist: the nodes created or copied along the chain (nearest copy wins; copies name the
+    snapshot node they replace) and the edges added. costs O(changes), whatever the snapshot's size;
+    the snapshot itself never changes, so a client can keep it and apply these on top.
+    """
+    chain = conversation_chain(db, conversation_id)
+    if not chain:
+        return None
+    own = chain[:-1]
+
+    nodes, edges = [], []
+    if own:
+        rows = db.execute(
+            select(Node.base_node_id, Node.conversation_id, *_node_columns(preview_chars))
+            .where(Node.conversation_id.in_(own)).order_by(Node.id)
+        ).all()
+        created = {row.id for row in rows if row.base_node_id is None}
+        nearest = _nearest_rows(chain, rows)
+        for identity, row in sorted(nearest.items()):
+            node = _node_dict(row, preview_chars)
+            if identity not in created:
+                node["replaces"] = str(identity)
+            nodes.append(node)
+
+        visible = {identity: row.id for identity, row in nearest.items()}
+        edges = [
+            {"id": str(edge_id), "source": str(visible.get(source, source)), "target": str(visible.get(target, target))}
+            for edge_id, source, target in db.execute(
+                select(Edge.id, Edge.source_node_id, Edge.target_node_id)
+                .where(Edge.conversation_id.in_(own)).order_by(Edge.id)
+            )
+        ]
+
+    changes = {
+        "conversation_id": str(conversation_id),
+        "snapshot_id": str(chain[-1]),
+        "nodes": nodes,
+        "edges": edges,
+    }
+    return read_page_blobs(changes) if read_blobs else changes
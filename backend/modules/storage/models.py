@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, ARRAY, Boolean, Index
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index, JSON
 from sqlalchemy.dialects.postgresql.json import JSONB
-from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func, false
+from sqlalchemy.orm import relationship, deferred
 from core.database import Base
 
 class User(Base):
@@ -41,6 +41,11 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone = True), server_default=func.now())
     updated_at = Column(DateTime(timezone = True), onupdate = func.now())
 
+    # forks (storage/forks.py): the conversation this one was forked from, and whether this one is
+    # a frozen snapshot (split off when its conversation was forked, or snapshotted directly)
+    base_conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete = "CASCADE"), nullable = True)
+    is_snapshot = Column(Boolean, default = False, server_default = false(), nullable = False)
+
     # setup relationships
     owner = relationship("User", back_populates="conversations")
     nodes = relationship("Node", back_populates="conversation", cascade="all, delete-orphan")
@@ -60,23 +65,51 @@ class Node(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete = "CASCADE"), nullable = False)
 
     created_at = Column(DateTime(timezone = True), server_default = func.now())
-    ancestor_ids = Column(ARRAY(Integer), default = [], nullable = False)       # for performance optimization
+    # ancestry lives in NodeClosure
+
+    # frontend temp ID the node was created under. backs llm/id_mapper.py and makes creates idempotent
+    client_id = Column(String(64), nullable = True, unique = True)
 
     # for various node types ('prompt', 'document', 'img') TODO: post-MVP
     node_type = Column(String(15), nullable = False)    # 'prompt', 'document', etc (TODO: implement later, only text for now)
     position_x = Column(Integer, nullable = False)
     position_y = Column(Integer, nullable = False)
 
-        
-    prompt_text = Column(Text, nullable = False)
-    response_text = Column(Text, nullable = True)
+
+    # deferred: graph operations (edges, moves, deletes) never read the bodies,
+    # so db.query(Node) only pulls them in on first attribute access
+    prompt_text = deferred(Column(Text, nullable = False))
+    response_text = deferred(Column(Text, nullable = True))
+
+    # bodies over BLOB_THRESHOLD_BYTES live in the blob store (storage/blobstore.py); the row keeps
+    # only the content key and byte size, and the *_text column is left empty.
+    # read/write through storage/content.py rather than the columns directly.
     is_large_content = Column(Boolean, default = False)
-    # if this is True, then we simply store a key to GCS or S3 as the prompt text(TODO: post-MVP)
-    type_data = Column(JSONB, default = {}, nullable = False)
+    prompt_blob_key = Column(String(64), nullable = True)
+    response_blob_key = Column(String(64), nullable = True)
+    prompt_size = Column(Integer, nullable = True)      # UTF-8 bytes
+    response_size = Column(Integer, nullable = True)
+    type_data = Column(JSON().with_variant(JSONB(), "postgresql"), default = {}, nullable = False)
+
+    # request key the response was generated from, and whether an upstream change has
+    # invalidated it since (storage/staleness.py)
+    context_hash = Column(String(64), nullable = True)
+    is_stale = Column(Boolean, default = False, server_default = false(), nullable = False)
+
+    # set on a fork's copy of an inherited node: the node it shadows (storage/forks.py).
+    # edges and closure rows only ever refer to the original
+    base_node_id = Column(Integer, ForeignKey("nodes.id", ondelete = "CASCADE"), nullable = True)
 
     # each node has one conversation
     conversation = relationship("Conversation", back_populates="nodes")
 
+    __table_args__ = (
+        # keyset pagination of a conversation's nodes (storage/graph.py)
+        Index('ix_node_conversation_id', 'conversation_id', 'id'),
+        # a fork's copies by the node they shadow; at most one copy per node per fork
+        Index('ix_node_base', 'base_node_id', 'conversation_id', unique = True),
+    )
+
 
 class Edge(Base):
     """
@@ -99,4 +132,47 @@ class Edge(Base):
         Index('ix_edge_conversation', 'conversation_id')
     )
 
-# TODO: consider using a closure table for faster ancestor lookups (graphDB only useful for 100k nodes, and will be just for fun)
\ No newline at end of file
+
+class NodeClosure(Base):
+    """
+    transitive closure of the node DAG, maintained incrementally (see storage/closure.py).
+    one row per (ancestor, descendant) pair plus a depth-0 row for every node.
+    ancestor and descendant lookups are single index scans.
+    """
+
+    __tablename__ = "node_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("nodes.id", ondelete = "CASCADE"), primary_key = True)
+    descendant_id = Column(Integer, ForeignKey("nodes.id", ondelete = "CASCADE"), primary_key = True)
+    depth = Column(Integer, nullable = False)      # shortest path length
+
+    __table_args__ = (
+        # primary key covers (ancestor -> descendants); this covers (descendant -> ancestors)
+        Index('ix_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+class LLMCacheEntry(Base):
+    """
+    persistent tier of the LLM response cache (see llm/cache.py).
+    keyed by a hash of the full request: model, assembled contents, generation config.
+    """
+
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key = True)
+    model = Column(String(100), nullable = False)
+    response_text = Column(Text, nullable = False)
+
+    created_at = Column(DateTime(timezone = True), nullable = False, index = True)
+    expires_at = Column(DateTime(timezone = True), nullable = False, index = True)
+
+
+class PubSubSequence(Base):
+    """
+    last message number per pub/sub channel, for the postgres graph-sync backend (see llm/pubsub.py)
+    """
+
+    __tablename__ = "pubsub_sequences"
+
+    channel = Column(String(128), primary_key = True)
+    seq = Column(BigInteger, nullable = False)
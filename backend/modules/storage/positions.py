@@ -0,0 +1,60 @@
+"""
+bulk node position writes
+"""
+
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import Integer, bindparam, column, select, update, values
+from sqlalchemy.orm import Session
+
+from .models import Conversation, Node
+
+nodes_table = Node.__table__
+
+
+def bulk_update_positions(db: Session, positions: Dict[int, Tuple[int, int]]) -> Set[int]:
+    """
+    write many node positions in one statement. returns the ids that exist (and were updated).
+
+    postgres gets UPDATE ... FROM (VALUES ...); other dialects (sqlite in tests) fall back to an
+    executemany over the same rows since they can't alias a VALUES list with column names.
+    only the position columns are touched, so type_data and the text columns aren't rewritten.
+    nodes of snapshots (storage/forks.py) never move and count as not found; a fork moves its copy.
+    """
+    if not positions:
+        return set()
+
+    live = nodes_table.c.conversation_id.in_(select(Conversation.id).where(Conversation.is_snapshot.is_(False)))
+
+    if db.get_bind().dialect.name == "postgresql":
+        data = values(
+            column("id", Integer), column("x", Integer), column("y", Integer), name = "v"
+        ).data([(node_id, x, y) for node_id, (x, y) in positions.items()])
+
+        return set(db.scalars(
+            update(nodes_table)
+            .where(nodes_table.c.id == data.c.id, live)
+            .values(position_x = data.c.x, position_y = data.c.y)
+            .returning(nodes_table.c.id)
+        ))
+
+    found = set(db.scalars(select(nodes_table.c.id).where(nodes_table.c.id.in_(list(positions)), live)))
+    if found:
+        db.execute(
+            update(nodes_table)
+            .where(nodes_table.c.id == bindparam("node_id"))
+            .values(position_x = bindparam("x"), position_y = bindparam("y")),
+            [{"node_id": node_id, "x": positions[node_id][0], "y": positions[node_id][1]} for node_id in found]
+        )
+    return found
+
+def conversation_ids(db: Session, node_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    node id -> conversation id, for announcing moves to the right conversation
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return {}
+    return dict(db.execute(
+        select(nodes_table.c.id, nodes_table.c.conversation_id).where(nodes_table.c.id.in_(node_ids))
+    ).all())
@@ -0,0 +1,525 @@
+"""
+full-text search over node prompts and responses, ranked, highlighted and scoped by
+conversation or user.
+
+- postgres: a stored generated tsvector column on nodes (prompt weighted A, response B) behind a
+  GIN index, created with the table or by ensure_search_schema() on an existing database. queries
+  go through websearch_to_tsquery, rank with ts_rank_cd and highlight with ts_headline, which only
+  runs for the page being returned. bodies offloaded to the blob store aren't in the column.
+- everything else (sqlite in tests and local runs): InvertedIndex, an in-process BM25 index built
+  from the nodes table on the first search and refreshed from committed content writes
+  (storage/content.py records which nodes a session changed). request handlers go through
+  search_nodes_async, which reads rows a page at a time through the async session and does the
+  blob reads, tokenizing and scoring in worker threads.
+
+both return the same hit shape: node and conversation ids, a rank, and per field a snippet plus
+the [start, end) offsets of the matched terms inside it, so clients never render markup from content.
+"""
+
+import asyncio
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import DDL, event, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from .content import CHANGED_NODES_KEY, resolve_rows, resolve_text
+from .models import Conversation, Node
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or that the this to was were "
+    "what when where which who will with you your".split()
+)
+
+# ts_headline markers, swapped for offsets before anything leaves this module
+_START, _STOP = "\x02", "\x03"
+
+# rows per query while (re)building the in-process index
+LOAD_PAGE = 5000
+
+# InvertedIndex._claim: nothing to load
+_UP_TO_DATE = object()
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+# postgres schema
+
+_SEARCH_DDL = (
+    "ALTER TABLE nodes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    " setweight(to_tsvector('{language}', coalesce(prompt_text, '')), 'A') ||"
+    " setweight(to_tsvector('{language}', coalesce(response_text, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_node_search_vector ON nodes USING GIN (search_vector)",
+)
+
+for statement in _SEARCH_DDL:
+    event.listen(
+        Node.__table__, "after_create",
+        DDL(statement.format(language = settings.SEARCH_LANGUAGE)).execute_if(dialect = "postgresql"),
+    )
+
+def ensure_search_schema(bind) -> None:
+    """
+    add the search column + index to an existing postgres nodes table (no-op elsewhere)
+    """
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as connection:
+        for statement in _SEARCH_DDL:
+            connection.exec_driver_sql(statement.format(language = settings.SEARCH_LANGUAGE))
+
+
+# snippets
+
+def _marked_snippet(marked: str) -> dict:
+    # ts_headline output -> plain text + highlight offsets
+    text, highlights, start = [], [], None
+    length = 0
+    for part in re.split(f"([{_START}{_STOP}])", marked):
+        if part == _START:
+            start = length
+        elif part == _STOP:
+            if start is not None:
+                highlights.append([start, length])
+            start = None
+        else:
+            text.append(part)
+            length += len(part)
+    return {"text": "".join(text), "highlights": highlights}
+
+def snippet(text: str, terms: Set[str], width: Optional[int] = None) -> dict:
+    """
+    a window of `width` characters around the first matched term, with every match in it
+    """
+    width = width or settings.SEARCH_SNIPPET_CHARS
+    matches = [m for m in _TOKEN.finditer(text) if m.group().lower() in terms]
+    if not matches:
+        return {"text": text[:width], "highlights": []}
+
+    start = max(matches[0].start() - width // 4, 0)
+    end = min(start + width, len(text))
+    start = max(min(start, end - width), 0)
+    highlights = [[m.start() - start, m.end() - start] for m in matches if m.start() >= start and m.end() <= end]
+    return {"text": text[start:end], "highlights": highlights}
+
+
+# in-process fallback
+
+class InvertedIndex:
+    """
+    BM25 over node prompt + response. documents are append-only: re-indexing a node tombstones its
+    old document, and postings are rebuilt once tombstones outnumber live documents.
+    postings are numpy arrays per term, so scoring a query is a few vectorized passes.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.dirty: Set[int] = set()
+        self._building: Optional[asyncio.Future] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # per document: (node_id, conversation_id, user_id), token count, live flag. grown by doubling
+        self._count = 0
+        self._ids = np.full((1024, 3), -1, np.int64)
+        self._lengths = np.zeros(1024, np.float32)
+        self._alive = np.zeros(1024, bool)
+        self._doc_of: Dict[int, int] = {}
+        self._total_length = 0
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_of)
+
+    # writes
+
+    def add(self, node_id: int, conversation_id: int, user_id: int, text: str) -> None:
+        tokens = tokenize(text)
+        with self._lock:
+            self._remove(node_id)
+            if self._count == len(self._alive):
+                self._ids = np.concatenate([self._ids, np.full_like(self._ids, -1)])
+                self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+                self._alive = np.concatenate([self._alive, np.zeros_like(self._alive)])
+
+            doc = self._count
+            self._count += 1
+            self._ids[doc] = (node_id, conversation_id, user_id)
+            self._lengths[doc] = len(tokens)
+            self._alive[doc] = True
+            self._doc_of[node_id] = doc
+            self._total_length += len(tokens)
+
+            for term, count in Counter(tokens).items():
+                docs, counts = self._pending.setdefault(term, ([], []))
+                docs.append(doc)
+                counts.append(count)
+
+    def remove(self, node_ids: Iterable[int]) -> None:
+        with self._lock:
+            for node_id in node_ids:
+                self._remove(node_id)
+
+    def _remove(self, node_id: int) -> None:
+        doc = self._doc_of.pop(node_id, None)
+        if doc is None:
+            return
+        self._alive[doc] = False
+        self._total_length -= int(self._lengths[doc])
+        if self._count > 1024 and len(self._doc_of) < self._count / 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        # drop tombstoned documents and renumber the rest
+        alive = self._alive[:self._count]
+        renumber = np.cumsum(alive) - 1
+        for term in set(self._postings) | set(self._pending):
+            docs, counts = self._term(term)
+            keep = alive[docs]
+            if keep.any():
+                self._postings[term] = (renumber[docs[keep]], counts[keep])
+            else:
+                del self._postings[term]
+
+        live = np.flatnonzero(alive)
+        capacity = max(1024, 2 * len(live))
+        ids, lengths = self._ids[live], self._lengths[live]
+        self._ids = np.full((capacity, 3), -1, np.int64)
+        self._lengths = np.zeros(capacity, np.float32)
+        self._alive = np.zeros(capacity, bool)
+        self._ids[:len(live)], self._lengths[:len(live)], self._alive[:len(live)] = ids, lengths, True
+        self._count = len(live)
+        self._doc_of = {int(node_id): doc for doc, node_id in enumerate(ids[:, 0])}
+
+    # reads
+
+    def _term(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        docs, counts = self._postings.get(term, (np.empty(0, np.int64), np.empty(0, np.float32)))
+        pending = self._pending.pop(term, None)
+        if pending:
+            docs = np.concatenate([docs, np.asarray(pending[0], np.int64)])
+            counts = np.concatenate([counts, np.asarray(pending[1], np.float32)])
+            self._postings[term] = (docs, counts)
+        return docs, counts
+
+    def search(self, query: str, limit: int, offset: int = 0, conversation_id: Optional[int] = None,
+               user_id: Optional[int] = None) -> Tuple[List[Tuple[int, int, float]], int]:
+        """
+        ((node_id, conversation_id, score) for the page, total matches)
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._doc_of:
+                return [], 0
+            count, ids, lengths, alive = self._count, self._ids, self._lengths, self._alive
+            live_docs = len(self._doc_of)
+            average_length = self._total_length / live_docs or 1
+
+            all_docs, all_weights = [], []
+            for term in terms:
+                docs, counts = self._term(term)
+                keep = alive[docs]
+                docs, counts = docs[keep], counts[keep]
+                if not len(docs):
+                    continue
+                idf = np.log(1 + (live_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+                all_docs.append(docs)
+                all_weights.append(idf * counts * (self.k1 + 1) / (counts + norm))
+
+        if not all_docs:
+            return [], 0
+        docs = np.concatenate(all_docs)
+        weights = np.concatenate(all_weights)
+        if conversation_id is not None:
+            keep = ids[docs, 1] == conversation_id
+            docs, weights = docs[keep], weights[keep]
+        if user_id is not None:
+            keep = ids[docs, 2] == user_id
+            docs, weights = docs[keep], weights[keep]
+        if not len(docs):
+            return [], 0
+
+        # sum per document: dense accumulator for broad queries, sort-based for narrow ones
+        if len(docs) * 8 > count:
+            scores = np.bincount(docs, weights = weights, minlength = count)
+            candidates = np.flatnonzero(scores)
+            candidate_scores = scores[candidates]
+        else:
+            candidates, inverse = np.unique(docs, return_inverse = True)
+            candidate_scores = np.bincount(inverse, weights = weights)
+
+        wanted = min(offset + limit, len(candidates))
+        if wanted <= offset:
+            return [], len(candidates)
+
+        top = np.argpartition(-candidate_scores, wanted - 1)[:wanted]
+        top = top[np.lexsort((ids[candidates[top], 0], -candidate_scores[top]))][offset:wanted]
+        page = [
+            (int(ids[candidates[i], 0]), int(ids[candidates[i], 1]), float(candidate_scores[i]))
+            for i in top
+        ]
+        return page, len(candidates)
+
+    # keeping up with the database
+
+    def sync(self, db: Session) -> None:
+        """
+        first call: index every node. later calls: re-index nodes changed since the last sync
+        """
+        with self._lock:
+            node_ids = self._claim()
+            if node_ids is _UP_TO_DATE:
+                return
+            seen, after = set(), 0
+            try:
+                while True:
+                    rows = _rows(db, node_ids, after)
+                    if not rows:
+                        break
+                    seen |= self._index_rows(rows)
+                    after = rows[-1][0]
+            except BaseException:
+                self._unclaim(node_ids)
+                raise
+            self._finish(node_ids, seen)
+
+    async def sync_async(self, db: AsyncSession) -> None:
+        """
+        sync() for request handlers. rows are read a page at a time through the async session, and
+        their blob reads + tokenizing run in a worker thread, so the first build doesn't stall the
+        event loop. concurrent searches wait for a build in progress
+        """
+        while self._building is not None:
+            await asyncio.shield(self._building)
+        with self._lock:
+            node_ids = self._claim()
+        if node_ids is _UP_TO_DATE:
+            return
+
+        self._building = asyncio.get_running_loop().create_future()
+        seen, after = set(), 0
+        try:
+            while True:
+                rows = await db.run_sync(_rows, node_ids, after)
+                if not rows:
+                    break
+                seen |= await asyncio.to_thread(self._index_rows, rows)
+                after = rows[-1][0]
+            self._finish(node_ids, seen)
+        except BaseException:
+            self._unclaim(node_ids)
+            raise
+        finally:
+            building, self._building = self._building, None
+            building.set_result(None)
+
+    def _claim(self):
+        # what the next sync has to load: None for everything, else the changed ids
+        if not self.loaded:
+            self.dirty.clear()
+            return None
+        if not self.dirty:
+            return _UP_TO_DATE
+        changed, self.dirty = self.dirty, set()
+        return changed
+
+    def _unclaim(self, node_ids: Optional[Set[int]]) -> None:
+        # a failed sync: the next one starts over
+        with self._lock:
+            if node_ids is None:
+                self._reset()
+            else:
+                self.dirty |= node_ids
+
+    def _finish(self, node_ids: Optional[Set[int]], seen: Set[int]) -> None:
+        if node_ids is None:
+            self.loaded = True
+        else:
+            # changed nodes no row came back for were deleted
+            self.remove(node_ids - seen)
+
+    def _index_rows(self, rows) -> Set[int]:
+        for node_id, conversation_id, user_id, prompt, prompt_key, response, response_key in rows:
+            text = f"{resolve_text(prompt, prompt_key) or ''}\n{resolve_text(response, response_key) or ''}"
+            self.add(node_id, conversation_id, user_id, text)
+        return {row[0] for row in rows}
+
+
+def _rows(db: Session, node_ids: Optional[Set[int]], after: int) -> list:
+    # the next LOAD_PAGE rows to index past id `after`, raw: whoever indexes them reads the blobs
+    query = (
+        select(Node.id, Node.conversation_id, Conversation.user_id,
+               Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key)
+        .join(Conversation, Conversation.id == Node.conversation_id)
+        .where(Node.id > after)
+    )
+    if node_ids is not None:
+        query = query.where(Node.id.in_(node_ids))
+    return db.execute(query.order_by(Node.id).limit(LOAD_PAGE)).all()
+
+
+_indexes: Dict[tuple, InvertedIndex] = {}
+_indexes_lock = threading.Lock()
+
+def fallback_index(bind) -> InvertedIndex:
+    """
+    the process-wide index for the database behind `bind` (sync and async engines share one)
+    """
+    url = bind.engine.url if hasattr(bind, "engine") else bind.url
+    key = (url.get_backend_name(), url.host, url.port, url.database)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = InvertedIndex()
+        return _indexes[key]
+
+@event.listens_for(Session, "after_commit")
+def _content_committed(session: Session) -> None:
+    changed = session.info.pop(CHANGED_NODES_KEY, None)
+    if not changed:
+        return
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        fallback_index(bind).dirty.update(changed)
+
+@event.listens_for(Session, "after_rollback")
+def _content_rolled_back(session: Session) -> None:
+    session.info.pop(CHANGED_NODES_KEY, None)
+
+
+# queries
+
+def _load_rows(db: Session, page: List[Tuple[int, int, float]]) -> list:
+    # raw content rows for a page of hits, for resolve_rows
+    return db.execute(
+        select(Node.id, Node.prompt_text, Node.prompt_blob_key, Node.response_text, Node.response_blob_key)
+        .where(Node.id.in_([node_id for node_id, _, _ in page]))
+    ).all()
+
+def _search_fallback(db: Session, query: str, limit: int, offset: int, conversation_id: Optional[int],
+                     user_id: Optional[int], index: InvertedIndex) -> dict:
+    index.sync(db)
+    page, total = index.search(query, limit, offset, conversation_id = conversation_id, user_id = user_id)
+    return {"results": _fallback_hits(query, page, _load_rows(db, page)), "total": total}
+
+def _fallback_hits(query: str, page: List[Tuple[int, int, float]], rows: list) -> List[dict]:
+    texts = resolve_rows(rows)
+    terms = set(tokenize(query))
+
+    results = []
+    for node_id, node_conversation_id, score in page:
+        if node_id not in texts:
+            # deleted since it was indexed
+            continue
+        prompt, response = texts[node_id]
+        results.append({
+            "node_id": str(node_id),
+            "conversation_id": node_conversation_id,
+            "rank": round(score, 4),
+            "prompt": snippet(prompt, terms),
+            "response": snippet(response, terms),
+        })
+    return results
+
+def _search_postgres(db: Session, query: str, limit: int, offset: int, conversation_id: Optional[int],
+                     user_id: Optional[int]) -> dict:
+    language = settings.SEARCH_LANGUAGE
+    tsquery = func.websearch_to_tsquery(language, query)
+    search_vector = literal_column("nodes.search_vector")
+
+    matches = (
+        select(Node.id, Node.conversation_id, func.ts_rank_cd(search_vector, tsquery, 32).label("rank"))
+        .join(Conversation, Conversation.id == Node.conversation_id)
+        .where(search_vector.op("@@")(tsquery))
+    )
+    if conversation_id is not None:
+        matches = matches.where(Node.conversation_id == conversation_id)
+    if user_id is not None:
+        matches = matches.where(Conversation.user_id == user_id)
+
+    total = db.scalar(select(func.count()).select_from(matches.subquery()))
+    page = matches.order_by(literal_column("rank").desc(), Node.id).limit(limit).offset(offset).subquery()
+
+    options = (f"StartSel={_START}, StopSel={_STOP}, MaxWords=35, MinWords=15, "
+               f"MaxFragments=1, FragmentDelimiter=\" ... \"")
+    rows = db.execute(
+        select(
+            page.c.id, page.c.conversation_id, page.c.rank,
+            func.ts_headline(language, func.coalesce(Node.prompt_text, ""), tsquery, options),
+            func.ts_headline(language, func.coalesce(Node.response_text, ""), tsquery, options),
+        )
+        .join(Node, Node.id == page.c.id)
+        .order_by(page.c.rank.desc(), page.c.id)
+    ).all()
+
+    return {
+        "results": [
+            {
+                "node_id": str(node_id),
+                "conversation_id": node_conversation_id,
+                "rank": round(rank, 4),
+                "prompt": _marked_snippet(prompt),
+                "response": _marked_snippet(response),
+            }
+            for node_id, node_conversation_id, rank, prompt, response in rows
+        ],
+        "total": total,
+    }
+
+def search_nodes(
+    db: Session,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    conversation_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    index: Optional[InvertedIndex] = None,
+) -> dict:
+    """
+    {"results": [...], "total": n, "backend": ...} for a free-text query, best matches first.
+    pass `index` to force the in-process backend (tests, benchmarks).
+    """
+    bind = db.get_bind()
+    if index is None and bind.dialect.name == "postgresql":
+        return {**_search_postgres(db, query, limit, offset, conversation_id, user_id), "backend": "postgres"}
+    index = index or fallback_index(bind)
+    return {**_search_fallback(db, query, limit, offset, conversation_id, user_id, index), "backend": "inverted_index"}
+
+async def search_nodes_async(
+    db: AsyncSession,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    conversation_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> dict:
+    """
+    search_nodes for request handlers. AsyncSession.run_sync runs on the event loop, so the
+    in-process backend builds and scores its index, reads blobs and cuts snippets in worker threads
+    """
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql":
+        return await db.run_sync(search_nodes, query, limit, offset, conversation_id, user_id)
+
+    index = fallback_index(bind)
+    await index.sync_async(db)
+    page, total = await asyncio.to_thread(
+        index.search, query, limit, offset, conversation_id = conversation_id, user_id = user_id
+    )
+    rows = await db.run_sync(_load_rows, page)
+    results = await asyncio.to_thread(_fallback_hits, query, page, rows)
+    return {"results": results, "total": total, "backend": "inverted_index"}
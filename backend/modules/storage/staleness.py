@@ -0,0 +1,73 @@
+"""
+incremental invalidation of executed nodes.
+
+every executed node keeps `context_hash`, the request key (provider, model, context turns and
+prompt; LLMProvider.request_key) its response was generated from. when a node's prompt or response
+is rewritten, or edges into its subtree change, every executed node below it gets `is_stale` set,
+one UPDATE driven by the closure table. nothing is re-run eagerly: a refresh run
+(llm/graph_runner.py build_stale_plan) re-executes the stale nodes in topological order and clears
+those whose recomputed key still matches without calling the LLM.
+"""
+
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from .models import Node, NodeClosure
+
+
+def ensure_staleness_schema(bind) -> None:
+    """
+    add context_hash / is_stale to a nodes table created before they existed
+    """
+    columns = {column["name"] for column in inspect(bind).get_columns("nodes")}
+    with bind.begin() as connection:
+        if "context_hash" not in columns:
+            connection.exec_driver_sql("ALTER TABLE nodes ADD COLUMN context_hash VARCHAR(64)")
+        if "is_stale" not in columns:
+            connection.exec_driver_sql("ALTER TABLE nodes ADD COLUMN is_stale BOOLEAN NOT NULL DEFAULT FALSE")
+
+
+def has_response():
+    """
+    nodes holding a response. sizes are recorded since large-content offloading; older rows
+    (size NULL) are judged by their inline text
+    """
+    return or_(Node.response_size > 0, and_(Node.response_size.is_(None), Node.response_text != ""))
+
+
+def record_execution(db: Session, node_id: int, context_hash: str) -> None:
+    """
+    the node's response is now current for context_hash
+    """
+    db.execute(update(Node).where(Node.id == node_id).values(context_hash = context_hash, is_stale = False))
+
+def clear_stale(db: Session, node_id: int) -> None:
+    db.execute(update(Node).where(Node.id == node_id).values(is_stale = False))
+
+def mark_descendants_stale(db: Session, node_ids: Iterable[int], include_self: bool = False) -> int:
+    """
+    flag every executed node below node_ids (and node_ids themselves with include_self).
+    nodes without a response have nothing to invalidate and are left alone. returns rows changed
+    """
+    node_ids = list(node_ids)
+    if not node_ids:
+        return 0
+    below = select(NodeClosure.descendant_id).where(
+        NodeClosure.ancestor_id.in_(node_ids),
+        NodeClosure.depth >= (0 if include_self else 1),
+    )
+    result = db.execute(
+        update(Node)
+        .where(Node.id.in_(below), Node.is_stale.is_(False), has_response())
+        .values(is_stale = True)
+        .execution_options(synchronize_session = False)
+    )
+    return result.rowcount
+
+def stale_node_ids(db: Session, conversation_id: Optional[int] = None) -> List[int]:
+    query = select(Node.id).where(Node.is_stale.is_(True))
+    if conversation_id is not None:
+        query = query.where(Node.conversation_id == conversation_id)
+    return list(db.scalars(query.order_by(Node.id)))
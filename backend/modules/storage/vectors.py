@@ -0,0 +1,263 @@
+"""
+on-disk vector index for node embeddings.
+
+vectors live in one float32 matrix, memory-mapped from <root>/vectors.f32, with a parallel int64
+matrix <root>/meta.i64 of (node_id, conversation_id, user_id) per row. rows are L2-normalized on
+insert, so a dot product is cosine similarity and a search is a single matrix-vector product over
+the rows that pass the conversation/user filter. deleted rows are tombstoned (node_id -1) and
+reused. header.json records the row count and which embedder (name + dimensions) filled the
+index; opening it with a different embedder starts over.
+
+for large corpora an optional IVF layer (k-means coarse quantizer, VECTOR_IVF_*) narrows each
+search to the rows in the nprobe nearest clusters. it is trained in memory when the index grows
+past VECTOR_IVF_MIN_ROWS and retrained whenever the row count doubles.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+_META_COLUMNS = 3       # node_id, conversation_id, user_id
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype = np.float32)
+    norms = np.linalg.norm(vectors, axis = -1, keepdims = True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class _IVF:
+    """
+    coarse quantizer: k-means centroids plus the cluster of every row
+    """
+
+    def __init__(self, vectors: np.ndarray, nlist: int, rng: np.random.Generator, iterations: int = 10):
+        sample = vectors[rng.choice(len(vectors), size = min(len(vectors), nlist * 64), replace = False)]
+        centroids = sample[rng.choice(len(sample), size = nlist, replace = False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis = 1)
+            for cluster in range(nlist):
+                members = sample[assign == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis = 0)
+            centroids = normalize(centroids)
+        self.centroids = centroids
+        self.assign = self.nearest(vectors)
+        self.trained_rows = len(vectors)
+
+    def nearest(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis = 1).astype(np.int32)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        scores = self.centroids @ query
+        return np.argpartition(-scores, min(nprobe, len(scores)) - 1)[:nprobe]
+
+
+class VectorIndex:
+    """
+    node embeddings with filtered top-k search. root=None keeps everything in memory (tests).
+    thread-safe: writes come from the embedding worker, searches from request handlers.
+    """
+
+    def __init__(self, root, dimensions: int, embedder: str = "", initial_capacity: int = 1024):
+        self.root = Path(root) if root is not None else None
+        self.dimensions = dimensions
+        self.embedder = embedder
+        self._lock = threading.RLock()
+        self._ivf: Optional[_IVF] = None
+        self._rng = np.random.default_rng(0)
+
+        self.count = 0          # rows in use, including tombstones
+        if self.root is not None and self._load_header():
+            self._open(self._capacity_on_disk())
+        else:
+            self._create(initial_capacity)
+
+        self._rows: Dict[int, int] = {int(node_id): row for row, node_id in enumerate(self.meta[:self.count, 0]) if node_id >= 0}
+        self._free: List[int] = [row for row in range(self.count) if self.meta[row, 0] < 0]
+        self._maybe_train()
+
+    # storage
+
+    def _load_header(self) -> bool:
+        try:
+            header = json.loads((self.root / "header.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return False
+        if header.get("dimensions") != self.dimensions or header.get("embedder") != self.embedder:
+            # different embedder: old vectors aren't comparable with new ones
+            return False
+        self.count = header["count"]
+        return True
+
+    def _capacity_on_disk(self) -> int:
+        return os.path.getsize(self.root / "meta.i64") // (8 * _META_COLUMNS)
+
+    def _write_header(self) -> None:
+        if self.root is None:
+            return
+        header = {"dimensions": self.dimensions, "embedder": self.embedder, "count": self.count}
+        fd, tmp_path = tempfile.mkstemp(dir = self.root, prefix = ".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.root / "header.json")
+
+    def _create(self, capacity: int) -> None:
+        self.count = 0
+        if self.root is None:
+            self.vectors = np.zeros((capacity, self.dimensions), dtype = np.float32)
+            self.meta = np.full((capacity, _META_COLUMNS), -1, dtype = np.int64)
+            return
+        self.root.mkdir(parents = True, exist_ok = True)
+        for name in ("vectors.f32", "meta.i64"):
+            (self.root / name).unlink(missing_ok = True)
+        self._open(capacity)
+        self.meta[:] = -1
+        self._write_header()
+
+    def _open(self, capacity: int) -> None:
+        vectors_path, meta_path = self.root / "vectors.f32", self.root / "meta.i64"
+        for path, row_bytes in ((vectors_path, 4 * self.dimensions), (meta_path, 8 * _META_COLUMNS)):
+            with open(path, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(vectors_path, dtype = np.float32, mode = "r+", shape = (capacity, self.dimensions))
+        self.meta = np.memmap(meta_path, dtype = np.int64, mode = "r+", shape = (capacity, _META_COLUMNS))
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.meta)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        if self.root is None:
+            self.vectors = np.concatenate([self.vectors, np.zeros((new_capacity - capacity, self.dimensions), np.float32)])
+            self.meta = np.concatenate([self.meta, np.full((new_capacity - capacity, _META_COLUMNS), -1, np.int64)])
+            return
+        self.flush()
+        del self.vectors, self.meta
+        self._open(new_capacity)
+        self.meta[capacity:] = -1
+
+    def flush(self) -> None:
+        with self._lock:
+            if self.root is None:
+                return
+            self.vectors.flush()
+            self.meta.flush()
+            self._write_header()
+
+    # writes
+
+    def upsert(self, node_ids: Sequence[int], conversation_ids: Sequence[int], user_ids: Sequence[int],
+               vectors: np.ndarray) -> None:
+        vectors = normalize(vectors)
+        with self._lock:
+            new = sum(1 for node_id in node_ids if node_id not in self._rows)
+            self._grow(self.count + max(new - len(self._free), 0))
+            rows = []
+            for node_id in node_ids:
+                row = self._rows.get(node_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._next_row()
+                    self._rows[node_id] = row
+                rows.append(row)
+
+            rows = np.asarray(rows)
+            self.vectors[rows] = vectors
+            self.meta[rows] = np.column_stack([node_ids, conversation_ids, user_ids])
+            if self._ivf is not None:
+                self._assign(rows, vectors)
+            self.flush()
+            self._maybe_train()
+
+    def _next_row(self) -> int:
+        self.count += 1
+        return self.count - 1
+
+    def delete(self, node_ids: Iterable[int]) -> None:
+        with self._lock:
+            for node_id in node_ids:
+                row = self._rows.pop(node_id, None)
+                if row is not None:
+                    self.meta[row] = -1
+                    self._free.append(row)
+            self.flush()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self._rows
+
+    # approximate layer
+
+    def _maybe_train(self) -> None:
+        if not settings.VECTOR_IVF_ENABLED or len(self._rows) < settings.VECTOR_IVF_MIN_ROWS:
+            self._ivf = None
+            return
+        if self._ivf is not None and self.count < 2 * self._ivf.trained_rows:
+            return
+        nlist = settings.VECTOR_IVF_NLIST or max(int(np.sqrt(self.count)), 1)
+        self._ivf = _IVF(np.asarray(self.vectors[:self.count]), nlist, self._rng)
+
+    def _assign(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if len(self._ivf.assign) < self.count:
+            self._ivf.assign = np.concatenate([self._ivf.assign, np.zeros(self.count - len(self._ivf.assign), np.int32)])
+        self._ivf.assign[rows] = self._ivf.nearest(vectors)
+
+    # search
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        conversation_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        exclude: Iterable[int] = (),
+        exact: bool = False,
+    ) -> List[Tuple[int, float]]:
+        """
+        up to k (node_id, cosine similarity) pairs, best first, among rows matching the filters.
+        exact=True skips the IVF layer.
+        """
+        query = normalize(query).reshape(-1)
+        with self._lock:
+            meta = self.meta[:self.count]
+            mask = meta[:, 0] >= 0
+            if conversation_id is not None:
+                mask &= meta[:, 1] == conversation_id
+            if user_id is not None:
+                mask &= meta[:, 2] == user_id
+            exclude = list(exclude)
+            if exclude:
+                mask &= ~np.isin(meta[:, 0], exclude)
+            if self._ivf is not None and not exact and mask.sum() >= settings.VECTOR_IVF_MIN_ROWS:
+                mask &= np.isin(self._ivf.assign[:self.count], self._ivf.probe(query, settings.VECTOR_IVF_NPROBE))
+
+            rows = np.flatnonzero(mask)
+            if not len(rows) or k <= 0:
+                return []
+            scores = self.vectors[rows] @ query
+            node_ids = meta[rows, 0]
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(node_ids[i]), float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        return {
+            "vectors": len(self._rows),
+            "rows": self.count,
+            "capacity": len(self.meta),
+            "dimensions": self.dimensions,
+            "embedder": self.embedder,
+            "ivf_clusters": 0 if self._ivf is None else len(self._ivf.centroids),
+        }
@@ -0,0 +1,28 @@
+"""
+delete offloaded prompt/response blobs that no node references anymore (see
+modules/storage/content.py sweep_blobs). safe to run while the API is up: blobs written or re-put
+within the grace period are kept.
+
+usage (from backend/):
+    python sweep_blobs.py [--grace-seconds 3600]
+"""
+
+import argparse
+import sys
+
+from core.database import SessionLocal
+from modules.storage.content import sweep_blobs
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grace-seconds", type = int, default = None,
+                        help = "keep unreferenced blobs younger than this (default: BLOB_SWEEP_GRACE_SECONDS)")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        deleted = sweep_blobs(db, grace_seconds = args.grace_seconds)
+    print(f"Deleted {len(deleted)} unreferenced blobs", file = sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
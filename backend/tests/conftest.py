@@ -0,0 +1,6 @@
+import os
+
+# LLM settings are required at import time. tests never talk to the real API,
+# so fall back to placeholder values when no .env is present
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("ALLOWED_ORIGINS", "http://localhost:5173")
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base, get_async_db
+from main import app
+from modules.llm.id_mapper import id_mapper
+from modules.storage.models import User, Conversation
+
+"""
+End-to-end tests for the graph editing endpoints on the async session, against in-memory aiosqlite.
+"""
+
+@pytest.fixture(scope = "function")
+def client():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass = StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit = False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+            db.add(Conversation(id = 1, user_id = 1, title = "api"))
+            await db.commit()
+
+    async def override():
+        async with factory() as db:
+            yield db
+
+    asyncio.run(setup())
+    id_mapper.clear_mappings()
+    app.dependency_overrides[get_async_db] = override
+
+    yield httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test/api/llm")
+
+    app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+# test 1: create nodes and edges by temp id, reject a cycle, load the graph, delete a node
+def test_graph_editing(client):
+    async def scenario():
+        async with client:
+            for temp_id, x in (("temp_a", 0), ("temp_b", 100), ("temp_c", 200)):
+                r = await client.post("/nodes/create", json = {"position": {"x": x, "y": 0},
+                                                                "conversation_id": "1", "temp_id": temp_id})
+                assert r.status_code == 200
+
+            r = await client.post("/edges/create", json = {"source_id": "temp_a", "target_id": "temp_b"})
+            assert r.json()["status"] == "success"
+            r = await client.post("/edges/create", json = {"source_id": "temp_b", "target_id": "temp_c"})
+            edge_id = r.json()["edge_id"]
+            r = await client.post("/edges/create", json = {"source_id": "temp_a", "target_id": "temp_b"})
+            assert r.json()["status"] == "exists"
+            r = await client.post("/edges/create", json = {"source_id": "temp_c", "target_id": "temp_a"})
+            assert r.status_code == 400 and "cycle" in r.json()["detail"]
+
+            graph = (await client.get("/conversations/1/graph")).json()
+            assert len(graph["nodes"]) == 3 and len(graph["edges"]) == 2
+
+            r = await client.request("DELETE", "/nodes/delete", json = {"node_id": graph["nodes"][1]["id"]})
+            assert r.json()["edges_deleted_count"] == 2
+            r = await client.request("DELETE", "/edges/delete", json = {"edge_id": edge_id})
+            assert r.status_code == 404
+
+            graph = (await client.get("/conversations/1/graph")).json()
+            assert len(graph["nodes"]) == 2 and graph["edges"] == []
+
+    asyncio.run(scenario())
+
+# test 2: a retried create with the same temp id returns the same node; missing conversations 404
+def test_create_idempotent(client):
+    async def scenario():
+        async with client:
+            body = {"position": {"x": 0, "y": 0}, "conversation_id": "1", "temp_id": "temp_retry"}
+            first = (await client.post("/nodes/create", json = body)).json()
+            second = (await client.post("/nodes/create", json = body)).json()
+            assert first == second
+
+            r = await client.post("/nodes/create", json = {"position": {"x": 0, "y": 0}, "conversation_id": "9"})
+            assert r.status_code == 404
+
+    asyncio.run(scenario())
+
+# test 3: a failed batch names the operation that failed, and nothing in it is applied
+def test_batch_failure_index(client):
+    async def scenario():
+        async with client:
+            r = await client.post("/graph/batch", json = {"conversation_id": "1", "operations": [
+                {"op": "create_node", "temp_id": "temp_ok", "position": {"x": 0, "y": 0}},
+                {"op": "delete_node", "node_id": "temp_missing"},
+            ]})
+            assert r.status_code == 400 and r.json()["operation"] == 1
+            assert "Operation 1" in r.json()["detail"]
+
+            graph = (await client.get("/conversations/1/graph")).json()
+            assert graph["nodes"] == []
+
+    asyncio.run(scenario())
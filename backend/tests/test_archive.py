@@ -0,0 +1,141 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base, get_async_db
+from main import app
+from modules.llm import api
+from modules.storage import archive, closure
+from modules.storage.archive import ArchiveError, export_conversation, import_conversation, read_records
+from modules.storage.content import save_prompt_text
+from modules.storage.forks import fork_conversation, writable_node
+from modules.storage.graph import load_graph_page
+from modules.storage.models import User, Conversation, Node, Edge
+
+"""
+Tests for conversation archives: export/import round trips with id remapping, forks exporting
+their own view, damaged archives, and the export/import endpoints.
+"""
+
+EDGES = [(1, 2), (2, 3), (2, 4), (3, 5), (4, 5)]
+
+def seed(db):
+    db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    db.add(Conversation(id = 1, user_id = 1, title = "source"))
+    db.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "position_x": i, "position_y": i * 10,
+         "prompt_text": f"prompt {i}", "response_text": f"answer {i}" if i < 5 else None, "type_data": {"i": i}}
+        for i in range(1, 6)
+    ])
+    closure.add_nodes(db, range(1, 6))
+    for source, target in EDGES:
+        db.add(Edge(conversation_id = 1, source_node_id = source, target_node_id = target))
+        closure.add_edge(db, source, target)
+
+@pytest.fixture(scope = "function")
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+    seed(session)
+    session.commit()
+
+    yield session
+
+    session.close()
+
+def shape(db, conversation_id, ancestry = True):
+    # the graph by content, independent of ids (ancestry is kept on original rows, so not for forks)
+    page = load_graph_page(db, conversation_id)
+    prompt_of = {node["id"]: node["prompt"] for node in page["nodes"]}
+    nodes = sorted((node["prompt"], node["response"], node["position"]["y"], node["type_data"]["i"]) for node in page["nodes"])
+    edges = sorted((prompt_of[edge["source"]], prompt_of[edge["target"]]) for edge in page["edges"])
+    if not ancestry:
+        return nodes, edges
+    return nodes, edges, sorted(
+        (prompt_of[node_id], tuple(sorted(prompt_of[str(a)] for a in closure.ancestor_ids(db, int(node_id)))))
+        for node_id in prompt_of
+    )
+
+# test 1: an export re-imports under new ids with the same nodes, edges and ancestry, a frame per chunk
+def test_round_trip(db_session):
+    frames = list(export_conversation(db_session, 1, chunk_rows = 2))
+    assert len(frames) > 5 and export_conversation(db_session, 99) is None
+    records = list(read_records(io.BytesIO(b"".join(frames))))
+    assert records[-1] == ["end", {"nodes": 5, "edges": 5, "closure": 14}]
+
+    result = import_conversation(db_session, io.BytesIO(b"".join(frames)), user_id = 1)
+    db_session.commit()
+    assert (result.nodes, result.edges) == (5, 5) and result.conversation_id != 1
+    assert min(result.node_ids) > 5
+    assert db_session.get(Conversation, result.conversation_id).title == "source"
+    assert shape(db_session, result.conversation_id) == shape(db_session, 1)
+
+# test 2: a fork exports as the conversation it shows; damaged archives are refused
+def test_fork_export_and_damage(db_session):
+    fork = fork_conversation(db_session, 1)
+    copy_id, _ = writable_node(db_session, 3, fork.id)
+    save_prompt_text(db_session, copy_id, "edited in fork")
+    db_session.commit()
+
+    data = b"".join(export_conversation(db_session, fork.id))
+    result = import_conversation(db_session, io.BytesIO(data), user_id = 1, title = "restored fork")
+    nodes, edges, _ = shape(db_session, result.conversation_id)
+    assert (nodes, edges) == shape(db_session, fork.id, ancestry = False) and ("edited in fork", "prompt 5") in edges
+    assert db_session.get(Conversation, result.conversation_id).base_conversation_id is None
+
+    for damaged, message in ((data[:-3], "truncated"), (b"nope" + data, "Not a conversation archive")):
+        with pytest.raises(ArchiveError, match = message):
+            import_conversation(db_session, io.BytesIO(damaged), user_id = 1)
+    with pytest.raises(LookupError):
+        import_conversation(db_session, io.BytesIO(data), user_id = 7)
+
+# test 3: the endpoints stream an export and load it back as a new conversation
+def test_archive_api(tmp_path, monkeypatch):
+    path = tmp_path / "archive.db"
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind = engine)() as db:
+        seed(db)
+        db.commit()
+
+    factory = async_sessionmaker(async_engine, expire_on_commit = False)
+
+    async def override():
+        async with factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override
+    monkeypatch.setattr(api, "SessionLocal", sessionmaker(bind = engine))
+    monkeypatch.setattr(api.llm_settings, "EMBEDDINGS_ENABLED", False)
+    monkeypatch.setattr(archive.settings, "ARCHIVE_CHUNK_ROWS", 3)
+    client = httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test/api/llm")
+
+    async def scenario():
+        async with client:
+            r = await client.get("/conversations/1/export")
+            assert r.status_code == 200 and r.headers["content-type"] == "application/octet-stream"
+            assert (await client.get("/conversations/99/export")).status_code == 404
+
+            imported = (await client.post("/conversations/import?title=copy", content = r.content)).json()
+            assert (imported["nodes"], imported["edges"]) == (5, 5)
+
+            r = await client.post("/conversations/import", content = b"garbage")
+            assert r.status_code == 400
+            return imported["conversation_id"]
+
+    try:
+        conversation_id = asyncio.run(scenario())
+        with sessionmaker(bind = engine)() as db:
+            assert shape(db, int(conversation_id)) == shape(db, 1)
+            assert db.get(Conversation, int(conversation_id)).title == "copy"
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
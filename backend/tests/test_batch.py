@@ -0,0 +1,96 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base
+from modules.llm.batch import apply_batch, BatchError
+from modules.llm.id_mapper import id_mapper
+from modules.llm.models import BatchRequest
+from modules.storage import closure
+from modules.storage.models import User, Conversation, Node, Edge
+
+"""
+Tests for the single-transaction batch mutation path, on in-memory SQLite.
+"""
+
+@pytest.fixture(scope = "function")
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+
+    session.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    session.add(Conversation(id = 1, user_id = 1, title = "batch"))
+    session.commit()
+    id_mapper.clear_mappings()
+
+    yield session
+
+    session.close()
+
+def batch(*operations):
+    return BatchRequest(conversation_id = "1", operations = list(operations))
+
+def create(temp_id, x = 0, y = 0):
+    return {"op": "create_node", "temp_id": temp_id, "position": {"x": x, "y": y}}
+
+def connect(source, target, temp_id = None):
+    return {"op": "create_edge", "source_id": source, "target_id": target, "temp_id": temp_id}
+
+# test 1: temp ids created in a batch resolve for later operations in the same batch
+def test_create_subgraph(db_session):
+    mappings, results = apply_batch(db_session, batch(
+        create("temp_a"), create("temp_b"), create("temp_c"),
+        connect("temp_a", "temp_b", "temp_e1"), connect("temp_b", "temp_c"),
+        connect("temp_a", "temp_b"),
+    ))
+    db_session.commit()
+
+    a, b, c = (int(mappings[t]) for t in ("temp_a", "temp_b", "temp_c"))
+    assert closure.ancestor_ids(db_session, c) == [b, a]
+    assert db_session.query(Edge).count() == 2
+    assert results[3]["status"] == "success"
+    assert results[5] == {"status": "exists", "edge_id": mappings["temp_e1"],
+                          "source_id": str(a), "target_id": str(b)}
+
+# test 2: deletes and position updates in one batch, last position write wins
+def test_delete_and_move(db_session):
+    mappings, _ = apply_batch(db_session, batch(
+        create("temp_a"), create("temp_b"), create("temp_c"),
+        connect("temp_a", "temp_b", "temp_e1"), connect("temp_b", "temp_c"),
+    ))
+    db_session.commit()
+    a, b, c = (int(mappings[t]) for t in ("temp_a", "temp_b", "temp_c"))
+
+    _, results = apply_batch(db_session, batch(
+        {"op": "update_position", "node_id": str(c), "position": {"x": 1, "y": 1}},
+        {"op": "update_position", "node_id": str(c), "position": {"x": 5, "y": 7}},
+        {"op": "delete_edge", "edge_id": mappings["temp_e1"]},
+        {"op": "delete_node", "node_id": str(b)},
+    ))
+    db_session.commit()
+
+    node = db_session.get(Node, c)
+    assert (node.position_x, node.position_y) == (5, 7)
+    assert results[3]["edges_deleted_count"] == 1
+    assert closure.ancestor_ids(db_session, c) == []
+    assert db_session.query(Node).count() == 2
+
+    # deleting something that is already gone doesn't fail the batch
+    _, results = apply_batch(db_session, batch(
+        {"op": "delete_edge", "edge_id": mappings["temp_e1"]},
+        {"op": "delete_node", "node_id": str(a)},
+    ))
+    assert [r["status"] for r in results] == ["not_found", "success"]
+
+# test 3: a failing operation reports its index and nothing is applied
+def test_cycle_rolls_back(db_session):
+    with pytest.raises(BatchError) as excinfo:
+        apply_batch(db_session, batch(
+            create("temp_a"), create("temp_b"),
+            connect("temp_a", "temp_b"), connect("temp_b", "temp_a"),
+        ))
+    db_session.rollback()
+
+    assert excinfo.value.index == 3
+    assert db_session.query(Node).count() == 0
@@ -0,0 +1,145 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base
+from core.config import settings
+from modules.storage import content
+from modules.storage.blobstore import LocalBlobStore, blob_key
+from modules.storage.content import BlobRef
+from modules.storage.graph import load_graph_page, read_page_blobs
+from modules.storage.models import User, Conversation, Node
+
+"""
+Tests for the content-addressed blob store and large-content offloading.
+"""
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(content, "blob_store", store)
+    monkeypatch.setattr(settings, "BLOB_THRESHOLD_BYTES", 64)
+    return store
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+
+    session.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    session.add(Conversation(id = 1, user_id = 1, title = "blobs"))
+    session.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "position_x": 0, "position_y": 0,
+         "prompt_text": "", "response_text": "", "type_data": {}}
+        for i in (1, 2)
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+
+# test 1: identical content is stored once, and range reads come back byte-exact
+def test_dedup_and_ranges(store):
+    data = "ünïcode ".encode() * 100
+    key = store.put(data)
+
+    assert key == blob_key(data) and store.put(data) == key
+    assert len(list(store.root.rglob(key))) == 1
+    assert store.read(key) == data
+    assert store.read(key, 10, 20) == data[10:20]
+    assert store.read(store.put(b"")) == b""
+
+    with pytest.raises(KeyError):
+        store.read("0" * 64)
+
+# test 2: large bodies leave the row, small ones stay inline, reads are transparent
+def test_offload(store, db_session):
+    large = "long response " * 20
+    content.save_response_text(db_session, 1, large)
+    content.save_prompt_text(db_session, 1, "short")
+    content.save_response_text(db_session, 2, large)
+    db_session.commit()
+
+    node = db_session.get(Node, 1)
+    assert node.response_text == "" and node.response_size == len(large)
+    assert node.response_blob_key == blob_key(large.encode()) and node.is_large_content
+    assert node.prompt_text == "short" and node.prompt_blob_key is None
+    assert content.load_text(db_session, 1, "response") == large
+    assert db_session.get(Node, 2).response_blob_key == node.response_blob_key
+
+    page = load_graph_page(db_session, 1, preview_chars = 4)
+    assert page["nodes"][0]["response_preview"] == "long"
+    assert page["nodes"][0]["response_length"] == len(large)
+    assert load_graph_page(db_session, 1)["nodes"][0]["response"] == large
+
+    # shrinking back under the threshold moves the body inline again
+    content.save_response_text(db_session, 1, "done")
+    db_session.commit()
+    db_session.refresh(node)
+    assert (node.response_text, node.response_blob_key, node.is_large_content) == ("done", None, False)
+
+# test 3: the sweep deletes only blobs no node references, and spares recent ones
+def test_sweep(store, db_session):
+    large = "shared body " * 20
+    content.save_response_text(db_session, 1, large)
+    content.save_response_text(db_session, 2, large)
+    content.save_prompt_text(db_session, 1, "old prompt " * 20)
+    db_session.commit()
+    old_prompt = db_session.get(Node, 1).prompt_blob_key
+
+    content.save_prompt_text(db_session, 1, "short")
+    content.save_response_text(db_session, 1, "done")
+    db_session.commit()
+    assert content.sweep_blobs(db_session, store) == []
+
+    # node 2 still holds the shared response; the overwritten prompt is orphaned
+    assert content.sweep_blobs(db_session, store, grace_seconds = 0) == [old_prompt]
+    assert not store.exists(old_prompt) and content.load_text(db_session, 2, "response") == large
+
+# test 4: re-putting an old orphaned blob inside a transaction keeps a sweep that runs before the
+# commit from deleting it
+def test_sweep_before_commit(store, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sweep.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind = engine)
+    large = "orphaned body " * 20
+    with Session() as db:
+        db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+        db.add(Conversation(id = 1, user_id = 1, title = "blobs"))
+        db.add(Node(id = 1, conversation_id = 1, node_type = "prompt", position_x = 0, position_y = 0,
+                    prompt_text = "", response_text = "", type_data = {}))
+        db.commit()
+
+    key = store.put(large.encode())
+    hour_ago = time.time() - 3600
+    os.utime(store._path(key), (hour_ago, hour_ago))
+
+    writer, sweeper = Session(), Session()
+    content.save_response_text(writer, 1, large)
+    assert content.sweep_blobs(sweeper, store, grace_seconds = 60) == [] and store.exists(key)
+    writer.commit()
+    assert content.load_text(sweeper, 1, "response") == large
+
+    writer.close()
+    sweeper.close()
+    engine.dispose()
+
+# test 5: loaders can leave offloaded bodies unread, for async callers to read in a worker thread
+def test_deferred_blob_reads(store, db_session):
+    large = "deferred body " * 20
+    key = blob_key(large.encode())
+    content.save_response_text(db_session, 1, large)
+    db_session.commit()
+
+    page = load_graph_page(db_session, 1, read_blobs = False)
+    assert page["nodes"][0]["response"] == BlobRef(key) and page["nodes"][1]["response"] == ""
+    assert read_page_blobs(page)["nodes"][0]["response"] == large
+
+    preview = load_graph_page(db_session, 1, preview_chars = 4, read_blobs = False)
+    assert preview["nodes"][0]["response_preview"] == BlobRef(key, 4)
+    assert read_page_blobs(preview)["nodes"][0]["response_preview"] == "defe"
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from modules.llm import cache as cache_module
+from modules.llm.cache import ResponseCache, generate_cached
+from modules.storage.models import LLMCacheEntry
+
+"""
+Tests for the two-tier LLM response cache. The persistent tier runs on in-memory SQLite.
+"""
+
+@pytest.fixture(scope = "function")
+def session_factory():
+    engine = create_engine("sqlite://", poolclass = StaticPool, connect_args = {"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind = engine)
+    engine.dispose()
+
+def make_cache(session_factory, **kwargs):
+    options = dict(max_entries = 2, ttl_seconds = 60, persistent = True, db_max_entries = 100)
+    options.update(kwargs)
+    return ResponseCache(session_factory = session_factory, **options)
+
+
+class FakeClient:
+    model = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def request_key(self, prompt, history = None):
+        return f"key:{prompt}"
+
+    async def generate(self, prompt, history = None):
+        self.calls += 1
+        return f"answer to {prompt}"
+
+# test 1: memory tier LRU eviction falls back to the db tier
+def test_memory_then_db_tier(session_factory):
+    cache = make_cache(session_factory)
+    for i in range(3):
+        cache.put(f"k{i}", "m", f"v{i}")
+
+    assert cache.get("k2") == "v2"
+    assert cache.memory_hits == 1
+
+    # k0 was evicted from memory but survives in the table
+    assert cache.get("k0") == "v0"
+    assert cache.db_hits == 1
+    assert cache.get("missing") is None
+    assert cache.misses == 1
+
+# test 2: expired entries are not served from either tier
+def test_ttl_expiry(session_factory, monkeypatch):
+    cache = make_cache(session_factory, ttl_seconds = 1)
+    cache.put("k", "m", "v")
+
+    real_time = time.time
+    monkeypatch.setattr(cache_module.time, "time", lambda: real_time() + 5)
+    cache._memory.clear()
+    db = session_factory()
+    db.query(LLMCacheEntry).update({LLMCacheEntry.expires_at: LLMCacheEntry.created_at})
+    db.commit()
+    db.close()
+
+    assert cache.get("k") is None
+
+# test 3: the db tier is trimmed to its size bound
+def test_db_size_bound(session_factory, monkeypatch):
+    monkeypatch.setattr(cache_module.llm_settings, "CACHE_SWEEP_EVERY", 1)
+    cache = make_cache(session_factory, db_max_entries = 3)
+    for i in range(6):
+        cache.put(f"k{i}", "m", f"v{i}")
+
+    db = session_factory()
+    assert db.query(LLMCacheEntry).count() == 3
+    db.close()
+
+# test 4: generate_cached hits, bypasses and invalidates
+def test_generate_cached(session_factory, monkeypatch):
+    monkeypatch.setattr(cache_module, "response_cache", make_cache(session_factory))
+    client = FakeClient()
+
+    async def scenario():
+        first = await generate_cached(client, "p")
+        second = await generate_cached(client, "p")
+        bypassed = await generate_cached(client, "p", bypass = True)
+        refreshed = await generate_cached(client, "p", invalidate = True)
+        return first, second, bypassed, refreshed
+
+    first, second, bypassed, refreshed = asyncio.run(scenario())
+    assert first == ("answer to p", False)
+    assert second == ("answer to p", True)
+    assert bypassed == ("answer to p", False)
+    assert refreshed == ("answer to p", False)
+    assert client.calls == 3
+    assert cache_module.response_cache.stats()["bypassed"] == 1
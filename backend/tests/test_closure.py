@@ -0,0 +1,158 @@
+import random
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base
+from modules.storage import closure
+from modules.storage.models import User, Conversation, Node, Edge, NodeClosure
+
+"""
+Tests for incremental closure-table maintenance. Runs on in-memory SQLite and checks
+the table against a brute-force walk of the edge list after every mutation.
+"""
+
+@pytest.fixture(scope = "function")
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+
+    user = User(name = "alice", email = "alice@mail.com")
+    session.add(user)
+    session.flush()
+    session.add(Conversation(id = 1, user_id = user.id, title = "closure"))
+    session.commit()
+
+    yield session
+
+    session.close()
+
+def make_nodes(db, count):
+    nodes = [Node(conversation_id = 1, node_type = "prompt", prompt_text = "",
+                  position_x = 0, position_y = 0) for _ in range(count)]
+    db.add_all(nodes)
+    db.flush()
+    closure.add_nodes(db, [node.id for node in nodes])
+    return [node.id for node in nodes]
+
+def connect(db, source_id, target_id):
+    db.add(Edge(conversation_id = 1, source_node_id = source_id, target_node_id = target_id))
+    closure.add_edge(db, source_id, target_id)
+
+def expected_closure(db):
+    # shortest-path BFS from every node over the current edges
+    children = {}
+    for source, target in db.query(Edge.source_node_id, Edge.target_node_id):
+        children.setdefault(source, []).append(target)
+
+    rows = set()
+    for (node_id,) in db.query(Node.id):
+        depth = {node_id: 0}
+        frontier = [node_id]
+        while frontier:
+            nxt = []
+            for current in frontier:
+                for child in children.get(current, []):
+                    if child not in depth:
+                        depth[child] = depth[current] + 1
+                        nxt.append(child)
+            frontier = nxt
+        rows.update((node_id, d, k) for d, k in depth.items())
+    return rows
+
+def actual_closure(db):
+    return set(db.query(NodeClosure.ancestor_id, NodeClosure.descendant_id, NodeClosure.depth))
+
+# test 1: ancestors/descendants of a diamond, including shortest depths
+def test_diamond(db_session):
+    a, b, c, d = make_nodes(db_session, 4)
+    connect(db_session, a, b)
+    connect(db_session, a, c)
+    connect(db_session, b, d)
+    connect(db_session, c, d)
+
+    assert closure.ancestor_ids(db_session, d) == [b, c, a]
+    assert closure.descendant_ids(db_session, a) == [b, c, d]
+    assert actual_closure(db_session) == expected_closure(db_session)
+
+# test 2: an edge into an internal node propagates to its descendants
+def test_internal_insert_propagates(db_session):
+    a, b, c, x = make_nodes(db_session, 4)
+    connect(db_session, a, b)
+    connect(db_session, b, c)
+    connect(db_session, x, b)
+
+    assert x in closure.ancestor_ids(db_session, c)
+
+# test 3: cycle rejection, including self loops
+def test_cycle_detection(db_session):
+    a, b, c = make_nodes(db_session, 3)
+    connect(db_session, a, b)
+    connect(db_session, b, c)
+
+    assert closure.would_create_cycle(db_session, c, a)
+    assert closure.would_create_cycle(db_session, b, b)
+    assert not closure.would_create_cycle(db_session, a, c)
+
+# test 4: edge and node deletes shrink the closure
+def test_deletes(db_session):
+    a, b, c, d = make_nodes(db_session, 4)
+    connect(db_session, a, b)
+    connect(db_session, b, c)
+    connect(db_session, a, d)
+    connect(db_session, d, c)
+
+    edge = db_session.query(Edge).filter_by(source_node_id = a, target_node_id = b).one()
+    db_session.delete(edge)
+    db_session.flush()
+    closure.remove_edge(db_session, b)
+    assert closure.ancestor_ids(db_session, c) == [b, d, a]
+    assert closure.ancestor_ids(db_session, b) == []
+
+    closure.remove_node(db_session, d)
+    db_session.query(Node).filter_by(id = d).delete()
+    assert closure.ancestor_ids(db_session, c) == [b]
+    assert actual_closure(db_session) == expected_closure(db_session)
+
+# test 5: random inserts and deletes always match a brute-force recomputation
+def test_random_mutations(db_session):
+    rng = random.Random(7)
+    node_ids = make_nodes(db_session, 30)
+
+    for step in range(150):
+        edges = db_session.query(Edge).all()
+        if edges and rng.random() < 0.3:
+            edge = rng.choice(edges)
+            target_id = edge.target_node_id
+            db_session.delete(edge)
+            db_session.flush()
+            closure.remove_edge(db_session, target_id)
+        else:
+            source, target = rng.sample(node_ids, 2)
+            exists = db_session.query(Edge).filter_by(source_node_id = source, target_node_id = target).first()
+            if not exists and not closure.would_create_cycle(db_session, source, target):
+                connect(db_session, source, target)
+
+        if step % 25 == 0:
+            assert actual_closure(db_session) == expected_closure(db_session)
+
+    assert actual_closure(db_session) == expected_closure(db_session)
+
+# test 6: a database from the ancestor_ids era gets its column dropped and closure rebuilt, once
+def test_ensure_closure_schema(db_session):
+    engine = db_session.get_bind()
+    db_session.execute(text("ALTER TABLE nodes ADD COLUMN ancestor_ids TEXT"))
+    node_ids = make_nodes(db_session, 6)
+    for source, target in [(0, 1), (1, 2), (0, 3), (3, 2), (2, 4)]:
+        connect(db_session, node_ids[source], node_ids[target])
+    db_session.query(NodeClosure).delete()
+    db_session.commit()
+
+    closure.ensure_closure_schema(engine)
+    assert "ancestor_ids" not in {column["name"] for column in inspect(engine).get_columns("nodes")}
+    assert actual_closure(db_session) == expected_closure(db_session)
+
+    closure.ensure_closure_schema(engine)
+    assert actual_closure(db_session) == expected_closure(db_session)
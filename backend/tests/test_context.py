@@ -0,0 +1,67 @@
+from modules.llm.context import ContextAssembler, estimate_tokens, topological_order, truncate_to_tokens
+
+"""
+Tests for ancestor context ordering, token budgeting and prefix memoization.
+Operates on already-fetched rows so no database is needed.
+"""
+
+# diamond: 1 -> 2, 1 -> 3, 2 -> 4, 3 -> 4
+DIAMOND_EDGES = [(1, 2), (1, 3), (2, 4), (3, 4)]
+
+def make_rows(node_ids, size = 40):
+    return [(node_id, f"p{node_id} " + "x" * size, f"r{node_id} " + "y" * size) for node_id in node_ids]
+
+# test 1: parents always come before children
+def test_topological_order():
+    order = topological_order([4, 3, 2, 1], DIAMOND_EDGES)
+    assert order == [1, 2, 3, 4]
+
+    # edges leaving the ancestor set are ignored
+    assert topological_order([1, 2], DIAMOND_EDGES) == [1, 2]
+
+# test 2: everything fits under a generous budget
+def test_build_within_budget():
+    assembler = ContextAssembler(token_budget = 10_000, max_turn_tokens = 1_000, policy = "truncate")
+    turns = assembler.build(make_rows([3, 1, 2]), DIAMOND_EDGES)
+
+    assert [t.node_id for t in turns] == [1, 2, 3]
+    assert turns[0].prompt.startswith("p1")
+
+# test 3: oldest turns are dropped first when over budget
+def test_drop_oldest_policy():
+    rows = make_rows([1, 2, 3, 4], size = 400)
+    per_turn = estimate_tokens(rows[0][1]) + estimate_tokens(rows[0][2])
+    assembler = ContextAssembler(token_budget = per_turn * 2, max_turn_tokens = 10_000, policy = "drop_oldest")
+
+    turns = assembler.build(rows, DIAMOND_EDGES)
+    assert [t.node_id for t in turns] == [3, 4]
+    assert sum(t.tokens for t in turns) <= per_turn * 2
+
+# test 4: truncate policy clips long turns and squeezes the last one into the remaining budget
+def test_truncate_policy():
+    rows = make_rows([1, 2], size = 4_000)
+    assembler = ContextAssembler(token_budget = 900, max_turn_tokens = 300, policy = "truncate")
+
+    turns = assembler.build(rows, [(1, 2)])
+    assert [t.node_id for t in turns] == [1, 2]
+    assert all("[...]" in t.response for t in turns)
+    assert sum(t.tokens for t in turns) <= 900
+
+    assert truncate_to_tokens("short", 10) == "short"
+
+# test 5: siblings sharing the same ancestors hit the memo; edits and rewired edges miss it
+def test_prefix_memoization():
+    assembler = ContextAssembler(token_budget = 10_000, max_turn_tokens = 1_000, policy = "truncate")
+    rows = make_rows([1, 2])
+
+    first = assembler.build(rows, [(1, 2)])
+    second = assembler.build(list(reversed(rows)), [(1, 2)])
+    assert first is second
+    assert (assembler.hits, assembler.misses) == (1, 1)
+
+    edited = [(1, "changed", "answer")] + rows[1:]
+    assembler.build(edited, [(1, 2)])
+    assert assembler.misses == 2
+
+    rewired = assembler.build(rows, [(2, 1)])
+    assert [t.node_id for t in rewired] == [2, 1] and assembler.misses == 3
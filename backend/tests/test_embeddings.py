@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.config import settings
+from core.database import Base
+from modules.llm.embeddings import EmbeddingIndexer, HashingEmbedder
+from modules.llm.retrieval import related_context
+from modules.storage import closure
+from modules.storage.models import User, Conversation, Node
+from modules.storage.vectors import VectorIndex
+
+"""
+Tests for node embeddings: the memory-mapped vector index, the background indexer and retrieval.
+"""
+
+def unit(rng, n, dim):
+    vectors = rng.normal(size = (n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis = 1, keepdims = True)
+
+# test 1: filtered top-k, tombstone reuse, and the index reopening from disk
+def test_vector_index(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = unit(rng, 50, 16)
+    index = VectorIndex(tmp_path, 16, "test", initial_capacity = 8)
+    index.upsert(list(range(1, 51)), [1 + i % 2 for i in range(50)], [7] * 50, vectors)
+
+    hits = index.search(vectors[10], 3)
+    assert hits[0][0] == 11 and hits[0][1] == pytest.approx(1.0, abs = 1e-5)
+    assert all(node_id % 2 == 0 for node_id, _ in index.search(vectors[10], 5, conversation_id = 2))
+    assert 11 not in [node_id for node_id, _ in index.search(vectors[10], 5, exclude = [11])]
+
+    index.delete([11])
+    index.upsert([99], [1], [7], vectors[10:11])
+    assert index.count == 50 and index.search(vectors[10], 1)[0][0] == 99
+
+    reopened = VectorIndex(tmp_path, 16, "test")
+    assert len(reopened) == 50 and reopened.search(vectors[20], 1)[0][0] == 21
+    # a different embedder means incomparable vectors: start over
+    assert len(VectorIndex(tmp_path, 16, "other")) == 0
+
+# test 2: the IVF layer finds (nearly) the same neighbours as exact search
+def test_ivf_recall(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_ENABLED", True)
+    monkeypatch.setattr(settings, "VECTOR_IVF_MIN_ROWS", 500)
+    monkeypatch.setattr(settings, "VECTOR_IVF_NPROBE", 4)
+    rng = np.random.default_rng(1)
+    centers = unit(rng, 20, 32)
+    vectors = centers[rng.integers(0, 20, 4000)] + 0.1 * rng.normal(size = (4000, 32)).astype(np.float32)
+
+    index = VectorIndex(None, 32, "test")
+    index.upsert(list(range(4000)), [1] * 4000, [1] * 4000, vectors)
+    assert index.stats()["ivf_clusters"] > 0
+
+    queries = vectors[rng.integers(0, 4000, 50)]
+    found = sum(index.search(q, 1)[0][0] == index.search(q, 1, exact = True)[0][0] for q in queries)
+    assert found >= 45
+
+# test 3: nodes are embedded in the background; retrieval skips ancestors and respects scope
+def test_related_context(tmp_path):
+    url = f"sqlite:///{tmp_path / 'rag.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind = engine)
+
+    texts = {
+        1: ("tell me about cats", "cats are small furry pets"),
+        2: ("and their diet", "they eat fish"),
+        3: ("what do cats like", ""),
+        4: ("my cats sleep a lot", "cats sleep sixteen hours a day"),
+        5: ("quantum chromodynamics", "quarks and gluons"),
+        6: ("cats in another conversation", "cats everywhere"),
+    }
+    with Session() as db:
+        db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+        db.add_all([Conversation(id = 1, user_id = 1, title = "a"), Conversation(id = 2, user_id = 1, title = "b")])
+        db.execute(insert(Node), [
+            {"id": i, "conversation_id": 2 if i == 6 else 1, "node_type": "prompt", "position_x": 0, "position_y": 0,
+             "prompt_text": prompt, "response_text": response, "type_data": {}}
+            for i, (prompt, response) in texts.items()
+        ])
+        closure.add_nodes(db, texts)
+        closure.add_edge(db, 1, 2)
+        closure.add_edge(db, 2, 3)
+        db.commit()
+
+    indexer = EmbeddingIndexer(Session, HashingEmbedder(64), VectorIndex(None, 64, "hashing"), flush_delay_ms = 0)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+
+    async def scenario():
+        indexer.schedule(texts)
+        await indexer.drain()
+        async with AsyncSession(async_engine) as db:
+            in_conversation = await related_context(db, 3, "what do cats like", 3, indexer = indexer)
+            for_user = await related_context(db, 3, "what do cats like", 3, scope = "user", indexer = indexer)
+        await async_engine.dispose()
+        return in_conversation, for_user
+
+    in_conversation, for_user = asyncio.run(scenario())
+    assert indexer.stats()["embedded"] == 6
+    # 1 and 2 are ancestors (already in context), 3 is the node itself
+    assert [turn.node_id for turn in in_conversation] == [4]
+    assert in_conversation[0].response == "cats sleep sixteen hours a day"
+    assert {turn.node_id for turn in for_user} == {4, 6}
@@ -0,0 +1,247 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base, get_async_db
+from main import app
+from modules.llm import api
+from modules.llm.context import ContextAssembler
+from modules.llm.id_mapper import id_mapper
+from modules.llm.positions import PositionCoalescer
+from modules.llm.providers.stub import StubProvider
+from modules.storage import closure
+from modules.storage.content import save_prompt_text, save_response_text
+from modules.storage.forks import ForkError, fork_conversation, writable_node
+from modules.storage.graph import load_fork_changes, load_graph_page
+from modules.storage.models import User, Conversation, Node, Edge
+from modules.storage.staleness import stale_node_ids
+
+"""
+Tests for copy-on-write forks: a fork sharing its snapshot's nodes, copies made on first write,
+the fork's view in graph pages and context, and the fork rules on the API.
+"""
+
+EDGES = [(1, 2), (2, 3), (2, 4)]
+
+def seed(db):
+    db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    db.add(Conversation(id = 1, user_id = 1, title = "base"))
+    db.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "position_x": 0, "position_y": i * 100,
+         "prompt_text": f"prompt {i}", "response_text": f"answer {i}", "response_size": 8, "type_data": {}}
+        for i in range(1, 5)
+    ])
+    closure.add_nodes(db, range(1, 5))
+    for source, target in EDGES:
+        db.add(Edge(conversation_id = 1, source_node_id = source, target_node_id = target))
+        closure.add_edge(db, source, target)
+
+@pytest.fixture(scope = "function")
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+    seed(session)
+    session.commit()
+
+    yield session
+
+    session.close()
+
+def texts(page):
+    return {node["id"]: node["prompt"] for node in page["nodes"]}
+
+# test 1: forking copies nothing; the first write to an inherited node copies it into the branch written
+def test_copy_on_write(db_session):
+    fork = fork_conversation(db_session, 1)
+    db_session.commit()
+    assert db_session.query(Node).count() == 4
+    assert texts(load_graph_page(db_session, fork.id)) == texts(load_graph_page(db_session, 1))
+
+    # the snapshot is read-only; the fork writes its own copy, and keeps writing the same one
+    with pytest.raises(ForkError):
+        writable_node(db_session, 3)
+    copy_id, conversation_id = writable_node(db_session, 3, fork.id)
+    assert conversation_id == fork.id and writable_node(db_session, 3, fork.id) == (copy_id, fork.id)
+    save_prompt_text(db_session, copy_id, "edited in fork")
+    db_session.commit()
+
+    page = load_graph_page(db_session, fork.id)
+    assert texts(page)[str(copy_id)] == "edited in fork" and "3" not in texts(page)
+    assert {"source": "2", "target": str(copy_id)} in [
+        {key: edge[key] for key in ("source", "target")} for edge in page["edges"]
+    ]
+    assert texts(load_graph_page(db_session, 1))["3"] == "prompt 3"
+
+    changes = load_fork_changes(db_session, fork.id)
+    assert changes["snapshot_id"] == str(fork.base_conversation_id) and changes["edges"] == []
+    assert [(node["id"], node["replaces"]) for node in changes["nodes"]] == [(str(copy_id), "3")]
+
+    # the forked conversation moved onto its own fork of the same snapshot and stays writable
+    original = db_session.get(Conversation, 1)
+    assert not original.is_snapshot and original.base_conversation_id == fork.base_conversation_id
+    own_copy, _ = writable_node(db_session, 3, 1)
+    save_prompt_text(db_session, own_copy, "edited in the original")
+    db_session.commit()
+    assert texts(load_graph_page(db_session, 1))[str(own_copy)] == "edited in the original"
+    assert texts(load_graph_page(db_session, fork.id))[str(copy_id)] == "edited in fork"
+
+# test 2: inside a fork, context and stale flags follow the fork's copies; the snapshot is untouched
+def test_fork_context_and_staleness(db_session):
+    fork = fork_conversation(db_session, 1)
+    copy_id, _ = writable_node(db_session, 2, fork.id)
+    save_prompt_text(db_session, copy_id, "changed upstream")
+
+    # 3 was executed below the edit: the fork gets a stale copy of it, the snapshot keeps its flag clear
+    stale = stale_node_ids(db_session, fork.id)
+    assert copy_id in stale and len(stale) == 3 and stale_node_ids(db_session, 1) == []
+
+    new = Node(conversation_id = fork.id, node_type = "prompt", position_x = 0, position_y = 0,
+               prompt_text = "leaf", response_text = "", type_data = {})
+    db_session.add(new)
+    db_session.flush()
+    closure.add_node(db_session, new.id)
+    db_session.add(Edge(conversation_id = fork.id, source_node_id = 4, target_node_id = new.id))
+    closure.add_edge(db_session, 4, new.id)
+    save_response_text(db_session, copy_id, "fork answer")
+    db_session.commit()
+
+    history = ContextAssembler().assemble(db_session, new.id)
+    prompts = [turn.prompt for turn in history]
+    assert prompts == ["prompt 1", "changed upstream", "prompt 4"]
+    assert [turn.prompt for turn in ContextAssembler().assemble(db_session, 4)] == ["prompt 1", "prompt 2"]
+
+# test 3: the API forks, moves and executes inherited nodes through the fork, and refuses inherited topology changes
+def test_fork_api(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass = StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit = False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            await db.run_sync(seed)
+            await db.commit()
+
+    async def override():
+        async with factory() as db:
+            yield db
+
+    asyncio.run(setup())
+    id_mapper.clear_mappings()
+    app.dependency_overrides[get_async_db] = override
+    monkeypatch.setattr(api, "_provider", lambda tier: StubProvider())
+    monkeypatch.setattr(api.llm_settings, "CACHE_ENABLED", False)
+    monkeypatch.setattr(api.llm_settings, "EMBEDDINGS_ENABLED", False)
+    client = httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test/api/llm")
+
+    async def scenario():
+        async with client:
+            fork = (await client.post("/conversations/1/fork", json = {"title": "what if"})).json()
+            fork_id, snapshot_id = fork["conversation_id"], fork["base_conversation_id"]
+            assert snapshot_id not in ("1", fork_id)
+
+            # the snapshot is read-only; the forked conversation keeps taking edits
+            r = await client.post("/graph/batch", json = {"conversation_id": snapshot_id, "operations": [
+                {"op": "create_node", "position": {"x": 0, "y": 0}}
+            ]})
+            assert r.status_code == 409 and "snapshot" in r.json()["detail"]
+            r = await client.post("/graph/batch", json = {"conversation_id": "1", "operations": [
+                {"op": "create_node", "position": {"x": 0, "y": 0}}
+            ]})
+            assert r.status_code == 200
+
+            r = await client.post("/graph/batch", json = {"conversation_id": fork_id, "operations": [
+                {"op": "create_node", "temp_id": "fork_a", "position": {"x": 0, "y": 500}},
+                {"op": "create_edge", "source_id": "3", "target_id": "fork_a"},
+                {"op": "update_position", "node_id": "4", "position": {"x": 50, "y": 50}},
+            ]})
+            leaf, results = r.json()["id_mappings"]["fork_a"], r.json()["results"]
+            moved = results[2]["node_id"]
+            assert results[1]["source_id"] == "3" and moved != "4"
+
+            for operation in ({"op": "create_edge", "source_id": leaf, "target_id": "4"},
+                              {"op": "delete_node", "node_id": moved}):
+                r = await client.post("/graph/batch", json = {"conversation_id": fork_id, "operations": [operation]})
+                assert r.status_code == 409
+
+            r = await client.post("/execute", json = {"node_id": "2", "prompt": "rewritten", "conversation_id": fork_id})
+            executed = r.json()["node_id"]
+            assert r.status_code == 200 and executed not in ("2", moved)
+
+            changes = (await client.get(f"/conversations/{fork_id}/changes")).json()
+            replaced = {node.get("replaces"): node for node in changes["nodes"]}
+            assert replaced["2"]["id"] == executed and replaced["2"]["prompt"] == "rewritten"
+            assert replaced["4"]["id"] == moved and replaced["4"]["position"] == {"x": 50, "y": 50}
+            assert len(changes["nodes"]) == 4 and len(changes["edges"]) == 1     # + fork_a, + stale copy of 3
+
+            base = (await client.get("/conversations/1/graph")).json()
+            assert {node["id"]: node["prompt"] for node in base["nodes"]}["2"] == "prompt 2"
+
+        async with factory() as db:
+            frozen = dict((await db.execute(select(Conversation.id, Conversation.is_snapshot))).all())
+            assert frozen == {1: False, int(snapshot_id): True, int(fork_id): False}
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(engine.dispose())
+
+# test 4: moving an inherited node in a fork, alone or in bulk, moves the fork's copy of it
+def test_fork_moves(tmp_path, monkeypatch):
+    path = tmp_path / "forks.db"
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind = engine)() as db:
+        seed(db)
+        fork_id = str(fork_conversation(db, 1).id)
+        db.commit()
+
+    factory = async_sessionmaker(async_engine, expire_on_commit = False)
+
+    async def override():
+        async with factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override
+    monkeypatch.setattr(api, "position_coalescer", PositionCoalescer(session_factory = sessionmaker(bind = engine), flush_delay_ms = 0))
+    client = httpx.AsyncClient(transport = httpx.ASGITransport(app = app), base_url = "http://test/api/llm")
+
+    async def scenario():
+        async with client:
+            r = await client.patch("/nodes/update-position", json = {"node_id": "4", "position": {"x": 7, "y": 7}})
+            assert r.status_code == 409
+
+            r = await client.patch("/nodes/update-position", json = {
+                "node_id": "4", "position": {"x": 7, "y": 7}, "conversation_id": fork_id
+            })
+            copy_4 = r.json()["node_id"]
+            assert r.status_code == 200 and copy_4 != "4"
+
+            r = await client.patch("/nodes/update-positions", json = {"conversation_id": fork_id, "updates": [
+                {"node_id": "3", "position": {"x": 3, "y": 3}},
+                {"node_id": "4", "position": {"x": 8, "y": 8}},
+                {"node_id": "99", "position": {"x": 0, "y": 0}},
+            ]})
+            body = r.json()
+            assert body["updated"] == ["3", "4"] and body["not_found"] == ["99"]
+            assert body["replaced"]["4"] == copy_4 and body["replaced"]["3"] not in ("3", copy_4)
+            return body["replaced"]
+
+    try:
+        replaced = asyncio.run(scenario())
+        with sessionmaker(bind = engine)() as db:
+            positions = {node["id"]: node["position"] for node in load_graph_page(db, int(fork_id))["nodes"]}
+            assert positions[replaced["4"]] == {"x": 8, "y": 8} and positions[replaced["3"]] == {"x": 3, "y": 3}
+            assert {node["id"]: node["position"] for node in load_graph_page(db, 1)["nodes"]}["4"] == {"x": 0, "y": 400}
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from modules.llm.providers.gemini import GeminiProvider
+
+"""
+Load tests for the async execution path of GeminiProvider against a local fake model.
+"""
+
+LATENCY = 0.2
+
+
+def last_prompt(contents) -> str:
+    return contents[-1].parts[0].text
+
+
+class FakeModels:
+    """
+    stands in for client.aio.models. sleeps instead of calling the API
+    and records how many calls were in flight at once
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+
+    async def generate_content(self, model, contents, config = None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return SimpleNamespace(text = f"echo: {last_prompt(contents)}")
+
+    async def generate_content_stream(self, model, contents, config = None):
+        async def chunks():
+            for word in f"echo: {last_prompt(contents)}".split(" "):
+                await asyncio.sleep(self.latency / 10)
+                yield SimpleNamespace(text = word + " ")
+        return chunks()
+
+
+def make_client(max_concurrency: int, latency: float = LATENCY) -> GeminiProvider:
+    client = GeminiProvider(api_key = "test-key", max_concurrency = max_concurrency)
+    client.client = SimpleNamespace(aio = SimpleNamespace(models = FakeModels(latency)))
+    return client
+
+async def run_many(client: GeminiProvider, n: int):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        client.generate(f"prompt {i}") for i in range(n)
+    ])
+    return results, time.perf_counter() - start
+
+# test 1: N simultaneous executes finish in about the time of one
+def test_concurrent_calls_overlap():
+    n = 10
+    client = make_client(max_concurrency = n)
+
+    results, elapsed = asyncio.run(run_many(client, n))
+
+    assert results == [f"echo: prompt {i}" for i in range(n)]
+    assert client.client.aio.models.peak == n
+    assert elapsed < LATENCY * 2
+
+# test 2: concurrency limit is respected
+def test_concurrency_limit():
+    client = make_client(max_concurrency = 2)
+
+    _, elapsed = asyncio.run(run_many(client, 6))
+
+    assert client.client.aio.models.peak == 2
+    assert elapsed >= LATENCY * 3 * 0.9
+
+# test 3: event loop keeps serving other work during a call
+def test_event_loop_not_blocked():
+    client = make_client(max_concurrency = 1)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await client.generate("slow prompt")
+        task.cancel()
+        return ticks
+
+    ticks = asyncio.run(scenario())
+    assert ticks >= 5
+
+# test 4: streaming yields chunks incrementally and reassembles to the full text
+def test_stream_response_chunks():
+    client = make_client(max_concurrency = 1)
+
+    async def collect():
+        return [chunk async for chunk in client.stream("a b c")]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) == 4
+    assert "".join(chunks).strip() == "echo: a b c"
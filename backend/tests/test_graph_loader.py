@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base
+from modules.storage.graph import load_graph_page
+from modules.storage.models import User, Conversation, Node, Edge
+
+"""
+Tests for the paged conversation graph loader, on in-memory SQLite.
+"""
+
+@pytest.fixture(scope = "function")
+def db_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind = engine)()
+
+    session.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    session.add(Conversation(id = 1, user_id = 1, title = "graph"))
+    session.add(Conversation(id = 2, user_id = 1, title = "empty"))
+    # chain 1 -> 2 -> ... -> 10 laid out diagonally
+    session.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "position_x": i * 100, "position_y": i * 100,
+         "prompt_text": f"prompt {i}", "response_text": None, "type_data": {}}
+        for i in range(1, 11)
+    ])
+    session.execute(insert(Edge), [
+        {"id": i, "conversation_id": 1, "source_node_id": i, "target_node_id": i + 1}
+        for i in range(1, 10)
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+
+# test 1: an unpaged load returns every node and edge
+def test_full_graph(db_session):
+    page = load_graph_page(db_session, 1)
+
+    assert [n["id"] for n in page["nodes"]] == [str(i) for i in range(1, 11)]
+    assert page["nodes"][0]["position"] == {"x": 100, "y": 100}
+    assert len(page["edges"]) == 9
+    assert page["has_more"] is False and page["next_cursor"] is None
+
+# test 2: walking the cursor visits every node and every edge exactly once
+def test_cursor_pages(db_session):
+    nodes, edges, cursor = [], [], None
+    while True:
+        page = load_graph_page(db_session, 1, cursor = cursor, limit = 3)
+        nodes += [n["id"] for n in page["nodes"]]
+        edges += [e["id"] for e in page["edges"]]
+        if not page["has_more"]:
+            break
+        cursor = int(page["next_cursor"])
+
+    assert nodes == [str(i) for i in range(1, 11)]
+    assert sorted(edges, key = int) == [str(i) for i in range(1, 10)]
+
+# test 3: bbox filters nodes and keeps only edges into visible nodes; unknown conversations are None
+def test_bbox_and_missing(db_session):
+    page = load_graph_page(db_session, 1, bbox = (250, 250, 500, 500))
+
+    assert [n["id"] for n in page["nodes"]] == ["3", "4", "5"]
+    assert [(e["source"], e["target"]) for e in page["edges"]] == [("2", "3"), ("3", "4"), ("4", "5")]
+
+    assert load_graph_page(db_session, 2) == {
+        "conversation_id": "2", "nodes": [], "edges": [], "next_cursor": None, "has_more": False
+    }
+    assert load_graph_page(db_session, 99) is None
+
+# test 4: preview mode returns lengths and prefixes; plain node queries leave bodies unloaded
+def test_preview_and_deferred(db_session):
+    db_session.execute(Node.__table__.update().where(Node.id == 1).values(response_text = "r" * 500))
+    db_session.commit()
+
+    page = load_graph_page(db_session, 1, limit = 2, preview_chars = 4)
+    first, second = page["nodes"]
+    assert "prompt" not in first
+    assert (first["prompt_preview"], first["prompt_length"]) == ("prom", 8)
+    assert (first["response_preview"], first["response_length"]) == ("rrrr", 500)
+    assert (second["response_preview"], second["response_length"]) == (None, 0)
+
+    node = db_session.query(Node).filter(Node.id == 1).first()
+    assert "prompt_text" not in node.__dict__ and "response_text" not in node.__dict__
+    assert node.response_text == "r" * 500
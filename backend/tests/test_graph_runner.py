@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from modules.llm.graph_runner import GraphPlan, run_plan
+
+"""
+Tests for the topological-wave scheduler behind /execute/graph, using a fake executor.
+"""
+
+LATENCY = 0.05
+
+def collect(plan, execute, max_workers):
+    async def scenario():
+        return [event async for event in run_plan(plan, execute, max_workers = max_workers)]
+    return asyncio.run(scenario())
+
+def make_executor(finished, fail = ()):
+    state = {"active": 0, "peak": 0}
+
+    async def execute(node_id, prompt):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(LATENCY)
+            if node_id in fail:
+                raise RuntimeError("boom")
+            finished.append(node_id)
+            return f"answer {node_id}"
+        finally:
+            state["active"] -= 1
+
+    return execute, state
+
+# test 1: wide fan-out runs in parallel, bounded by max_workers
+def test_fan_out_parallel():
+    children = list(range(2, 10))
+    plan = GraphPlan(
+        node_ids = {1, *children},
+        edges = [(1, child) for child in children],
+        prompts = {node_id: f"p{node_id}" for node_id in [1, *children]}
+    )
+    finished = []
+    execute, state = make_executor(finished)
+
+    start = time.perf_counter()
+    events = collect(plan, execute, max_workers = 4)
+    elapsed = time.perf_counter() - start
+
+    assert finished[0] == 1
+    assert state["peak"] == 4
+    # root + two waves of four children
+    assert elapsed < LATENCY * 5
+    assert events[-1] == {"event": "done", "completed": 9, "failed": 0, "skipped": 0}
+
+# test 2: a node never starts before all of its parents finish
+def test_parents_first():
+    plan = GraphPlan(
+        node_ids = {1, 2, 3, 4},
+        edges = [(1, 2), (1, 3), (2, 4), (3, 4)],
+        prompts = {1: "a", 2: "b", 3: "c", 4: "d"}
+    )
+    finished = []
+    execute, _ = make_executor(finished)
+    collect(plan, execute, max_workers = 4)
+
+    assert finished[0] == 1
+    assert finished[-1] == 4
+    assert set(finished[1:3]) == {2, 3}
+
+# test 3: failures skip descendants; empty prompts are skipped without blocking
+def test_failure_and_empty_prompt():
+    plan = GraphPlan(
+        node_ids = {1, 2, 3, 4, 5},
+        edges = [(1, 2), (2, 3), (1, 4), (4, 5)],
+        prompts = {1: "a", 2: "b", 3: "c", 4: "", 5: "e"}
+    )
+    finished = []
+    execute, _ = make_executor(finished, fail = {2})
+    events = collect(plan, execute, max_workers = 2)
+
+    by_node = {(e["event"], e.get("node_id")) for e in events}
+    assert ("failed", "2") in by_node
+    assert ("skipped", "3") in by_node
+    assert ("skipped", "4") in by_node
+    assert sorted(finished) == [1, 5]
+    assert events[-1] == {"event": "done", "completed": 2, "failed": 1, "skipped": 2}
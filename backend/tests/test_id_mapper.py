@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from modules.llm.batch import apply_batch
+from modules.llm.id_mapper import IDMapper, id_mapper
+from modules.llm.models import BatchRequest
+from modules.storage.models import User, Conversation, Node
+
+"""
+Tests for the persistent temp-ID mapper and idempotent node creation.
+"""
+
+@pytest.fixture(scope = "function")
+def session_factory():
+    # one shared in-memory database across sessions, like separate workers on one Postgres
+    engine = create_engine("sqlite://", connect_args = {"check_same_thread": False}, poolclass = StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind = engine)
+
+    session = factory()
+    session.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    session.add(Conversation(id = 1, user_id = 1, title = "ids"))
+    session.add(Node(id = 7, conversation_id = 1, node_type = "prompt", position_x = 0, position_y = 0,
+                     prompt_text = "", client_id = "temp_seven"))
+    session.commit()
+    session.close()
+    id_mapper.clear_mappings()
+
+    return factory
+
+# test 1: a fresh mapper (restart / other worker) resolves from the db, then from its cache
+def test_resolve_from_db(session_factory):
+    mapper = IDMapper(session_factory = session_factory)
+
+    assert mapper.resolve_id("temp_seven") == 7
+    assert mapper.resolve_id("temp_seven") == 7
+    assert mapper.stats()["hits"] == 1 and mapper.stats()["misses"] == 1
+    assert mapper.resolve_id("42") == 42
+
+    with pytest.raises(ValueError):
+        mapper.resolve_id("temp_unknown")
+    with pytest.raises(ValueError):
+        mapper.resolve_id("not-an-id")
+
+# test 2: the cache is bounded LRU and entries expire
+def test_bounded_cache(session_factory):
+    mapper = IDMapper(max_entries = 2, session_factory = session_factory)
+    mapper.add_mapping("temp_a", 1)
+    mapper.add_mapping("temp_b", 2)
+    mapper.get_mapping("temp_a")
+    mapper.add_mapping("temp_c", 3)
+    assert mapper.snapshot() == {"temp_a": 1, "temp_c": 3}
+
+    mapper.ttl_seconds = -1
+    mapper.add_mapping("temp_seven", 999)
+    # expired entry falls through to the db
+    assert mapper.get_mapping("temp_seven") == 7
+
+# test 3: replaying a batch create (or repeating a temp id within one) reuses the node
+def test_idempotent_batch_create(session_factory):
+    db = session_factory()
+    request = BatchRequest(conversation_id = "1", operations = [
+        {"op": "create_node", "temp_id": "temp_new", "position": {"x": 1, "y": 2}},
+        {"op": "create_node", "temp_id": "temp_new", "position": {"x": 1, "y": 2}},
+        {"op": "create_node", "temp_id": "temp_seven", "position": {"x": 0, "y": 0}},
+    ])
+
+    mappings, results = apply_batch(db, request)
+    db.commit()
+    assert [r["status"] for r in results] == ["success", "exists", "exists"]
+    assert results[1]["node_id"] == mappings["temp_new"] and results[2]["node_id"] == "7"
+
+    _, replay = apply_batch(db, request)
+    db.commit()
+    assert [r["status"] for r in replay] == ["exists"] * 3
+    assert db.query(Node).count() == 2
+    db.close()
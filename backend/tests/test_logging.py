@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+import queue
+
+import httpx
+from fastapi import FastAPI
+
+from core.logging import (
+    ContextFilter, DroppingQueueHandler, JsonFormatter, RequestContextMiddleware,
+    redact, request_id_var, sample_rate, sampled_var,
+)
+
+"""
+Tests for structured logging: redaction, JSON output, per-request sampling, request ids
+and the non-blocking queue handler.
+"""
+
+def make_record(level = logging.INFO, msg = "saved %s", args = (1,), **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+# test 1: prompt bodies and credentials never reach the output, only their length
+def test_redaction():
+    assert redact("hello", "prompt") == "[redacted len=5]"
+    assert redact({"Authorization": "Bearer x", "node_id": 3}) == {
+        "Authorization": "[redacted len=8]", "node_id": 3,
+    }
+
+# test 2: one JSON object per record carrying the request id and extra fields
+def test_json_format():
+    token = request_id_var.set("abc123")
+    try:
+        record = make_record(node_id = 7, prompt = "secret")
+        assert ContextFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "saved 1"
+    assert entry["request_id"] == "abc123"
+    assert entry["node_id"] == 7
+    assert "secret" not in json.dumps(entry)
+
+# test 3: unsampled requests drop INFO but keep WARNING; longest route prefix wins
+def test_sampling():
+    token = sampled_var.set(False)
+    try:
+        assert not ContextFilter().filter(make_record(logging.INFO))
+        assert ContextFilter().filter(make_record(logging.WARNING))
+    finally:
+        sampled_var.reset(token)
+
+    rates = {"/api": 0.5, "/api/llm/nodes/update-position": 0.01}
+    assert sample_rate("/api/llm/nodes/update-position", rates) == 0.01
+    assert sample_rate("/api/llm/execute", rates) == 0.5
+
+# test 4: a full queue drops records instead of blocking
+def test_queue_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize = 1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+# test 5: responses echo the caller's X-Request-ID, or get a fresh one
+def test_middleware_request_id():
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/ping")
+    def ping():
+        return {"request_id": request_id_var.get()}
+
+    async def run():
+        transport = httpx.ASGITransport(app = app)
+        async with httpx.AsyncClient(transport = transport, base_url = "http://test") as client:
+            given = await client.get("/ping", headers = {"X-Request-ID": "req-1"})
+            fresh = await client.get("/ping")
+        return given, fresh
+
+    given, fresh = asyncio.run(run())
+    assert given.headers["x-request-id"] == "req-1"
+    assert given.json()["request_id"] == "req-1"
+    assert len(fresh.headers["x-request-id"]) == 32
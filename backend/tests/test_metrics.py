@@ -0,0 +1,83 @@
+import asyncio
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import create_engine, text
+
+from core.metrics import (
+    Counter, Histogram, MetricsMiddleware, RequestTimings, instrument_engine, stage, timings_var,
+)
+
+"""
+Tests for the metrics registry primitives, DB statement instrumentation and the metrics middleware.
+"""
+
+# test 1: histograms render cumulative buckets, count and sum in the text format
+def test_histogram_render():
+    histogram = Histogram("test_latency_seconds", "test", ("route",), buckets = (0.1, 1.0))
+    histogram.labels(route = "/a").observe(0.05)
+    histogram.labels(route = "/a").observe(0.5)
+    histogram.labels(route = "/a").observe(5)
+
+    lines = histogram.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{route="/a"} 3' in lines
+    assert 'test_latency_seconds_sum{route="/a"} 5.55' in lines
+
+    counter = Counter("test_events_total", "test", ("kind",))
+    counter.labels(kind = 'say "hi"').inc(2)
+    assert 'test_events_total{kind="say \\"hi\\""} 2' in counter.render()
+
+# test 2: statements and stages are charged to the current request's timings
+def test_request_timings():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    timings = RequestTimings()
+    token = timings_var.set(timings)
+    try:
+        with stage("context"):
+            with engine.connect() as conn:
+                conn.execute(text("select 1"))
+                conn.execute(text("select 2"))
+    finally:
+        timings_var.reset(token)
+
+    assert timings.db_queries == 2
+    assert "context" in timings.stages
+    header = timings.server_timing()
+    assert header.startswith("context;dur=")
+    assert 'db;dur=' in header and '"2 queries"' in header
+
+# test 3: the middleware labels by route template (router prefix included) and adds Server-Timing
+def test_middleware():
+    router = APIRouter()
+
+    @router.get("/items/{item_id}")
+    def item(item_id: int):
+        with stage("lookup"):
+            return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router, prefix = "/api")
+    app.add_middleware(MetricsMiddleware, server_timing = True)
+
+    @app.get("/metrics-test")
+    def metrics_test():
+        from core.metrics import registry
+        return registry.render()
+
+    async def run():
+        transport = httpx.ASGITransport(app = app)
+        async with httpx.AsyncClient(transport = transport, base_url = "http://test") as client:
+            response = await client.get("/api/items/7")
+            rendered = (await client.get("/metrics-test")).json()
+        return response, rendered
+
+    response, rendered = asyncio.run(run())
+    assert response.json() == {"id": 7}
+    assert response.headers["server-timing"].startswith("lookup;dur=")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/items/{item_id}",status="200"}' in rendered
+    assert "/api/items/7" not in rendered
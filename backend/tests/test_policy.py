@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from modules.llm.providers.errors import CircuitOpenError, DeadlineExceededError, ProviderRequestError, \
+    RateLimitedError, classify
+from modules.llm.providers.policy import CallPolicy, CircuitBreaker, deadline
+from modules.llm.providers.stub import FaultInjectingStub, StubProvider, UpstreamError
+
+"""
+Tests for the provider call policy: retries, circuit breaker, deadlines and hedging,
+driven by the fault-injecting stub provider.
+"""
+
+def make_provider(faults = (), **policy):
+    provider = FaultInjectingStub(faults = faults)
+    options = dict(max_attempts = 3, base_delay = 0.001, max_delay = 0.01, attempt_timeout = 1.0)
+    options.update(policy)
+    provider.policy = CallPolicy("test", **options)
+    return provider
+
+# test 1: retryable failures are retried, waiting at least Retry-After; 4xx is not retried
+def test_retries():
+    provider = make_provider([UpstreamError(503), UpstreamError(429, retry_after = 0.05)])
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await provider.generate("hello")
+        return response, loop.time() - start
+
+    response, elapsed = asyncio.run(scenario())
+    assert response == provider.respond("hello")
+    assert provider.attempts == 3
+    assert elapsed >= 0.05
+
+    assert isinstance(classify(UpstreamError(429, retry_after = 2)), RateLimitedError)
+    assert classify(UpstreamError(429, retry_after = 2)).retry_after == 2.0
+
+    provider = make_provider([UpstreamError(400)])
+    with pytest.raises(ProviderRequestError):
+        asyncio.run(provider.generate("hello"))
+    assert provider.attempts == 1
+
+# test 2: the breaker opens after consecutive failures, then lets one probe through
+def test_circuit_breaker():
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold = 2, reset_timeout = 10, clock = lambda: now[0])
+    provider = make_provider([UpstreamError(503)] * 3, max_attempts = 1, breaker = breaker)
+
+    async def call():
+        return await provider.generate("hello")
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            asyncio.run(call())
+    assert breaker.state == "open"
+
+    # fails fast without touching the provider
+    with pytest.raises(CircuitOpenError) as error:
+        asyncio.run(call())
+    assert provider.attempts == 2
+    assert error.value.retry_after == 10
+
+    # half-open: the probe fails and re-opens, the next probe succeeds and closes
+    now[0] = 11
+    with pytest.raises(Exception):
+        asyncio.run(call())
+    assert breaker.state == "open"
+    now[0] = 22
+    assert asyncio.run(call()) == provider.respond("hello")
+    assert breaker.state == "closed"
+
+# test 3: a slow provider hits the request deadline as a DeadlineExceededError
+def test_deadline():
+    provider = make_provider([5.0, 5.0, 5.0])
+
+    async def scenario():
+        with deadline(0.05):
+            await provider.generate("hello")
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(scenario())
+
+# test 4: a hedged duplicate wins over a stalled first attempt
+def test_hedging():
+    provider = make_provider([5.0, None], hedge_after = 0.02)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await provider.generate("hello")
+        return response, loop.time() - start
+
+    response, elapsed = asyncio.run(scenario())
+    assert response == provider.respond("hello")
+    assert provider.attempts == 2
+    assert elapsed < 1.0
+
+# test 5: streams are retried until the first chunk arrives
+def test_stream_retry():
+    provider = make_provider([UpstreamError(503), ConnectionError("reset")])
+
+    async def scenario():
+        return "".join([chunk async for chunk in provider.stream("hello")])
+
+    assert asyncio.run(scenario()).strip() == provider.respond("hello")
+    assert provider.attempts == 3
+
+# test 6: waiting for a local concurrency slot isn't an attempt timeout: a healthy provider queues
+# without failing or tripping the breaker, and only the request deadline bounds the wait
+def test_slot_wait_outside_attempt_timeout():
+    provider = StubProvider(max_concurrency = 2, latency_ms = 300, batching = False)
+    provider.policy = CallPolicy("test", max_attempts = 3, attempt_timeout = 0.5)
+
+    async def collect(stream):
+        return "".join([chunk async for chunk in stream]).strip()
+
+    async def queued_past_deadline():
+        # both slots busy for longer than the deadline
+        async with provider._slot(), provider._slot():
+            with deadline(0.05):
+                await provider.generate("late")
+
+    async def scenario():
+        generated = await asyncio.gather(*(provider.generate(f"hello {i}") for i in range(6)))
+        streamed = await asyncio.gather(*(collect(provider.stream(f"stream {i}")) for i in range(4)))
+        with pytest.raises(DeadlineExceededError):
+            await queued_past_deadline()
+        return generated, streamed
+
+    generated, streamed = asyncio.run(scenario())
+    assert generated == [provider.respond(f"hello {i}") for i in range(6)]
+    assert streamed == [provider.respond(f"stream {i}") for i in range(4)]
+    assert provider.calls == 10 and provider.policy.breaker.failures == 0 and provider._semaphore._value == 2
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from modules.llm.positions import PositionCoalescer
+from modules.storage.positions import bulk_update_positions
+from modules.storage.models import User, Conversation, Node
+
+"""
+Tests for bulk position writes and last-write-wins coalescing, on in-memory SQLite.
+"""
+
+@pytest.fixture(scope = "function")
+def session_factory():
+    engine = create_engine("sqlite://", poolclass = StaticPool, connect_args = {"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind = engine)
+
+    db = factory()
+    db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+    db.add(Conversation(id = 1, user_id = 1, title = "positions"))
+    db.execute(insert(Node), [
+        {"id": i, "conversation_id": 1, "node_type": "prompt", "prompt_text": "",
+         "position_x": 0, "position_y": 0, "type_data": {}} for i in range(1, 11)
+    ])
+    db.commit()
+    db.close()
+
+    yield factory
+    engine.dispose()
+
+def positions_in_db(factory):
+    db = factory()
+    try:
+        return {node_id: (x, y) for node_id, x, y in db.query(Node.id, Node.position_x, Node.position_y)}
+    finally:
+        db.close()
+
+# test 1: bulk write updates existing nodes and reports missing ones
+def test_bulk_update_positions(session_factory):
+    db = session_factory()
+    found = bulk_update_positions(db, {1: (5, 6), 2: (7, 8), 99: (1, 1)})
+    db.commit()
+    db.close()
+
+    assert found == {1, 2}
+    stored = positions_in_db(session_factory)
+    assert stored[1] == (5, 6) and stored[2] == (7, 8) and stored[3] == (0, 0)
+
+# test 2: a drag storm collapses to a few flushes and the last write wins
+def test_coalescing_last_write_wins(session_factory):
+    coalescer = PositionCoalescer(session_factory = session_factory, flush_delay_ms = 5)
+
+    async def storm():
+        # 200 drag events spread over 10 nodes
+        return await asyncio.gather(*[
+            coalescer.submit({step % 10 + 1: (step, step)}) for step in range(200)
+        ])
+
+    results = asyncio.run(storm())
+
+    assert all(len(found) == 1 for found in results)
+    assert coalescer.flushes < 5
+    stored = positions_in_db(session_factory)
+    for node_id in range(1, 11):
+        last_step = 190 + node_id - 1
+        assert stored[node_id] == (last_step, last_step)
+
+# test 3: unknown nodes are reported back to the caller that sent them
+def test_missing_node(session_factory):
+    coalescer = PositionCoalescer(session_factory = session_factory, flush_delay_ms = 0)
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.submit({1: (1, 1)}),
+            coalescer.submit({42: (1, 1)}),
+        )
+
+    ok, missing = asyncio.run(scenario())
+    assert ok == {1}
+    assert missing == set()
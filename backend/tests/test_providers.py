@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from modules.llm.config import llm_settings
+from modules.llm.providers.base import LLMProvider
+from modules.llm.providers.batching import MicroBatcher
+from modules.llm.providers.gemini import GeminiProvider
+from modules.llm.providers.registry import ProviderRegistry, registry
+from modules.llm.providers.stub import StubProvider
+
+"""
+Tests for the provider layer: micro-batching, the deterministic stub provider and tier routing.
+"""
+
+# test 1: concurrent submits are coalesced into max_size batches, results in caller order
+def test_micro_batcher():
+    sizes = []
+
+    async def run_batch(items):
+        sizes.append(len(items))
+        await asyncio.sleep(0.01)
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(run_batch, max_size = 4, max_wait_ms = 20)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10))), batcher
+
+    results, batcher = asyncio.run(scenario())
+    assert results == [i * 2 for i in range(10)]
+    assert sorted(sizes) == [2, 4, 4]
+    assert batcher.stats()["batches"] == 3
+
+# test 2: a failing batch call fails every caller in it
+def test_micro_batcher_error():
+    async def run_batch(items):
+        raise RuntimeError("provider down")
+
+    async def scenario():
+        batcher = MicroBatcher(run_batch, max_size = 8, max_wait_ms = 1)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions = True)
+
+    results = asyncio.run(scenario())
+    assert all("provider down" in str(result) for result in results)
+
+# test 3: the stub is deterministic and serves concurrent generates in one batch call
+def test_stub_provider():
+    stub = StubProvider(latency_ms = 10, batching = True)
+
+    async def scenario():
+        responses = await asyncio.gather(*(stub.generate(f"prompt {i}") for i in range(8)))
+        streamed = "".join([chunk async for chunk in stub.stream("prompt 3")])
+        vectors = await stub.embed(["the cat sat", "the cat sat down", "quantum chromodynamics"])
+        tokens = await stub.count_tokens("a" * 40)
+        return responses, streamed, vectors, tokens
+
+    responses, streamed, vectors, tokens = asyncio.run(scenario())
+    assert responses[3] == stub.respond("prompt 3")
+    assert streamed.strip() == responses[3]
+    assert stub.generate_batcher.stats()["batches"] == 1
+    assert tokens == 10
+
+    def dot(a, b):
+        return sum(x * y for x, y in zip(a, b))
+
+    assert dot(vectors[0], vectors[0]) == pytest.approx(1.0)
+    assert dot(vectors[0], vectors[1]) > dot(vectors[0], vectors[2])
+
+# test 4: tiers route to their configured provider:model; instances are shared
+def test_tier_routing(monkeypatch):
+    monkeypatch.setattr(llm_settings, "LLM_TIERS", {"fast": "stub:stub-fast"})
+    routes = ProviderRegistry()
+    routes.register("stub", lambda model: StubProvider(model))
+
+    fast = routes.for_tier("fast")
+    assert isinstance(fast, StubProvider) and fast.model == "stub-fast"
+    assert routes.for_tier("fast") is fast
+    with pytest.raises(ValueError):
+        routes.for_tier("premium")
+    with pytest.raises(ValueError):
+        registry.get("nonexistent")
+
+# test 5: batching without a native batch call falls back to one call per request; keys name the provider
+def test_batch_fallback_and_keys():
+    class Unbatched(StubProvider):
+        _generate_batch = LLMProvider._generate_batch
+
+    provider = Unbatched(batching = True)
+
+    async def scenario():
+        return await asyncio.gather(*(provider.generate(f"prompt {i}") for i in range(4)))
+
+    assert asyncio.run(scenario()) == [provider.respond(f"prompt {i}") for i in range(4)]
+    assert provider.calls == 4
+
+    gemini = GeminiProvider(api_key = "test-key", model = "stub-echo")
+    assert gemini.request_key("hi") == LLMProvider.request_key(gemini, "hi") != StubProvider().request_key("hi")
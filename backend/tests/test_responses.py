@@ -0,0 +1,38 @@
+from modules.llm.responses import text_body_response
+
+"""
+Tests for the ETag / byte-range text body responses.
+"""
+
+BODY = "héllo world"    # 12 bytes in UTF-8
+
+def respond(**headers):
+    return text_body_response(BODY, {k.replace("_", "-"): v for k, v in headers.items()})
+
+# test 1: full body carries an ETag, and a matching If-None-Match gets 304
+def test_etag_revalidation():
+    full = respond()
+    etag = full.headers["etag"]
+    assert full.status_code == 200 and full.body == BODY.encode()
+
+    assert respond(if_none_match = etag).status_code == 304
+    assert respond(if_none_match = f'"other", W/{etag}').status_code == 304
+    assert respond(if_none_match = '"other"').status_code == 200
+
+# test 2: single byte ranges get 206, unsatisfiable ones 416, unsupported ones the full body
+def test_ranges():
+    partial = respond(range = "bytes=0-2")
+    assert partial.status_code == 206
+    assert partial.body == "hé".encode()
+    assert partial.headers["content-range"] == "bytes 0-2/12"
+
+    assert respond(range = "bytes=-5").body == b"world"
+    assert respond(range = "bytes=7-").body == b"world"
+    assert respond(range = "bytes=7-100").headers["content-range"] == "bytes 7-11/12"
+
+    unsatisfiable = respond(range = "bytes=12-")
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */12"
+
+    assert respond(range = "bytes=0-1,4-5").status_code == 200
+    assert respond(range = "bytes=0-2", if_range = '"stale"').status_code == 200
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from modules.llm.providers.errors import DeadlineExceededError
+from modules.llm.providers.policy import deadline
+from modules.llm.scheduler import ExecutionScheduler, SchedulerRejected, TokenBucket, principal
+
+"""
+Tests for the LLM execution scheduler: token buckets, the global cap, fair queuing and 429 feedback.
+"""
+
+# test 1: the bucket allows a burst, then refills at its rate
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(rate = 2, burst = 3, clock = lambda: now[0])
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+    now[0] = 0.5
+    assert bucket.take() == 0
+
+# test 2: a user over their rate gets rejected with a retry-after; graph-style callers wait instead
+def test_rate_limit():
+    scheduler = ExecutionScheduler(max_concurrency = 4, rate = 20, burst = 2)
+
+    async def call(block = False):
+        async with scheduler.slot("user:1", block = block):
+            pass
+
+    async def scenario():
+        await call()
+        await call()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await call()
+        assert rejected.value.reason == "rate_limited"
+        assert 0 < rejected.value.retry_after <= 0.05
+        with pytest.raises(SchedulerRejected):
+            scheduler.check("user:1")
+        await call(block = True)
+        scheduler.check("user:2")
+
+    asyncio.run(scenario())
+
+# test 3: the global cap holds, and a light user isn't stuck behind a heavy user's backlog
+def test_fair_queuing():
+    scheduler = ExecutionScheduler(max_concurrency = 2, max_queue = 100, rate = 1000, burst = 1000)
+    active, peak, order = [0], [0], []
+
+    async def call(user, i):
+        async with scheduler.slot(user):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            order.append((user, i))
+            await asyncio.sleep(0.005)
+            active[0] -= 1
+
+    async def scenario():
+        heavy = [asyncio.create_task(call("user:heavy", i)) for i in range(20)]
+        await asyncio.sleep(0)
+        light = [asyncio.create_task(call("user:light", i)) for i in range(2)]
+        await asyncio.gather(*heavy, *light)
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+    # both light calls are served within the first few slots, not after all 20 heavy ones
+    light_positions = [n for n, (user, _) in enumerate(order) if user == "user:light"]
+    assert max(light_positions) < 8
+
+# test 4: a full queue rejects with position and ETA; cancelled waiters leave the queue
+def test_queue_full():
+    scheduler = ExecutionScheduler(max_concurrency = 1, max_queue = 2, rate = 1000, burst = 1000)
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("user:1"):
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queued"] == 2
+
+        with pytest.raises(SchedulerRejected) as rejected:
+            async with scheduler.slot("user:2"):
+                pass
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.position == 3 and rejected.value.eta > 0
+
+        tasks[2].cancel()
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 1
+
+        gate.set()
+        await asyncio.gather(*tasks, return_exceptions = True)
+        assert scheduler.stats()["active"] == 0 and scheduler.stats()["queued"] == 0
+
+        # calls inside a principal use its user
+        with principal("user:3"):
+            async with scheduler.slot():
+                pass
+        assert "user:3" in scheduler._buckets
+
+    asyncio.run(scenario())
+
+# test 5: a queued call gives up at its deadline and leaves the queue; a slot granted as the
+# deadline hits is passed on, not leaked
+def test_queue_deadline():
+    scheduler = ExecutionScheduler(max_concurrency = 1, max_queue = 10, rate = 1000, burst = 1000)
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("user:1"):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceededError):
+                async with scheduler.slot("user:2"):
+                    pass
+        assert scheduler.stats()["queued"] == 0 and scheduler.stats()["active"] == 1
+
+        # a waiter granted in the same step it is cancelled hands the slot to the next one
+        waiter = asyncio.create_task(scheduler._acquire("user:3", True, 0.0))
+        later = asyncio.create_task(scheduler._acquire("user:4", True, 0.0))
+        await asyncio.sleep(0.01)
+        scheduler._release()        # on the holder's behalf; its own release below frees `later`'s slot
+        waiter.cancel()
+        outcome, = await asyncio.gather(waiter, return_exceptions = True)
+        if outcome is None:
+            # the grant won the race (wait_for returns a result that is already there)
+            scheduler._release()
+        await asyncio.wait_for(later, 1)
+        assert scheduler.stats()["active"] == 1 and scheduler.stats()["queued"] == 0
+
+        gate.set()
+        await holder
+        assert scheduler.stats()["active"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from modules.storage.content import save_response_text
+from modules.storage.models import User, Conversation, Node
+from modules.storage import search as search_module
+from modules.storage.search import InvertedIndex, _marked_snippet, search_nodes, search_nodes_async, snippet
+
+"""
+Tests for full-text search: BM25 ranking and scoping in the in-process index, snippets,
+and keeping the index current with committed writes (SQLite).
+"""
+
+@pytest.fixture(scope = "function")
+def Session():
+    engine = create_engine("sqlite://", poolclass = StaticPool, connect_args = {"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind = engine)
+    with Session() as db:
+        db.add_all([User(id = 1, name = "alice", email = "alice@mail.com"), User(id = 2, name = "bob", email = "bob@mail.com")])
+        db.add_all([Conversation(id = 1, user_id = 1, title = "a"), Conversation(id = 2, user_id = 2, title = "b")])
+        db.execute(insert(Node), [
+            {"id": i, "conversation_id": conversation_id, "node_type": "prompt", "position_x": 0, "position_y": 0,
+             "prompt_text": prompt, "response_text": response, "type_data": {}}
+            for i, conversation_id, prompt, response in [
+                (1, 1, "how do I tune postgres", "raise shared_buffers and work_mem for postgres"),
+                (2, 1, "sourdough recipe", "flour, water, salt and a starter"),
+                (3, 1, "postgres vacuum", "autovacuum reclaims dead tuples"),
+                (4, 2, "postgres replication", "streaming replication ships WAL"),
+            ]
+        ])
+        db.commit()
+    yield Session
+    engine.dispose()
+
+# test 1: BM25 ranks by term frequency and rarity, scopes by conversation and user, pages
+def test_ranking_and_scope():
+    index = InvertedIndex()
+    index.add(1, 1, 1, "postgres tuning postgres postgres")
+    index.add(2, 1, 1, "postgres and a long answer about many other unrelated topics entirely")
+    index.add(3, 2, 2, "postgres replication")
+    index.add(4, 2, 2, "nothing relevant here")
+
+    page, total = index.search("postgres", 10)
+    assert total == 3 and page[0][0] == 1
+    assert [hit[0] for hit in index.search("postgres replication", 10)[0]][0] == 3
+    assert {hit[0] for hit in index.search("postgres", 10, conversation_id = 1)[0]} == {1, 2}
+    assert {hit[0] for hit in index.search("postgres", 10, user_id = 2)[0]} == {3}
+    assert index.search("postgres", 1, offset = 1)[0][0][0] == index.search("postgres", 2)[0][1][0]
+    assert index.search("the", 10) == ([], 0)
+
+# test 2: snippets center on the first match and report highlight offsets
+def test_snippets():
+    text = "x" * 300 + " the Postgres planner chooses postgres plans"
+    result = snippet(text, {"postgres"}, width = 60)
+    assert len(result["text"]) <= 60
+    assert [result["text"][s:e] for s, e in result["highlights"]] == ["Postgres", "postgres"]
+
+    marked = _marked_snippet("tune \x02postgres\x03 and \x02vacuum\x03")
+    assert marked == {"text": "tune postgres and vacuum", "highlights": [[5, 13], [18, 24]]}
+
+# test 3: search_nodes builds the index from the table and follows committed writes only
+def test_search_nodes(Session, monkeypatch):
+    monkeypatch.setattr(search_module, "_indexes", {})
+    with Session() as db:
+        found = search_nodes(db, "postgres", user_id = 1)
+        assert [hit["node_id"] for hit in found["results"]] == ["1", "3"]
+        assert found["backend"] == "inverted_index" and found["total"] == 2
+        response = found["results"][0]["response"]
+        assert [response["text"][s:e] for s, e in response["highlights"]] == ["postgres"]
+
+    with Session() as db:
+        save_response_text(db, 2, "bake it hot; bread has no vacuum")
+        db.rollback()
+        assert search_nodes(db, "bread")["total"] == 0
+
+        save_response_text(db, 2, "bake it hot; bread needs steam")
+        db.commit()
+        assert [hit["node_id"] for hit in search_nodes(db, "bread")["results"]] == ["2"]
+
+        # deleted rows drop out of results even before the index hears about them
+        db.query(Node).filter(Node.id == 3).delete()
+        db.commit()
+        assert search_nodes(db, "vacuum")["results"] == []
+
+# test 4: re-indexing most documents compacts the postings without changing results
+def test_compaction():
+    index = InvertedIndex()
+    for i in range(2000):
+        index.add(i, 1, 1, f"common term{i % 7}")
+    for i in range(2000):
+        index.add(i, 1, 1, f"common revised term{i % 7}")
+    for i in range(500):
+        index.add(i, 1, 1, f"common updated term{i % 7}")
+    # tombstones outnumbered live documents at some point and were dropped
+    assert index._count < 4500
+    assert index.search("updated", 5000)[1] == 500
+    assert index.search("revised", 5000)[1] == 1500
+    assert index.search("term3", 5000)[1] == len([i for i in range(2000) if i % 7 == 3])
+    assert index.search("common", 5000)[1] == 2000
+
+# test 5: the async path builds the index a page at a time off the event loop; concurrent searches
+# wait for one build and agree with the sync path
+def test_search_nodes_async(Session, tmp_path, monkeypatch):
+    path = tmp_path / "search.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session() as source, sessionmaker(bind = engine)() as db:
+        for model in (User, Conversation, Node):
+            db.execute(insert(model), [
+                {column.name: getattr(row, column.name) for column in model.__table__.columns}
+                for row in source.query(model)
+            ])
+        db.commit()
+
+    monkeypatch.setattr(search_module, "_indexes", {})
+    monkeypatch.setattr(search_module, "LOAD_PAGE", 2)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(async_engine, expire_on_commit = False)
+
+    async def search(query, **scope):
+        async with factory() as db:
+            return await search_nodes_async(db, query, **scope)
+
+    async def scenario():
+        return await asyncio.gather(search("postgres", user_id = 1), search("postgres"), search("sourdough"))
+
+    try:
+        scoped, everywhere, bread = asyncio.run(scenario())
+        assert [hit["node_id"] for hit in scoped["results"]] == ["1", "3"] and everywhere["total"] == 3
+        assert [hit["node_id"] for hit in bread["results"]] == ["2"]
+        index = search_module.fallback_index(engine)
+        assert index.loaded and len(index) == 4 and index._building is None
+        with sessionmaker(bind = engine)() as db:
+            assert search_nodes(db, "postgres", user_id = 1)["results"] == scoped["results"]
+    finally:
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from core.database import Base
+from modules.llm import api, graph_runner
+from modules.llm.context import ContextTurn
+from modules.llm.models import ExecuteNodeRequest
+from modules.llm.graph_runner import build_plan, build_stale_plan, execute_and_save, refresh_and_save, run_plan
+from modules.llm.providers.stub import StubProvider
+from modules.storage import closure
+from modules.storage.content import save_prompt_text, save_response_text
+from modules.storage.models import User, Conversation, Node, Edge
+from modules.storage.staleness import mark_descendants_stale, stale_node_ids
+
+"""
+Tests for incremental invalidation: stale flags propagating down the closure table on content
+and edge changes, and refresh runs that re-execute only nodes whose context really changed.
+"""
+
+EDGES = [(1, 2), (2, 3), (2, 4)]
+
+@pytest.fixture(scope = "function")
+def Session(tmp_path, monkeypatch):
+    # file-backed so the sync test session and the runner's async sessions see the same rows
+    path = tmp_path / "graph.db"
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(graph_runner, "AsyncSessionLocal", async_sessionmaker(async_engine, expire_on_commit = False))
+    monkeypatch.setattr(graph_runner.llm_settings, "CACHE_ENABLED", False)
+    monkeypatch.setattr(graph_runner.llm_settings, "EMBEDDINGS_ENABLED", False)
+
+    Session = sessionmaker(bind = engine)
+    with Session() as db:
+        db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+        db.add(Conversation(id = 1, user_id = 1, title = "a"))
+        db.execute(insert(Node), [
+            {"id": i, "conversation_id": 1, "node_type": "prompt", "position_x": 0, "position_y": 0,
+             "prompt_text": f"prompt {i}", "type_data": {}}
+            for i in range(1, 5)
+        ])
+        closure.add_nodes(db, range(1, 5))
+        for source, target in EDGES:
+            db.add(Edge(conversation_id = 1, source_node_id = source, target_node_id = target))
+            closure.add_edge(db, source, target)
+        db.commit()
+    yield Session
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+def run(plan, execute):
+    async def scenario():
+        return [event async for event in run_plan(plan, execute)]
+    return asyncio.run(scenario())
+
+def by_event(events):
+    return {(event["event"], event["node_id"]) for event in events if "node_id" in event}
+
+# test 1: content writes flag executed descendants only; a new prompt also flags the node itself
+def test_propagation(Session):
+    with Session() as db:
+        for node_id in (3, 2, 1):
+            save_response_text(db, node_id, f"answer {node_id}")
+        db.commit()
+        assert stale_node_ids(db, 1) == [2, 3]      # 4 was never executed
+
+        db.execute(Node.__table__.update().values(is_stale = False))
+        save_prompt_text(db, 2, "new prompt")
+        db.commit()
+        assert stale_node_ids(db, 1) == [2, 3]
+
+        db.execute(Node.__table__.update().values(is_stale = False))
+        closure.remove_edge(db, 3)
+        assert mark_descendants_stale(db, [3], include_self = True) == 1
+        assert stale_node_ids(db) == [3]
+
+# test 2: refresh re-executes changed contexts and only clears the flag on unchanged ones
+def test_refresh(Session):
+    provider = StubProvider()
+    with Session() as db:
+        plan = build_plan(db, [1])
+    events = run(plan, lambda node_id, prompt: execute_and_save(node_id, prompt, provider = provider))
+    assert events[-1]["completed"] == 4
+    with Session() as db:
+        assert stale_node_ids(db) == []
+        assert None not in db.scalars(select(Node.context_hash)).all()
+
+    # re-running the root gives the same response: everything below is flagged, nothing changed
+    asyncio.run(execute_and_save(1, "prompt 1", provider = provider))
+    with Session() as db:
+        assert stale_node_ids(db) == [2, 3, 4]
+        plan = build_stale_plan(db, 1)
+    calls = provider.calls
+    events = run(plan, lambda node_id, prompt: refresh_and_save(node_id, prompt, provider = provider))
+    assert by_event(events) >= {("unchanged", "2"), ("unchanged", "3"), ("unchanged", "4")}
+    assert provider.calls == calls
+    with Session() as db:
+        assert stale_node_ids(db) == []
+
+    # an edited upstream response changes the context of everything below it
+    with Session() as db:
+        save_response_text(db, 2, "edited by hand")
+        db.commit()
+        plan = build_stale_plan(db, 1)
+    assert plan.node_ids == {3, 4}
+    events = run(plan, lambda node_id, prompt: refresh_and_save(node_id, prompt, provider = provider))
+    assert events[-1] == {"event": "done", "completed": 2, "failed": 0, "skipped": 0}
+    with Session() as db:
+        assert stale_node_ids(db) == []
+
+# test 3: rows from before response sizes are still flagged; /execute's hash ignores retrieved turns
+def test_legacy_rows_and_retrieval(Session, monkeypatch):
+    with Session() as db:
+        db.execute(Node.__table__.update().values(response_text = "old answer", response_size = None))
+        save_prompt_text(db, 2, "new prompt")
+        db.commit()
+        assert stale_node_ids(db) == [2, 3, 4]
+        db.execute(Node.__table__.update().values(is_stale = False))
+        db.commit()
+
+    provider = StubProvider()
+    monkeypatch.setattr(api, "_provider", lambda tier: provider)
+
+    async def related(db, node_id, query, k, scope):
+        return (ContextTurn(1, "retrieved", "turn", 2),)
+    monkeypatch.setattr(api, "related_context", related)
+
+    async def scenario():
+        async with graph_runner.AsyncSessionLocal() as db:
+            await api.execute_node(ExecuteNodeRequest(node_id = "3", prompt = "prompt 3", retrieve_k = 1), timeout = 30, db = db)
+        return await refresh_and_save(3, "prompt 3", provider = provider)
+
+    calls = provider.calls
+    assert asyncio.run(scenario()) is None and provider.calls == calls + 1
+
+# test 4: a stream keeps the old response until text arrives and flags descendants once, at the end
+def test_stream_checkpoints(Session, monkeypatch):
+    with Session() as db:
+        for node_id in (2, 3, 4):
+            save_response_text(db, node_id, f"answer {node_id}")
+        db.execute(Node.__table__.update().values(is_stale = False))
+        db.commit()
+    monkeypatch.setattr(api, "AsyncSessionLocal", graph_runner.AsyncSessionLocal)
+    monkeypatch.setattr(api.llm_settings, "STREAM_FLUSH_EVERY", 1)
+    seen = []
+
+    class Provider(StubProvider):
+        async def _stream(self, prompt, history):
+            if prompt == "fail":
+                raise RuntimeError("upstream down")
+            for chunk in ("partial ", "answer"):
+                yield chunk
+                with Session() as db:
+                    seen.append((db.get(Node, 2).response_text, stale_node_ids(db)))
+
+    def stream(prompt):
+        async def scenario():
+            return [event async for event in api._stream_execution(Provider(), 2, prompt)]
+        return asyncio.run(scenario())
+
+    stream("fail")
+    with Session() as db:
+        assert db.get(Node, 2).response_text == "answer 2" and stale_node_ids(db) == []
+
+    stream("prompt 2")
+    assert seen == [("partial ", []), ("partial answer", [])]     # checkpointed, nothing flagged yet
+    with Session() as db:
+        assert db.get(Node, 2).response_text == "partial answer" and stale_node_ids(db) == [3, 4]
@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from core.database import Base, get_async_db
+from main import app
+from modules.llm import api
+from modules.llm.id_mapper import id_mapper
+from modules.llm.pubsub import InMemoryPubSub
+from modules.llm.sync import SyncHub, _Outbox, node_added, node_content, node_moved, node_removed, edge_added
+from modules.storage.models import User, Conversation
+
+"""
+Tests for real-time graph sync: delta coalescing, numbered frames through the in-memory pub/sub,
+resuming from a sequence number, and the WebSocket endpoint.
+"""
+
+def frames_of(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(json.loads(subscriber.queue.get_nowait()))
+    return messages
+
+# test 1: a burst collapses: moves keep the last position, add + remove cancels out (edges included)
+def test_outbox_coalescing():
+    outbox = _Outbox()
+    for x in range(50):
+        outbox.add(node_moved(1, x, x))
+    outbox.add(node_added(2, 0, 0))
+    outbox.add(node_moved(2, 5, 5))
+    outbox.add(node_content(1, prompt = "a"))
+    outbox.add(node_content(1, response = "b"))
+    outbox.add(node_added(3, 0, 0))
+    outbox.add(edge_added(7, 2, 3))
+    outbox.add(node_moved(3, 1, 1))
+    outbox.add(node_removed(3))
+
+    assert outbox.deltas() == [
+        ["n~", 1, 49, 49],
+        ["n+", 2, 5, 5, "prompt"],
+        ["n*", 1, {"prompt_preview": "a", "prompt_length": 1, "response_preview": "b", "response_length": 1}],
+    ]
+
+# test 2: frames are numbered per conversation, tagged with their origin, split to fit the backend
+def test_frames_and_resume():
+    async def scenario():
+        pubsub = InMemoryPubSub()
+        hub = SyncHub(pubsub, flush_delay_ms = 0, replay_frames = 3, linger_s = 60)
+
+        async with hub.connect(1) as subscriber:
+            hub.publish(1, [node_moved(1, x, 0) for x in range(20)], origin = "tab-a")
+            hub.publish(2, [node_added(9, 0, 0)])
+            await hub.drain()
+            hello, frame = frames_of(subscriber)
+            assert hello == {"t": "hello", "seq": 0, "epoch": pubsub.epoch, "resumed": False}
+            assert frame == {"t": "d", "s": 1, "o": "tab-a", "d": [["n~", 1, 19, 0]]}
+
+            pubsub.max_message_bytes = 300
+            hub.publish(1, [node_added(node_id, 0, 0) for node_id in range(100, 120)])
+            await hub.drain()
+            split = frames_of(subscriber)
+            assert len(split) > 1 and [frame["s"] for frame in split] == list(range(2, 2 + len(split)))
+            assert sum(len(frame["d"]) for frame in split) == 20
+            last = split[-1]["s"]
+
+        # disconnected: changes keep flowing into the lingering replay buffer
+        pubsub.max_message_bytes = None
+        hub.publish(1, [node_removed(100)])
+        await hub.drain()
+
+        async with hub.connect(1, since = last, epoch = pubsub.epoch) as subscriber:
+            hello, missed = frames_of(subscriber)
+            assert hello["resumed"] and hello["seq"] == last
+            assert missed["s"] == last + 1 and missed["d"] == [["n-", 100]]
+
+        # older than the buffer, or from another epoch: start over
+        for since, epoch in ((1, pubsub.epoch), (last, "other")):
+            async with hub.connect(1, since = since, epoch = epoch) as subscriber:
+                hello, = frames_of(subscriber)
+                assert not hello["resumed"] and hello["seq"] == last + 1
+        assert hub.stats()["resumes"] == 1
+
+    asyncio.run(scenario())
+
+# test 3: websocket clients see batch edits as one frame and can resume; unknown conversations are refused
+def test_websocket(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass = StaticPool)
+    factory = async_sessionmaker(engine, expire_on_commit = False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with factory() as db:
+            db.add(User(id = 1, name = "alice", email = "alice@mail.com"))
+            db.add(Conversation(id = 1, user_id = 1, title = "sync"))
+            await db.commit()
+
+    async def override():
+        async with factory() as db:
+            yield db
+
+    asyncio.run(setup())
+    id_mapper.clear_mappings()
+    app.dependency_overrides[get_async_db] = override
+    monkeypatch.setattr(api, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(api, "sync_hub", SyncHub(InMemoryPubSub(), flush_delay_ms = 0))
+
+    batch = {"conversation_id": "1", "operations": [
+        {"op": "create_node", "temp_id": "ws_a", "position": {"x": 0, "y": 0}},
+        {"op": "create_node", "temp_id": "ws_b", "position": {"x": 0, "y": 100}},
+        {"op": "create_edge", "temp_id": "ws_e", "source_id": "ws_a", "target_id": "ws_b"},
+        {"op": "update_position", "node_id": "ws_a", "position": {"x": 5, "y": 5}},
+        {"op": "update_position", "node_id": "ws_a", "position": {"x": 9, "y": 9}},
+    ]}
+
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/llm/conversations/1/sync") as ws:
+                hello = ws.receive_json()
+                assert (hello["seq"], hello["resumed"]) == (0, False)
+
+                r = client.post("/api/llm/graph/batch", json = batch, headers = {"X-Sync-Client": "tab-1"})
+                ids = r.json()["id_mappings"]
+                a, b, e = int(ids["ws_a"]), int(ids["ws_b"]), int(ids["ws_e"])
+                frame = ws.receive_json()
+                assert frame == {"t": "d", "s": 1, "o": "tab-1",
+                                 "d": [["n+", a, 9, 9, "prompt"], ["n+", b, 0, 100, "prompt"], ["e+", e, a, b]]}
+
+            with client.websocket_connect(f"/api/llm/conversations/1/sync?since=0&epoch={hello['epoch']}") as ws:
+                assert ws.receive_json()["resumed"]
+                assert ws.receive_json()["s"] == 1
+
+            with client.websocket_connect("/api/llm/conversations/99/sync") as ws:
+                with pytest.raises(WebSocketDisconnect) as closed:
+                    ws.receive_json()
+                assert closed.value.code == 4404
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(engine.dispose())
+
+# test 4: frames from different clients keep commit order; each client's run is coalesced on its own
+def test_origin_order():
+    async def scenario():
+        hub = SyncHub(InMemoryPubSub(), flush_delay_ms = 0, linger_s = 60)
+
+        async with hub.connect(1) as subscriber:
+            hub.publish(1, [node_moved(1, 1, 1), node_moved(1, 2, 2)], origin = "tab-a")
+            hub.publish(1, [node_moved(1, 3, 3)], origin = "tab-b")
+            hub.publish(1, [node_moved(1, 4, 4)], origin = "tab-a")
+            hub.publish(1, [node_removed(1)], origin = "tab-a")
+            await hub.drain()
+            _, *frames = frames_of(subscriber)
+
+        assert [(frame["o"], frame["d"]) for frame in frames] == [
+            ("tab-a", [["n~", 1, 2, 2]]),
+            ("tab-b", [["n~", 1, 3, 3]]),
+            ("tab-a", [["n-", 1]]),
+        ]
+        assert [frame["s"] for frame in frames] == [1, 2, 3]
+
+    asyncio.run(scenario())
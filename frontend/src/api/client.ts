@@ -1,7 +1,10 @@
-import {apiQueue} from '../utils/requestQueue';
+import {BatchQueue, BatchOperationError, randomId} from '../utils/requestQueue';
 import type{
     ExecuteNodeRequest,
     ExecuteNodeResponse,
+    ExecuteGraphRequest,
+    ExecuteGraphEvent,
+    RefreshStaleRequest,
     CreateNodeRequest,
     CreateNodeResponse,
     CreateEdgeRequest,
@@ -9,10 +12,22 @@ import type{
     DeleteEdgeRequest,
     DeleteEdgeResponse,
     DeleteNodeRequest,
-    DeleteNodeResponse
+    DeleteNodeResponse,
+    BatchOperation,
+    BatchRequest,
+    BatchResponse,
+    ConversationGraphRequest,
+    ConversationGraphResponse,
+    ForkConversationResponse,
+    ForkChangesResponse
 } from '../types/api'
 
-const API_BASE_URL = 'http://localhost:8000';
+export const API_BASE_URL = 'http://localhost:8000';
+/* graph sync websockets live on the same server (http -> ws, https -> wss) */
+export const SYNC_BASE_URL = API_BASE_URL.replace(/^http/, 'ws');
+
+/* identifies this tab to graph sync, so it can skip the echoes of its own changes */
+export const SYNC_CLIENT_ID = randomId();
 
 export const executeNode = async (
     request: ExecuteNodeRequest
@@ -24,6 +39,66 @@ export const executeNode = async (
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID,
+        },
+        body: JSON.stringify(request),
+    });
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    return await response.json();
+};
+
+/* read a server-sent event stream, calling onEvent for each frame */
+const readEventStream = async (
+    response: Response,
+    onEvent: (event: string, payload: any) => void
+): Promise<void> => {
+    if(!response.body){
+        throw new Error('Response has no body to stream');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    // server-sent events are separated by a blank line
+    while(true){
+        const {value, done} = await reader.read();
+        if(done) break;
+
+        buffer += decoder.decode(value, {stream: true});
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop() ?? '';
+
+        for(const frame of frames){
+            let event = 'message';
+            let data = '';
+            for(const line of frame.split('\n')){
+                if(line.startsWith('event:')) event = line.slice(6).trim();
+                else if(line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if(data){
+                onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+};
+
+/* execute node and stream tokens back as they are generated */
+export const executeNodeStream = async (
+    request: ExecuteNodeRequest,
+    onChunk: (text: string) => void
+): Promise<ExecuteNodeResponse> => {
+
+    const response = await fetch(`${API_BASE_URL}/api/llm/execute/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID,
+            'Accept': 'text/event-stream',
         },
         body: JSON.stringify(request),
     });
@@ -32,112 +107,282 @@ export const executeNode = async (
         throw new Error(`HTTP error! status: ${response.status}`);
     }
 
+    let result: ExecuteNodeResponse | null = null;
+    await readEventStream(response, (event, payload) => {
+        if(event === 'chunk'){
+            onChunk(payload.text);
+        } else if(event === 'done'){
+            result = payload;
+        } else if(event === 'error'){
+            throw new Error(payload.detail ?? 'Streaming failed');
+        }
+    });
+
+    if(!result){
+        throw new Error('Stream ended before completion');
+    }
+    return result;
+};
+
+/* execute roots and everything downstream of them, reporting per-node progress */
+export const executeGraph = async (
+    request: ExecuteGraphRequest,
+    onEvent: (event: ExecuteGraphEvent) => void
+): Promise<void> => {
+
+    const response = await fetch(`${API_BASE_URL}/api/llm/execute/graph`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID,
+            'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify(request),
+    });
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    await readEventStream(response, (event, payload) => {
+        onEvent({...payload, event});
+    });
+};
+
+/* re-execute the conversation's stale nodes; ones whose context is unchanged report 'unchanged' */
+export const refreshStale = async (
+    request: RefreshStaleRequest,
+    onEvent: (event: ExecuteGraphEvent) => void
+): Promise<void> => {
+
+    const response = await fetch(`${API_BASE_URL}/api/llm/execute/stale`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID,
+            'Accept': 'text/event-stream',
+        },
+        body: JSON.stringify(request),
+    });
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    await readEventStream(response, (event, payload) => {
+        onEvent({...payload, event});
+    });
+};
+
+/* send a list of graph mutations as one transaction */
+export const applyBatch = async (
+    request: BatchRequest
+): Promise<BatchResponse> => {
+    const response = await fetch(`${API_BASE_URL}/api/llm/graph/batch`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID
+        },
+        body: JSON.stringify(request)
+    });
+
+    if(!response.ok){
+        const errorText = await response.text();
+        console.error('[API] Batch failed:', response.status, errorText);
+        const message = `Batch failed: ${response.status} - ${errorText}`;
+
+        // a failed operation is reported by index; the batch queue resends the others
+        let operation: unknown;
+        try{
+            operation = JSON.parse(errorText).operation;
+        }catch{
+            operation = undefined;
+        }
+        if(typeof operation === 'number'){
+            throw new BatchOperationError(message, operation);
+        }
+        throw new Error(message);
+    }
+
+    return await response.json();
+}
+
+/* load one page of a conversation's nodes and edges, optionally limited to a viewport */
+export const loadConversationGraph = async (
+    request: ConversationGraphRequest
+): Promise<ConversationGraphResponse> => {
+    const params = new URLSearchParams();
+    if(request.cursor) params.set('cursor', request.cursor);
+    if(request.limit) params.set('limit', String(request.limit));
+    if(request.mode) params.set('mode', request.mode);
+    if(request.bbox){
+        for(const [key, value] of Object.entries(request.bbox)){
+            params.set(key, String(value));
+        }
+    }
+
+    const response = await fetch(
+        `${API_BASE_URL}/api/llm/conversations/${request.conversation_id}/graph?${params}`
+    );
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    return await response.json();
+};
+
+/* branch a conversation: it and the fork share a new read-only snapshot of its nodes, and both stay editable */
+export const forkConversation = async (
+    conversationId: string,
+    title?: string
+): Promise<ForkConversationResponse> => {
+    const response = await fetch(`${API_BASE_URL}/api/llm/conversations/${conversationId}/fork`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Sync-Client': SYNC_CLIENT_ID
+        },
+        body: JSON.stringify({title})
+    });
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
     return await response.json();
 };
 
+/* freeze a conversation as a read-only snapshot */
+export const snapshotConversation = async (
+    conversationId: string
+): Promise<void> => {
+    const response = await fetch(`${API_BASE_URL}/api/llm/conversations/${conversationId}/snapshot`, {
+        method: 'POST',
+        headers: {'X-Sync-Client': SYNC_CLIENT_ID}
+    });
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+};
+
+/* a fork's own nodes and edges; with a cached copy of its snapshot, all that's needed to show it */
+export const loadForkChanges = async (
+    conversationId: string,
+    mode: 'full' | 'preview' = 'full'
+): Promise<ForkChangesResponse> => {
+    const response = await fetch(
+        `${API_BASE_URL}/api/llm/conversations/${conversationId}/changes?mode=${mode}`
+    );
+
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    return await response.json();
+};
+
+/* download link for a conversation archive (compressed; streams however large the graph is) */
+export const conversationExportUrl = (conversationId: string): string =>
+    `${API_BASE_URL}/api/llm/conversations/${conversationId}/export`;
+
+/* load an archive from conversationExportUrl as a new conversation; returns its id */
+export const importConversation = async (
+    archive: Blob,
+    title?: string
+): Promise<string> => {
+    const params = new URLSearchParams();
+    if(title) params.set('title', title);
+    const response = await fetch(`${API_BASE_URL}/api/llm/conversations/import?${params}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/octet-stream',
+            'X-Sync-Client': SYNC_CLIENT_ID
+        },
+        body: archive
+    });
+
+    if(!response.ok){
+        const errorText = await response.text();
+        throw new Error(`Import failed: ${response.status} - ${errorText}`);
+    }
+
+    return (await response.json()).conversation_id;
+};
+
+/* fetch a full prompt/response body; pass the previous etag to skip unchanged bodies (returns null) */
+export const fetchNodeBody = async (
+    nodeId: string,
+    field: 'prompt' | 'response' = 'response',
+    etag?: string
+): Promise<{ body: string; etag: string | null } | null> => {
+    const response = await fetch(
+        `${API_BASE_URL}/api/llm/nodes/${nodeId}/body?field=${field}`,
+        { headers: etag ? { 'If-None-Match': etag } : {} }
+    );
+
+    if(response.status === 304){
+        return null;
+    }
+    if(!response.ok){
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    return { body: await response.text(), etag: response.headers.get('ETag') };
+};
+
+/* graph mutations made in the same tick, or while a batch is in flight, are coalesced into one batch request */
+const graphBatch = new BatchQueue<BatchOperation, any>(async (operations) => {
+    console.log(`[API] Sending batch of ${operations.length} operation(s)`);
+    const result = await applyBatch({operations});
+    return result.results;
+});
+
 /* hit backend to create node */
 export const createNode = async (
     request: CreateNodeRequest
 ): Promise<CreateNodeResponse> => {
-    return apiQueue.enqueue(async () => {
-
-        // node creation via backend
-        const response = await fetch(`${API_BASE_URL}/api/llm/nodes/create`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(request)
-        });
-
-        if(!response.ok){
-            throw new Error(`Failed to create node: ${response.status}`)
-        }
-
-        return await response.json();
-    })
+    return graphBatch.enqueue({op: 'create_node', ...request});
 }
 
 /* hit backend to create ege */
 export const createEdge = async (
     request: CreateEdgeRequest
 ): Promise<CreateEdgeResponse> => {
-    return apiQueue.enqueue(async () => {
-
-        // actual edge creation
-        const response = await fetch(`${API_BASE_URL}/api/llm/edges/create`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(request)
-        })
-
-        if(!response.ok){
-            throw new Error(`Failed to create edge: ${response.status}`)
-        }
-
-        return await response.json()
-    })
+    return graphBatch.enqueue({op: 'create_edge', ...request});
 }
 
 export const deleteEdge = async (
     request: DeleteEdgeRequest
 ): Promise<DeleteEdgeResponse> => {
-    return apiQueue.enqueue(async () => {
-        console.log('[FrontendAPI] Deleting edge:', request.edge_id);
-
-        const response = await fetch(`${API_BASE_URL}/api/llm/edges/delete`,{
-            method: 'DELETE',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(request)
-        })
-        
-        if(!response.ok){
-            const errorText = await response.text();
-            console.error('[API] Delete edge failed:', response.status, errorText);
-            throw new Error(`Failed to delete edge: ${response.status} - ${errorText}`)
+    console.log('[FrontendAPI] Deleting edge:', request.edge_id);
 
-        }
+    const result = await graphBatch.enqueue({op: 'delete_edge', ...request});
+    if(result.status === 'not_found'){
+        throw new Error(`Failed to delete edge: 404 - edge ${request.edge_id} not found`);
+    }
 
-        const result = await response.json();
-        console.log('[API] Delete edge success:', result);
-        return result;
-    });
+    console.log('[API] Delete edge success:', result);
+    return result;
 }
 
 export const deleteNode = async(
     request: DeleteNodeRequest
 ): Promise<DeleteNodeResponse> => {
+    console.log('[API] Deleting node:', request.node_id);
 
-    return apiQueue.enqueue(async () => {
-
-        console.log('[API] Deleting node:', request.node_id);
-
-        const response = await fetch(`${API_BASE_URL}/api/llm/nodes/delete`, {
-            method: 'DELETE',
-            headers:{
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(request)
-        });
-
-        // handle bad response
-        if(!response.ok){
-            const errorText = await response.text();
-            console.error('[API] Delete node failed:', response.status, errorText);
-            throw new Error(`Failed to delete node: ${response.status} - ${errorText}`);
-        }
+    const result = await graphBatch.enqueue({op: 'delete_node', ...request});
+    if(result.status === 'not_found'){
+        throw new Error(`Failed to delete node: 404 - node ${request.node_id} not found`);
+    }
 
-        const result = await response.json();
-        console.log('[API] Delete node success:', result);
-        // Log cascade deletion info
-        if (result.edges_deleted_count > 0) {
-            console.log(`[API] Cascade-deleted ${result.edges_deleted_count} edge(s)`);
-        }
+    console.log('[API] Delete node success:', result);
+    // Log cascade deletion info
+    if (result.edges_deleted_count > 0) {
+        console.log(`[API] Cascade-deleted ${result.edges_deleted_count} edge(s)`);
+    }
 
-        return result;
-    });
-}
\ No newline at end of file
+    return result;
+}
@@ -6,7 +6,7 @@ import {
 import { useCallback, memo, useMemo } from 'react';
 
 import './PromptNode.css';
-import {executeNode} from '../api/client';
+import {executeNodeStream} from '../api/client';
 import {useModal} from '../contexts/ModalContext'
 import {useNodeState} from '../hooks/useNodeState';
 
@@ -17,6 +17,7 @@ function PromptNode({ id, selected, dragging} : NodeProps) {
         state,
         setPrompt,
         startLoading,
+        setPartialResponse,
         setResponse,
         setError,
         updateId
@@ -37,15 +38,20 @@ function PromptNode({ id, selected, dragging} : NodeProps) {
         console.log('[PromptNode] Submitting prompt:', state.prompt);
         startLoading();
         
-        // send prompt to whatever LLM
+        // send prompt to whatever LLM, rendering tokens as they stream in
         try{
-            const response = await executeNode({node_id: state.id, prompt: state.prompt});
+            let partial = '';
+            const response = await executeNodeStream(
+                {node_id: state.id, prompt: state.prompt},
+                (chunk) => {
+                    partial += chunk;
+                    setPartialResponse(partial);
+                }
+            );
             console.log('[PromptNode] Received response:', response);
 
             // update response text in node
-            if(response.response){
-                setResponse(response.response);
-            }
+            setResponse(response.response ?? partial);
 
             // update ID
             if(response.node_id && response.node_id !== state.id){
@@ -58,7 +64,7 @@ function PromptNode({ id, selected, dragging} : NodeProps) {
         }
 
         // display response 
-    }, [state.id, state.prompt, startLoading, setResponse, setError, updateId]);
+    }, [state.id, state.prompt, startLoading, setPartialResponse, setResponse, setError, updateId]);
 
     const handleOpenModal = useCallback(() => {
         openModal({
@@ -75,7 +81,7 @@ function PromptNode({ id, selected, dragging} : NodeProps) {
         if(state.error){
             return <span style={{ color: '#dc3545' }}>Error: {state.error}</span>;
         }
-        if(state.isLoading){
+        if(state.isLoading && !state.response){
             return <span style={{ color: '#007bff' }}>Loading...</span>;
         }
         if(!state.response){
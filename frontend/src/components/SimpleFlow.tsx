@@ -19,15 +19,58 @@ import { ReactFlow, ConnectionMode,
 import '@xyflow/react/dist/style.css';
 import PromptNode from './PromptNode';
 import {generateTempId} from '../utils/requestQueue';
+import {useGraphSync, applyNodeDeltas, applyEdgeDeltas} from '../hooks/useGraphSync';
 import {
     createNode as createNodeAPI,
     createEdge as createEdgeAPI,
     deleteEdge as deleteEdgeAPI,
     deleteNode as deleteNodeAPI,
+    loadConversationGraph,
 } from '../api/client';
+import type {GraphDelta, GraphNodeData} from '../types/api';
 
 const nodeTypes: NodeTypes = { prompt: PromptNode }
 
+const flowNode = (id: string, position: {x: number; y: number}, data: Record<string, unknown>, nodeType = 'prompt'): Node => ({
+    id,
+    type: nodeType in nodeTypes ? nodeType : 'prompt',
+    position,
+    data,
+    connectable: true,
+    draggable: true,
+    selectable: true,
+    deletable: true,
+    focusable: true
+});
+
+/** an edge the backend already has (loaded, or added in another tab) */
+const confirmedEdge = (id: string, source: string, target: string): Edge => ({
+    id,
+    source,
+    target,
+    type: 'default',
+    selectable: true,
+    focusable: true,
+    markerEnd: {
+        type: MarkerType.ArrowClosed,
+        width: 10,
+        height: 10,
+        color: '#555'
+    },
+    data: {status: 'confirmed'},
+    style: {
+        strokeWidth: 2,
+        stroke: '#555'
+    }
+});
+
+const nodeData = (node: GraphNodeData): Record<string, unknown> => ({
+    label: `Node ${node.id}`,
+    prompt: node.prompt_preview,
+    response: node.response_preview,
+    is_stale: node.is_stale
+});
+
 function SimpleFlow() {
 
     const [nodes, setNodes] = useState<Node[]>([]);
@@ -36,6 +79,40 @@ function SimpleFlow() {
     const [isCreatingNode, setIsCreatingNode] = useState(false);
     const [conversationId] = useState(1)
 
+    /** (re)load the whole graph: on connect, and whenever sync can't replay what was missed */
+    const loadGraph = useCallback(async () => {
+        const loadedNodes: Node[] = [];
+        const loadedEdges: Edge[] = [];
+        let cursor: string | undefined;
+        try{
+            do{
+                const page = await loadConversationGraph({
+                    conversation_id: String(conversationId),
+                    cursor,
+                    mode: 'preview'
+                });
+                loadedNodes.push(...page.nodes.map(node => flowNode(node.id, node.position, nodeData(node), node.node_type)));
+                loadedEdges.push(...page.edges.map(edge => confirmedEdge(edge.id, edge.source, edge.target)));
+                cursor = page.next_cursor ?? undefined;
+            } while(cursor);
+        }catch(error){
+            console.error('[SimpleFlow] Failed to load graph:', error);
+            return;
+        }
+
+        // nodes and edges still waiting on the backend aren't in the loaded graph yet
+        setNodes((nds) => [...loadedNodes, ...nds.filter(node => node.id.startsWith('temp_'))]);
+        setEdges((eds) => [...loadedEdges, ...eds.filter(edge => edge.id.startsWith('temp_'))]);
+    }, [conversationId]);
+
+    /** changes made in other tabs */
+    const applySyncDeltas = useCallback((deltas: GraphDelta[]) => {
+        setNodes((nds) => applyNodeDeltas(nds, deltas, (id, position, nodeType) => flowNode(id, position, {label: `Node ${id}`}, nodeType)));
+        setEdges((eds) => applyEdgeDeltas(eds, deltas, confirmedEdge));
+    }, []);
+
+    useGraphSync(conversationId, applySyncDeltas, loadGraph);
+
     const onNodesChange: OnNodesChange = useCallback(
 
 
@@ -136,19 +213,7 @@ function SimpleFlow() {
             y: baseY + (row * offsetY),
         };
 
-        const newNode: Node = {
-            id: tempId,
-            type: 'prompt',
-            position: position,
-            data: {
-                label: `Node ${nodeIdCounter}`,
-            },
-            connectable: true,
-            draggable: true,
-            selectable: true,
-            deletable: true,
-            focusable: true
-        };
+        const newNode = flowNode(tempId, position, {label: `Node ${nodeIdCounter}`});
 
         setNodes((nds) => [...nds, newNode]);
         setNodeIdCounter((count) => count + 1);
@@ -157,7 +222,8 @@ function SimpleFlow() {
         try{
             const response = await createNodeAPI({
                 position,
-                conversation_id: String(conversationId)
+                conversation_id: String(conversationId),
+                temp_id: tempId
             });
 
             console.log('[SimpleFlow] Backend confirmed node:', response.node_id);
@@ -0,0 +1,167 @@
+import {useEffect, useRef} from 'react';
+import type {Edge, Node} from '@xyflow/react';
+import {SYNC_BASE_URL, SYNC_CLIENT_ID} from '../api/client';
+import type {GraphDelta, SyncMessage} from '../types/api';
+
+/**
+ * custom hook for real-time graph sync: keeps a websocket open for the conversation and hands
+ * other tabs' changes to onDeltas. reconnects with the last seen sequence number so missed frames
+ * are replayed; when that isn't possible (or frames were lost) onReload should refetch the graph
+ */
+
+const MAX_RETRY_MS = 10_000;
+
+export function useGraphSync(
+    conversationId: string | number,
+    onDeltas: (deltas: GraphDelta[]) => void,
+    onReload: () => void
+){
+    // latest callbacks without reopening the socket on every render
+    const handlers = useRef({onDeltas, onReload});
+    handlers.current = {onDeltas, onReload};
+
+    useEffect(() => {
+        let socket: WebSocket | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let retryMs = 500;
+        let closed = false;
+        let seq: number | null = null;
+        let epoch: string | null = null;
+
+        const connect = () => {
+            const params = new URLSearchParams();
+            if(seq !== null && epoch !== null){
+                params.set('since', String(seq));
+                params.set('epoch', epoch);
+            }
+            socket = new WebSocket(`${SYNC_BASE_URL}/api/llm/conversations/${conversationId}/sync?${params}`);
+
+            socket.onmessage = (event) => {
+                const message: SyncMessage = JSON.parse(event.data);
+
+                if(message.t === 'hello'){
+                    retryMs = 500;
+                    if(!message.resumed){
+                        handlers.current.onReload();
+                    }
+                    seq = message.seq;
+                    epoch = message.epoch;
+                } else if(message.t === 'd'){
+                    seq = message.s;
+                    // our own changes are already applied locally
+                    if(message.o !== SYNC_CLIENT_ID){
+                        handlers.current.onDeltas(message.d);
+                    }
+                } else if(message.t === 'reset'){
+                    console.log('[GraphSync] Missed updates, reloading graph');
+                    seq = null;
+                    socket?.close();
+                }
+            };
+
+            socket.onclose = (event) => {
+                if(closed) return;
+                if(event.code === 4404){
+                    console.error(`[GraphSync] Conversation ${conversationId} not found`);
+                    return;
+                }
+                retryTimer = setTimeout(connect, retryMs);
+                retryMs = Math.min(retryMs * 2, MAX_RETRY_MS);
+            };
+        };
+
+        connect();
+
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            socket?.close();
+        };
+    }, [conversationId]);
+}
+
+/* apply deltas to react flow nodes; newNode builds a node another tab added */
+export function applyNodeDeltas(
+    nodes: Node[],
+    deltas: GraphDelta[],
+    newNode: (id: string, position: {x: number; y: number}, nodeType: string) => Node
+): Node[]{
+    let next = nodes;
+    for(const delta of deltas){
+        switch(delta[0]){
+            case 'n+': {
+                const id = String(delta[1]);
+                if(!next.some(node => node.id === id)){
+                    next = [...next, newNode(id, {x: delta[2], y: delta[3]}, delta[4])];
+                }
+                break;
+            }
+            case 'n~': {
+                const id = String(delta[1]);
+                next = next.map(node => node.id === id ? {...node, position: {x: delta[2], y: delta[3]}} : node);
+                break;
+            }
+            case 'n*': {
+                const id = String(delta[1]);
+                next = next.map(node => node.id === id ? {...node, data: {...node.data, ...delta[2]}} : node);
+                break;
+            }
+            case 'n-': {
+                const id = String(delta[1]);
+                next = next.filter(node => node.id !== id);
+                break;
+            }
+            case 'n=': {
+                // a fork copied an inherited node: the copy takes its place
+                const [oldId, newId] = [String(delta[1]), String(delta[2])];
+                next = next.map(node => node.id === oldId ? {...node, id: newId} : node);
+                break;
+            }
+        }
+    }
+    return next;
+}
+
+/* apply deltas to react flow edges; newEdge builds an edge another tab added */
+export function applyEdgeDeltas(
+    edges: Edge[],
+    deltas: GraphDelta[],
+    newEdge: (id: string, source: string, target: string) => Edge
+): Edge[]{
+    let next = edges;
+    for(const delta of deltas){
+        switch(delta[0]){
+            case 'e+': {
+                const id = String(delta[1]);
+                if(!next.some(edge => edge.id === id)){
+                    next = [...next, newEdge(id, String(delta[2]), String(delta[3]))];
+                }
+                break;
+            }
+            case 'e-': {
+                const id = String(delta[1]);
+                next = next.filter(edge => edge.id !== id);
+                break;
+            }
+            case 'n-': {
+                // the backend removes a deleted node's edges with it
+                const id = String(delta[1]);
+                next = next.filter(edge => edge.source !== id && edge.target !== id);
+                break;
+            }
+            case 'n=': {
+                const [oldId, newId] = [String(delta[1]), String(delta[2])];
+                next = next.map(edge => edge.source === oldId || edge.target === oldId
+                    ? {
+                        ...edge,
+                        source: edge.source === oldId ? newId : edge.source,
+                        target: edge.target === oldId ? newId : edge.target
+                    }
+                    : edge
+                );
+                break;
+            }
+        }
+    }
+    return next;
+}
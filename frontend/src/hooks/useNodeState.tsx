@@ -36,10 +36,15 @@ export function useNodeState(initialId: string){
             isLoading: true,
             error: null,
             status: 'pending',
-            response: 'Loading...'
+            response: ''
         }));
     }, []);
 
+    /** show partial response while tokens are still streaming in */
+    const setPartialResponse = useCallback((response: string) => {
+        setState(prev => ({ ...prev, response }));
+    }, []);
+
     /** set response after successful call. following ok backend response */
     const setResponse = useCallback((response: string) => {
         setState(prev => ({
@@ -87,6 +92,7 @@ export function useNodeState(initialId: string){
         state,
         setPrompt,
         startLoading,
+        setPartialResponse,
         setResponse,
         setError,
         updateId,
@@ -7,6 +7,7 @@ export interface NodeSnapshot{
 export interface CreateNodeRequest{
     position: { x: number; y: number };
     conversation_id?: string;
+    temp_id?: string;
 }
 
 export interface CreateNodeResponse{
@@ -39,6 +40,15 @@ export interface CreateEdgeResponse{
 export interface ExecuteNodeRequest{
     node_id: string;
     prompt: string;
+    bypass_cache?: boolean;
+    invalidate_cache?: boolean;
+    // model tier configured on the backend (e.g. "fast"); omit for the default model
+    tier?: string;
+    // add up to N similar nodes from elsewhere in the conversation (or all of the user's) as context
+    retrieve_k?: number;
+    retrieval_scope?: 'conversation' | 'user';
+    // the fork being worked in, when the node was inherited from a snapshot
+    conversation_id?: string;
 }
 
 export interface ExecuteNodeResponse{
@@ -46,6 +56,31 @@ export interface ExecuteNodeResponse{
     node_id: string;
     message?: string;
     response?: string;
+    cached?: boolean;
+}
+
+export interface ExecuteGraphRequest{
+    node_ids: string[];
+    max_workers?: number;
+    bypass_cache?: boolean;
+    invalidate_cache?: boolean;
+    tier?: string;
+    conversation_id?: string;
+}
+
+export interface RefreshStaleRequest{
+    conversation_id: string;
+    max_workers?: number;
+    tier?: string;
+}
+
+export interface ExecuteGraphEvent{
+    event: 'plan' | 'started' | 'completed' | 'unchanged' | 'failed' | 'skipped' | 'done';
+    node_id?: string;
+    response?: string;
+    detail?: string;
+    reason?: string;
+    node_count?: number;
 }
 
 export interface DeleteEdgeRequest{
@@ -69,7 +104,92 @@ export interface DeleteNodeResponse{
     edges_deleted_count?: number;
 }
 
+export interface BatchOperation{
+    op: 'create_node' | 'create_edge' | 'delete_node' | 'delete_edge' | 'update_position';
+    temp_id?: string;
+    node_id?: string;
+    edge_id?: string;
+    source_id?: string;
+    target_id?: string;
+    position?: { x: number; y: number };
+    conversation_id?: string;
+}
+
+export interface BatchRequest{
+    operations: BatchOperation[];
+    conversation_id?: string;
+}
+
+export interface BatchResponse{
+    status: string;
+    id_mappings: { [tempId: string]: string };
+    results: any[];
+}
+
+export interface GraphNodeData{
+    id: string;
+    node_type: string;
+    position: { x: number; y: number };
+    type_data: { [key: string]: any };
+    // an upstream node changed since this one was executed
+    is_stale: boolean;
+    // full mode
+    prompt?: string;
+    response?: string | null;
+    // preview mode (lengths in UTF-8 bytes); full bodies via fetchNodeBody
+    prompt_preview?: string;
+    prompt_length?: number;
+    response_preview?: string | null;
+    response_length?: number;
+}
+
+export interface ConversationGraphRequest{
+    conversation_id: string;
+    cursor?: string;
+    limit?: number;
+    // viewport: all four or none
+    bbox?: { min_x: number; min_y: number; max_x: number; max_y: number };
+    mode?: 'full' | 'preview';
+}
+
+export interface ConversationGraphResponse{
+    conversation_id: string;
+    nodes: GraphNodeData[];
+    edges: EdgeData[];
+    next_cursor: string | null;
+    has_more: boolean;
+}
+
+export interface ForkConversationResponse{
+    status: string;
+    conversation_id: string;
+    base_conversation_id: string;
+}
+
+// what a fork changed on top of its snapshot; copied nodes name the snapshot node they replace
+export interface ForkChangesResponse{
+    conversation_id: string;
+    snapshot_id: string;
+    nodes: (GraphNodeData & { replaces?: string })[];
+    edges: EdgeData[];
+}
+
 // maps frontend id to ground truth ID
 export interface IDMapping{
     [tempId: string]: string;
-};
\ No newline at end of file
+};
+// real-time sync deltas (backend modules/llm/sync.py), compact arrays keyed by their first element
+export type GraphDelta =
+    | ['n+', number, number, number, string]           // node added: id, x, y, node_type
+    | ['n~', number, number, number]                   // node moved: id, x, y
+    | ['n*', number, Partial<GraphNodeData>]           // node content changed: previews + lengths
+    | ['n-', number]                                   // node removed
+    | ['n=', number, number]                           // node replaced by the fork's copy: id, new id
+    | ['e+', number, number, number]                   // edge added: id, source, target
+    | ['e-', number];                                  // edge removed
+
+export type SyncMessage =
+    | { t: 'hello'; seq: number; epoch: string; resumed: boolean }
+    // s: sequence number, o: X-Sync-Client of the tab that made the change (if any)
+    | { t: 'd'; s: number; o: string | null; d: GraphDelta[] }
+    | { t: 'reset' };
@@ -36,11 +36,113 @@ class RequestQueue{
 }
 
 export const apiQueue = new RequestQueue();
-export function generateTempId(): string{
+
+type BatchSender<Op, Result> = (operations: Op[]) => Promise<Result[]>;
+
+interface PendingOperation<Op, Result>{
+    operation: Op;
+    resolve: (result: Result) => void;
+    reject: (error: unknown) => void;
+}
+
+/** thrown by a batch sender when the server names the operation that failed (the rest were rolled back) */
+class BatchOperationError extends Error{
+    index: number;
+
+    constructor(message: string, index: number){
+        super(message);
+        this.name = 'BatchOperationError';
+        this.index = index;
+    }
+}
+
+/**
+ * coalesces operations into batch requests, one in flight at a time: everything enqueued while a
+ * batch is being sent goes out together in the next one. batches are sent through a RequestQueue
+ * so they stay ordered with other queued calls.
+ * a batch is one transaction. when the server names the failing operation, only that one is
+ * rejected and the others are sent again; operations depending on it then fail on their own.
+ */
+class BatchQueue<Op, Result>{
+    private pending: PendingOperation<Op, Result>[] = [];
+    private scheduled = false;
+    private inFlight = false;
+    private send: BatchSender<Op, Result>;
+    private queue: RequestQueue;
+    private maxBatchSize: number;
+
+    constructor(send: BatchSender<Op, Result>, queue: RequestQueue = apiQueue, maxBatchSize = 500){
+        this.send = send;
+        this.queue = queue;
+        this.maxBatchSize = maxBatchSize;
+    }
+
+    enqueue(operation: Op): Promise<Result>{
+        return new Promise<Result>((resolve, reject) => {
+            this.pending.push({operation, resolve, reject});
+
+            // while a batch is in flight, its completion sends whatever has piled up
+            if(this.inFlight) return;
+            if(this.pending.length >= this.maxBatchSize){
+                this.flush();
+            } else if(!this.scheduled){
+                this.scheduled = true;
+                setTimeout(() => this.flush(), 0);
+            }
+        });
+    }
+
+    getPendingCount(): number{
+        return this.pending.length;
+    }
+
+    private flush(): void{
+        this.scheduled = false;
+        if(this.inFlight || this.pending.length === 0) return;
+
+        const batch = this.pending.slice(0, this.maxBatchSize);
+        this.pending = this.pending.slice(this.maxBatchSize);
+        this.inFlight = true;
+
+        this.queue.enqueue(() => this.sendBatch(batch))
+            .catch(() => {})
+            .finally(() => {
+                this.inFlight = false;
+                this.flush();
+            });
+    }
+
+    private async sendBatch(batch: PendingOperation<Op, Result>[]): Promise<void>{
+        let remaining = batch;
+        while(remaining.length > 0){
+            try{
+                const results = await this.send(remaining.map(item => item.operation));
+                remaining.forEach((item, i) => item.resolve(results[i]));
+                return;
+            }catch(error){
+                const index = error instanceof BatchOperationError ? error.index : -1;
+                if(index < 0 || index >= remaining.length){
+                    // no way to tell which operation failed: every operation in it failed
+                    remaining.forEach(item => item.reject(error));
+                    return;
+                }
+                remaining[index].reject(error);
+                remaining = remaining.filter((_, i) => i !== index);
+            }
+        }
+    }
+}
+
+/* a random id; crypto.randomUUID only exists in secure contexts (https, localhost) */
+export function randomId(): string{
     if(typeof crypto !== 'undefined' && crypto.randomUUID){
-        return `temp_${crypto.randomUUID()}`;
+        return crypto.randomUUID();
     }
 
-    return `temp_${Date.now()}_${Math.random().toString(36).substring(2, 9)}`
+    return `${Date.now()}_${Math.random().toString(36).substring(2, 9)}`
+}
+
+export function generateTempId(): string{
+    return `temp_${randomId()}`;
 }
-export { RequestQueue }
\ No newline at end of file
+export { RequestQueue, BatchQueue, BatchOperationError }
\ No newline at end of file
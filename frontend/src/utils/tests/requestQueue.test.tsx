@@ -1,4 +1,4 @@
-import { RequestQueue } from "../requestQueue";
+import { RequestQueue, BatchQueue, BatchOperationError } from "../requestQueue";
 
 const testRequestQueue = async (): Promise<void> => {
 
@@ -37,4 +37,53 @@ const testRequestQueue = async (): Promise<void> => {
     // otherwise: promise ordering is not handled properly by queue
 }
 
-testRequestQueue();
\ No newline at end of file
+testRequestQueue();
+
+const testBatchQueue = async (): Promise<void> => {
+
+    const sentBatches: number[][] = [];
+    const batchQueue = new BatchQueue<number, number>(async (operations) => {
+        sentBatches.push(operations);
+        return operations.map(op => op * 10);
+    }, new RequestQueue());
+
+    // enqueued in the same tick: should be coalesced into one batch
+    const results = await Promise.all([
+        batchQueue.enqueue(1),
+        batchQueue.enqueue(2),
+        batchQueue.enqueue(3)
+    ]);
+    await batchQueue.enqueue(4);
+
+    console.log(`batches: ${JSON.stringify(sentBatches)}, results: ${results}`)
+    // expect: batches [[1,2,3],[4]], results 10,20,30
+}
+
+testBatchQueue();
+
+const testBatchQueueInFlight = async (): Promise<void> => {
+
+    const sentBatches: number[][] = [];
+    const batchQueue = new BatchQueue<number, number>(async (operations) => {
+        sentBatches.push(operations);
+        await new Promise(resolve => setTimeout(resolve, 20));
+        // the server names the failing operation; nothing else in the batch was applied
+        const failed = operations.indexOf(13);
+        if(failed >= 0){
+            throw new BatchOperationError('Operation failed', failed);
+        }
+        return operations.map(op => op * 10);
+    }, new RequestQueue());
+
+    const first = batchQueue.enqueue(11);
+    // enqueued on later ticks while the first batch is in flight: should ride together in the next one
+    await new Promise(resolve => setTimeout(resolve, 5));
+    const rest = [12, 13, 14].map(op => batchQueue.enqueue(op).catch(() => -1));
+
+    const results = await Promise.all([first, ...rest]);
+
+    console.log(`batches: ${JSON.stringify(sentBatches)}, results: ${results}`)
+    // expect: batches [[11],[12,13,14],[12,14]], results 110,120,-1,140
+}
+
+testBatchQueueInFlight();